@@ -11,7 +11,10 @@ import template
 from pox.lib.util import dpidToStr
 #from gui_to_pofmanager import *
 import string
+import json
+from collections import OrderedDict
 from pox.lib.revent.revent import EventMixin
+from cache import CachedRender, JSONCache
 
 ###################################################################
 global links
@@ -78,6 +81,9 @@ class POFdesk(EventMixin):
                       {'root':local_path},True)
         local_path=path_prase('data')
         httpd.set_handler("/data", StaticContentHandler, {'root':local_path}, True)
+        httpd.set_handler("/pofdesk/", datahandler, {}, True)
+        core.PofManager.addListenerByName("FlowTableChanged", tables_json.invalidate)
+        core.PofManager.addListenerByName("PortStatusChanged", ports_json.invalidate)
         for key in protocols.keys():
             match_field_list = []
             field_list=[]
@@ -94,6 +100,7 @@ class POFdesk(EventMixin):
         ss=dpidToStr(event.dpid)
         Tables[ss]=[]
         Flow_entry_list[ss]=[]
+        self._invalidate_all()
     def _handle_ConnectionDown (self, event):
         global Flow_entry_list
         global ports
@@ -108,6 +115,12 @@ class POFdesk(EventMixin):
         for port in ports:
             if port[0]==ss:
                 ports.remove(port)
+        self._invalidate_all()
+
+    def _invalidate_all (self):
+        topology_json.invalidate()
+        ports_json.invalidate()
+        tables_json.invalidate()
     
     def _handle_PortStatus (self, event):
         """
@@ -131,6 +144,7 @@ class POFdesk(EventMixin):
             links.add((s1,s2))
         elif event.removed and (s1,s2) in links:
             links.remove((s1,s2))
+        topology_json.invalidate()
             
 def path_prase(local_path):
 #find the real path
@@ -149,6 +163,83 @@ def OnlyStr(s,oth=''):
         if not c in fomart:
             s = s.replace(c,'');
     return s;  
+
+###################################################################
+'''
+Pages are compiled once, and again only when their file changes.  The data
+they show is served as JSON from /pofdesk/ and built once per change: each
+JSONCache is invalidated by the events that change what it holds.
+'''
+render = CachedRender(path_prase('template'))
+
+def build_topology():
+    switches = sorted(core.PofManager.switches.keys())
+    return {'device':[{'id':dpidToStr(switch)} for switch in switches],
+            'links':[{'source':s1, 'target':s2} for s1, s2 in sorted(list(links))]}
+
+_port_fields = (('portId', 'port_id'), ('hardwareAddress', 'hw_addr'), ('name', 'name'),
+                ('config', 'config'), ('state', 'state'), ('currentFeatures', 'curr'),
+                ('advertisedFeatures', 'advertised'), ('supportedFeatures', 'supported'),
+                ('peerFeatures', 'peer'), ('currentSpeed', 'curr_speed'),
+                ('maxSpeed', 'max_speed'), ('openflowEnable', 'of_enable'))
+
+def build_ports():
+    # port.html lays the columns out in this order
+    r = OrderedDict()
+    for device_id in sorted(core.PofManager.switches.keys()):
+        switch = dpidToStr(device_id)
+        r[switch] = []
+        for port_id in core.PofManager.get_all_port_id(device_id) or []:
+            status = core.PofManager.get_port_status(device_id, port_id)
+            if status is None:
+                continue
+            port = OrderedDict([('deviceId', switch)])
+            for key, attr in _port_fields:
+                port[key] = str(getattr(status.desc, attr))
+            r[switch].append(port)
+    return r
+
+def build_tables():
+    # the table page's current view, with each table's entry count from PofManager
+    tables = {}
+    for switch, table_list in showtables.items():
+        device_id = int(OnlyStr(switch), 16)
+        tables[switch] = []
+        for table in table_list:
+            if not table:
+                continue
+            table = dict(table)
+            entries = core.PofManager.database.get_flow_entries_map(device_id, table['global_id'])
+            table['entry_count'] = len(entries) if entries is not None else 0
+            tables[switch].append(table)
+    entries = {}
+    for switch, entry_list in showflowentrys.items():
+        entries[switch] = [entry for entry in entry_list if entry]
+    return {'tables':tables, 'entries':entries}
+
+topology_json = JSONCache(build_topology)
+ports_json = JSONCache(build_ports)
+tables_json = JSONCache(build_tables)
+
+class datahandler(SplitRequestHandler):
+    '''
+    serves the cached JSON the pages render: topology.json, ports.json, tables.json
+    '''
+    caches = {'/topology.json':topology_json,
+              '/ports.json':ports_json,
+              '/tables.json':tables_json}
+    def do_GET(self):
+        cache = self.caches.get(self.path.split('?')[0])
+        if cache is None:
+            self.send_error(404, "No such data")
+            return
+        s = cache.get()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(s)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(s)
     
 # class topohandler(StaticContentHandler):
 #     """
@@ -213,42 +304,12 @@ class topohandler(StaticContentHandler):
     """
     def do_GET (self): 
           
-        global links
         print "it is topo get"
-        ovs_switches=[]
-        for switch in core.PofManager.switches.keys():
-            ovs_switches.append(dpidToStr(switch))
         if self.path.startswith('/static/'):
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self) #load static source
         else:   
-            i=0
-            jsonStr=""
-            for switch in ovs_switches:
-                if i==0:
-                    jsonStr+='{"device":[{"id":"'+switch+'"}'
-                    i+=1
-                else:
-                    jsonStr+=',{"id":"'+switch+'"}'
-                    i+=1
-            jsonStr+=']'
-            i=0
-            if links:
-                for link in links:
-                    if i == 0:
-                        jsonStr+=',"links":[{"source":"'+link[0]+'","target":"'+link[1]+'"}'
-                        i+=1
-                    else:
-                        jsonStr+=',{"source":"'+link[0]+'","target":"'+link[1]+'"}'
-                        i+=1
-                jsonStr+=']}'
-            else:
-                jsonStr+='}'   
-            path=path_prase('template')
-            render = template.render(path)
-            s=render.topology(jsonStr)
-              
-            s=str(s)
-            s=s.replace('&quot;', '"')#translate &quot into "
+            # the page fetches its data from /pofdesk/topology.json
+            s=str(render.topology())
             self.send_response(200)
             self.send_header('Content-type','text/html')
             self.end_headers()
@@ -295,8 +356,6 @@ class protocolhandler(StaticContentHandler):
         if self.path.startswith('/static/'):
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self) #load static source
         else:
-            path=path_prase('template')
-            render = template.render(path)
             s=render.protocol(self.Operation_argument,protocols,protocol,protocol_name,Switch_list,Table_entry,Metadata,Flow_entry_list,ports,Tables,Table,fields)           
             s=str(s)
             s=s.replace('&quot;', '"')#translate &quot into "
@@ -514,8 +573,7 @@ class protocolhandler(StaticContentHandler):
             self.file.close()
             self.Operation_argument['save_flag']=1
 ###################to send message to HTML#################################
-        path=path_prase('template')
-        render = template.render(path)
+        tables_json.invalidate()
         f=render.protocol(self.Operation_argument,protocols,protocol,protocol_name,Switch_list,Table_entry,Metadata,Flow_entry_list,ports,Tables,Table,fields)
         self.send_response(200)
         self.end_headers()
@@ -535,14 +593,12 @@ class tablehandler(StaticContentHandler):
         if self.path.startswith('/static/'):
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self) #load static source
         else:
-            showflowentrys=Flow_entry_list
-            showtables=Tables
-            print showflowentrys
-            path=path_prase('template')
-            render = template.render(path)
-            s=render.table(showflowentrys,Switch_list,protocols,showtables)           
-            s=str(s)
-            s=s.replace('&quot;', '"')#translate &quot into "
+            if showflowentrys is not Flow_entry_list or showtables is not Tables:
+                showflowentrys=Flow_entry_list
+                showtables=Tables
+                tables_json.invalidate()
+            # the page fetches the lists from /pofdesk/tables.json
+            s=str(render.table(Switch_list,protocols))
             self.send_response(200)
             self.send_header('Content-type','text/html')
             self.end_headers()
@@ -710,57 +766,18 @@ class tablehandler(StaticContentHandler):
             showflowentrys={}                 
             Table_entry={}
             
-        path=path_prase('template')
-        render = template.render(path)
-        f=render.table(showflowentrys,Switch_list,protocols,showtables)
+        tables_json.invalidate()
+        f=render.table(Switch_list,protocols)
         self.send_response(200)
         self.end_headers()
         self.wfile.write(f)
 class porthandler(StaticContentHandler):
     def do_GET(self):
         print "it is port get"
-        Switch_list=[]
-        for switch in core.PofManager.switches.keys():
-            Switch_list.append(dpidToStr(switch))
-        jsonStr=""
         if self.path.startswith('/static'):
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
         else:
-            jsonStr='{'
-            i=0
-            for switch in Switch_list:
-                device_id=OnlyStr(switch)
-                device_id=int(device_id,16)
-                ports=core.PofManager.get_all_port_id(device_id)
-                if(i==0):
-                    jsonStr+='"'+switch+'":'
-                    i+=1
-                else:
-                    jsonStr+=',"'+switch+'":' 
-                j=0
-                for p in ports:
-                    status=core.PofManager.get_port_status(device_id,p)
-                    if j==0:
-                        jsonStr+='[{"deviceId":"'+switch+'","portId":"'+str(status.desc.port_id)+'","hardwareAddress":"'+str(status.desc.hw_addr)+'","name":"'+str(status.desc.name)+'","config":"'+str(status.desc.config)+'","state":"'+str(status.desc.state)+'","currentFeatures":"'+str(status.desc.curr)+'","advertisedFeatures":"'+str(status.desc.advertised)+'","supportedFeatures":"'+str(status.desc.supported)+'","peerFeatures":"'+str(status.desc.peer)+'","currentSpeed":"'+str(status.desc.curr_speed)+'","maxSpeed":"'+str(status.desc.max_speed)+'","openflowEnable":"'+str(status.desc.of_enable)+'"}'
-                        j+=1
-                    else:
-                        jsonStr+=',{"deviceId":"'+switch+'","portId":"'+str(status.desc.port_id)+'","hardwareAddress":"'+str(status.desc.hw_addr)+'","name":"'+str(status.desc.name)+'","config":"'+str(status.desc.config)+'","state":"'+str(status.desc.state)+'","currentFeatures":"'+str(status.desc.curr)+'","advertisedFeatures":"'+str(status.desc.advertised)+'","supportedFeatures":"'+str(status.desc.supported)+'","peerFeatures":"'+str(status.desc.peer)+'","currentSpeed":"'+str(status.desc.curr_speed)+'","maxSpeed":"'+str(status.desc.max_speed)+'","openflowEnable":"'+str(status.desc.of_enable)+'"}'
-                jsonStr+=']'
-            jsonStr+='}'
-        path=path_prase('template')
-        render = template.render(path)
-        try:
-            s=render.port(jsonStr,Switch_list)
-            s=str(s)
-            s=s.replace("&#39;","'")
-            s=s.replace('&quot;','"')
-            self.send_response(200)
-            self.send_header('Content-type','text/html')
-            self.end_headers()
-            self.wfile.write(s)
-        except Exception:
-            self.wfile._sock.close()
-            self.wfile._sock=None
+            self.send_page()
     def do_POST (self):
         print "Ports--POST"
         form = cgi.FieldStorage(
@@ -782,45 +799,12 @@ class porthandler(StaticContentHandler):
         else:
             onoff=False
         core.PofManager.set_port_of_enable(device_id, port_id, onoff)
-        Switch_list=[]
-        for switch in core.PofManager.switches.keys():
-            Switch_list.append(dpidToStr(switch))
-        jsonStr=""
-        if self.path.startswith('/static'):
-            SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
-        else:
-            jsonStr='{'
-            i=0
-            for switch in Switch_list:
-                device_id=OnlyStr(switch)
-                device_id=int(device_id,16)
-                ports=core.PofManager.get_all_port_id(device_id)
-                if(i==0):
-                    jsonStr+='"'+switch+'":'
-                    i+=1
-                else:
-                    jsonStr+=',"'+switch+'":' 
-                j=0
-                for p in ports:
-                    status=core.PofManager.get_port_status(device_id,p)
-                    if j==0:
-                        jsonStr+='[{"deviceId":"'+switch+'","portId":"'+str(status.desc.port_id)+'","hardwareAddress":"'+str(status.desc.hw_addr)+\
-                        '","name":"'+str(status.desc.name)+'","config":"'+str(status.desc.config)+'","state":"'+str(status.desc.state)+\
-                        '","currentFeatures":"'+str(status.desc.curr)+'","advertisedFeatures":"'+str(status.desc.advertised)+\
-                        '","supportedFeatures":"'+str(status.desc.supported)+'","peerFeatures":"'+str(status.desc.peer)+'","currentSpeed":"'\
-                        +str(status.desc.curr_speed)+'","maxSpeed":"'+str(status.desc.max_speed)+'","openflowEnable":"'+str(status.desc.of_enable)+'"}'
-                        j+=1
-                    else:
-                        jsonStr+=',{"deviceId":"'+switch+'","portId":"'+str(status.desc.port_id)+'","hardwareAddress":"'+str(status.desc.hw_addr)+'","name":"'+str(status.desc.name)+'","config":"'+str(status.desc.config)+'","state":"'+str(status.desc.state)+'","currentFeatures":"'+str(status.desc.curr)+'","advertisedFeatures":"'+str(status.desc.advertised)+'","supportedFeatures":"'+str(status.desc.supported)+'","peerFeatures":"'+str(status.desc.peer)+'","currentSpeed":"'+str(status.desc.curr_speed)+'","maxSpeed":"'+str(status.desc.max_speed)+'","openflowEnable":"'+str(status.desc.of_enable)+'"}'
-                jsonStr+=']'
-            jsonStr+='}'
-        path=path_prase('template')
-        render = template.render(path)
+        self.send_page()
+    def send_page(self):
+        # the page fetches its data from /pofdesk/ports.json
+        Switch_list=[dpidToStr(switch) for switch in core.PofManager.switches.keys()]
         try:
-            s=render.port(jsonStr,Switch_list)
-            s=str(s)
-            s=s.replace("&#39;","'")
-            s=s.replace('&quot;','"')
+            s=str(render.port(Switch_list))
             self.send_response(200)
             self.send_header('Content-type','text/html')
             self.end_headers()
@@ -837,8 +821,6 @@ class slothandler(StaticContentHandler):
         if self.path.startswith('/static/'):
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self) #load static source
         else:
-            path=path_prase('template')
-            render = template.render(path)
             f=render.slot(self.slot)
             self.send_response(200)
             self.send_header('Content-type','text/html')
@@ -853,8 +835,6 @@ class slothandler(StaticContentHandler):
           environ={'REQUEST_METHOD':'POST',
               'CONTENT_TYPE':self.headers['Content-Type'],
               })
-        path=path_prase('template')
-        render = template.render(path)
         f=render.slot(self.slot)
         self.send_response(200)
         self.end_headers()
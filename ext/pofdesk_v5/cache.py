@@ -0,0 +1,74 @@
+"""
+Caches for POFDesk pages and the data they show
+
+CachedRender compiles each template once and keeps it until its file
+changes.  JSONCache keeps a JSON document until something it depends on
+changes, so a page's data is built once per change rather than once per
+request.
+"""
+import os
+import json
+import threading
+
+import template
+
+
+class CachedRender (template.Render):
+    """
+    A template.Render which compiles a template on first use and again only
+    when the template file's mtime changes
+    """
+    def __init__ (self, loc, **keywords):
+        template.Render.__init__(self, loc, cache = False, **keywords)
+        self._compiled = {}   # name -> (path, mtime, Template)
+        self._lock = threading.Lock()
+
+    def _template (self, name):
+        entry = self._compiled.get(name)
+        if entry is not None:
+            path, mtime, t = entry
+            try:
+                if os.path.getmtime(path) == mtime:
+                    return t
+            except OSError:
+                pass
+        kind, path = self._lookup(name)
+        if kind != 'file':
+            return template.Render._template(self, name)
+        with self._lock:
+            mtime = os.path.getmtime(path)
+            t = template.Template(open(path).read(), filename = path,
+                                  **self._keywords)
+            self._compiled[name] = (path, mtime, t)
+        return t
+
+
+class JSONCache (object):
+    """
+    The JSON text of build(), built on first get() after an invalidate()
+
+    Invalidations are counted, so a document whose build overlapped an
+    invalidation is returned but not kept.
+    """
+    def __init__ (self, build):
+        self._build = build
+        self._lock = threading.Lock()
+        self._version = 0
+        self._data = None
+
+    def invalidate (self, event = None):
+        # takes (and ignores) an event, so it can be a handler directly
+        with self._lock:
+            self._version += 1
+            self._data = None
+
+    def get (self):
+        with self._lock:
+            if self._data is not None:
+                return self._data
+            version = self._version
+        data = json.dumps(self._build(), separators = (',', ':'))
+        with self._lock:
+            if self._version == version:
+                self._data = data
+        return data
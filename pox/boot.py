@@ -16,12 +16,27 @@ import inspect
 import types
 
 import pox.core
-core = pox.core.initialize()   # An object of class POXCore()
+
+def _epoll_requested (argv):
+    """
+    The --epoll POX option picks the scheduler's SelectHub, which exists
+    before options are processed, so look for it ahead of time.
+    """
+    for arg in argv:
+        if not arg.startswith("-"):
+            break    # POX options end at the first component
+        arg = arg.lstrip("-").split("=", 1)
+        if arg[0] == "epoll":
+            return len(arg) == 1 or arg[1].lower() in ("1", "true", "yes", "on")
+    return False
+
+core = pox.core.initialize(epoll_selecthub = _epoll_requested(sys.argv[1:]))   # An object of class POXCore()
 
 import pox.openflow
 import pox.openflow.of_01
 import pox.openflow.pof_01
 import pox.openflow.pofmanager
+import pox.openflow.keepalive_pof
 
 from pox.lib.util import str_to_bool
 
@@ -316,6 +331,8 @@ Notable POX options include:
   --no-openflow   Don't automatically load the OpenFlow module
   --log-config=F  Load a Python log configuration file (if you include the
                   option without specifying F, it defaults to logging.cfg)
+  --epoll         Keep sockets registered with epoll between select loop
+                  cycles (Linux; scales to many thousands of switches)
 
 C1, C2, etc. are component names (e.g., Python modules).  Options they
 support are up to the module.  As an example, you can load a learning
@@ -349,6 +366,9 @@ class POXOptions (Options):
         print(core._get_python_version())
         sys.exit(0)
 
+    def _set_epoll (self, given_name, name, value):
+        pass    # already used by _epoll_requested() when core was created
+
     def _set_no_openflow (self, given_name, name, value):
         self.enable_openflow = not str_to_bool(value)
         
@@ -396,6 +416,7 @@ def _post_startup ():
     if _options.enable_openflow:
         #pox.openflow.of_01.launch() # Usually, we launch of_01
         pox.openflow.pof_01.launch()
+        pox.openflow.keepalive_pof.launch()
         
         
 def _setup_logging ():
@@ -182,7 +182,7 @@ class POXCore (EventMixin):
         ComponentRegistered
     ])
     
-    def __init__ (self):
+    def __init__ (self, epoll_selecthub = False):
         self.debug = False
         self.running = True
         self.starting_up = True
@@ -195,7 +195,8 @@ class POXCore (EventMixin):
         self.version_name = "beta"
         print(self.banner)
     
-        self.scheduler = recoco.Scheduler(daemon=True)
+        self.scheduler = recoco.Scheduler(daemon=True,
+                                          persistentEpoll=epoll_selecthub)
     
         self._waiters = [] # List of waiting components
 
@@ -555,9 +556,12 @@ class POXCore (EventMixin):
 
 core = None
 
-def initialize ():
+def initialize (epoll_selecthub = False):
+    """
+    epoll_selecthub makes the scheduler use recoco.EpollSelectHub
+    """
     global core
-    core = POXCore()
+    core = POXCore(epoll_selecthub)
     return core
 
 # The below is a big hack to make tests and doc tools work.
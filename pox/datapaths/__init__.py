@@ -24,6 +24,8 @@ from pox.datapaths.switch import SoftwareSwitch, OFConnection
 from pox.datapaths.switch import ExpireMixin
 from pox.lib.util import dpid_to_str, str_to_dpid
 
+loop = None
+
 
 class OpenFlowWorker (BackoffWorker):
   def __init__ (self, switch=None, **kw):
@@ -39,7 +41,9 @@ class OpenFlowWorker (BackoffWorker):
 
   def _handle_connect (self):
     super(OpenFlowWorker, self)._handle_connect()
-    self.connection = OFConnection(self)
+    # A switch may speak another protocol (see pof_switch.POFConnection)
+    cls = getattr(self.switch, 'connection_class', OFConnection)
+    self.connection = cls(self)
     self.switch.set_connection(self.connection)
     self._info("Connected to controller")
 
@@ -74,10 +78,9 @@ def do_launch (cls, address = '127.0.0.1', port = 6633, max_retry_delay = 16,
   _switches = core.datapaths
 
   if dpid is None:
-    for dpid in range(1,256):
-      if dpid not in _switches: break
-    if dpid in _switches:
-      raise RuntimeError("Out of DPIDs")
+    dpid = 1
+    while dpid in _switches:
+      dpid += 1
   else:
     dpid = str_to_dpid(dpid)
 
@@ -90,9 +93,11 @@ def do_launch (cls, address = '127.0.0.1', port = 6633, max_retry_delay = 16,
   def up (event):
     import pox.lib.ioworker
     global loop
-    loop = pox.lib.ioworker.RecocoIOLoop()
-    #loop.more_debugging = True
-    loop.start()
+    # All switches share one IO loop (and so one recoco task)
+    if loop is None:
+      loop = pox.lib.ioworker.RecocoIOLoop()
+      #loop.more_debugging = True
+      loop.start()
     OpenFlowWorker.begin(loop=loop, addr=address, port=port,
         max_retry_delay=max_retry_delay, switch=switch)
 
@@ -0,0 +1,905 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A software POF switch
+
+PofSoftwareSwitch speaks POF (libpof_02) to the controller and runs
+packets through POF flow tables: a table matches on fields given as
+(offset, length) in bits, either into the packet (from the packet's
+current offset) or into the metadata.  The pipeline starts at global
+table 0, goto_table moves the packet offset along, and a table miss sends
+a packet-in.
+
+Lookups are indexed.  EM tables are a dict on the packet key, MM and LPM
+tables use the pmclassifier structures the controller keeps for its own
+view of the tables, and LINEAR tables are reached by index through
+goto_direct_table.
+
+The switch is meant for exercising the controller, so some of POF is
+missing: entry timeouts, groups, meters, write/clear actions, conditional
+jumps, calculated fields and checksums.  Instructions and actions it
+doesn't implement are skipped (and logged once).
+
+Connecting N switches to a controller in the same process:
+./pox.py datapaths.pof_switch --count=200 --ports=4
+"""
+
+from pox.datapaths import do_launch
+from pox.datapaths.switch import OFConnection
+from pox.lib.revent import Event, EventMixin
+from pox.lib.util import dpid_to_str, str_to_dpid
+from pox.lib.addresses import EthAddr
+import pox.openflow.libpof_02 as of
+from pox.openflow.pmclassifier import PMTableClassifier, matchx_list_to_key
+
+import binascii
+import logging
+
+# What the switch reports per table type:
+# table_type: (table_num, key_length, total_size)
+DEFAULT_TABLE_RESOURCES = {
+  of.OF_MM_TABLE     : (16, 320, 4096),
+  of.OF_LPM_TABLE    : (8, 320, 4096),
+  of.OF_EM_TABLE     : (8, 320, 4096),
+  of.OF_LINEAR_TABLE : (8, 32, 4096),
+}
+
+METADATA_LENGTH = 128   # bytes
+
+# A packet visiting more tables than this is in a loop and dropped
+MAX_TABLE_HOPS = 64
+
+# Not in libpof_02's error types (but sent by pofswitch)
+OFPET_COUNTER_MOD_FAILED = 15
+
+_FIELD_BITS = of.OFP_MAX_FIELD_LENGTH_IN_BYTE * 8
+_METADATA_BITS = METADATA_LENGTH * 8
+
+# Returned by an instruction to end processing of the packet
+_STOP = (None, None)
+
+
+def _field_value (raw, length):
+  """
+  Value of the first length bits of a field value as it comes off the
+  wire (OFP_MAX_FIELD_LENGTH_IN_BYTE bytes, maybe with trailing zeros cut)
+  """
+  if length <= 0: return 0
+  raw = raw[:of.OFP_MAX_FIELD_LENGTH_IN_BYTE]
+  raw += b'\x00' * (of.OFP_MAX_FIELD_LENGTH_IN_BYTE - len(raw))
+  return int(binascii.hexlify(raw), 16) >> (_FIELD_BITS - min(length,
+                                                               _FIELD_BITS))
+
+
+class PofDpPacketOut (Event):
+  """
+  Event raised when a switch sends a packet out a port
+
+  data is the packet (bytes), port the ofp_phy_port.
+  """
+  def __init__ (self, node, data, port):
+    Event.__init__(self)
+    self.node = node
+    self.data = data
+    self.port = port
+
+
+class POFConnection (OFConnection):
+  """
+  OFConnection for POF messages
+  """
+  _lib = of
+
+
+class PofPacket (object):
+  """
+  A packet going through the pipeline
+
+  The packet and its metadata are kept as integers, so a field at any bit
+  offset and length is a shift and a mask away.  offset is where the
+  packet currently starts in bits; field offsets are relative to it.
+  """
+  __slots__ = ('value', 'bits', 'offset', 'metadata', 'in_port')
+
+  def __init__ (self, data, in_port):
+    self.value = int(binascii.hexlify(data), 16) if data else 0
+    self.bits = len(data) * 8
+    self.offset = 0
+    self.metadata = 0
+    self.in_port = in_port
+
+  def get (self, offset, length):
+    """
+    Bits [offset, offset+length) of the packet (zeros past its end)
+    """
+    shift = self.bits - self.offset - offset - length
+    if shift >= 0:
+      return (self.value >> shift) & ((1 << length) - 1)
+    return (self.value << -shift) & ((1 << length) - 1)
+
+  def set (self, offset, length, value):
+    """
+    Sets bits [offset, offset+length); returns False if past the end
+    """
+    shift = self.bits - self.offset - offset - length
+    if shift < 0 or length <= 0: return False
+    mask = ((1 << length) - 1) << shift
+    self.value = (self.value & ~mask) | ((value << shift) & mask)
+    return True
+
+  def insert (self, offset, length, value):
+    """
+    Inserts length bits of value at offset; returns False if past the end
+    """
+    tail = self.bits - self.offset - offset
+    if tail < 0 or length <= 0: return False
+    low = self.value & ((1 << tail) - 1)
+    high = ((self.value >> tail) << length) | (value & ((1 << length) - 1))
+    self.value = (high << tail) | low
+    self.bits += length
+    return True
+
+  def delete (self, offset, length):
+    """
+    Removes bits [offset, offset+length) (as many as there are)
+    """
+    tail = self.bits - self.offset - offset - length
+    if tail < 0:
+      length += tail
+      tail = 0
+    if length <= 0: return False
+    self.value = ((self.value >> (tail + length)) << tail) | \
+                 (self.value & ((1 << tail) - 1))
+    self.bits -= length
+    return True
+
+  def get_metadata (self, offset, length):
+    shift = _METADATA_BITS - offset - length
+    if shift < 0 or length <= 0: return 0
+    return (self.metadata >> shift) & ((1 << length) - 1)
+
+  def set_metadata (self, offset, length, value):
+    shift = _METADATA_BITS - offset - length
+    if shift < 0 or length <= 0: return False
+    mask = ((1 << length) - 1) << shift
+    self.metadata = (self.metadata & ~mask) | ((value << shift) & mask)
+    return True
+
+  def field (self, match):
+    """
+    Value of the field an ofp_match20 (or ofp_matchx) describes
+    """
+    if match.field_id == of.ofp_match20._METADATA_FIELD_ID:
+      return self.get_metadata(match.offset, match.length)
+    return self.get(match.offset, match.length)
+
+  def set_field (self, match, value):
+    if match.field_id == of.ofp_match20._METADATA_FIELD_ID:
+      return self.set_metadata(match.offset, match.length, value)
+    return self.set(match.offset, match.length, value)
+
+  def pack (self, start = 0):
+    """
+    The packet as bytes, from byte start of the packet (not of offset)
+    """
+    nbytes = (self.bits + 7) // 8
+    if nbytes == 0: return b''
+    value = self.value << (nbytes * 8 - self.bits)
+    data = binascii.unhexlify('%0*x' % (nbytes * 2, value))
+    return data[start:] if start else data
+
+
+class PofTable (object):
+  """
+  A flow table of the switch, its entries and their lookup index
+  """
+  def __init__ (self, table_id, flow_table):
+    self.table_id = table_id           # global table id
+    self.flow_table = flow_table       # ofp_flow_table it was added with
+    self.table_type = flow_table.table_type
+    self.fields = list(flow_table.match_field_list)
+    self.key_length = sum(f.length for f in self.fields)
+    self.entries = {}                  # index: ofp_flow_mod
+    self._keys = {}                    # EM index: key
+    self._exact = {}                   # EM key: index
+    self.classifier = None
+    if self.table_type in (of.OF_MM_TABLE, of.OF_LPM_TABLE):
+      self.classifier = PMTableClassifier(self.table_type)
+    self.lookup_count = 0
+    self.matched_count = 0
+
+  def __len__ (self):
+    return len(self.entries)
+
+  def put (self, flow_mod):
+    """
+    Adds or replaces the entry at flow_mod.index
+
+    Returns False if the entry's match doesn't fit the table.
+    """
+    index = flow_mod.index
+    if self.table_type != of.OF_LINEAR_TABLE:
+      try:
+        value, mask, key_length = matchx_list_to_key(flow_mod.match_list)
+      except ValueError:
+        return False
+      if key_length != self.key_length:
+        return False
+    self.remove(index)
+    if self.table_type == of.OF_EM_TABLE:
+      self._keys[index] = value
+      self._exact[value] = index
+    elif self.classifier is not None:
+      if not self.classifier.put(index, flow_mod):
+        return False
+    self.entries[index] = flow_mod
+    return True
+
+  def remove (self, index):
+    """
+    Removes the entry at index; returns it (or None)
+    """
+    entry = self.entries.pop(index, None)
+    if entry is None: return None
+    if self.table_type == of.OF_EM_TABLE:
+      key = self._keys.pop(index)
+      if self._exact.get(key) == index:
+        del self._exact[key]
+    elif self.classifier is not None:
+      self.classifier.remove(index)
+    return entry
+
+  def key (self, packet):
+    """
+    The packet's key for this table: its fields concatenated
+    """
+    key = 0
+    for f in self.fields:
+      key = (key << f.length) | packet.field(f)
+    return key
+
+  def lookup (self, packet):
+    """
+    Returns the ofp_flow_mod the packet matches, or None
+
+    LINEAR tables have no key; their entries are reached by index.
+    """
+    self.lookup_count += 1
+    if self.table_type == of.OF_LINEAR_TABLE or not self.entries:
+      return None
+    key = self.key(packet)
+    if self.table_type == of.OF_EM_TABLE:
+      index = self._exact.get(key)
+    else:
+      index = self.classifier.match(key)
+    if index is None: return None
+    self.matched_count += 1
+    return self.entries[index]
+
+
+class PofSoftwareSwitch (EventMixin):
+  """
+  A POF switch with ports that exist only as PofDpPacketOut events and
+  calls to rx_packet()
+  """
+  _eventMixin_events = set([PofDpPacketOut])
+
+  # Used by OpenFlowWorker for the connection to the controller
+  connection_class = POFConnection
+
+  def __init__ (self, dpid, name=None, ports=4, miss_send_len=128,
+                table_resources=None, counter_num=1024, compact=True):
+    """
+    Initialize switch
+     - ports is a list of ofp_phy_ports or a number of ports
+     - miss_send_len is bytes of a packet sent in a packet-in (until the
+       controller sets it)
+     - table_resources is {table_type: (table_num, key_length, total_size)}
+     - counter_num is how many counters the switch has
+     - compact is whether it accepts compact flow_mods
+    """
+    if name is None: name = dpid_to_str(dpid)
+    self.name = name
+
+    self.dpid = dpid
+    self.miss_send_len = miss_send_len
+    self.config_flags = 0
+    self.compact = compact
+    self._has_sent_hello = False
+    self._has_reported = False
+
+    self.log = logging.getLogger(self.name)
+    self._connection = None
+
+    if table_resources is None:
+      table_resources = DEFAULT_TABLE_RESOURCES
+    self.table_resources = dict(table_resources)
+    # Global table id of each type's table 0, as the controller works it
+    # out from the resource report
+    self.table_bases = {}
+    base = 0
+    for table_type in range(of.OF_MAX_TABLE_TYPE):
+      self.table_bases[table_type] = base
+      base += self.table_resources[table_type][0]
+
+    self.tables = {}      # global table id: PofTable
+    self.counter_num = counter_num
+    self.counters = {}    # counter_id: [packets, bytes]
+
+    self._lookup_count = 0
+    self._unsupported = set()
+
+    # Map port_id -> ofp_phy_port
+    self.ports = {}
+    if isinstance(ports, int):
+      ports = [self.generate_port(i) for i in range(1, ports+1)]
+    for port in ports:
+      self.add_port(port)
+
+    # Set up handlers for incoming POF messages
+    # That is, self.ofp_handlers[OFPT_FOO] = self._rx_foo
+    self.ofp_handlers = {}
+    for value,name in of.ofp_type_map.iteritems():
+      name = name.split("OFPT_",1)[-1].lower()
+      h = getattr(self, "_rx_" + name, None)
+      if not h: continue
+      self.ofp_handlers[value] = h
+
+    # Set up handlers for instructions and actions
+    # That is, self.instruction_handlers[OFPIT_FOO] = self._ins_foo
+    # and self.action_handlers[OFPAT_FOO] = self._action_foo
+    self.instruction_handlers = {}
+    for value,name in of.ofp_instruction_type_map.iteritems():
+      h = getattr(self, "_ins_" + name.lower(), None)
+      if h: self.instruction_handlers[value] = h
+    self.action_handlers = {}
+    for value,name in of.ofp_action_type_map.iteritems():
+      name = name.split("OFPAT_",1)[-1].lower()
+      h = getattr(self, "_action_" + name, None)
+      if h: self.action_handlers[value] = h
+
+  def generate_port (self, port_id, name = None, ethaddr = None):
+    p = of.ofp_phy_port()
+    p.port_id = port_id
+    p.device_id = self.dpid
+    if ethaddr is None:
+      p.hw_addr = EthAddr("02%06x%04x" % (self.dpid % 0x00FFff,
+                                          port_id % 0xffFF))
+    else:
+      p.hw_addr = EthAddr(ethaddr)
+    if name is None:
+      p.name = "%s-eth%s" % (self.name, port_id)
+    else:
+      p.name = name
+    p.curr_speed = p.max_speed = 10000000   # kbps
+    return p
+
+  def rx_message (self, connection, msg):
+    """
+    Handle an incoming POF message
+    """
+    ofp_type = msg.header_type
+    h = self.ofp_handlers.get(ofp_type)
+    if h is None:
+      raise RuntimeError("No handler for ofp_type %s(%d)"
+                         % (of.ofp_type_map.get(ofp_type), ofp_type))
+
+    self.log.debug("Got %s with XID %s",of.ofp_type_map.get(ofp_type),msg.xid)
+    h(msg, connection=connection)
+
+  def set_connection (self, connection):
+    """
+    Set this switch's connection.
+    """
+    self._has_sent_hello = False
+    self._has_reported = False
+    connection.set_message_handler(self.rx_message)
+    self._connection = connection
+
+  def send (self, message, connection = None):
+    """
+    Send a message to this switch's communication partner
+    """
+    if connection is None:
+      connection = self._connection
+    if connection:
+      connection.send(message)
+    else:
+      self.log.debug("Asked to send message %s, but not connected", message)
+
+  def table_id (self, table_type, table_id):
+    """
+    Global id of table table_id of type table_type, or None
+    """
+    resource = self.table_resources.get(table_type)
+    if resource is None or table_id >= resource[0]:
+      return None
+    return self.table_bases[table_type] + table_id
+
+  def _rx_hello (self, ofp, connection):
+    self.send_hello()
+
+  def _rx_echo_request (self, ofp, connection):
+    self.send(of.ofp_echo_reply(xid=ofp.xid, body=ofp.body))
+
+  def _rx_echo_reply (self, ofp, connection):
+    pass
+
+  def _rx_features_request (self, ofp, connection):
+    capabilities = (of.OFPC_FLOW_STATS | of.OFPC_TABLE_STATS
+                    | of.OFPC_PORT_STATS)
+    if self.compact:
+      capabilities |= of.OFPC_COMPACT_FLOW_MOD
+    table_num = sum(r[0] for r in self.table_resources.itervalues())
+    msg = of.ofp_features_reply(xid = ofp.xid,
+                                device_id = self.dpid,
+                                port_num = len(self.ports),
+                                table_num = table_num,
+                                capabilities = capabilities,
+                                experimenter_name = "POX",
+                                device_forward_engine_name = "pof_switch",
+                                device_lookup_engine_name = "pof_switch")
+    self.send(msg)
+
+  def _rx_get_config_request (self, ofp, connection):
+    """
+    Replies, then (once per connection) reports resources and ports
+
+    The controller asks for the config last in its handshake, and counts
+    ports from here on.  The resource report goes first so the table ids
+    are known by the time the connection is up.
+    """
+    msg = of.ofp_get_config_reply(xid = ofp.xid, device_id = self.dpid,
+                                  flags = self.config_flags,
+                                  miss_send_len = self.miss_send_len)
+    self.send(msg)
+    if self._has_reported: return
+    self._has_reported = True
+    self.send_resource_report()
+    for port_id in sorted(self.ports):
+      self.send_port_status(self.ports[port_id], of.OFPPR_ADD)
+
+  def _rx_set_config (self, config, connection):
+    self.config_flags = config.flags
+    self.miss_send_len = config.miss_send_len
+
+  def _rx_barrier_request (self, ofp, connection):
+    self.send(of.ofp_barrier_reply(xid = ofp.xid))
+
+  def _rx_port_mod (self, port_mod, connection):
+    desc = port_mod.desc
+    port = self.ports.get(desc.port_id)
+    if port is None:
+      self.send_error(type=of.OFPET_PORT_MOD_FAILED, code=of.OFPPMFC_BAD_PORT,
+                      ofp=port_mod, connection=connection)
+      return
+    port.config = desc.config
+    port.of_enable = desc.of_enable
+
+  def _rx_table_mod (self, table_mod, connection):
+    flow_table = table_mod.flow_table
+    table_id = self.table_id(flow_table.table_type, flow_table.table_id)
+    code = None
+    if flow_table.table_type not in self.table_resources:
+      code = of.OFPTMFC_BAD_TABLE_TYPE
+    elif table_id is None:
+      code = of.OFPTMFC_BAD_TABLE_ID
+    elif flow_table.command == of.OFPTC_ADD:
+      if table_id in self.tables:
+        code = of.OFPTMFC_BAD_TABLE_ID
+      elif not self._check_table(flow_table):
+        code = of.OFPTMFC_UNKNOWN
+      else:
+        self.tables[table_id] = PofTable(table_id, flow_table)
+    elif flow_table.command == of.OFPTC_MODIFY:
+      old = self.tables.get(table_id)
+      if old is None:
+        code = of.OFPTMFC_BAD_TABLE_ID
+      elif not self._check_table(flow_table):
+        code = of.OFPTMFC_UNKNOWN
+      else:
+        # The fields may have changed, so index the entries again
+        table = PofTable(table_id, flow_table)
+        for entry in old.entries.itervalues():
+          if not table.put(entry):
+            self.log.warn("Entry %s of table %s dropped by table_mod",
+                          entry.index, table_id)
+        self.tables[table_id] = table
+    elif flow_table.command == of.OFPTC_DELETE:
+      if self.tables.pop(table_id, None) is None:
+        code = of.OFPTMFC_BAD_TABLE_ID
+    else:
+      code = of.OFPTMFC_BAD_COMMAND
+    if code is not None:
+      self.send_error(type=of.OFPET_TABLE_MOD_FAILED, code=code,
+                      ofp=table_mod, connection=connection)
+
+  def _check_table (self, flow_table):
+    key_length = sum(f.length for f in flow_table.match_field_list)
+    return key_length <= self.table_resources[flow_table.table_type][1]
+
+  def _rx_flow_mod (self, flow_mod, connection):
+    table_id = self.table_id(flow_mod.table_type, flow_mod.table_id)
+    table = self.tables.get(table_id)
+    code = None
+    command = flow_mod.command
+    if table is None:
+      code = of.OFPFMFC_BAD_TABLE_ID
+    elif command == of.OFPFC_ADD:
+      if flow_mod.index in table.entries:
+        code = of.OFPFMFC_ENTRY_EXIST
+      elif (table.flow_table.table_size
+            and len(table) >= table.flow_table.table_size):
+        code = of.OFPFMFC_TABLE_FULL
+      elif not table.put(flow_mod):
+        code = of.OFPFMFC_UNKNOWN
+    elif command in (of.OFPFC_MODIFY, of.OFPFC_MODIFY_STRICT):
+      if flow_mod.index not in table.entries:
+        code = of.OFPFMFC_ENTRY_UNEXIST
+      elif not table.put(flow_mod):
+        code = of.OFPFMFC_UNKNOWN
+    elif command in (of.OFPFC_DELETE, of.OFPFC_DELETE_STRICT):
+      if table.remove(flow_mod.index) is None:
+        code = of.OFPFMFC_ENTRY_UNEXIST
+    else:
+      code = of.OFPFMFC_BAD_COMMAND
+    if code is not None:
+      self.send_error(type=of.OFPET_FLOW_MOD_FAILED, code=code,
+                      ofp=flow_mod, connection=connection)
+
+  def _rx_counter_mod (self, counter_mod, connection):
+    counter = counter_mod.counter
+    code = None
+    if counter.command == of.OFPCC_ADD:
+      if counter.counter_id in self.counters:
+        code = of.OFPCMFC_COUNTER_EXIST
+      elif len(self.counters) >= self.counter_num:
+        code = of.OFPCMFC_BAD_COUNTER_ID
+      else:
+        self.counters[counter.counter_id] = [0, 0]
+    elif counter.command == of.OFPCC_DELETE:
+      if self.counters.pop(counter.counter_id, None) is None:
+        code = of.OFPCMFC_COUNTER_UNEXIST
+    elif counter.command == of.OFPCC_CLEAR:
+      if counter.counter_id not in self.counters:
+        code = of.OFPCMFC_COUNTER_UNEXIST
+      else:
+        self.counters[counter.counter_id] = [0, 0]
+    else:
+      code = of.OFPCMFC_BAD_COMMAND
+    if code is not None:
+      self.send_error(type=OFPET_COUNTER_MOD_FAILED, code=code,
+                      ofp=counter_mod, connection=connection)
+
+  def _rx_counter_request (self, request, connection):
+    values = self.counters.get(request.counter.counter_id)
+    if values is None:
+      self.send_error(type=OFPET_COUNTER_MOD_FAILED,
+                      code=of.OFPCMFC_COUNTER_UNEXIST,
+                      ofp=request, connection=connection)
+      return
+    counter = of.ofp_counter(command = of.OFPCC_QUERYREPLY,
+                             counter_id = request.counter.counter_id,
+                             counter_value = values[0],
+                             byte_value = values[1])
+    self.send(of.ofp_counter_reply(xid = request.xid, counter = counter))
+
+  def _rx_packet_out (self, packet_out, connection):
+    """
+    Runs the packet_out's actions on its data
+
+    The switch doesn't buffer packets, so a buffer_id is an error.
+    """
+    if packet_out.buffer_id is not None:
+      self.send_error(type=of.OFPET_BAD_REQUEST,
+                      code=of.OFPBRC_BUFFER_UNKNOWN,
+                      ofp=packet_out, connection=connection)
+      return
+    packet = PofPacket(packet_out.data, packet_out.in_port)
+    self._apply_actions(packet_out.actions, packet)
+
+  def send_hello (self, force = False):
+    """
+    Send hello (once)
+    """
+    if self._has_sent_hello and not force: return
+    self._has_sent_hello = True
+    self.send(of.ofp_hello(xid=0))
+
+  def send_resource_report (self):
+    msg = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                 counter_num = self.counter_num)
+    for table_type in range(of.OF_MAX_TABLE_TYPE):
+      table_num, key_length, total_size = self.table_resources[table_type]
+      msg.table_resources_map[table_type] = of.ofp_table_resource(
+          device_id = self.dpid, table_type = table_type,
+          table_num = table_num, key_length = key_length,
+          total_size = total_size)
+    self.send(msg)
+
+  def send_port_status (self, port, reason):
+    """
+    Send port status
+
+    port is an ofp_phy_port
+    reason is one of OFPPR_xxx
+    """
+    self.send(of.ofp_port_status(desc=port, reason=reason))
+
+  def send_packet_in (self, data, in_port, reason = None, table_id = 0,
+                      cookie = 0):
+    """
+    Send PacketIn with (at most miss_send_len bytes of) data
+    """
+    port = self.ports.get(in_port)
+    if port is not None and port.config & of.OFPPC_NO_PACKET_IN: return
+    if reason is None:
+      reason = of.OFPR_NO_MATCH
+    total_len = len(data)
+    data = data[:min(self.miss_send_len, of.OFP_PACKET_IN_MAX_LENGTH)]
+    msg = of.ofp_packet_in(xid = 0, total_len = total_len, reason = reason,
+                           table_id = table_id, cookie = cookie,
+                           device_id = self.dpid, slot_port_id = in_port,
+                           data = data)
+    self.send(msg)
+
+  def send_error (self, type, code, ofp=None, data=None, connection=None):
+    """
+    Send an error
+
+    If you pass ofp, it will be used as the source of the error's XID and
+    data.
+    You can override the data by also specifying data.
+    """
+    err = of.ofp_error(type=type, code=code, device_id=self.dpid)
+    if ofp:
+      err.xid = ofp.xid
+      err.data = ofp.pack()
+    else:
+      err.xid = 0
+    if data is not None:
+      err.data = data
+    err.data = err.data[:of.OFP_ERROR_STRING_MAX_LENGTH]
+    self.send(err, connection = connection)
+
+  def add_port (self, port):
+    """
+    Add a port (an ofp_phy_port)
+    """
+    port_id = port.port_id
+    assert port_id not in self.ports
+    port.device_id = self.dpid
+    self.ports[port_id] = port
+    if self._has_reported:
+      self.send_port_status(port, of.OFPPR_ADD)
+
+  def delete_port (self, port):
+    """
+    Removes a port (an ofp_phy_port or a port_id)
+    """
+    port_id = getattr(port, 'port_id', port)
+    port = self.ports.pop(port_id)
+    if self._has_reported:
+      self.send_port_status(port, of.OFPPR_DELETE)
+
+  def rx_packet (self, data, in_port):
+    """
+    Process a dataplane packet (bytes) arriving on in_port
+
+    Packets on ports the controller hasn't enabled POF on are ignored.
+    """
+    port = self.ports.get(in_port)
+    if port is None or not port.of_enable: return
+    if port.config & (of.OFPPC_PORT_DOWN | of.OFPPC_NO_RECV): return
+    self._lookup_count += 1
+    self._pipeline(PofPacket(data, in_port), 0)
+
+  def _pipeline (self, packet, table_id):
+    """
+    Runs packet through the tables, starting at table_id
+    """
+    entry = None
+    for _ in xrange(MAX_TABLE_HOPS):
+      if entry is None:
+        table = self.tables.get(table_id)
+        if table is not None:
+          entry = table.lookup(packet)
+        if entry is None:
+          self.send_packet_in(packet.pack(), packet.in_port,
+                              of.OFPR_NO_MATCH, table_id)
+          return
+      if entry.counter_id:
+        self._count(entry.counter_id, packet)
+      table_id, entry = self._apply_instructions(entry, packet)
+      if table_id is None:
+        return
+    self.log.warn("Dropping packet after %s tables (loop?)", MAX_TABLE_HOPS)
+
+  def _apply_instructions (self, entry, packet):
+    """
+    Runs an entry's instructions
+
+    Returns (next table id, entry there or None) or (None, None) when the
+    packet is done with.
+    """
+    for instruction in entry.instruction_list:
+      h = self.instruction_handlers.get(instruction.type)
+      if h is None:
+        self._unsupported_feature(of.ofp_instruction_type_map,
+                                  instruction.type)
+        continue
+      r = h(instruction, packet)
+      if r is not None:
+        return r
+    return _STOP
+
+  def _apply_actions (self, actions, packet):
+    """
+    Runs actions; returns True if one of them dropped the packet
+    """
+    for action in actions:
+      h = self.action_handlers.get(action.type)
+      if h is None:
+        self._unsupported_feature(of.ofp_action_type_map, action.type)
+        continue
+      if h(action, packet) is True:
+        return True
+    return False
+
+  def _unsupported_feature (self, type_map, value):
+    name = type_map.get(value, value)
+    if name in self._unsupported: return
+    self._unsupported.add(name)
+    self.log.info("%s is not supported, skipping it", name)
+
+  def _count (self, counter_id, packet):
+    values = self.counters.get(counter_id)
+    if values is not None:
+      values[0] += 1
+      values[1] += packet.bits // 8
+
+  def _ins_goto_table (self, instruction, packet):
+    packet.offset += instruction.packet_offset * 8
+    return instruction.next_table_id, None
+
+  def _ins_goto_direct_table (self, instruction, packet):
+    if instruction.index_type == 0:
+      index = instruction.index_value
+    else:
+      index = packet.field(instruction.index_field)
+    packet.offset += instruction.packet_offset * 8
+    table = self.tables.get(instruction.next_table_id)
+    entry = None
+    if table is not None:
+      entry = table.entries.get(index)
+    if entry is None:
+      # A miss in the next table
+      return instruction.next_table_id, None
+    table.lookup_count += 1
+    table.matched_count += 1
+    return instruction.next_table_id, entry
+
+  def _ins_apply_actions (self, instruction, packet):
+    if self._apply_actions(instruction.action_list, packet):
+      return _STOP
+
+  def _ins_write_metadata (self, instruction, packet):
+    value = _field_value(binascii.unhexlify(instruction.value),
+                         instruction.write_length)
+    packet.set_metadata(instruction.metadata_offset,
+                        instruction.write_length, value)
+
+  def _ins_write_metadata_from_packet (self, instruction, packet):
+    value = packet.get(instruction.packet_offset, instruction.write_length)
+    packet.set_metadata(instruction.metadata_offset,
+                        instruction.write_length, value)
+
+  def _action_output (self, action, packet):
+    if action.port_id_value_type == 0:
+      port_id = action.port_id
+    else:
+      port_id = packet.field(action.port_id_field)
+    self._output_packet(packet.pack(action.packet_offset), port_id,
+                        packet.in_port)
+
+  def _action_drop (self, action, packet):
+    return True
+
+  def _action_packetin (self, action, packet):
+    self.send_packet_in(packet.pack(), packet.in_port, of.OFPR_ACTION)
+
+  def _action_counter (self, action, packet):
+    self._count(action.counter_id, packet)
+
+  def _action_set_field (self, action, packet):
+    setting = action.field_setting
+    value = _field_value(setting.value_raw, setting.length)
+    mask = _field_value(setting.mask_raw, setting.length)
+    if mask:
+      value = (packet.field(setting) & ~mask) | (value & mask)
+    packet.set_field(setting, value)
+
+  def _action_set_field_from_metadata (self, action, packet):
+    setting = action.field_setting
+    packet.set_field(setting, packet.get_metadata(action.metadata_offset,
+                                                  setting.length))
+
+  def _action_modify_field (self, action, packet):
+    field = action.match_field
+    increment = action.increment
+    if increment & 0x80000000:
+      increment -= 1 << 32
+    packet.set_field(field, packet.field(field) + increment)
+
+  def _action_add_field (self, action, packet):
+    value = _field_value(action.field_value, action.field_length)
+    packet.insert(action.field_position, action.field_length, value)
+
+  def _action_delete_field (self, action, packet):
+    if action.tag_length_value_type == 0:
+      length = action.tag_length_value
+    else:
+      length = packet.field(action.tag_length_field)
+    packet.delete(action.tag_position, length)
+
+  def _output_packet (self, data, out_port, in_port):
+    """
+    Send data out out_port (a port_id or one of the OFPP_ ports)
+    """
+    if out_port == of.OFPP_IN_PORT:
+      out_port = in_port
+    if out_port in (of.OFPP_FLOOD, of.OFPP_ALL):
+      for port_id, port in self.ports.iteritems():
+        if port_id == in_port: continue
+        if out_port == of.OFPP_FLOOD and not port.of_enable: continue
+        self._output_packet_physical(data, port_id)
+    elif out_port == of.OFPP_CONTROLLER:
+      self.send_packet_in(data, in_port, of.OFPR_ACTION)
+    elif out_port in self.ports:
+      self._output_packet_physical(data, out_port)
+    else:
+      self.log.warn("Can't output to port %s", out_port)
+
+  def _output_packet_physical (self, data, port_id):
+    """
+    Send data out a single physical port
+    """
+    port = self.ports[port_id]
+    if port.config & (of.OFPPC_PORT_DOWN | of.OFPPC_NO_FWD): return
+    self.raiseEvent(PofDpPacketOut(self, data, port))
+
+  def __repr__ (self):
+    return "%s(dpid=%s, num_ports=%d)" % (type(self).__name__,
+                                          dpid_to_str(self.dpid),
+                                          len(self.ports))
+
+
+def launch (address = '127.0.0.1', port = 6633, max_retry_delay = 16,
+            dpid = None, ports = 4, count = 1, extra = None,
+            __INSTANCE__ = None):
+  """
+  Launches count PofSoftwareSwitches
+
+  With dpid, the switches get DPIDs dpid, dpid+1, ...; otherwise each one
+  gets the lowest free DPID.
+  """
+  count = int(count)
+  ports = int(ports)
+  if dpid is not None:
+    dpid = str_to_dpid(dpid)
+  for i in range(count):
+    do_launch(PofSoftwareSwitch, address, port, max_retry_delay,
+              None if dpid is None else dpid_to_str(dpid + i),
+              extra_args = extra, ports = ports)
@@ -1079,6 +1079,9 @@ class OFConnection (object):
   ERR_BAD_LENGTH  = 3
   ERR_EXCEPTION   = 4
 
+  # The OpenFlow library whose version, messages and errors this speaks
+  _lib = of
+
   # These methods are called externally by IOWorker
   def msg (self, m):
     self.log.debug("%s %s", str(self), str(m))
@@ -1095,7 +1098,7 @@ class OFConnection (object):
     OFConnection.ID += 1
     self.ID = OFConnection.ID
     self.log = logging.getLogger("ControllerConnection(id=%d)" % (self.ID,))
-    self.unpackers = make_type_to_unpacker_table()
+    self.unpackers = make_type_to_unpacker_table(self._lib)
 
     self.on_message_received = None
 
@@ -1127,7 +1130,7 @@ class OFConnection (object):
       ofp_version = ord(message[0])
       ofp_type = ord(message[1])
 
-      if ofp_version != OFP_VERSION:
+      if ofp_version != self._lib.OFP_VERSION:
         info = ofp_version
         r = self._error_handler(self.ERR_BAD_VERSION, info)
         if r is False: break
@@ -1193,7 +1196,7 @@ class OFConnection (object):
         self.log.warn('Unsupported OpenFlow version 0x%02x', info)
         if self.starting:
           message = self.io_worker.peek()
-          err = ofp_error(type=OFPET_HELLO_FAILED, code=OFPHFC_INCOMPATIBLE)
+          err = self._lib.ofp_error(type=OFPET_HELLO_FAILED, code=OFPHFC_INCOMPATIBLE)
           #err = ofp_error(type=OFPET_BAD_REQUEST, code=OFPBRC_BAD_VERSION)
           err.xid = self._extract_message_xid(message)
           err.data = 'Version unsupported'
@@ -1204,7 +1207,7 @@ class OFConnection (object):
         ofp_type, message_length = info
         self.log.warn('Unsupported OpenFlow message type 0x%02x', ofp_type)
         message = self.io_worker.peek()
-        err = ofp_error(type=OFPET_BAD_REQUEST, code=OFPBRC_BAD_TYPE)
+        err = self._lib.ofp_error(type=OFPET_BAD_REQUEST, code=OFPBRC_BAD_TYPE)
         err.xid = self._extract_message_xid(message)
         err.data = message[:message_length]
         self.send(err)
@@ -1214,7 +1217,7 @@ class OFConnection (object):
         self.log.error('Different idea of message length for %s '
                        '(us:%s them:%s)' % (t, new_offset, message_length))
         message = self.io_worker.peek()
-        err = ofp_error(type=OFPET_BAD_REQUEST, code=OFPBRC_BAD_LEN)
+        err = self._lib.ofp_error(type=OFPET_BAD_REQUEST, code=OFPBRC_BAD_LEN)
         err.xid = self._extract_message_xid(message)
         err.data = message[:message_length]
         self.send(err)
@@ -34,6 +34,7 @@ from pox.lib.recoco import Timer
 from collections import defaultdict
 from pox.openflow.discovery import Discovery
 from pox.lib.util import dpid_to_str
+from pox.lib.graph.paths import PathService
 import time
 
 log = core.getLogger()
@@ -47,8 +48,8 @@ switches = {}
 # ethaddr -> (switch, port)
 mac_map = {}
 
-# [sw1][sw2] -> (distance, intermediate)
-path_map = defaultdict(lambda:defaultdict(lambda:(None,None)))
+# Shortest paths between switches, kept in step with adjacency
+path_service = PathService()
 
 # Waiting path.  (dpid,xid)->WaitingPath
 waiting_paths = {}
@@ -64,61 +65,21 @@ FLOW_HARD_TIMEOUT = 30
 PATH_SETUP_TIME = 4
 
 
-def _calc_paths ():
-  """
-  Essentially Floyd-Warshall algorithm
-  """
-
-  def dump ():
-    for i in sws:
-      for j in sws:
-        a = path_map[i][j][0]
-        #a = adjacency[i][j]
-        if a is None: a = "*"
-        print a,
-      print
-
-  sws = switches.values()
-  path_map.clear()
-  for k in sws:
-    for j,port in adjacency[k].iteritems():
-      if port is None: continue
-      path_map[k][j] = (1,None)
-    path_map[k][k] = (0,None) # distance, intermediate
-
-  #dump()
-
-  for k in sws:
-    for i in sws:
-      for j in sws:
-        if path_map[i][k][0] is not None:
-          if path_map[k][j][0] is not None:
-            # i -> k -> j exists
-            ikj_dist = path_map[i][k][0]+path_map[k][j][0]
-            if path_map[i][j][0] is None or ikj_dist < path_map[i][j][0]:
-              # i -> k -> j is better than existing
-              path_map[i][j] = (ikj_dist, k)
-
-  #print "--------------------"
-  #dump()
-
-
-def _get_raw_path (src, dst):
+def _get_raw_path (src, dst, key = None):
   """
   Get a raw path (just a list of nodes to traverse)
+
+  key picks one of several equal cost paths (see PathService.path())
   """
-  if len(path_map) == 0: _calc_paths()
   if src is dst:
     # We're here!
     return []
-  if path_map[src][dst][0] is None:
+  if src not in path_service or dst not in path_service:
     return None
-  intermediate = path_map[src][dst][1]
-  if intermediate is None:
-    # Directly connected
-    return []
-  return _get_raw_path(src, intermediate) + [intermediate] + \
-         _get_raw_path(intermediate, dst)
+  path = path_service.path(src, dst, key)
+  if path is None:
+    return None
+  return path[1:-1]
 
 
 def _check_path (p):
@@ -135,7 +96,7 @@ def _check_path (p):
   return True
 
 
-def _get_path (src, dst, first_port, final_port):
+def _get_path (src, dst, first_port, final_port, key = None):
   """
   Gets a cooked path -- a list of (node,in_port,out_port)
   """
@@ -143,7 +104,7 @@ def _get_path (src, dst, first_port, final_port):
   if src == dst:
     path = [src]
   else:
-    path = _get_raw_path(src, dst)
+    path = _get_raw_path(src, dst, key)
     if path is None: return None
     path = [src] + path + [dst]
 
@@ -260,7 +221,9 @@ class Switch (EventMixin):
     """
     Attempts to install a path between this switch and some destination
     """
-    p = _get_path(self, dst_sw, event.port, last_port)
+    # Spread flows between different hosts over equal cost paths
+    p = _get_path(self, dst_sw, event.port, last_port,
+                  key = (match.dl_src, match.dl_dst))
     if p is None:
       log.warning("Can't get from %s to %s", match.dl_src, match.dl_dst)
 
@@ -435,7 +398,7 @@ class l2_multi (EventMixin):
     sw1 = switches[l.dpid1]
     sw2 = switches[l.dpid2]
 
-    # Invalidate all flows and path info.
+    # Invalidate all flows.  (Path info is updated incrementally below.)
     # For link adds, this makes sure that if a new link leads to an
     # improved path, we use it.
     # For link removals, this makes sure that we don't use a
@@ -445,7 +408,6 @@ class l2_multi (EventMixin):
     for sw in switches.itervalues():
       if sw.connection is None: continue
       sw.connection.send(clear)
-    path_map.clear()
 
     if event.removed:
       # This link no longer okay
@@ -483,12 +445,18 @@ class l2_multi (EventMixin):
         log.debug("Unlearned %s", mac)
         del mac_map[mac]
 
+    if adjacency[sw1][sw2] is None:
+      path_service.remove_link(sw1, sw2)
+    else:
+      path_service.add_link(sw1, sw2)
+
   def _handle_ConnectionUp (self, event):
     sw = switches.get(event.dpid)
     if sw is None:
       # New switch
       sw = Switch()
       switches[event.dpid] = sw
+      path_service.add_node(sw)
       sw.connect(event.connection)
     else:
       sw.connect(event.connection)
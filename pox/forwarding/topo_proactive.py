@@ -38,6 +38,7 @@ from pox.lib.util import dpid_to_str
 from pox.proto.dhcpd import DHCPLease, DHCPD
 from collections import defaultdict
 from pox.openflow.discovery import Discovery
+from pox.lib.graph.paths import PathService
 import time
 
 log = core.getLogger("f.t_p")
@@ -50,69 +51,27 @@ adjacency = defaultdict(lambda:defaultdict(lambda:None))
 switches_by_dpid = {}
 switches_by_id = {}
 
-# [sw1][sw2] -> (distance, intermediate)
-path_map = defaultdict(lambda:defaultdict(lambda:(None,None)))
+# Shortest paths between switches, kept in step with adjacency
+path_service = PathService()
 
 
 def dpid_to_mac (dpid):
   return EthAddr("%012x" % (dpid & 0xffFFffFFffFF,))
 
 
-def _calc_paths ():
-  """
-  Essentially Floyd-Warshall algorithm
-  """
-
-  def dump ():
-    for i in sws:
-      for j in sws:
-        a = path_map[i][j][0]
-        #a = adjacency[i][j]
-        if a is None: a = "*"
-        print a,
-      print
-
-  sws = switches_by_dpid.values()
-  path_map.clear()
-  for k in sws:
-    for j,port in adjacency[k].iteritems():
-      if port is None: continue
-      path_map[k][j] = (1,None)
-    path_map[k][k] = (0,None) # distance, intermediate
-
-  #dump()
-
-  for k in sws:
-    for i in sws:
-      for j in sws:
-        if path_map[i][k][0] is not None:
-          if path_map[k][j][0] is not None:
-            # i -> k -> j exists
-            ikj_dist = path_map[i][k][0]+path_map[k][j][0]
-            if path_map[i][j][0] is None or ikj_dist < path_map[i][j][0]:
-              # i -> k -> j is better than existing
-              path_map[i][j] = (ikj_dist, k)
-
-  #print "--------------------"
-  #dump()
-
-
 def _get_raw_path (src, dst):
   """
   Get a raw path (just a list of nodes to traverse)
   """
-  if len(path_map) == 0: _calc_paths()
   if src is dst:
     # We're here!
     return []
-  if path_map[src][dst][0] is None:
+  if src not in path_service or dst not in path_service:
     return None
-  intermediate = path_map[src][dst][1]
-  if intermediate is None:
-    # Directly connected
-    return []
-  return _get_raw_path(src, intermediate) + [intermediate] + \
-         _get_raw_path(intermediate, dst)
+  path = path_service.path(src, dst)
+  if path is None:
+    return None
+  return path[1:-1]
 
 
 def _get_path (src, dst):
@@ -416,7 +375,7 @@ class topo_addressing (object):
     sw1 = switches_by_dpid[l.dpid1]
     sw2 = switches_by_dpid[l.dpid2]
 
-    # Invalidate all flows and path info.
+    # Invalidate all flows.  (Path info is updated incrementally below.)
     # For link adds, this makes sure that if a new link leads to an
     # improved path, we use it.
     # For link removals, this makes sure that we don't use a
@@ -426,7 +385,6 @@ class topo_addressing (object):
     for sw in switches_by_dpid.itervalues():
       if sw.connection is None: continue
       sw.connection.send(clear)
-    path_map.clear()
 
     if event.removed:
       # This link no longer okay
@@ -454,6 +412,11 @@ class topo_addressing (object):
           adjacency[sw1][sw2] = l.port1
           adjacency[sw2][sw1] = l.port2
 
+    if adjacency[sw1][sw2] is None:
+      path_service.remove_link(sw1, sw2)
+    else:
+      path_service.add_link(sw1, sw2)
+
     for sw in switches_by_dpid.itervalues():
       sw.send_table()
 
@@ -466,6 +429,7 @@ class topo_addressing (object):
 
       sw = TopoSwitch()
       switches_by_dpid[event.dpid] = sw
+      path_service.add_node(sw)
       sw.connect(event.connection)
     else:
       sw.connect(event.connection)
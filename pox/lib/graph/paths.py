@@ -0,0 +1,288 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+All-pairs shortest paths, kept up to date as links come and go
+
+PathService holds an undirected graph of nodes (any hashable, e.g. a
+forwarding app's switch objects) and the distance from every node to
+every other.  Nodes are numbered internally and each node's distances are
+one array of ints, so N nodes cost N*N*4 bytes rather than N*N dict
+entries.
+
+Nothing is recomputed wholesale:
+ - Adding a link only relaxes, for each source it shortens anything for,
+   the distances it improves.
+ - Removing a link only matters for a source if the link was the last
+   hop of that source's only shortest path to one of its ends; those
+   sources get a fresh BFS (Dijkstra if any link is weighted), and all
+   other sources are left alone.
+
+Shortest paths are not stored, they are read off the distances, so every
+equal cost path is available: next_hops() lists the ECMP next hops,
+path() picks one (spread over the choices by a flow key if given) and
+paths() yields all of them.
+"""
+
+from array import array
+from collections import deque
+import heapq
+
+# Distance to a node that can't be reached
+INFINITY = 0x7fffffff
+
+
+class PathService (object):
+  def __init__ (self):
+    self._index = {}     # node -> index
+    self._nodes = []     # index -> node, None if free
+    self._free = []      # free indexes
+    self._adj = []       # index -> {neighbor index : weight}
+    self._dist = []      # index -> array of distances from it, by index
+    self._weighted = 0   # number of links with weight != 1
+
+  def __len__ (self):
+    return len(self._index)
+
+  def __contains__ (self, node):
+    return node in self._index
+
+  def nodes (self):
+    return self._index.keys()
+
+  def add_node (self, node):
+    """
+    Adds node (unconnected); returns False if it was already there
+    """
+    if node in self._index: return False
+    if self._free:
+      i = self._free.pop()
+      self._nodes[i] = node
+      # column i was left at INFINITY when the slot was freed
+      row = array('i', [INFINITY]) * len(self._nodes)
+    else:
+      i = len(self._nodes)
+      self._nodes.append(node)
+      for row in self._dist:
+        if row is not None: row.append(INFINITY)
+      row = array('i', [INFINITY]) * (i + 1)
+      self._adj.append(None)
+      self._dist.append(None)
+    row[i] = 0
+    self._adj[i] = {}
+    self._dist[i] = row
+    self._index[node] = i
+    return True
+
+  def remove_node (self, node):
+    """
+    Removes node and its links; returns False if it wasn't there
+    """
+    i = self._index.get(node)
+    if i is None: return False
+    for j in self._adj[i].keys():
+      self._remove_link(i, j)
+    del self._index[node]
+    self._nodes[i] = None
+    self._adj[i] = None
+    self._dist[i] = None
+    self._free.append(i)
+    return True
+
+  def has_link (self, a, b):
+    i = self._index.get(a)
+    j = self._index.get(b)
+    return i is not None and j is not None and j in self._adj[i]
+
+  def add_link (self, a, b, weight = 1):
+    """
+    Adds (or reweights) the link between a and b, adding the nodes if
+    needed
+
+    weight is a positive int.  Returns False if nothing changed.
+    """
+    if not isinstance(weight, (int, long)) or weight <= 0:
+      raise ValueError("link weight must be a positive int")
+    if a == b:
+      raise ValueError("a link needs two different nodes")
+    self.add_node(a)
+    self.add_node(b)
+    i = self._index[a]
+    j = self._index[b]
+    old = self._adj[i].get(j)
+    if old == weight: return False
+    if old is not None and weight > old:
+      # a longer link can only lengthen paths
+      self._remove_link(i, j)
+      old = None
+    if old is not None and old != 1: self._weighted -= 1
+    if weight != 1: self._weighted += 1
+    self._adj[i][j] = weight
+    self._adj[j][i] = weight
+    for s, row in enumerate(self._dist):
+      if row is None: continue
+      di = row[i]
+      dj = row[j]
+      if di + weight < dj:
+        self._relax(row, j, di + weight)
+      elif dj + weight < di:
+        self._relax(row, i, dj + weight)
+    return True
+
+  def remove_link (self, a, b):
+    """
+    Removes the link between a and b; returns False if there wasn't one
+    """
+    i = self._index.get(a)
+    j = self._index.get(b)
+    if i is None or j is None or j not in self._adj[i]: return False
+    self._remove_link(i, j)
+    return True
+
+  def _remove_link (self, i, j):
+    adj = self._adj
+    weight = adj[i].pop(j)
+    del adj[j][i]
+    if weight != 1: self._weighted -= 1
+    for s, row in enumerate(self._dist):
+      if row is None: continue
+      di = row[i]
+      dj = row[j]
+      if dj == di + weight:
+        far = j
+      elif di == dj + weight:
+        far = i
+      else:
+        continue   # not on a shortest path from s
+      # still as close through some other neighbor?
+      d = row[far]
+      for n, w in adj[far].iteritems():
+        if row[n] + w == d: break
+      else:
+        self._dist[s] = self._sssp(s)
+
+  def _relax (self, row, start, d):
+    """ Lowers row[start] to d and propagates the improvement """
+    adj = self._adj
+    if not self._weighted:
+      row[start] = d
+      q = deque([start])
+      while q:
+        x = q.popleft()
+        d = row[x] + 1
+        for y in adj[x]:
+          if d < row[y]:
+            row[y] = d
+            q.append(y)
+      return
+    heap = [(d, start)]
+    while heap:
+      d, x = heapq.heappop(heap)
+      if d >= row[x]: continue
+      row[x] = d
+      for y, w in adj[x].iteritems():
+        if d + w < row[y]:
+          heapq.heappush(heap, (d + w, y))
+
+  def _sssp (self, s):
+    """ Distances from index s, from scratch """
+    adj = self._adj
+    row = array('i', [INFINITY]) * len(self._nodes)
+    row[s] = 0
+    if not self._weighted:
+      q = deque([s])
+      while q:
+        x = q.popleft()
+        d = row[x] + 1
+        for y in adj[x]:
+          if row[y] == INFINITY:
+            row[y] = d
+            q.append(y)
+      return row
+    heap = [(0, s)]
+    done = set()
+    while heap:
+      d, x = heapq.heappop(heap)
+      if x in done: continue
+      done.add(x)
+      for y, w in adj[x].iteritems():
+        if d + w < row[y]:
+          row[y] = d + w
+          heapq.heappush(heap, (d + w, y))
+    return row
+
+  def distance (self, a, b):
+    """
+    Length of the shortest path from a to b, None if there is none
+    """
+    d = self._dist[self._index[a]][self._index[b]]
+    if d == INFINITY: return None
+    return d
+
+  def _next_hops (self, i, j):
+    d = self._dist[i][j]
+    if d == INFINITY or i == j: return []
+    dist = self._dist
+    return sorted(n for n, w in self._adj[i].iteritems()
+                  if w + dist[n][j] == d)
+
+  def next_hops (self, a, b):
+    """
+    The neighbors of a which start a shortest path to b
+    """
+    nodes = self._nodes
+    return [nodes[n] for n in self._next_hops(self._index[a],
+                                              self._index[b])]
+
+  def path (self, a, b, key = None):
+    """
+    A shortest path from a to b as a list of nodes [a, ..., b], or None
+
+    Where there are equal cost choices, the lowest numbered next hop is
+    taken, or if key is given, one picked by hashing key (e.g. a flow's
+    addresses) with the node, so different keys spread over the paths.
+    """
+    i = self._index[a]
+    j = self._index[b]
+    if self._dist[i][j] == INFINITY: return None
+    nodes = self._nodes
+    path = [a]
+    while i != j:
+      hops = self._next_hops(i, j)
+      if key is None or len(hops) == 1:
+        i = hops[0]
+      else:
+        i = hops[hash((key, nodes[i])) % len(hops)]
+      path.append(nodes[i])
+    return path
+
+  def paths (self, a, b, limit = None):
+    """
+    Yields every shortest path from a to b (at most limit of them)
+    """
+    i = self._index[a]
+    j = self._index[b]
+    if self._dist[i][j] == INFINITY: return
+    nodes = self._nodes
+    count = 0
+    stack = [(i, [i])]
+    while stack:
+      x, p = stack.pop()
+      if x == j:
+        yield [nodes[n] for n in p]
+        count += 1
+        if limit is not None and count >= limit: return
+        continue
+      for n in reversed(self._next_hops(x, j)):
+        stack.append((n, p + [n]))
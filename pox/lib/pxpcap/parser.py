@@ -23,7 +23,7 @@ It's not great, but does the job for now.
 # Add usec to the datetime one?
 
 from datetime import datetime
-from struct import unpack_from
+from struct import unpack_from, Struct
 
 class PCapParser (object):
   def __init__ (self, callback = None):
@@ -101,3 +101,51 @@ class PCapParser (object):
       new_s = len(self._buf)
       if new_s == s: break
       s = new_s
+
+
+class PCapReader (object):
+  """
+  Reads a pcap file one record at a time
+
+  Unlike PCapParser, which is fed data and keeps it in one growing
+  buffer, this reads each record straight from the file, so a capture of
+  any size is streamed.  Iterating yields (timestamp, data, wire_size).
+  A truncated last record (e.g., from a capture still being written) ends
+  the iteration quietly.
+  """
+  def __init__ (self, infile):
+    self._in = infile
+    header = infile.read(24)
+    if len(header) < 24:
+      raise RuntimeError("Not a pcap file")
+
+    magic = header[0:4]
+    if magic in ("\xd4\xc3\xb2\xa1", "\x4d\x3c\xb2\xa1"):
+      prefix = "<"
+    elif magic in ("\xa1\xb2\xc3\xd4", "\xa1\xb2\x3c\x4d"):
+      prefix = ">"
+    else:
+      raise RuntimeError("Wrong magic number")
+    # The second form of the magic number has nanosecond timestamps
+    self._tick = 1000000.0 if magic[1:3] in ("\xc3\xb2", "\xb2\xc3") \
+                 else 1000000000.0
+
+    major,minor = unpack_from(prefix + "HH", header, 4)
+    self.version = float("%s.%s" % (major,minor))
+    if self.version != 2.4:
+      raise RuntimeError("Unknown PCap version: %s" % (self.version,))
+
+    self.snaplen,self.lltype = unpack_from(prefix + "LL", header, 16)
+    self._record = Struct(prefix + "LLLL")
+
+  def __iter__ (self):
+    read = self._in.read
+    unpack = self._record.unpack
+    tick = self._tick
+    while True:
+      header = read(16)
+      if len(header) < 16: return
+      sec,frac,cap_size,wire_size = unpack(header)
+      data = read(cap_size)
+      if len(data) < cap_size: return
+      yield sec + frac / tick, data, wire_size
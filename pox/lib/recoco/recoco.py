@@ -24,7 +24,9 @@ import traceback
 import os
 import socket
 import pox.lib.util
-import random
+import heapq
+import itertools
+import errno
 from pox.lib.epoll_select import EpollSelect
 
 CYCLE_MAXIMUM = 2
@@ -45,6 +47,8 @@ class BaseTask  (object):
     id = None
     #running = False
     priority = 1
+    run_count = 0     # times the Scheduler has run this task
+    run_time = 0.0    # seconds spent in those runs
 
     @classmethod
     def new (cls, *args, **kw):
@@ -134,13 +138,128 @@ class Task (BaseTask):
         return "<" + self.__class__.__name__ + "/tid" + str(self.name) + ">"
 
 
+# Lowest share a task can get; priority <= 0 is treated as this
+MIN_PRIORITY = 0.001
+
+class RunQueue (object):
+  """
+  The Scheduler's queue of ready Tasks
+
+  Tasks are kept FIFO in one deque per priority value.  Levels are picked
+  by stride scheduling: each has a pass value which goes up by
+  1/priority every time it runs a task, and the non-empty level with the
+  lowest pass goes next.  So a priority 0.5 task gets half the turns of a
+  priority 1 task, deterministically, and a level that was empty for a
+  while does not get to catch up on the turns it missed.  Picking a task
+  costs O(number of distinct priorities).
+
+  Tasks added with first=True go to a separate queue served before all
+  levels (a woken task which should run next).
+
+  The SelectHub thread adds woken tasks while the scheduler thread pops
+  them, so changes to the queue are made under a lock.
+  """
+  def __init__ (self):
+    self._lock = threading.Lock()
+    self._first = deque()
+    self._levels = {}     # priority -> [pass, stride, deque]
+    self._active = []     # levels with tasks in them
+    self._queued = set()
+    self._pass = 0.0
+    self.max_depth = 0
+
+  def __len__ (self):
+    return len(self._queued)
+
+  def __contains__ (self, task):
+    return task in self._queued
+
+  def _level (self, task):
+    priority = task.priority
+    level = self._levels.get(priority)
+    if level is None:
+      level = [self._pass, 1.0 / max(priority, MIN_PRIORITY), deque()]
+      self._levels[priority] = level
+    if not level[2]:
+      # don't let an idle level bank turns
+      if level[0] < self._pass: level[0] = self._pass
+      self._active.append(level)
+    return level
+
+  def append (self, task):
+    with self._lock:
+      self._level(task)[2].append(task)
+      self._queued.add(task)
+      if len(self._queued) > self.max_depth:
+        self.max_depth = len(self._queued)
+
+  def appendleft (self, task):
+    with self._lock:
+      self._first.append(task)
+      self._queued.add(task)
+      if len(self._queued) > self.max_depth:
+        self.max_depth = len(self._queued)
+
+  def popleft (self):
+    """
+    Removes and returns the next task to run; IndexError if there is none
+    """
+    with self._lock:
+      if self._first:
+        task = self._first.popleft()
+      else:
+        active = self._active
+        if not active:
+          raise IndexError("pop from an empty RunQueue")
+        level = active[0]
+        if len(active) > 1:
+          for l in active:
+            if l[0] < level[0]: level = l
+        self._pass = level[0]
+        level[0] += level[1]
+        task = level[2].popleft()
+        if not level[2]:
+          active.remove(level)
+      self._queued.discard(task)
+      return task
+
+  def depths (self):
+    """
+    Returns {priority:number of ready tasks}, with first=True ones
+    under None
+    """
+    with self._lock:
+      d = dict((p, len(l[2])) for p, l in self._levels.iteritems() if l[2])
+      if self._first:
+        d[None] = len(self._first)
+    return d
+
+
 class Scheduler (object):
-  """ Scheduler for Tasks """
+  """
+  Scheduler for Tasks
+
+  Ready tasks are run in priority order (see RunQueue).  Each time the
+  scheduler wakes up it runs up to batch tasks before checking for quit
+  and waiting again.  Counters are in stats() and on each task
+  (run_count, run_time).
+
+  useEpoll makes the SelectHub poll with EpollSelect; persistentEpoll
+  uses EpollSelectHub instead (see there), if select.epoll is available.
+  """
   def __init__ (self, isDefaultScheduler = None, startInThread = True,
-                daemon = False, useEpoll=False):
-    self._ready = deque()
+                daemon = False, useEpoll=False, persistentEpoll=False,
+                batch = 1):
+    self._ready = RunQueue()
+    self.batch = max(1, int(batch))
+    self._runs = 0
+    self._runTime = 0.0
+    self._slowest = (0.0, None)   # (seconds, str(task)) of the longest run
     self._hasQuit = False
-    self._selectHub = SelectHub(self, useEpoll=useEpoll)
+    if persistentEpoll and hasattr(select, 'epoll'):
+      self._selectHub = EpollSelectHub(self)
+    else:
+      self._selectHub = SelectHub(self, useEpoll=useEpoll)
     self._thread = None
     self._event = threading.Event()
 
@@ -208,7 +327,7 @@ class Scheduler (object):
 
     st = ScheduleTask(self, task)
     #print('Schedule --> schedule()')   #cc
-    st.start(fast=True)
+    st.start(self, fast=True)
 
   def fast_schedule (self, task, first = False):
     """
@@ -259,39 +378,56 @@ class Scheduler (object):
       self._selectHub._cycle()
       self._allDone = True
 
+  def stats (self):
+    """
+    Returns a dict of run queue and run time counters
+    """
+    return {'ready' : len(self._ready),
+            'ready_max' : self._ready.max_depth,
+            'ready_by_priority' : self._ready.depths(),
+            'runs' : self._runs,
+            'run_time' : self._runTime,
+            'slowest_run' : self._slowest[0],
+            'slowest_task' : self._slowest[1]}
+
   def cycle (self):
-    #if len(self._ready) == 0: return False
+    """
+    Runs up to self.batch ready tasks
 
-    # Patented hilarious priority system
-    #TODO: Replace it with something better
-    #print('Scheduler --> cycle() instructed by run()')    #print information
-    t = None
-    try:
-      while True:
+    Returns False if there was nothing to run.
+    """
+    ran = False
+    for _ in xrange(self.batch):
+      try:
         t = self._ready.popleft()
-        if t.priority >= 1:
-            break
-        if len(self._ready) == 0:
-            break
-        if t.priority >= random.random():
-            break
-        self._ready.append(t)
-    except IndexError:
-      return False
-
-    #print(len(self._ready), "tasks")
-
+      except IndexError:
+        break
+      ran = True
+      self._run(t)
+      if self._hasQuit: break
+    return ran
+
+  def _run (self, t):
+    start = time.time()
     try:
       rv = t.execute()
     except StopIteration:
-      return True
+      return
     except:
       try:
         print("Task", t, "caused exception and was de-scheduled")
         traceback.print_exc()
       except:
         pass
-      return True
+      return
+    finally:
+      elapsed = time.time() - start
+      t.run_count += 1
+      t.run_time += elapsed
+      self._runs += 1
+      self._runTime += elapsed
+      if elapsed > self._slowest[0]:
+        self._slowest = (elapsed, str(t))
 
     if isinstance(rv, BlockingOperation):
       try:
@@ -314,8 +450,6 @@ class Scheduler (object):
     elif rv == None:
       raise RuntimeError("Must yield a value!")
 
-    return True
-
 
 #TODO: Read() and Write() BlockingOperations that use nonblocking sockets with
 #      SelectHub and do post-processing of the return value.
@@ -652,6 +786,182 @@ class SelectHub (object):
     self._scheduler.fast_schedule(sleepingTask)
 
 
+_EPOLL_READ = getattr(select, 'EPOLLIN', 0) | getattr(select, 'EPOLLPRI', 0)
+_EPOLL_WRITE = getattr(select, 'EPOLLOUT', 0)
+_EPOLL_ERROR = getattr(select, 'EPOLLERR', 0) | getattr(select, 'EPOLLHUP', 0)
+
+class EpollSelectHub (SelectHub):
+  """
+  A SelectHub which keeps file descriptors registered with epoll from one
+  Select() to the next, instead of rebuilding and diffing every waiting
+  task's lists each cycle.
+
+  A task's lists are compared (in C) with the ones it waited on last time
+  and epoll is only told about the difference.  FDs are registered
+  EPOLLONESHOT, so one that fires stays quiet until its task waits again,
+  when just the FDs that fired are re-armed; epoll is level triggered, so
+  anything still pending is reported again then.  Timeouts live in a heap
+  (stale entries are skipped when they reach the top).
+
+  An FD belongs to the last task which asked for it, as with SelectHub.
+  """
+  def __init__ (self, scheduler):
+    self._epoll = select.epoll()
+    self._fds = {}         # fd -> [obj, epoll mask, in xlist, task, armed]
+    self._interest = {}    # task -> (rlist, wlist, xlist, set of fds)
+    self._disarmed = {}    # task -> [fd], fired since the task last waited
+    self._waiting = {}     # task -> token of its current Select()
+    self._timers = []      # heap of (time, token, task)
+    self._tokens = itertools.count()
+    self._failed = []      # fd records epoll refused (bad fd)
+    SelectHub.__init__(self, scheduler)
+
+  def _threadProc (self):
+    pinger_fd = self._pinger.fileno()
+    self._epoll.register(pinger_fd, select.EPOLLIN)
+    timers = self._timers
+    waiting = self._waiting
+
+    while self._scheduler._hasQuit == False:
+      # drop timers of tasks which were already woken by IO
+      while timers and waiting.get(timers[0][2]) != timers[0][1]:
+        heapq.heappop(timers)
+      timeout = CYCLE_MAXIMUM
+      if timers:
+        timeout = min(timeout, max(0, timers[0][0] - time.time()))
+
+      try:
+        events = self._epoll.poll(timeout)
+      except IOError as e:
+        if e.errno == errno.EINTR: continue
+        raise
+
+      rets = {}
+      pinged = False
+      for fd, ev in events:
+        if fd == pinger_fd:
+          pinged = True
+          continue
+        rec = self._fds.get(fd)
+        if rec is None: continue
+        rec[4] = False
+        task = rec[3]
+        self._disarmed.setdefault(task, []).append(fd)
+        if task not in waiting: continue
+        r = rets.get(task)
+        if r is None: r = rets[task] = ([],[],[])
+        obj = rec[0]
+        if ev & _EPOLL_ERROR and rec[2]:
+          r[2].append(obj)
+        elif ev & _EPOLL_READ or (ev & _EPOLL_ERROR and rec[1] & _EPOLL_READ):
+          r[0].append(obj)
+        if ev & _EPOLL_WRITE:
+          r[1].append(obj)
+
+      if pinged:
+        self._pinger.pongAll()
+        while not self._incoming.empty():
+          stuff = self._incoming.get(True)
+          self._register(*stuff)
+          self._incoming.task_done()
+        for rec in self._failed:
+          task = rec[3]
+          if task in waiting:
+            r = rets.get(task)
+            if r is None: r = rets[task] = ([],[],[])
+            r[2 if rec[2] else 0].append(rec[0])
+        del self._failed[:]
+
+      if timers:
+        now = time.time()
+        while timers and timers[0][0] <= now:
+          t, token, task = heapq.heappop(timers)
+          if waiting.get(task) == token and task not in rets:
+            rets[task] = ([],[],[])
+
+      for task, v in rets.iteritems():
+        del waiting[task]
+        self._return(task, v)
+
+  def _register (self, task, rlist, wlist, xlist, timeout):
+    assert task not in self._waiting
+    rlist = list(rlist) if rlist else []
+    wlist = list(wlist) if wlist else []
+    xlist = list(xlist) if xlist else []
+    old = self._interest.get(task)
+    if old is None:
+      if rlist or wlist or xlist:
+        self._update_interest(task, rlist, wlist, xlist, None)
+    elif old[0] != rlist or old[1] != wlist or old[2] != xlist:
+      self._update_interest(task, rlist, wlist, xlist, old)
+
+    for fd in self._disarmed.pop(task, ()):
+      rec = self._fds.get(fd)
+      if rec is not None and rec[3] is task and not rec[4]:
+        self._arm(fd, rec)
+
+    token = next(self._tokens)
+    self._waiting[task] = token
+    if timeout is not None:
+      heapq.heappush(self._timers, (timeout, token, task))
+
+  def _update_interest (self, task, rlist, wlist, xlist, old):
+    want = {}
+    for obj in rlist: want[obj] = _EPOLL_READ
+    for obj in wlist: want[obj] = want.get(obj, 0) | _EPOLL_WRITE
+    xset = set(xlist)
+    for obj in xlist: want.setdefault(obj, 0)
+
+    fds = set()
+    for obj, mask in want.iteritems():
+      fd = obj if isinstance(obj, (int, long)) else obj.fileno()
+      fds.add(fd)
+      rec = self._fds.get(fd)
+      if rec is not None and rec[3] is not task:
+        # taken over from another task
+        other = self._interest.get(rec[3])
+        if other is not None:
+          other[3].discard(fd)
+          if not other[3]:
+            del self._interest[rec[3]]
+            self._disarmed.pop(rec[3], None)
+        rec = None
+      if rec is None or rec[0] is not obj or rec[1] != mask:
+        rec = [obj, mask, obj in xset, task, False]
+        self._fds[fd] = rec
+        self._arm(fd, rec)
+      else:
+        rec[2] = obj in xset
+
+    if old is not None:
+      for fd in old[3] - fds:
+        rec = self._fds.get(fd)
+        if rec is not None and rec[3] is task:
+          del self._fds[fd]
+          try:
+            self._epoll.unregister(fd)
+          except (IOError, OSError):
+            pass   # already closed
+
+    if fds:
+      self._interest[task] = (rlist, wlist, xlist, fds)
+    else:
+      self._interest.pop(task, None)
+
+  def _arm (self, fd, rec):
+    mask = rec[1] | select.EPOLLONESHOT
+    try:
+      try:
+        self._epoll.modify(fd, mask)
+      except IOError as e:
+        if e.errno != errno.ENOENT: raise
+        self._epoll.register(fd, mask)
+      rec[4] = True
+    except (IOError, OSError, ValueError):
+      # closed under us; hand it back to the task (see _threadProc)
+      self._fds.pop(fd, None)
+      self._failed.append(rec)
+
 class ScheduleTask (BaseTask):
   """
   If multiple real threads (such as a recoco scheduler thread and any
@@ -94,8 +94,6 @@ class Source (EventMixin):
 
 from __future__ import print_function
 
-import operator
-
 # weakrefs are used for some event handlers so that just having an event
 # handler set will not keep the source (publisher) alive.
 import weakref
@@ -155,6 +153,9 @@ class Event (object):
     def _invoke (self, handler, *args, **kw):
         return handler(self, *args, **kw)
 
+# Event._invoke itself, to tell events which don't override it
+_plainInvoke = Event.__dict__['_invoke']
+
 def handleEventException (source, event, args, kw, exc_info):
     """
     Called when an exception is raised by an event handler when the event
@@ -218,6 +219,20 @@ class EventMixin (object):
       setattr(self, "_eventMixin_events", True)
     if not hasattr(self, "_eventMixin_handlers"):
       setattr(self, "_eventMixin_handlers", {})
+    if not hasattr(self, "_eventMixin_dispatch"):
+      setattr(self, "_eventMixin_dispatch", {})
+
+  def _eventMixin_compile (self, eventType):
+    """
+    Returns the handler entries for eventType as a tuple, built once and
+    kept until a listener for eventType is added or removed.
+
+    raiseEvent() walks this instead of the list, so listeners added or
+    removed by a handler take effect from the next raise.
+    """
+    handlers = tuple(self._eventMixin_handlers.get(eventType, ()))
+    self._eventMixin_dispatch[eventType] = handlers
+    return handlers
 
   def raiseEventNoErrors (self, event, *args, **kw):
     """
@@ -270,11 +285,17 @@ class EventMixin (object):
       raise RuntimeError("Event %s not defined on object of type %s"
                          % (eventType, type(self)))
 
-    # Create a copy so that it can be modified freely during event
-    # processing.  It might make sense to change this.
-    handlers = self._eventMixin_handlers.get(eventType, [])
+    handlers = self._eventMixin_dispatch.get(eventType)
+    if handlers is None:
+      handlers = self._eventMixin_compile(eventType)
+
+    # Skip the _invoke() call for plain events without extra arguments
+    direct = (classCall and not args and not kw and
+              type(event)._invoke.im_func is _plainInvoke)
     for (priority, handler, once, eid) in handlers:
-      if classCall:
+      if direct:
+        rv = handler(event)
+      elif classCall:
         rv = event._invoke(handler, *args, **kw)
       else:
         rv = handler(event, *args, **kw)
@@ -362,6 +383,8 @@ class EventMixin (object):
                                                 if x[1] != handler]
         altered = altered or l != len(self._eventMixin_handlers[eventType])
 
+    if altered:
+      self._eventMixin_dispatch.clear()
     return altered
 
   def addListenerByName (self, *args, **kw):
@@ -431,10 +454,18 @@ class EventMixin (object):
 
     entry = (priority, handler, once, eid)
 
-    handlers.append(entry)
-    if priority is not None:
-      # If priority is specified, sort the event handlers
-      handlers.sort(reverse = True, key = operator.itemgetter(0))
+    # Handlers are kept highest priority first, equal priorities in the
+    # order they were added, and those without a priority last; so a new
+    # one just goes in after the last with at least its priority.
+    if priority is None:
+      handlers.append(entry)
+    else:
+      i = len(handlers)
+      while i > 0 and (handlers[i-1][0] is None
+                       or handlers[i-1][0] < priority):
+        i -= 1
+      handlers.insert(i, entry)
+    self._eventMixin_dispatch.pop(eventType, None)
 
     return (eventType,eid)
 
@@ -465,6 +496,62 @@ class EventMixin (object):
     Remove all handlers from this object
     """
     self._eventMixin_handlers = {}
+    self._eventMixin_dispatch = {}
+
+
+def raiseEventChainNoErrors (sources, event, *args, **kw):
+  """
+  Raises one event on each of sources in turn until it is halted.
+
+  This is what raising an event on an OpenFlow nexus and then, unless a
+  handler halted it, on the connection does; but an Event subclass is
+  instantiated (with args and kw) only once, and only if some source has
+  a listener for it, and every source's handlers get the same object.
+  event.source is set to each source as the event is raised on it.
+  As with raiseEventNoErrors(), exceptions in handlers are passed to
+  handleEventException and the next source still gets the event.
+
+  Sources which are not EventMixins are passed the event (or the type
+  and arguments) through their own raiseEventNoErrors().
+
+  Returns the event, or None if it was never created.
+  """
+  if isinstance(event, Event):
+    eventType = type(event)
+  else:
+    eventType = event
+    event = None
+    if not issubclass(eventType, Event):
+      # a plain value, nothing to share
+      for source in sources:
+        source.raiseEventNoErrors(eventType, *args, **kw)
+      return None
+
+  for source in sources:
+    if not isinstance(source, EventMixin):
+      if event is None:
+        source.raiseEventNoErrors(eventType, *args, **kw)
+      else:
+        source.raiseEventNoErrors(event)
+      continue
+    handlers = getattr(source, "_eventMixin_handlers", None)
+    if not handlers or not handlers.get(eventType):
+      continue
+    try:
+      if event is None:
+        event = eventType(*args, **kw)
+      event.source = source
+      source.raiseEvent(event)
+    except:
+      if handleEventException is not None:
+        import sys
+        handleEventException(source, event or eventType, args, kw,
+                             sys.exc_info())
+      if event is None:
+        return None
+    if event.halt:
+      break
+  return event
 
 
 def autoBindEvents (sink, source, prefix='', weak=False, priority=None):
@@ -0,0 +1,58 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+a responder for the POF cbench benchmark (tools/pof_cbench.py)
+
+The POF counterpart of misc.cbench: every packet-in is answered with one
+flow_mod (or, with --reply=packet_out, one packet_out sending the packet
+back out its in port), so the benchmark measures the controller's
+packet-in to response path and nothing else.
+
+./pox.py misc.pof_cbench [--reply=flow_mod|packet_out]
+"""
+
+from pox.core import core
+import pox.openflow.libpof_02 as of
+
+
+class POFCBench (object):
+  def __init__ (self, connection, reply):
+    self.connection = connection
+    if reply == "packet_out":
+      self._handle_PacketIn = self._packet_out
+    connection.addListeners(self)
+
+  def _handle_PacketIn (self, event):
+    msg = of.ofp_flow_mod()
+    self.connection.send(msg)
+
+  def _packet_out (self, event):
+    msg = of.ofp_packet_out(data = event.ofp.data)
+    msg.actions.append(of.ofp_action_output(port_id = event.port))
+    self.connection.send(msg)
+
+class pof_cbench (object):
+  def __init__ (self, reply):
+    self.reply = reply
+    core.openflow.addListeners(self)
+
+  def _handle_ConnectionUp (self, event):
+    POFCBench(event.connection, self.reply)
+
+
+def launch (reply = "flow_mod"):
+  if reply not in ("flow_mod", "packet_out"):
+    raise RuntimeError("--reply must be flow_mod or packet_out")
+  core.registerNew(pof_cbench, reply)
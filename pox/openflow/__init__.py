@@ -202,6 +202,11 @@ class PacketIn (Event):
     port (int) - number of port the packet came in on
     data (bytes) - raw packet data
     parsed (packet subclasses) - pox.lib.packet's parsed version
+
+    The packet is parsed by (and cached on) the ofp_packet_in, so it is
+    parsed at most once per message.  Handlers which only need the
+    ethertype or MAC addresses can use peek_ethertype(), peek_dst() and
+    peek_src() without parsing at all.
     """
     def __init__ (self, connection, ofp):
         Event.__init__(self)
@@ -210,13 +215,10 @@ class PacketIn (Event):
         #self.port = ofp.in_port
         self.port = ofp.slot_port_id
         self.data = ofp.data
-        self._parsed = None
         self.dpid = connection.dpid
 
     def parse (self):
-        if self._parsed is None:
-            self._parsed = ethernet(self.data)
-        return self._parsed
+        return self.ofp.parse()
 
     @property
     def parsed (self):
@@ -225,6 +227,15 @@ class PacketIn (Event):
         """
         return self.parse()
 
+    def peek_ethertype (self):
+        return self.ofp.peek_ethertype()
+
+    def peek_dst (self):
+        return self.ofp.peek_dst()
+
+    def peek_src (self):
+        return self.ofp.peek_src()
+
 class ErrorIn (Event):
     def __init__ (self, connection, ofp):
         Event.__init__(self)
@@ -279,6 +290,43 @@ class BarrierIn (Event):
         self.dpid = connection.dpid
         self.xid = ofp.xid
 
+class EchoReply (Event):
+    """
+    Fired in response to an echo request
+    xid (int) - XID of the echo request
+    """
+    def __init__ (self, connection, ofp):
+        Event.__init__(self)
+        self.connection = connection
+        self.ofp = ofp
+        self.dpid = connection.dpid
+        self.xid = ofp.xid
+
+class SendQueueHigh (Event):
+    """
+    Fired when the data queued for sending on a connection (the switch is
+    not taking it as fast as it comes) grows past the connection's
+    send_queue_high; senders of bulk should hold back until SendQueueLow
+    queued (int) - bytes queued
+    """
+    def __init__ (self, connection):
+        Event.__init__(self)
+        self.connection = connection
+        self.dpid = connection.dpid
+        self.queued = connection.send_queue_bytes
+
+class SendQueueLow (Event):
+    """
+    Fired when, after a SendQueueHigh, the data queued for sending on a
+    connection has drained below its send_queue_low
+    queued (int) - bytes queued
+    """
+    def __init__ (self, connection):
+        Event.__init__(self)
+        self.connection = connection
+        self.dpid = connection.dpid
+        self.queued = connection.send_queue_bytes
+
 class ConnectionIn (Event):
     def __init__ (self, connection):
         super(ConnectionIn,self).__init__()
@@ -351,6 +399,7 @@ class OpenFlowNexus (EventMixin):
         FlowRemoved,
         PacketIn,
         BarrierIn,
+        EchoReply,
         ErrorIn,
         RawStatsReply,
         SwitchDescReceived,
@@ -361,6 +410,8 @@ class OpenFlowNexus (EventMixin):
         QueueStatsReceived,
         ResourceReport,
         CounterReply,
+        SendQueueHigh,
+        SendQueueLow,
     ])
     
     # Bytes to send to controller when a packet misses all flows
@@ -25,7 +25,6 @@ process 6 pof messages:
 '''
 
 import time
-import threading
 
 #import pox.openflow.libpof_01 as of
 import pox.openflow.libpof_02 as of
@@ -38,21 +37,13 @@ from pox.openflow import GetConfigReply
 from pox.openflow import ResourceReport
 from pox.openflow import ErrorIn
 from pox.openflow import PacketIn
+from pox.openflow import CounterReply
 
 from pox.core import core
+from pox.lib.revent import raiseEventChainNoErrors
 
 log = core.getLogger()
 
-def echo_cycle(con):
-    def sayhello():
-        #print "send echo_request"
-        con.send(of.ofp_echo_request())
-        global t
-        t = threading.Timer(2.0, sayhello)
-        t.start()
-    t = threading.Timer(2.0, sayhello)
-    t.start()
-
 def handle_FEATURES_REPLY (con, msg):    #type:6
     #print "CC: receive Features_Reply message\n",msg
     connecting = con.connect_time == None       #connect_time = None as default, so connecting = ture
@@ -60,12 +51,12 @@ def handle_FEATURES_REPLY (con, msg):    #type:6
     con.features = msg
     con.dpid = msg.device_id
     con.port_num_received = 0
+    con.compact_flow_mod = (con.allow_compact_flow_mod and
+                            bool(msg.capabilities & of.OFPC_COMPACT_FLOW_MOD))
 
     if not connecting:
         con.ofnexus._connect(con)
-        e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
-        if e is None or e.halt != True:
-            con.raiseEventNoErrors(FeaturesReceived, con, msg)
+        raiseEventChainNoErrors((con.ofnexus, con), FeaturesReceived, con, msg)
         return
 
     #OpenFlowConnectionArbiter is defined and registered in openflow.__init__.py
@@ -98,9 +89,8 @@ def handle_FEATURES_REPLY (con, msg):    #type:6
             if e is None or e.halt != True:
                 con.raiseEventNoErrors(ConnectionUp, con, msg)
             """
-            e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
-            if e is None or e.halt != True:
-                con.raiseEventNoErrors(FeaturesReceived, con, msg)
+            raiseEventChainNoErrors((con.ofnexus, con),
+                                    FeaturesReceived, con, msg)
         con.removeListeners(listeners)
     listeners.append(con.addListener(GetConfigReply, finish_connecting))
     
@@ -128,40 +118,31 @@ def handle_PORT_STATUS (con, msg):    # type:12
         con.ports._forget(msg.desc)
     else:
         con.ports._update(msg.desc)
-    e = con.ofnexus.raiseEventNoErrors(PortStatus, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(PortStatus, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), PortStatus, con, msg)
     con.port_num_received += 1
     if con.port_num_received == con.features.port_num:
         con.info("connected")
         con.connect_time = time.time()
-        e = con.ofnexus.raiseEventNoErrors(ConnectionUp, con, msg)
-        if e is None or e.halt != True:
-            con.raiseEventNoErrors(ConnectionUp, con, msg)
+        raiseEventChainNoErrors((con.ofnexus, con), ConnectionUp, con, msg)
 
 def handle_RESOURCE_REPORT (con, msg):      # type:13
     #print "CC: receive RESOURCE_REPORT message\n",msg
-    e = con.ofnexus.raiseEventNoErrors(ResourceReport, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(ResourceReport, con, msg)
-    echo_cycle(con)
+    raiseEventChainNoErrors((con.ofnexus, con), ResourceReport, con, msg)
 
 def handle_PACKET_IN (con, msg):   # type: 10
     #print "CC: receive PACKET_IN message\n", msg
-    e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(PacketIn, con, msg)
+    # one event for both, so listeners share its parsed packet
+    raiseEventChainNoErrors((con.ofnexus, con), PacketIn, con, msg)
         
 def handle_ERROR_MSG (con, msg):   # type: 1
     #print "CC: receive RESOURCE_REPORT message\n",msg
     err = ErrorIn(con, msg)
-    e = con.ofnexus.raiseEventNoErrors(err)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(err)
+    raiseEventChainNoErrors((con.ofnexus, con), err)
     if err.should_log:
         log.error(str(con) + " OpenFlow Error:\n" +
               msg.show(str(con) + " Error: ").strip())
 
-def handle_COUNTER_REPLY (con, msg):
-    print "CC: receive COUNTER_REPLY message\n",msg
+def handle_COUNTER_REPLY (con, msg):     # type:33
+    #print "CC: receive COUNTER_REPLY message\n",msg
+    raiseEventChainNoErrors((con.ofnexus, con), CounterReply, con, msg)
 
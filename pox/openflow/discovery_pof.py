@@ -33,7 +33,7 @@ import pox.lib.packet as pkt
 
 import struct
 import time
-from collections import namedtuple
+from collections import namedtuple, deque
 from random import shuffle, random
 
 
@@ -61,13 +61,13 @@ def _add_protocol(protocol_name, field_list):
 class LLDPSender (object):
     """
     Sends out discovery packets
-    """
-
-    SendItem = namedtuple("LLDPSenderItem", ('dpid','port_num','packet'))
 
-    #NOTE: This class keeps the packets to send in a flat list, which makes
-    #      adding/removing them on switch join/leave or (especially) port
-    #      status changes relatively expensive. Could easily be improved.
+    Each port's packet_out is packed once, when the port is added (or its
+    address changes), and a switch's packet_outs are joined into one
+    buffer which is rebuilt only after one of its ports changes.  The
+    sender goes round the switches, writing each one's buffer in a single
+    send.
+    """
 
     # Maximum times to run the timer per second
     _sends_per_sec = 15
@@ -84,13 +84,19 @@ class LLDPSender (object):
           consider the rest of the data to be valid.  We don't use this, but
           other LLDP agents might.  Can't be 0 (this means revoke).
         """
-        # Packets remaining to be sent in this cycle
-        self._this_cycle = []
+        # dpid -> {port_num: (port_addr, packed packet_out)}
+        self._ports = {}
+
+        # dpid -> all of the switch's packet_outs in one buffer (None if stale)
+        self._buffers = {}
+
+        # Switches remaining to be sent to in this cycle
+        self._this_cycle = deque()
     
-        # Packets we've already sent in this cycle
-        self._next_cycle = []
+        # Switches we've already sent to in this cycle
+        self._next_cycle = deque()
     
-        # Packets to send in a batch
+        # Switches to send to in a batch
         self._send_chunk_size = 1
     
         self._timer = None
@@ -112,6 +118,8 @@ class LLDPSender (object):
                 Timer(3,self.add_port, args =[event.dpid, event.port, event.ofp.desc.hw_addr],recurring=False)
             elif event.deleted:
                 self.del_port(event.dpid, event.port)
+            elif event.modified:
+                self.update_port(event.dpid, event.port, event.ofp.desc.hw_addr)
 
     def _handle_openflow_ConnectionUp (self, event):
         self.del_switch(event.dpid, set_timer = False)
@@ -127,39 +135,66 @@ class LLDPSender (object):
         self.del_switch(event.dpid)
 
     def del_switch (self, dpid, set_timer = True):
-        self._this_cycle = [p for p in self._this_cycle if p.dpid != dpid] #cc:remove p from this_cycle if p.dpid==dpid
-        self._next_cycle = [p for p in self._next_cycle if p.dpid != dpid]
+        if self._ports.pop(dpid, None) is None: return
+        self._buffers.pop(dpid, None)
+        self._this_cycle = deque(d for d in self._this_cycle if d != dpid)
+        self._next_cycle = deque(d for d in self._next_cycle if d != dpid)
         if set_timer: self._set_timer()
 
     def del_port (self, dpid, port_num, set_timer = True):
         if port_num > of.OFPP_MAX: return
-        self._this_cycle = [p for p in self._this_cycle
-                            if p.dpid != dpid or p.port_num != port_num]
-        self._next_cycle = [p for p in self._next_cycle
-                            if p.dpid != dpid or p.port_num != port_num]
-        if set_timer: self._set_timer()
+        ports = self._ports.get(dpid)
+        if ports is None or ports.pop(port_num, None) is None: return
+        self._buffers[dpid] = None
+        if not ports:
+            self.del_switch(dpid, set_timer)
 
     def add_port (self, dpid, port_num, port_addr, set_timer = True):
         if port_num > of.OFPP_MAX: return
-        self.del_port(dpid, port_num, set_timer = False)
-        self._next_cycle.append(LLDPSender.SendItem(dpid, port_num,
-              self.create_discovery_packet(dpid, port_num, port_addr)))
+        ports = self._ports.get(dpid)
+        if ports is None:
+            ports = self._ports[dpid] = {}
+            self._next_cycle.append(dpid)
+        else:
+            set_timer = False   # same number of switches, same schedule
+        ports[port_num] = (port_addr,
+                           self.create_discovery_packet(dpid, port_num, port_addr))
+        self._buffers[dpid] = None
         
         if set_timer: self._set_timer()
 
+    def update_port (self, dpid, port_num, port_addr):
+        """
+        Rebuilds a port's packet if its address changed
+        """
+        old = self._ports.get(dpid, {}).get(port_num)
+        if old is not None and old[0] != port_addr:
+            self.add_port(dpid, port_num, port_addr)
+
+    def get_buffer (self, dpid):
+        """
+        All of the discovery packet_outs for a switch, packed together
+        """
+        buf = self._buffers.get(dpid)
+        if buf is None:
+            ports = self._ports.get(dpid, {})
+            buf = b''.join(ports[p][1] for p in sorted(ports))
+            self._buffers[dpid] = buf
+        return buf
+
     def _set_timer (self):
         if self._timer: self._timer.cancel()
         self._timer = None
-        num_packets = len(self._this_cycle) + len(self._next_cycle)
+        num_switches = len(self._this_cycle) + len(self._next_cycle)
     
-        if num_packets == 0: return
+        if num_switches == 0: return
     
         self._send_chunk_size = 1 # One at a time
-        interval = self._send_cycle_time / float(num_packets)
+        interval = self._send_cycle_time / float(num_switches)
         if interval < 1.0 / self._sends_per_sec:
             # Would require too many sends per sec -- send more than one at once
             interval = 1.0 / self._sends_per_sec
-            chunk = float(num_packets) / self._send_cycle_time / self._sends_per_sec
+            chunk = float(num_switches) / self._send_cycle_time / self._sends_per_sec
             self._send_chunk_size = chunk
         self._timer = Timer(interval,self._timer_handler, recurring=True)
 
@@ -167,9 +202,9 @@ class LLDPSender (object):
         """
         Called by a timer to actually send packets.
     
-        Picks the first packet off this cycle's list, sends it, and then puts
-        it on the next-cycle list.  When this cycle's list is empty, starts
-        the next cycle.
+        Picks the first switch off this cycle's list, sends it all of its
+        packets in one buffer, and then puts it on the next-cycle list.
+        When this cycle's list is empty, starts the next cycle.
         """
         num = int(self._send_chunk_size)
         fpart = self._send_chunk_size - num
@@ -177,11 +212,11 @@ class LLDPSender (object):
         for _ in range(num):
             if len(self._this_cycle) == 0:
                 self._this_cycle = self._next_cycle
-                self._next_cycle = []
-                #shuffle(self._this_cycle)
-            item = self._this_cycle.pop(0)
-            self._next_cycle.append(item)
-            core.openflow.sendToDPID(item.dpid, item.packet)
+                self._next_cycle = deque()
+                if len(self._this_cycle) == 0: return
+            dpid = self._this_cycle.popleft()
+            self._next_cycle.append(dpid)
+            core.openflow.sendToDPID(dpid, self.get_buffer(dpid))
 
     def create_discovery_packet (self, dpid, port_num, port_addr):
         """
@@ -216,6 +251,42 @@ class LLDPSender (object):
         return po.pack()
 
 
+_tlv_header = struct.Struct("!H")
+_lldp_dst = pkt.ETHERNET.NDP_MULTICAST.toRaw()
+
+def _fast_lldp (data):
+    """
+    (dpid, port) from an LLDP frame laid out as LLDPSender builds them
+    (untagged; chassis id "dpid:<hex>", port id "<decimal>", then TTL),
+    read straight from the bytes.  None for anything else, which is left
+    to the full parser.
+    """
+    try:
+        offset = 14
+        typelen = _tlv_header.unpack_from(data, offset)[0]
+        length = typelen & 0x1ff
+        if (typelen >> 9 != pkt.lldp.CHASSIS_ID_TLV or length < 7
+            or ord(data[offset + 2]) != pkt.chassis_id.SUB_LOCAL
+            or data[offset + 3:offset + 8] != 'dpid:'):
+            return None
+        dpid = int(data[offset + 8:offset + 2 + length], 16)
+        offset += 2 + length
+        typelen = _tlv_header.unpack_from(data, offset)[0]
+        length = typelen & 0x1ff
+        if (typelen >> 9 != pkt.lldp.PORT_ID_TLV
+            or ord(data[offset + 2]) != pkt.port_id.SUB_PORT):
+            return None
+        port = data[offset + 3:offset + 2 + length]
+        if not port.isdigit():
+            return None
+        offset += 2 + length
+        if _tlv_header.unpack_from(data, offset)[0] >> 9 != pkt.lldp.TTL_TLV:
+            return None
+        return dpid, int(port)
+    except (struct.error, ValueError, IndexError):
+        return None
+
+
 class LinkEvent (Event):
     """
     Link up/down event
@@ -370,9 +441,9 @@ class Discovery (EventMixin):
         Receive and process LLDP packets
         """
     
-        packet = event.parsed
-        if (packet.effective_ethertype != pkt.ethernet.LLDP_TYPE
-            or packet.dst != pkt.ETHERNET.NDP_MULTICAST):
+        data = event.ofp.data
+        if (event.ofp.peek_ethertype() != pkt.ethernet.LLDP_TYPE
+            or data[:6] != _lldp_dst):
             #print "LLDP packet in"
             if not self._eat_early_packets: return
             if not event.connection.connect_time: return
@@ -389,22 +460,57 @@ class Discovery (EventMixin):
 #                 msg.in_port = event.port
 #                 event.connection.send(msg)'''
     
-        lldph = packet.find(pkt.lldp)
+        # Our own probes are read from the raw bytes; anything else is parsed
+        originator = _fast_lldp(data)
+        if originator is None:
+            originator = self._parse_lldp(event)
+            if originator is None:
+                return EventHalt
+        originatorDPID, originatorPort = originator
+    
+        if originatorDPID not in core.openflow.connections:
+            log.info('Received LLDP packet from unknown switch')
+            return EventHalt
+    
+        if (event.dpid, event.port) == (originatorDPID, originatorPort):
+            log.warning("Port received its own LLDP packet; ignoring")
+            return EventHalt
+    
+        link = Discovery.Link(originatorDPID, originatorPort, event.dpid,
+                              event.port)
+    
+        if link not in self.adjacency:
+            self.adjacency[link] = time.time()
+            log.info('link detected: %s', link)
+            self.raiseEventNoErrors(LinkEvent, True, link)
+        else:
+            # Just update timestamp
+            self.adjacency[link] = time.time()
+    
+        return EventHalt # Probably nobody else needs this event
+
+    def _parse_lldp (self, event):
+        """
+        (dpid, port) of the sender of an LLDP packet, by full parsing
+
+        Returns None (having logged why) if there isn't one.
+        """
+        lldph = event.parsed.find(pkt.lldp)
         if lldph is None or not lldph.parsed:
             log.error("LLDP packet could not be parsed")
-            return EventHalt
+            return None
         if len(lldph.tlvs) < 3:
             log.error("LLDP packet without required three TLVs")
-            return EventHalt
+            return None
         if lldph.tlvs[0].tlv_type != pkt.lldp.CHASSIS_ID_TLV:
             log.error("LLDP packet TLV 1 not CHASSIS_ID")
-            return EventHalt
+            return None
         if lldph.tlvs[1].tlv_type != pkt.lldp.PORT_ID_TLV:
             log.error("LLDP packet TLV 2 not PORT_ID")
-            return EventHalt
+            return None
         if lldph.tlvs[2].tlv_type != pkt.lldp.TTL_TLV:
             log.error("LLDP packet TLV 3 not TTL")
-            return EventHalt
+            return None
     
         def lookInSysDesc ():
             r = None
@@ -450,16 +556,12 @@ class Discovery (EventMixin):
     
         if originatorDPID == None:
             log.warning("Couldn't find a DPID in the LLDP packet")
-            return EventHalt
-    
-        if originatorDPID not in core.openflow.connections:
-            log.info('Received LLDP packet from unknown switch')
-            return EventHalt
+            return None
     
         # Get port number from port TLV
         if lldph.tlvs[1].subtype != pkt.port_id.SUB_PORT:
             log.warning("Thought we found a DPID, but packet didn't have a port")
-            return EventHalt
+            return None
         originatorPort = None
         if lldph.tlvs[1].id.isdigit():
             # We expect it to be a decimal value
@@ -473,24 +575,9 @@ class Discovery (EventMixin):
         if originatorPort is None:
             log.warning("Thought we found a DPID, but port number didn't " +
                       "make sense")
-            return EventHalt
-    
-        if (event.dpid, event.port) == (originatorDPID, originatorPort):
-            log.warning("Port received its own LLDP packet; ignoring")
-            return EventHalt
-    
-        link = Discovery.Link(originatorDPID, originatorPort, event.dpid,
-                              event.port)
+            return None
     
-        if link not in self.adjacency:
-            self.adjacency[link] = time.time()
-            log.info('link detected: %s', link)
-            self.raiseEventNoErrors(LinkEvent, True, link)
-        else:
-            # Just update timestamp
-            self.adjacency[link] = time.time()
-    
-        return EventHalt # Probably nobody else needs this event
+        return originatorDPID, originatorPort
 
     def _delete_links (self, links):
         for link in links:
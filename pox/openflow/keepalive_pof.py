@@ -0,0 +1,197 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Keepalive for POF switches
+
+One recoco Timer walks core.openflow.connections every --interval seconds
+and sends each switch an echo request.  The echo reply gives the switch's
+round trip time; a switch we have heard nothing from (echo reply or any
+other message) for --interval + --timeout seconds is disconnected.
+
+Per switch liveness and latency are kept in core.openflow_keepalive.stats
+(see SwitchLiveness) and can be read with get_stats().
+
+It supports the following commandline options:
+ --interval=X  Send an echo request every X seconds (default 2)
+ --timeout=X   Disconnect a switch silent for X seconds beyond the
+               interval (default 6)
+"""
+
+from pox.core import core
+from pox.lib.revent import *
+from pox.lib.recoco import Timer
+from pox.lib.util import dpid_to_str
+import pox.openflow.libpof_02 as of
+
+import time
+
+log = core.getLogger()
+
+
+class SwitchTimeout (Event):
+    """
+    Raised on core.openflow_keepalive just before a silent switch is
+    disconnected
+    """
+    def __init__ (self, connection, idle):
+        Event.__init__(self)
+        self.connection = connection
+        self.dpid = connection.dpid
+        self.idle = idle
+
+
+class SwitchLiveness (object):
+    """
+    Liveness and echo latency of one switch, times in seconds
+    """
+    # weight of a new sample in the smoothed rtt, as TCP's srtt
+    RTT_ALPHA = 0.125
+
+    def __init__ (self, dpid):
+        self.dpid = dpid
+        self.alive = True
+        self.connect_time = time.time()
+        self.last_seen = self.connect_time
+        self.echo_sent = 0
+        self.echo_received = 0
+        self.echo_missed = 0
+        self.rtt_last = None
+        self.rtt_min = None
+        self.rtt_max = None
+        self.rtt_avg = None
+        self.pending_xid = None
+        self.pending_time = None
+
+    def add_rtt (self, rtt):
+        self.echo_received += 1
+        self.rtt_last = rtt
+        if self.rtt_avg is None:
+            self.rtt_min = self.rtt_max = self.rtt_avg = rtt
+        else:
+            self.rtt_min = min(self.rtt_min, rtt)
+            self.rtt_max = max(self.rtt_max, rtt)
+            self.rtt_avg += self.RTT_ALPHA * (rtt - self.rtt_avg)
+
+    def to_dict (self):
+        return {'dpid' : self.dpid,
+                'alive' : self.alive,
+                'connect_time' : self.connect_time,
+                'last_seen' : self.last_seen,
+                'echo_sent' : self.echo_sent,
+                'echo_received' : self.echo_received,
+                'echo_missed' : self.echo_missed,
+                'rtt_last' : self.rtt_last,
+                'rtt_min' : self.rtt_min,
+                'rtt_max' : self.rtt_max,
+                'rtt_avg' : self.rtt_avg}
+
+
+class Keepalive (EventMixin):
+    """
+    Sends echo requests to every connected switch from a single timer
+    """
+    _eventMixin_events = set([
+        SwitchTimeout,
+    ])
+
+    _core_name = "openflow_keepalive"
+
+    def __init__ (self, interval = 2, timeout = 6):
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self.stats = {}   # dpid: SwitchLiveness
+        core.listen_to_dependencies(self)
+        self._timer = Timer(self.interval, self._handle_timer, recurring = True)
+
+    def _handle_openflow_ConnectionUp (self, event):
+        self.stats[event.dpid] = SwitchLiveness(event.dpid)
+
+    def _handle_openflow_ConnectionDown (self, event):
+        s = self.stats.get(event.dpid)
+        if s is not None:
+            s.alive = False
+            s.pending_xid = None
+
+    def _handle_openflow_EchoReply (self, event):
+        s = self.stats.get(event.dpid)
+        if s is None or s.pending_xid != event.xid:
+            return    # not ours, or a late reply already counted as missed
+        now = time.time()
+        s.add_rtt(now - s.pending_time)
+        s.last_seen = now
+        s.pending_xid = None
+
+    def _handle_timer (self):
+        if not core.hasComponent("openflow"):
+            return
+        now = time.time()
+        dead = []
+        for dpid, con in core.openflow.connections.items():
+            s = self.stats.get(dpid)
+            if s is None:
+                # connected but ConnectionUp not raised yet
+                s = self.stats[dpid] = SwitchLiveness(dpid)
+                s.last_seen = con.idle_time
+            s.alive = True
+            s.last_seen = max(s.last_seen, con.idle_time)
+            idle = now - s.last_seen
+            if idle > self.interval + self.timeout:
+                dead.append((con, idle))
+                continue
+            if s.pending_xid is not None:
+                s.echo_missed += 1
+            er = of.ofp_echo_request()
+            s.pending_xid = er.xid
+            s.pending_time = now
+            s.echo_sent += 1
+            con.send(er)
+
+        for con, idle in dead:
+            log.warn("%s silent for %.1f s, disconnecting",
+                     dpid_to_str(con.dpid), idle)
+            self.raiseEventNoErrors(SwitchTimeout, con, idle)
+            s = self.stats.get(con.dpid)
+            if s is not None:
+                s.alive = False
+                s.pending_xid = None
+            con.disconnect("timed out")
+
+    def get_stats (self, dpid = None):
+        """
+        return the stats dict of dpid, or a list of all of them; None if
+        dpid has never connected
+        """
+        if dpid is None:
+            return [s.to_dict() for s in self.stats.itervalues()]
+        s = self.stats.get(dpid)
+        if s is None:
+            return None
+        return s.to_dict()
+
+    def get_rtt (self, dpid):
+        """
+        return the smoothed echo rtt of dpid in seconds, None if unknown
+        """
+        s = self.stats.get(dpid)
+        if s is None:
+            return None
+        return s.rtt_avg
+
+
+def launch (interval = 2, timeout = 6):
+    if core.hasComponent(Keepalive._core_name):
+        return
+    core.registerNew(Keepalive, interval = float(interval),
+                     timeout = float(timeout))
@@ -25,6 +25,7 @@ openflow.pofmanager
 
 import struct
 import sys
+import binascii
 from pox.core import core
 from pox.lib.addresses import EthAddr
 from pox.lib.addresses import IPAddr
@@ -32,6 +33,7 @@ from pox.lib.util import initHelper
 from pox.lib.util import hexdump
 from pox.lib.util import assert_type
 from pox.lib.packet import packet_base
+from pox.lib.packet.ethernet import ethernet
 
 
 EMPTY_ETH = EthAddr(None)
@@ -474,6 +476,7 @@ ofp_capabilities_rev_map = {  # modified by cc
   'OFPC_QUEUE_STATS'  : 64,
   #'OFPC_ARP_MATCH_IP' : 128,
   'OFPC_PORT_BLOCKED' : 256,
+  'OFPC_COMPACT_FLOW_MOD' : 1 << 31,  # add, switch decodes compact ofp_flow_mod
 }
 
 # ----------- org.openflow.protocol.OFSwitchConfig ----------- #
@@ -499,6 +502,11 @@ ofp_flow_mod_flags_rev_map = {
   'OFPFF_EMERG'         : 4,
 }
 
+# Set in the (otherwise padding) byte after instruction_num of an ofp_flow_mod
+# when only the populated matchx/instruction slots are on the wire.  Only sent
+# to switches which report OFPC_COMPACT_FLOW_MOD.
+OFPFMF_COMPACT = 0x01
+
 # ---------- org.openflow.protocol.OFMultipartReply -------------- #
 ofp_stats_reply_flags_rev_map = {  # edit by CC
   'OFPSF_REPLY_MORE' : 1,  # or 'REPLY_MORE'?
@@ -865,11 +873,38 @@ class ofp_instruction_base (ofp_base):
         packed += struct.pack("!HH", self.type, len(self))
         packed += _PAD4
         return packed
-    
+
+    def compact_len(self):
+        """
+        Length of this instruction in a compact ofp_flow_mod
+        (no trailing padding)
+        """
+        return len(self)
+
+    def pack_compact(self):
+        """
+        Packs this instruction without its trailing padding, as used by
+        compact ofp_flow_mod messages.  The length in the header is the
+        compact length.
+        """
+        packed = self.pack()
+        length = self.compact_len()
+        return packed[:2] + struct.pack("!H", length) + packed[4:length]
+
+    def pack_into(self, buf, offset=0, compact=False):
+        """
+        Packs this instruction into buf (a zero filled bytearray) at offset
+        and returns the offset just past what was written.  Trailing padding
+        is left to the buffer.
+        """
+        packed = self.pack_compact() if compact else self.pack()
+        buf[offset:offset + len(packed)] = packed
+        return offset + len(packed)
+
     def unpack(self, raw, offset=0):
         offset, length = self._unpack_header(raw, offset)
         return offset, length
-    
+
     def _unpack_header(self, raw, offset):
         offset, (self.type, length) = _unpack("!HH", raw, offset)
         offset = _skip(raw, offset, 4)
@@ -1139,6 +1174,37 @@ class ofp_match(ofp_base):
         outstr += prefix + 'transport_dst:    ' + str(self.transport_dst) + '\n'
         return outstr
     
+# Precompiled structs for the flow_mod hot path (matchx, instructions and the
+# fixed part of ofp_flow_mod).  Field ids are signed on the way out since
+# callers use -1 for metadata, but come back unsigned.
+_matchx_pack_struct = struct.Struct("!hHH2x%ds%ds" % (OFP_MAX_FIELD_LENGTH_IN_BYTE,
+                                                      OFP_MAX_FIELD_LENGTH_IN_BYTE))
+_matchx_unpack_struct = struct.Struct("!HHH2x%ds%ds" % (OFP_MAX_FIELD_LENGTH_IN_BYTE,
+                                                        OFP_MAX_FIELD_LENGTH_IN_BYTE))
+_match20_pack_struct = struct.Struct("!hHH2x")
+_match20_unpack_struct = struct.Struct("!HHH2x")
+_instruction_header_struct = struct.Struct("!HH4x")
+_goto_table_struct = struct.Struct("!HH4xBBH4x")
+_apply_actions_struct = struct.Struct("!HH4xB7x")
+_flow_mod_struct = struct.Struct("!BBHLBBBBLQQBBHHHL4x")
+
+_ZERO_FIELD = _PAD * OFP_MAX_FIELD_LENGTH_IN_BYTE
+
+def _hex_to_field (data):
+    """
+    Converts a hex string (or a list of byte values) into the
+    OFP_MAX_FIELD_LENGTH_IN_BYTE raw bytes used on the wire, like Hex2Raw
+    """
+    if isinstance(data, basestring):
+        if len(data) % 2:
+            data += '0'
+        raw = binascii.unhexlify(data)
+    else:
+        raw = b''.join(chr(i) for i in data)
+    if len(raw) > OFP_MAX_FIELD_LENGTH_IN_BYTE:
+        raise RuntimeError("Out of length")
+    return raw + _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(raw))
+
 class ofp_match20 (ofp_base):  # add by cc
     _MIN_LENGTH = 8
     _METADATA_FIELD_ID = 0xffff
@@ -1163,20 +1229,18 @@ class ofp_match20 (ofp_base):  # add by cc
     
     def pack(self):
         assert self._assert()
-        
-        packed = b""
-        packed += struct.pack("!h" , self.field_id)
-        packed += struct.pack("!H" , self.offset)
-        packed += struct.pack("!H" , self.length)
-        packed += _PAD2
-        return packed
+        return _match20_pack_struct.pack(self.field_id, self.offset, self.length)
+
+    def pack_into(self, buf, offset=0):
+        _match20_pack_struct.pack_into(buf, offset, self.field_id, self.offset, self.length)
+        return offset + 8
 
     def unpack(self, raw, offset=0):
-        _offset = offset
-        offset, (self.field_id, self.offset, self.length) = _unpack('!HHH', raw, offset)
-        offset = _skip(raw, offset, 2)
-        assert offset - _offset == len(self)
-        return offset
+        if len(raw) - offset < 8:
+            raise UnderrunError()
+        (self.field_id, self.offset, self.length) = \
+            _match20_unpack_struct.unpack_from(raw, offset)
+        return offset + 8
 
     def show(self, prefix=''):
         outstr = ''
@@ -1191,9 +1255,19 @@ class ofp_match20 (ofp_base):  # add by cc
     
 
 class ofp_matchx(ofp_base):  # add by cc
+    """
+    value and mask are set and read as hex strings, but are kept as the
+    OFP_MAX_FIELD_LENGTH_IN_BYTE raw bytes which go on the wire (value_raw,
+    mask_raw), so packing does no per-byte conversion.
+    """
     _MIN_LENGTH = 40
     
     def __init__(self, **kw):
+        self._value = ''
+        self._value_raw = _ZERO_FIELD
+        self._mask = ''
+        self._mask_raw = _ZERO_FIELD
+
         for k,v in kw.iteritems():
             if not hasattr(self, k):
                 setattr(self, k, v)
@@ -1212,47 +1286,71 @@ class ofp_matchx(ofp_base):  # add by cc
             
         if 'value' in kw:
             self.value = kw['value']  # 16 bytes
-        else:
-            self.value = []
             
         if 'mask' in kw:
             self.mask = kw['mask']  # 16 bytes
-        else:
-            self.mask = []
         
         initHelper(self, kw)
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = binascii.hexlify(self._value_raw)
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value_raw = _hex_to_field(value)
+        self._value = value if isinstance(value, basestring) else None
+
+    @property
+    def value_raw(self):
+        return self._value_raw
+
+    @value_raw.setter
+    def value_raw(self, raw):
+        self._value_raw = raw + _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(raw))
+        self._value = None
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = binascii.hexlify(self._mask_raw)
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask_raw = _hex_to_field(mask)
+        self._mask = mask if isinstance(mask, basestring) else None
+
+    @property
+    def mask_raw(self):
+        return self._mask_raw
+
+    @mask_raw.setter
+    def mask_raw(self, raw):
+        self._mask_raw = raw + _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(raw))
+        self._mask = None
     
     def set_value(self, hexstring):
-        if(len(hexstring) % 2):
-            hexstring += '0'
         if(len(hexstring) > OFP_MAX_FIELD_LENGTH_IN_BYTE * 2):
-            #hexstring = hexstring[:OFP_MAX_FIELD_LENGTH_IN_BYTE * 2]
             _log(error = "out of length in ofp_matchx.value")
-        self.value = []
-        for i in xrange(0, len(hexstring) / 2):
-            int_c = int(hexstring[i*2:i*2+2],16)
-            #print (hexstring[i*2:i*2+2]),int_c
-            self.value.append(int_c)
+            hexstring = hexstring[:OFP_MAX_FIELD_LENGTH_IN_BYTE * 2]
+        self.value = hexstring
     
     def set_mask(self,hexstring):
-        if (len(hexstring) % 2):
-            hexstring +='0'
         if (len(hexstring) > OFP_MAX_FIELD_LENGTH_IN_BYTE * 2):
-            #hexstring=hexstring[:OFP_MAX_FIELD_LENGTH_IN_BYTE * 2]
             _log(error = "out of length in ofp_matchx.mask")
-        self.mask=[]
-        for i in xrange(0,len(hexstring)/2):
-            int_c=int(hexstring[i*2:i*2+2], 16)    
-            #print (hexstring[i*2:i*2+2]),int_c
-            self.mask.append(int_c)
+            hexstring = hexstring[:OFP_MAX_FIELD_LENGTH_IN_BYTE * 2]
+        self.mask = hexstring
 
     def __eq__(self, other):
         if type(self) != type(other): return False
         if self.field_id != other.field_id: return False
         if self.offset != other.offset: return False
         if self.length != other.length: return False       
-        if self.value != other.value: return False
-        if self.mask != other.mask: return False
+        if self._value_raw != other._value_raw: return False
+        if self._mask_raw != other._mask_raw: return False
         return True
   
     def __len__(self):
@@ -1260,48 +1358,23 @@ class ofp_matchx(ofp_base):  # add by cc
     
     def pack(self):
         assert self._assert()
+        return _matchx_pack_struct.pack(self.field_id, self.offset, self.length,
+                                        self._value_raw, self._mask_raw)
 
-        packed = b""
-        packed += struct.pack("!h" , self.field_id)
-        packed += struct.pack("!H" , self.offset)
-        packed += struct.pack("!H" , self.length)
-        packed += _PAD2
-        """
-        for i in self.value:
-            packed += struct.pack("!B", int(i))
-        packed += _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(self.value))
-        """
-        #packed += b''.join((chr(int(self.value[x*2:x*2+2], 16)) for x in range(len(self.value)/2)))
-        """
-        for i in self.value:
-            packed += chr(i)
-        packed += _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(self.value)/2)
-        """
-        """
-        for i in self.mask:
-            packed += struct.pack("!B", int(i))
-        packed += _PAD * (OFP_MAX_FIELD_LENGTH_IN_BYTE - len(self.mask))
-        """
-        #packed += '\xff'*OFP_MAX_FIELD_LENGTH_IN_BYTE
-        packed += Hex2Raw(self.value, OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw()
-        packed += Hex2Raw(self.mask, OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw()
-        return packed
+    def pack_into(self, buf, offset=0):
+        _matchx_pack_struct.pack_into(buf, offset, self.field_id, self.offset,
+                                      self.length, self._value_raw, self._mask_raw)
+        return offset + 40
 
     def unpack(self, raw, offset=0):
-        _offset = offset
-        offset, (self.field_id, self.offset, self.length) = _unpack('!HHH', raw, offset)
-        offset = _skip(raw, offset, 2)
-        
-        for _ in xrange(0, OFP_MAX_FIELD_LENGTH_IN_BYTE):
-            offset, temp_value = _unpack('!B', raw, offset)
-            self.value.append(temp_value)
-            
-        for _ in xrange(0, OFP_MAX_FIELD_LENGTH_IN_BYTE):
-            offset, temp_mask = _unpack('!B', raw, offset)
-            self.mask.append(temp_mask)
-            
-        assert offset - _offset == len(self)
-        return offset
+        if len(raw) - offset < 40:
+            raise UnderrunError()
+        (self.field_id, self.offset, self.length, self._value_raw,
+         self._mask_raw) = _matchx_unpack_struct.unpack_from(raw, offset)
+        # value and mask come back as hex strings, converted on first use
+        self._value = None
+        self._mask = None
+        return offset + 40
 
     def show(self, prefix=''):
         outstr = ''
@@ -1400,11 +1473,14 @@ class ofp_flow_table(ofp_base):  # used in ofp_table_mod
         offset, (self.command, self.table_id, self.table_type, self.match_field_num,
                  self.table_size, self.key_length) = _unpack('!BBBBLH', raw, offset)        
         offset = _skip(raw, offset, 6)
-        offset, self.name = _readzs(raw, offset, OFP_NAME_MAX_LENGTH)
-        for _ in xrange(0, OFP_MAX_MATCH_FIELD_NUM):
+        offset, self.table_name = _readzs(raw, offset, OFP_NAME_MAX_LENGTH)
+        # only the first match_field_num slots are fields, the rest padding
+        self.match_field_list = []
+        for i in xrange(0, OFP_MAX_MATCH_FIELD_NUM):
             m = ofp_match20()
             offset = m.unpack(raw, offset)
-            self.match_field_list.append(m)
+            if i < self.match_field_num:
+                self.match_field_list.append(m)
             
         assert offset - _offset == len(self)
         return offset
@@ -1422,7 +1498,7 @@ class ofp_flow_table(ofp_base):  # used in ofp_table_mod
         if self.table_size != other.table_size: return False
         if self.key_length != other.key_length: return False
         if self.table_name != other.table_name: return False
-        if self.match_field_list != other.match_field_num: return False
+        if self.match_field_list != other.match_field_list: return False
         return True
     
     def show (self, prefix=''):
@@ -1530,12 +1606,12 @@ class ofp_action_output (ofp_action_base):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
 
-        offset, self.port_id_value_type = _unpack('!B', raw, offset)
+        offset, (self.port_id_value_type,) = _unpack('!B', raw, offset)
         offset = _skip(raw, offset, 1)
         offset, (self.metadata_offset, self.metadata_length,
             self.packet_offset) = _unpack("!HHH", raw, offset)
         if self.port_id_value_type == 0:
-            offset, self.port_id = _unpack('!L', raw, offset)
+            offset, (self.port_id,) = _unpack('!L', raw, offset)
             offset = _skip(raw, offset , 4)
             self.port_id_field = None
         elif self.port_id_value_type == 1:
@@ -1658,7 +1734,7 @@ class ofp_action_set_field_from_metadata (ofp_action_base):
         
         self.field_setting = ofp_match20()
         offset = self.field_setting.unpack(raw, offset)  # ofp_matchx.upack
-        offset, self.metadata_offset = _unpack("!H", raw, offset)
+        offset, (self.metadata_offset,) = _unpack("!H", raw, offset)
         offset = _skip(raw, offset, 6)
         assert offset - _offset == len(self)
         return offset, length
@@ -1713,7 +1789,7 @@ class ofp_action_modify_field (ofp_action_base):
         
         self.match_field = ofp_match20()
         offset = self.match_field.unpack(raw, offset)  # ofp_matchx.upack
-        offset, self.increment = _unpack("!L", raw, offset)
+        offset, (self.increment,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -1843,7 +1919,7 @@ class ofp_action_delete_field (ofp_action_base):
         offset, (self.tag_position, self.tag_length_value_type) = _unpack("!HB", raw, offset)
         offset = _skip(raw, offset, 5)
         if self.tag_length_value_type == 0:
-            offset, self.tag_length_value = _unpack("!L", raw, offset)
+            offset, (self.tag_length_value,) = _unpack("!L", raw, offset)
             offset = _skip(raw, offset, 4)
         elif self.tag_length_value_type == 1:
             self.tag_length_value = 0
@@ -1968,7 +2044,7 @@ class ofp_action_group (ofp_action_base):
     def unpack (self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
-        offset, self.group_id = _unpack("!L", raw, offset)
+        offset, (self.group_id,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -2015,7 +2091,7 @@ class ofp_action_drop (ofp_action_base):
     def unpack (self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
-        offset, self.reason = _unpack("!L", raw, offset)
+        offset, (self.reason,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -2063,7 +2139,7 @@ class ofp_action_packetin (ofp_action_base):
     def unpack (self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
-        offset, self.reason = _unpack("!L", raw, offset)
+        offset, (self.reason,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -2110,7 +2186,7 @@ class ofp_action_counter (ofp_action_base):
     def unpack (self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
-        offset, self.counter_id = _unpack("!L", raw, offset)
+        offset, (self.counter_id,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -2157,7 +2233,7 @@ class ofp_action_experimenter (ofp_action_base):
     def unpack (self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
-        offset, self.exterimenter = _unpack("!L", raw, offset)
+        offset, (self.exterimenter,) = _unpack("!L", raw, offset)
         offset = _skip(raw, offset, 4)
         assert offset - _offset == len(self)
         return offset, length
@@ -2223,24 +2299,42 @@ class ofp_instruction_goto_table(ofp_instruction_base):
     
     def unpack(self, raw, offset=0):
         _offset = offset
-        offset, length = self._unpack_header(raw, offset)
-        
-        offset, (self.next_table_id, self.match_field_num, self.packet_offset) = \
-               _unpack('!BBH', raw, offset)
-        offset = _skip(raw, offset, 4)
+        if len(raw) - offset < ofp_instruction_goto_table._MIN_LENGTH:
+            raise UnderrunError()
+        (self.type, length, self.next_table_id, self.match_field_num,
+         self.packet_offset) = _goto_table_struct.unpack_from(raw, offset)
+        offset += ofp_instruction_goto_table._MIN_LENGTH
+        self.match_list = []
         for _ in xrange(self.match_field_num):
             match = ofp_match20()
             offset = match.unpack(raw, offset)
             self.match_list.append(match)
-        offset = _skip(raw, offset, (OFP_MAX_MATCH_FIELD_NUM - len(self.match_list)) * ofp_match20._MIN_LENGTH)
+        # Full messages pad the match list out to OFP_MAX_MATCH_FIELD_NUM
+        offset = _skip(raw, offset, length - (offset - _offset))
 
-        assert offset - _offset == len(self)
+        assert offset - _offset == length
         return offset, length
 
     @staticmethod
     def __len__():
         return ofp_instruction_goto_table._MAX_LENGTH
 
+    def compact_len(self):
+        return ofp_instruction_goto_table._MIN_LENGTH + \
+               ofp_match20._MIN_LENGTH * len(self.match_list)
+
+    def pack_into(self, buf, offset=0, compact=False):
+        if len(self.match_list) > OFP_MAX_MATCH_FIELD_NUM:
+            _log(error = "out of range in ofp_instruction_goto_table.match_list")
+            return ofp_instruction_base.pack_into(self, buf, offset, compact)
+        length = self.compact_len() if compact else len(self)
+        _goto_table_struct.pack_into(buf, offset, self.type, length, self.next_table_id,
+                                     self.match_field_num, self.packet_offset)
+        o = offset + ofp_instruction_goto_table._MIN_LENGTH
+        for match in self.match_list:
+            o = match.pack_into(buf, o)
+        return o
+
     def __eq__(self, other):
         if type(self) != type(other): return False
         if not ofp_instruction_base.__eq__(self, other): return False
@@ -2291,7 +2385,8 @@ class ofp_instruction_write_metadata(ofp_instruction_base):
         offset, length = self._unpack_header(raw, offset)
         
         offset, (self.metadata_offset, self.write_length) = _unpack('!HH', raw, offset)
-        offset, self.value = _readzs(raw, offset, OFP_MAX_FIELD_LENGTH_IN_BYTE)   # FIXME:?
+        offset, value = _read(raw, offset, OFP_MAX_FIELD_LENGTH_IN_BYTE)
+        self.value = binascii.hexlify(value)   # hex, as pack() takes it
         offset = _skip(raw, offset, 4)
         
         assert offset - _offset == len(self)
@@ -2339,14 +2434,18 @@ class ofp_instruction_write_actions(ofp_instruction_base):
     def unpack(self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
+        offset = _skip(raw, offset, length - (offset - _offset))
         
-        assert offset - _offset == len(self)
+        assert offset - _offset == length
         return offset, length
 
     @staticmethod
     def __len__():
         return ofp_instruction_write_actions._MAX_LENGTH
 
+    def compact_len(self):
+        return ofp_instruction_base._MIN_LENGTH
+
     def __eq__(self, other):
         if type(self) != type(other): return False
         if not ofp_instruction_base.__eq__(self, other): return False
@@ -2392,20 +2491,53 @@ class ofp_instruction_apply_actions(ofp_instruction_base):
             packed += _PAD * ofp_action_base._MAX_LENGTH * (OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION - self.action_num)
         return packed
     
+    def pack_compact(self):
+        assert self._assert()
+        actions = b''.join(action.pack() for action in self.action_list)
+        packed = b""
+        packed += struct.pack("!HH", self.type, self._MIN_LENGTH + len(actions))
+        packed += _PAD4
+        packed += struct.pack("!B", self.action_num)
+        packed += _PAD7
+        packed += actions
+        return packed
+
     def unpack(self, raw, offset=0):
         _offset = offset
-        offset, length = self._unpack_header(raw, offset)
-        offset, self.action_num = _unpack('!B', raw, offset)
-        offset = _skip(raw, offset, 7)
-        offset, self.action_list = _unpack_actions(raw, OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION*ofp_action_base._MAX_LENGTH, offset, 1)  #FIXME:
+        if len(raw) - offset < ofp_instruction_apply_actions._MIN_LENGTH:
+            raise UnderrunError()
+        (self.type, length, self.action_num) = _apply_actions_struct.unpack_from(raw, offset)
+        offset += ofp_instruction_apply_actions._MIN_LENGTH
+        # Full instructions keep every action in an ofp_action_base._MAX_LENGTH
+        # slot; compact ones (shorter than _MAX_LENGTH) pack them back to back.
+        padded = (length == ofp_instruction_apply_actions._MAX_LENGTH)
+        offset, self.action_list = _unpack_actions(raw, length - (offset - _offset), offset, padded)
         
-        assert offset - _offset == len(self)
+        assert offset - _offset == length
         return offset, length
 
     @staticmethod
     def __len__():
         return ofp_instruction_apply_actions._MAX_LENGTH
 
+    def compact_len(self):
+        return ofp_instruction_apply_actions._MIN_LENGTH + \
+               sum(len(action) for action in self.action_list)
+
+    def pack_into(self, buf, offset=0, compact=False):
+        if (self.action_num != len(self.action_list) or
+                self.action_num > OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION):
+            # let pack() report it
+            return ofp_instruction_base.pack_into(self, buf, offset, compact)
+        length = self.compact_len() if compact else len(self)
+        _apply_actions_struct.pack_into(buf, offset, self.type, length, self.action_num)
+        o = offset + ofp_instruction_apply_actions._MIN_LENGTH
+        for action in self.action_list:
+            packed = action.pack()
+            buf[o:o + len(packed)] = packed
+            o += len(action) if compact else ofp_action_base._MAX_LENGTH
+        return o
+
     def __eq__(self, other):
         if type(self) != type(other): return False
         if not ofp_instruction_base.__eq__(self, other): return False
@@ -2444,14 +2576,18 @@ class ofp_instruction_clear_actions(ofp_instruction_base):
     def unpack(self, raw, offset=0):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
+        offset = _skip(raw, offset, length - (offset - _offset))
         
-        assert offset - _offset == len(self)
+        assert offset - _offset == length
         return offset, length
 
     @staticmethod
     def __len__():
         return ofp_instruction_write_metadata._MAX_LENGTH
 
+    def compact_len(self):
+        return ofp_instruction_base._MIN_LENGTH
+
     def __eq__(self, other):
         if type(self) != type(other): return False
         if not ofp_instruction_base.__eq__(self, other): return False
@@ -2490,7 +2626,7 @@ class ofp_instruction_meter(ofp_instruction_base):
         _offset = offset
         offset, length = self._unpack_header(raw, offset)
         
-        offset, self.meter_id = _unpack('!L', raw, offset)
+        offset, (self.meter_id,) = _unpack('!L', raw, offset)
         offset = _skip(raw, offset, 4)
         
         assert offset - _offset == len(self)
@@ -3393,8 +3529,18 @@ class ofp_set_config (ofp_header):  # uses ofp_switch_config
         outstr += prefix + 'miss_send_len: ' + str(self.miss_send_len) + '\n'
         return outstr
     
+_packet_in_struct = struct.Struct("!BBHLLHBBQLL")   # header + fixed fields, 32 bytes
+_ethertype_struct = struct.Struct("!H")
+
 @openflow_s_message("OFPT_PACKET_IN", 10)  # FIXME:
 class ofp_packet_in (ofp_header):
+    """
+    Only the 32 byte fixed part is decoded by unpack(); data is kept as
+    bytes and parsed into pox.lib.packet.ethernet the first time parse()
+    (or .parsed) is called, once per message however many PacketIn events
+    are built from it.  The peek_*() methods read L2 fields straight from
+    data without parsing.
+    """
     _MIN_LENGTH = 32
     
     def __init__ (self, **kw):
@@ -3412,6 +3558,49 @@ class ofp_packet_in (ofp_header):
         
         initHelper(self, kw)
 
+    @property
+    def data (self):
+        return self._data
+
+    @data.setter
+    def data (self, data):
+        self._data = data
+        self._parsed = None
+
+    def parse (self):
+        if self._parsed is None:
+            self._parsed = ethernet(self._data)
+        return self._parsed
+
+    @property
+    def parsed (self):
+        return self.parse()
+
+    def peek_ethertype (self):
+        """
+        ethertype of data (the inner one of an 802.1Q frame), None if data
+        is too short
+        """
+        data = self._data
+        if data is None or len(data) < 14:
+            return None
+        ethertype = _ethertype_struct.unpack_from(data, 12)[0]
+        if ethertype == ethernet.VLAN_TYPE:
+            if len(data) < 18:
+                return None
+            ethertype = _ethertype_struct.unpack_from(data, 16)[0]
+        return ethertype
+
+    def peek_dst (self):   # return EthAddr, None if data is too short
+        if self._data is None or len(self._data) < 14:
+            return None
+        return EthAddr(self._data[:6])
+
+    def peek_src (self):   # return EthAddr, None if data is too short
+        if self._data is None or len(self._data) < 14:
+            return None
+        return EthAddr(self._data[6:12])
+
     def _validate (self):
         if self.data and (self.total_len < len(self.data)):
             return "total len less than data len"
@@ -3425,20 +3614,23 @@ class ofp_packet_in (ofp_header):
         packed += struct.pack("!LHBBQLHH", self.buffer_id, self.total_len, self.in_port,
             self.reason, self.cookie, self.device_id, self.slot_id, self.port_id)
         """
-        packed += struct.pack("!LHBBQLL", self.buffer_id, self.total_len, self.in_port,
-            self.reason, self.cookie, self.device_id, self.slot_port_id)
+        packed += struct.pack("!LHBBQLL", self.buffer_id, self.total_len, self.reason,
+            self.table_id, self.cookie, self.device_id, self.slot_port_id)
         packed += self.data
         return packed
 
     def unpack (self, raw, offset=0):
-        offset, length = self._unpack_header(raw, offset)
         """
         offset, (self.buffer_id, self._total_len, self.reason, self.table_id, self.cookie,
             self.device_id, self.slot_id, self.port_id) = _unpack("!LHBBQLHH", raw, offset)
         """
-        offset, (self.buffer_id, self._total_len, self.reason, self.table_id, self.cookie,
-            self.device_id, self.slot_port_id) = _unpack("!LHBBQLL", raw, offset)
-        offset, self.data = _read(raw, offset, length - 32)
+        if len(raw) - offset < 32:
+            raise UnderrunError()
+        (self.version, self.header_type, length, self.xid, self.buffer_id, self._total_len,
+            self.reason, self.table_id, self.cookie, self.device_id,
+            self.slot_port_id) = _packet_in_struct.unpack_from(raw, offset)
+        self.total_len = self._total_len
+        offset, self.data = _read(raw, offset + 32, length - 32)
         assert length == len(self)
         return offset, length
 
@@ -3870,6 +4062,10 @@ class ofp_packet_out (ofp_header): #change to avoid collision by milktank
     def _validate (self):
         if self.buffer_id is not None and self.data != b'':
             return "can not have both buffer_id and data set"
+        if len(self.actions) > OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION:
+            return "too many actions"
+        if len(self.data) > OFP_PACKET_IN_MAX_LENGTH:
+            return "data is longer than %d bytes" % (OFP_PACKET_IN_MAX_LENGTH,)
         return None
       
     def pack (self):
@@ -3890,39 +4086,15 @@ class ofp_packet_out (ofp_header): #change to avoid collision by milktank
 #         print "data:", self.data
 #         print "_data:", self._data
 #     
-        if len(self.actions)==0:
-            packed += _PAD * OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION * ofp_action_base._MAX_LENGTH
-        else:
-            numcount = 0
-            for i in self.actions:
-                packed += i.pack()
-                if len(i)< ofp_action_base._MAX_LENGTH:
-                    packed += _PAD * (ofp_action_base._MAX_LENGTH-len(i))
-                numcount+=1
-            #print (packed.encode("hex"))
-            if numcount < OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION:
-                packed +=_PAD * (OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION - numcount) *ofp_action_base._MAX_LENGTH
-            #print (packed.encode("hex"))
-            if (self.data !=b""):
-                if (len(self.data) < OFP_PACKET_IN_MAX_LENGTH):
-                    #datapacked =b""+ struct.pack("!10s" ,self.data)
-                    #print ("datapacked:",datapacked.encode("hex"))    
-                    packed += self.data
-                    #print ("data:",self.data.encode("hex"))
-                    #print (len(self.data))
-            #print ("Blank:",(_PAD*(OFP_PACKET_IN_MAX_LENGTH - len(self.data))).encode("hex"))
-            #print ("Blank:",(_PAD*1600).encode("hex"))
-            blank=OFP_PACKET_IN_MAX_LENGTH - len(self.data)
-            #print ("before memset blank:\n",packed.encode("hex"))
-            if blank > 1024:            
-                packed += _PAD*(1024)
-                packed += _PAD*(blank-1024)
-                #print ("Blank1:\n",(_PAD*(1024)).encode("hex"))
-                #print ("Blank2:\n",( _PAD*(blank-1024)).encode("hex"))
-            else:
-                packed += _PAD*blank
-            #print ("after memset blank:\n",packed.encode("hex"))    
-            #print ("after memset blank length:\n",len(packed))            
+        for i in self.actions:
+            packed += i.pack()
+            if len(i) < ofp_action_base._MAX_LENGTH:
+                packed += _PAD * (ofp_action_base._MAX_LENGTH - len(i))
+        packed += _PAD * (OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION - len(self.actions)) \
+            * ofp_action_base._MAX_LENGTH
+        # the data field is always OFP_PACKET_IN_MAX_LENGTH bytes long
+        packed += self.data
+        packed += _PAD * (OFP_PACKET_IN_MAX_LENGTH - len(self.data))
         return packed
         """
         if self.data is not None:
@@ -3939,15 +4111,19 @@ class ofp_packet_out (ofp_header): #change to avoid collision by milktank
     def unpack (self, raw, offset=0):
         _offset = offset
         offset,length = self._unpack_header(raw, offset)
-        offset,(self._buffer_id, self.in_port, actions_len) = \
-            _unpack("!LHH", raw, offset)
-        offset,self.actions = _unpack_actions(raw, length - 24, offset, 0)
-
-        remaining = length - (offset - _offset)
-        if remaining <= 0:
-            self.data = None
-        else:
-            offset,self.data = _read(raw, offset, remaining)
+        offset,(self._buffer_id, self.in_port, action_num) = \
+            _unpack("!LLB", raw, offset)
+        offset = _skip(raw, offset, 3)
+        offset,(data_len,) = _unpack("!L", raw, offset)
+        offset,actions = _unpack_actions(raw,
+            OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION * ofp_action_base._MAX_LENGTH,
+            offset, True)
+        self.actions = actions[:action_num]
+        if data_len > OFP_PACKET_IN_MAX_LENGTH:
+            raise RuntimeError("data_len %s is longer than the data field"
+                               % (data_len,))
+        offset,self.data = _read(raw, offset, data_len)
+        offset = _skip(raw, offset, OFP_PACKET_IN_MAX_LENGTH - data_len)
 
         assert length == len(self)
         return offset,length
@@ -3963,6 +4139,7 @@ class ofp_packet_out (ofp_header): #change to avoid collision by milktank
         if self.buffer_id != other.buffer_id: return False
         if self.in_port != other.in_port: return False
         if self.actions != other.actions: return False
+        if self.data != other.data: return False
         return True
 
     def show (self, prefix=''):
@@ -3982,6 +4159,12 @@ class ofp_packet_out (ofp_header): #change to avoid collision by milktank
   
 @openflow_c_message("OFPT_FLOW_MOD", 15)
 class ofp_flow_mod (ofp_header):
+    """
+    Full flow_mods are always _MAX_LENGTH bytes: every unused matchx and
+    instruction slot is zero padding.  With compact set (or pack(compact=True))
+    only the populated matchx and the unpadded instructions are sent and
+    OFPFMF_COMPACT is set in the flags byte; unpack() handles both forms.
+    """
     _MIN_LENGTH = 48
     _MAX_LENGTH = 48 + ofp_matchx._MIN_LENGTH * OFP_MAX_MATCH_FIELD_NUM + \
                     ofp_instruction_base._MAX_LENGTH * OFP_MAX_INSTRUCTION_NUM  # 2192
@@ -4002,6 +4185,7 @@ class ofp_flow_mod (ofp_header):
         self.index = 0            # 4 bytes
         self.match_list = []      # ofp_matchx
         self.instruction_list = []  # ofp_instruction
+        self.compact = False      # use the compact encoding (OFPFMF_COMPACT)
         
         initHelper(self, kw)
 
@@ -4013,55 +4197,87 @@ class ofp_flow_mod (ofp_header):
         # FIXME:
         return None
 
-    def pack (self):
+    def pack (self, compact=None):
         assert self._assert()
-        
-        packed = b""
-        packed += ofp_header.pack(self)
-        packed += struct.pack ("!BBB" , self.command, self.match_field_num, self.instruction_num)
-        packed += _PAD
-        packed += struct.pack ("!LQQBBHHHL", self.counter_id, self.cookie, self.cookie_mask,
-                               self.table_id, self.table_type, self.idle_timeout,
-                               self.hard_timeout, self.priority, self.index)
-        packed += _PAD4
-        
-        for i in self.match_list:
-            packed += i.pack()
-        if (len(self.match_list) < OFP_MAX_MATCH_FIELD_NUM):
-            packed += _PAD * ((OFP_MAX_MATCH_FIELD_NUM - len(self.match_list)) * ofp_matchx._MIN_LENGTH)
-            
-        for i in self.instruction_list:
-            packed += i.pack()
-            if (len(i) < ofp_instruction_base._MAX_LENGTH):
-                packed += _PAD * (ofp_instruction_base._MAX_LENGTH - len(i))
-        if (len(self.instruction_list) < OFP_MAX_INSTRUCTION_NUM):
-            packed += _PAD * ((OFP_MAX_INSTRUCTION_NUM - len(self.instruction_list)) * ofp_instruction_base._MAX_LENGTH)
-        return packed
+        if compact is None:
+            compact = self.compact
+        buf = bytearray(self._wire_len(compact))
+        self.pack_into(buf, 0, compact)
+        return bytes(buf)
 
-    def unpack (self, raw, offset=0):  # FIXME:
-        offset, length = self._unpack_header(raw, offset)
-        offset, (self.command, self.match_field_num, self.instruction_num) = \
-            _unpack("!BBB", raw, offset)
-        offset = _skip(raw, offset, 1)
-        offset, (self.counter_id, self.cookie, self.cookie_mask, self.table_id,
-                self.table_type, self.idle_timeout, self.hard_timeout,
-                self.priority, self.index) = _unpack("!LQQBBHHHL", raw, offset)
+    def pack_into (self, buf, offset=0, compact=None):
+        """
+        Packs into buf, which must be a zero filled bytearray with at least
+        len(self) bytes free after offset (padding is not written), and
+        returns the offset of the end of the message.  This lets several
+        flow_mods share one preallocated buffer.
+        """
+        if compact is None:
+            compact = self.compact
+        length = self._wire_len(compact)
+        _flow_mod_struct.pack_into(buf, offset, self.version, self.header_type,
+                                   length, self.xid, self.command,
+                                   self.match_field_num, self.instruction_num,
+                                   OFPFMF_COMPACT if compact else 0,
+                                   self.counter_id, self.cookie, self.cookie_mask,
+                                   self.table_id, self.table_type, self.idle_timeout,
+                                   self.hard_timeout, self.priority, self.index)
+        o = offset + ofp_flow_mod._MIN_LENGTH
+        if compact:
+            for matchx in self.match_list:
+                o = matchx.pack_into(buf, o)
+            for instruction in self.instruction_list:
+                o = instruction.pack_into(buf, o, True)
+        else:
+            for matchx in self.match_list:
+                o = matchx.pack_into(buf, o)
+            o = offset + ofp_flow_mod._MIN_LENGTH + \
+                ofp_matchx._MIN_LENGTH * OFP_MAX_MATCH_FIELD_NUM
+            for instruction in self.instruction_list:
+                instruction.pack_into(buf, o)
+                o += ofp_instruction_base._MAX_LENGTH
+        return offset + length
+
+    def unpack (self, raw, offset=0):
+        _offset = offset
+        if len(raw) - offset < ofp_flow_mod._MIN_LENGTH:
+            raise UnderrunError()
+        (self.version, self.header_type, length, self.xid, self.command,
+         self.match_field_num, self.instruction_num, flags, self.counter_id,
+         self.cookie, self.cookie_mask, self.table_id, self.table_type,
+         self.idle_timeout, self.hard_timeout, self.priority, self.index) = \
+            _flow_mod_struct.unpack_from(raw, offset)
+        offset += ofp_flow_mod._MIN_LENGTH
+        self.compact = bool(flags & OFPFMF_COMPACT)
         self.match_list = []
         self.instruction_list = []
-        for _ in xrange(OFP_MAX_MATCH_FIELD_NUM):
+        for _ in xrange(self.match_field_num):
             matchx = ofp_matchx()
             offset = matchx.unpack(raw, offset)
             self.match_list.append(matchx)
-            
-        instructions_len = ofp_instruction_base._MAX_LENGTH * OFP_MAX_INSTRUCTION_NUM
-        offset, self.instruction_list = _unpack_instructions(raw, instructions_len, offset)
+        if self.compact:
+            instructions_len = length - (offset - _offset)
+            offset, self.instruction_list = _unpack_instructions(raw, instructions_len, offset)
+        else:
+            # skip the unused matchx slots
+            offset = _skip(raw, offset, ofp_matchx._MIN_LENGTH *
+                           (OFP_MAX_MATCH_FIELD_NUM - self.match_field_num))
+            instructions_len = ofp_instruction_base._MAX_LENGTH * OFP_MAX_INSTRUCTION_NUM
+            offset, self.instruction_list = _unpack_instructions(raw, instructions_len, offset, True)
         
         assert length == len(self)
         return offset, length
 
-    def __len__ (self):
+    def _wire_len (self, compact):
+        if compact:
+            return (ofp_flow_mod._MIN_LENGTH +
+                    ofp_matchx._MIN_LENGTH * len(self.match_list) +
+                    sum(i.compact_len() for i in self.instruction_list))
         return ofp_flow_mod._MAX_LENGTH
 
+    def __len__ (self):
+        return self._wire_len(self.compact)
+
     def __eq__ (self, other):
         if type(self) != type(other): return False
         if not ofp_header.__eq__(self, other): return False
@@ -4144,7 +4360,7 @@ class ofp_group_mod (ofp_header):
         offset, (self.group_id, self.counter_id) = _unpack("!LL", raw, offset)
 
         actions_len = ofp_action_base._MAX_LENGTH * self.action_num
-        offset, self.action_list = _unpack_actions(raw, actions_len, offset)
+        offset, self.action_list = _unpack_actions(raw, actions_len, offset, True)
         offset = _skip(raw, offset , (OFP_MAX_ACTION_NUMBER_PER_GROUP - self.action_num) * ofp_action_base._MAX_LENGTH)
 
         assert length == len(self)
@@ -4692,11 +4908,13 @@ class ofp_counter_reply(ofp_header):
         
         
         
-def _unpack_actions (b, length, offset=0):
+def _unpack_actions (b, length, offset=0, padded=False):
     """
     Parses actions from a buffer
     b is a buffer (bytes)
     offset, if specified, is where in b to start decoding
+    if padded is set, every action sits in a slot of
+    ofp_action_base._MAX_LENGTH bytes and an all-zero slot ends the list
     returns (next_offset, [Actions])
     """
     if (len(b) - offset) < length: raise UnderrunError
@@ -4704,6 +4922,9 @@ def _unpack_actions (b, length, offset=0):
     end = length + offset
     while offset < end:
         (t, l) = struct.unpack_from("!HH", b, offset)
+        if l == 0:
+            # Padding of a full-length instruction/message
+            break
         if (len(b) - offset) < l: raise UnderrunError
         a = _action_type_to_class.get(t)
         if a is None:
@@ -4712,18 +4933,19 @@ def _unpack_actions (b, length, offset=0):
             _log(error="unknown action type")
         else:
             a = a()
-        a.unpack(b[offset:offset + l])
-        assert len(a) == l
-        actions.append(a)
-        offset += l
-    return (offset, actions)
+            a.unpack(b, offset)
+            actions.append(a)
+        offset += ofp_action_base._MAX_LENGTH if padded else l
+    return (end, actions)
 
-def _unpack_instructions (b, length, offset=0):
+def _unpack_instructions (b, length, offset=0, padded=False):
     """
     Parses instructions from a buffer
     b is a buffer (bytes)
     offset, if specified, is where in b to start decoding
-    returns (next_offset, [Actions])
+    if padded is set, every instruction sits in a slot of
+    ofp_instruction_base._MAX_LENGTH bytes and an all-zero slot ends the list
+    returns (next_offset, [Instructions])
     """
     if (len(b) - offset) < length:
         raise UnderrunError
@@ -4731,6 +4953,9 @@ def _unpack_instructions (b, length, offset=0):
     end = length + offset
     while offset < end:
         (t, l) = struct.unpack_from("!HH", b, offset)
+        if l == 0:
+            # Padding of a full-length flow_mod
+            break
         if (len(b) - offset) < l:
             raise UnderrunError
         a = _instruction_type_to_class.get(t)
@@ -4740,11 +4965,10 @@ def _unpack_instructions (b, length, offset=0):
             _log(error="unknown instruction type")
         else:
             a = a()
-        a.unpack(b[offset:offset + l])
-        assert len(a) == l
-        instructions.append(a)
-        offset += l
-    return (offset, instructions)
+            a.unpack(b, offset)
+            instructions.append(a)
+        offset += ofp_instruction_base._MAX_LENGTH if padded else l
+    return (end, instructions)
 
 
 
@@ -0,0 +1,292 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Controller side lookup structures for MM and LPM flow tables
+
+A flow entry's matchx list is flattened into one (value, mask) pair of
+integers over the table's key bits (the first matchx.length bits of each
+matchx, concatenated in order).  Two matches overlap when some key matches
+both of them: (value_1 ^ value_2) & mask_1 & mask_2 == 0.  A query with an
+all-ones mask is a packet key, so the overlapping entries are exactly the
+entries the switch would consider for that packet.
+
+TupleSpaceClassifier keeps one hash bucket per distinct mask; PrefixTrie
+keeps prefix masks in a binary trie.  PMTableClassifier puts the two
+together for a table and is what PMFlowTableDB maintains.
+"""
+
+from pox.core import core
+import pox.openflow.libpof_02 as of
+
+import binascii
+
+log = core.getLogger()
+
+_FIELD_BITS = of.OFP_MAX_FIELD_LENGTH_IN_BYTE * 8
+
+def matchx_list_to_key(matchx_list):
+    """
+    return (value, mask, key_length) with value and mask as integers of
+    key_length bits
+    """
+    value = 0
+    mask = 0
+    key_length = 0
+    for matchx in matchx_list:
+        length = matchx.length
+        if length <= 0 or length > _FIELD_BITS:
+            raise ValueError("bad matchx length %s" % (length,))
+        shift = _FIELD_BITS - length
+        value = (value << length) | (int(binascii.hexlify(matchx.value_raw), 16) >> shift)
+        mask = (mask << length) | (int(binascii.hexlify(matchx.mask_raw), 16) >> shift)
+        key_length += length
+    return value & mask, mask, key_length
+
+def prefix_length(mask, key_length):
+    """
+    return the number of leading one bits if mask is a prefix mask, else -1
+    """
+    inverted = ~mask & ((1 << key_length) - 1)
+    if inverted & (inverted + 1):
+        return -1
+    return key_length - inverted.bit_length()
+
+def overlaps(value_1, mask_1, value_2, mask_2):
+    return (value_1 ^ value_2) & mask_1 & mask_2 == 0
+
+
+class TupleSpaceClassifier(object):
+    """
+    Entries bucketed by mask: {mask: {value: set(entry_id)}}
+    A lookup costs one hash probe per distinct mask whose bits the query
+    mask covers; other buckets are scanned.
+    """
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, entry_id, value, mask):
+        self.buckets.setdefault(mask, {}).setdefault(value, set()).add(entry_id)
+
+    def remove(self, entry_id, value, mask):
+        bucket = self.buckets.get(mask)
+        if bucket is None:
+            return
+        ids = bucket.get(value)
+        if ids is None:
+            return
+        ids.discard(entry_id)
+        if not ids:
+            del bucket[value]
+            if not bucket:
+                del self.buckets[mask]
+
+    def lookup(self, value, mask):   # return a list of entry_id
+        result = []
+        for bucket_mask, bucket in self.buckets.iteritems():
+            if bucket_mask & ~mask == 0:
+                ids = bucket.get(value & bucket_mask)
+                if ids:
+                    result.extend(ids)
+            else:
+                common = bucket_mask & mask
+                for bucket_value, ids in bucket.iteritems():
+                    if (bucket_value ^ value) & common == 0:
+                        result.extend(ids)
+        return result
+
+    def __len__(self):
+        return sum(len(ids) for bucket in self.buckets.itervalues() for ids in bucket.itervalues())
+
+
+class PrefixTrie(object):
+    """
+    Binary trie over the key bits, entries stored at the node of their
+    prefix length.  A node is [child_0, child_1, set(entry_id) or None].
+    """
+    def __init__(self, key_length):
+        self.key_length = key_length
+        self.root = [None, None, None]
+
+    def _bit(self, value, depth):
+        return (value >> (self.key_length - 1 - depth)) & 1
+
+    def add(self, entry_id, value, plen):
+        node = self.root
+        for depth in xrange(plen):
+            bit = self._bit(value, depth)
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            node[2] = set()
+        node[2].add(entry_id)
+
+    def remove(self, entry_id, value, plen):
+        path = []
+        node = self.root
+        for depth in xrange(plen):
+            bit = self._bit(value, depth)
+            if node[bit] is None:
+                return
+            path.append((node, bit))
+            node = node[bit]
+        if node[2] is None:
+            return
+        node[2].discard(entry_id)
+        if not node[2]:
+            node[2] = None
+        # prune empty branches
+        while path and node[0] is None and node[1] is None and node[2] is None:
+            parent, bit = path.pop()
+            parent[bit] = None
+            node = parent
+
+    def lookup(self, value, plen):
+        """
+        return entry ids on the path to the query prefix (entries covering it)
+        and everywhere below it (entries it covers), longest prefix first
+        """
+        covering = []
+        node = self.root
+        for depth in xrange(plen):
+            if node[2]:
+                covering.append(node[2])
+            node = node[self._bit(value, depth)]
+            if node is None:
+                break
+        result = []
+        if node is not None:
+            stack = [node]
+            while stack:
+                n = stack.pop()
+                if n[2]:
+                    result.extend(n[2])
+                if n[0] is not None:
+                    stack.append(n[0])
+                if n[1] is not None:
+                    stack.append(n[1])
+        for ids in reversed(covering):
+            result.extend(ids)
+        return result
+
+
+class PMTableClassifier(object):
+    """
+    Incrementally maintained lookup for one OF_MM_TABLE or OF_LPM_TABLE.
+    LPM entries with prefix masks go into a PrefixTrie; everything else
+    (all MM entries, odd LPM masks) goes into a TupleSpaceClassifier.
+    """
+    def __init__(self, table_type):
+        self.table_type = table_type
+        self.key_length = None
+        self.entries = {}    # entry_id: (value, mask, prefix_length, priority)
+        self.tuple_space = TupleSpaceClassifier()
+        self.trie = None
+
+    def put(self, entry_id, flow_entry):
+        self.remove(entry_id)
+        try:
+            value, mask, key_length = matchx_list_to_key(flow_entry.match_list)
+        except ValueError as e:
+            log.error("classifier: entry %s not indexed, %s" % (entry_id, e))
+            return False
+        if self.key_length is None:
+            self.key_length = key_length
+        elif key_length != self.key_length:
+            log.error("classifier: entry %s has key length %s, table has %s" % (entry_id, key_length, self.key_length))
+            return False
+        plen = -1
+        if self.table_type == of.OF_LPM_TABLE:
+            plen = prefix_length(mask, key_length)
+        if plen >= 0:
+            if self.trie is None:
+                self.trie = PrefixTrie(key_length)
+            self.trie.add(entry_id, value, plen)
+        else:
+            self.tuple_space.add(entry_id, value, mask)
+        self.entries[entry_id] = (value, mask, plen, flow_entry.priority)
+        return True
+
+    def remove(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        value, mask, plen, _ = entry
+        if plen >= 0:
+            self.trie.remove(entry_id, value, plen)
+        else:
+            self.tuple_space.remove(entry_id, value, mask)
+
+    def lookup(self, matchx_list):
+        """
+        return the ids of every entry overlapping matchx_list, in the order the
+        switch would prefer them (longest prefix for LPM, then priority)
+        """
+        if not self.entries:
+            return []
+        try:
+            value, mask, key_length = matchx_list_to_key(matchx_list)
+        except ValueError as e:
+            log.error("classifier: bad lookup key, %s" % (e,))
+            return []
+        if key_length != self.key_length:
+            log.error("classifier: lookup key length %s, table has %s" % (key_length, self.key_length))
+            return []
+        result = self.tuple_space.lookup(value, mask)
+        if self.trie is not None:
+            plen = prefix_length(mask, key_length)
+            if plen >= 0:
+                result.extend(self.trie.lookup(value, plen))
+            else:
+                # not a prefix query: anything overlapping it agrees with the
+                # query's leading one bits, so walk the trie by those and filter
+                lead = self._leading_ones(mask, key_length)
+                for entry_id in self.trie.lookup(value, lead):
+                    e_value, e_mask = self.entries[entry_id][:2]
+                    if overlaps(value, mask, e_value, e_mask):
+                        result.append(entry_id)
+        entries = self.entries
+        if self.table_type == of.OF_LPM_TABLE:
+            result.sort(key = lambda i: (bin(entries[i][1]).count('1'), entries[i][3]), reverse = True)
+        else:
+            result.sort(key = lambda i: entries[i][3], reverse = True)
+        return result
+
+    def match(self, value):
+        """
+        return the id of the entry a switch applies to the packet key value
+        (key_length bits), or None
+        """
+        if not self.entries:
+            return None
+        result = self.tuple_space.lookup(value, (1 << self.key_length) - 1)
+        if self.trie is not None:
+            result.extend(self.trie.lookup(value, self.key_length))
+        if not result:
+            return None
+        entries = self.entries
+        if self.table_type == of.OF_LPM_TABLE:
+            return max(result, key = lambda i: (bin(entries[i][1]).count('1'), entries[i][3]))
+        return max(result, key = lambda i: entries[i][3])
+
+    @staticmethod
+    def _leading_ones(mask, key_length):
+        n = 0
+        while n < key_length and (mask >> (key_length - 1 - n)) & 1:
+            n += 1
+        return n
+
+    def __len__(self):
+        return len(self.entries)
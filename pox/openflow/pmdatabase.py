@@ -16,11 +16,19 @@
 from pox.lib.revent.revent import EventMixin
 from pox.core import core
 import pox.openflow.libpof_02 as of
+from pox.openflow.pmclassifier import PMTableClassifier
+from pox.openflow.pmjournal import decode_table, decode_entry, decode_meter
 
 #from collections import defaultdict
 
 import sys
 import copy
+import heapq
+import struct
+from itertools import izip
+from operator import attrgetter
+from contextlib import contextmanager
+from collections import deque
 from cookielib import offset_from_tz_string
 
 log = core.getLogger()
@@ -154,14 +162,106 @@ class ProtocolDB(object):
             outstr += self.protocol_dict.get(each_protocol_id).show()           
         return outstr
 
+class IDAllocator(object):
+    """
+    Allocates integer ids from start_no up to max_number, always handing out
+    the lowest free id first.  Freed ids are kept in a heap (plus a set to
+    catch double frees), so alloc and free never sort or scan a list.
+    """
+    def __init__(self, start_no = 0, max_number = sys.maxint):
+        self.start_no = start_no
+        self.max_number = max_number
+        self.next_no = start_no    # lowest id never handed out
+        self.free_heap = []
+        self.free_set = set()
+        
+    def alloc(self):   # return -1 when out of ids
+        if self.free_heap:
+            index = heapq.heappop(self.free_heap)
+            self.free_set.discard(index)
+            return index
+        return self.alloc_new()
+    
+    def alloc_new(self):
+        if self.next_no > self.max_number:
+            return -1
+        index = self.next_no
+        self.next_no += 1
+        return index
+    
+    def alloc_many(self, num):
+        ids = []
+        while self.free_heap and len(ids) < num:
+            ids.append(self.alloc())
+        rest = min(num - len(ids), self.max_number + 1 - self.next_no)
+        if rest > 0:
+            ids.extend(xrange(self.next_no, self.next_no + rest))
+            self.next_no += rest
+        return ids
+    
+    def free(self, index):   # return boolean
+        if index < self.start_no or index >= self.next_no or index in self.free_set:
+            return False
+        heapq.heappush(self.free_heap, index)
+        self.free_set.add(index)
+        return True
+    
+    def reserve(self, index):   # take a given free id (when restoring); return boolean
+        if index < self.start_no or index > self.max_number:
+            return False
+        if index >= self.next_no:
+            for free_index in xrange(self.next_no, index):   # ascending, so still a heap
+                self.free_heap.append(free_index)
+                self.free_set.add(free_index)
+            self.next_no = index + 1
+            return True
+        if index not in self.free_set:
+            return False
+        self.free_set.remove(index)
+        self.free_heap.remove(index)
+        heapq.heapify(self.free_heap)
+        return True
+    
+    def is_allocated(self, index):
+        return self.start_no <= index < self.next_no and index not in self.free_set
+    
+    def get_free_ids(self):   # sorted list of freed ids below next_no
+        return sorted(self.free_heap)
+    
+    def used_size(self):
+        return self.next_no - self.start_no - len(self.free_heap)
+    
+_match_key_struct = struct.Struct("!hHH%ds%ds" % (of.OFP_MAX_FIELD_LENGTH_IN_BYTE,
+                                                    of.OFP_MAX_FIELD_LENGTH_IN_BYTE))
+
+def get_match_key(matchx_list):
+    """
+    Index key of a flow entry's match: (field_id, offset, length,
+    value & mask, mask) of every matchx, in order, packed.  Value bits
+    outside the mask don't count, as in matching.  Linear tables have no
+    key ('').
+    """
+    parts = []
+    for matchx in matchx_list:
+        mask = matchx.mask_raw
+        value = bytes(bytearray(v & m for v, m in izip(bytearray(matchx.value_raw),
+                                                       bytearray(mask))))
+        parts.append(_match_key_struct.pack(matchx.field_id, matchx.offset,
+                                            matchx.length, value, mask))
+    return b''.join(parts)
+    
 class PMFlowTableDB(object):
     
     def __init__(self, **kw):
-        self.flow_table_id = 0       # global_table_id
+        self.flow_table_id = kw.get('flow_table_id', 0)       # global_table_id
         self.flow_entries_map = {}   # entry_id : flow_entry
-        self.flow_entry_no = 0
-        self.free_flow_entry_id_list = []
+        self.flow_entry_id_allocator = IDAllocator(FLOWENTRYID_START)
         self.match_key_map = {}    #key_string: entry_id
+        self.entry_match_key_map = {}   #entry_id: key_string, as indexed
+        self.classifier = None     # PMTableClassifier, for tables with a match
+        table_type = kw.get('table_type')
+        if table_type is not None and table_type != of.OF_LINEAR_TABLE:
+            self.classifier = PMTableClassifier(table_type)
         """
         self.flow_table_dict = {}    # {flow_table_id: flow_table}
         self.flow_table_name = {}    # {flow_table_name: flow_table_id}
@@ -170,19 +270,57 @@ class PMFlowTableDB(object):
         #self.flow_table_id_assigned = 0
         """
     def get_new_flow_entry_id(self):
-        if 0 == len(self.free_flow_entry_id_list):
-            new_flow_entry_id = self.flow_entry_no
-            self.flow_entry_no += 1
-        else:
-            new_flow_entry_id = self.free_flow_entry_id_list.pop(0)
-        return new_flow_entry_id
+        return self.flow_entry_id_allocator.alloc()
+    
+    def get_new_flow_entry_ids(self, num):
+        # reserve num ids at once: free ids first, then a fresh contiguous range
+        return self.flow_entry_id_allocator.alloc_many(num)
+    
+    def put_flow_entry(self, entry_id, flow_entry):
+        # add or replace, keeping match_key_map and the classifier in step
+        self.delete_match_key_of_entry(entry_id)
+        self.flow_entries_map[entry_id] = flow_entry
+        key = get_match_key(flow_entry.match_list)
+        if key:
+            self.put_match_key(key, entry_id)
+        if self.classifier is not None:
+            if key:
+                self.classifier.put(entry_id, flow_entry)
+            else:
+                self.classifier.remove(entry_id)
     
     def delete_flow_entry(self, index):
         flow_entry = self.flow_entries_map.pop(index)
-        self.free_flow_entry_id_list.append(index)
-        self.free_flow_entry_id_list.sort()
+        self.delete_match_key_of_entry(index)
+        if self.classifier is not None:
+            self.classifier.remove(index)
+        self.flow_entry_id_allocator.free(index)
         return flow_entry
     
+    def get_matched_flow_entry_ids(self, matchx_list):
+        # entries overlapping matchx_list, best first (see pmclassifier)
+        if self.classifier is None:
+            return []
+        return self.classifier.lookup(matchx_list)
+    
+    def put_match_key(self, key_string, entry_id):
+        self.match_key_map[key_string] = entry_id
+        self.entry_match_key_map[entry_id] = key_string
+    
+    def get_flow_entry_index_by_match_key(self, key_string):
+        return self.match_key_map.get(key_string, FLOWENTRYID_INVALID)
+    
+    def delete_match_key(self, key_string):
+        entry_id = self.match_key_map.pop(key_string, None)
+        if entry_id is not None:
+            self.entry_match_key_map.pop(entry_id, None)
+        return entry_id
+    
+    def delete_match_key_of_entry(self, entry_id):
+        key_string = self.entry_match_key_map.pop(entry_id, None)
+        if key_string is not None and self.match_key_map.get(key_string) == entry_id:
+            del self.match_key_map[key_string]
+    
     def get_flow_entry(self, entry_id):
         return self.flow_entries_map.get(entry_id)
     
@@ -269,16 +407,46 @@ class Metadata(object): # wenjian
         return outstr
 
 
+class PMCounterStats(object):
+    """
+    latest reading of one counter, with the packet and byte rates (per
+    second) since the reading before it
+    """
+    def __init__(self, counter_id):
+        self.counter_id = counter_id
+        self.counter_value = 0
+        self.byte_value = 0
+        self.packet_rate = 0.0
+        self.byte_rate = 0.0
+        self.timestamp = None    # time.time() of the reading
+        
+    def update(self, counter_value, byte_value, timestamp):
+        # no rate across a reset (values went down) or without a previous reading
+        if (self.timestamp is not None and timestamp > self.timestamp
+                and counter_value >= self.counter_value and byte_value >= self.byte_value):
+            interval = timestamp - self.timestamp
+            self.packet_rate = (counter_value - self.counter_value) / interval
+            self.byte_rate = (byte_value - self.byte_value) / interval
+        else:
+            self.packet_rate = 0.0
+            self.byte_rate = 0.0
+        self.counter_value = counter_value
+        self.byte_value = byte_value
+        self.timestamp = timestamp
+        
+    def reset(self):
+        self.__init__(self.counter_id)
+        
+
 class DataTable(object):  #TODO:need to put in the lib
     """
-    when delete an element, save the index into the freeList
-    alloc a new index from the freeList first; if freeList is empty, use the entryIdNo (then entryIdNo++)
+    when delete an element, give its index back to the id allocator
+    alloc returns the lowest free index (see IDAllocator)
     """
     def __init__(self, start_no):
         self.start_no = start_no
         self.data_table = {}   # id: value (ofp_couter of ofp_meter or ofp_group)
-        self.free_id_list = []
-        self.entry_id_no = start_no
+        self.id_allocator = IDAllocator(start_no)
         self.max_number = sys.maxint
         
     def put(self, index, value):   #index:id, value:ofp_couter of ofp_meter or ofp_group
@@ -299,33 +467,28 @@ class DataTable(object):  #TODO:need to put in the lib
             log.error("DataTable.remove(): wrong index")   #TODO: throw exception
         else:
             value = self.data_table.pop(index)
-            self.free_id_list.append(index)
-            self.free_id_list.sort()
+            self.id_allocator.free(index)
         return value
     
     def remove_value(self, value):
         for index in self.data_table.keys():
             if self.data_table.get(index) == value:
                 self.data_table.pop(index)
-                self.free_id_list.append(index)
+                self.id_allocator.free(index)
             
     def alloc(self):
-        if len(self.free_id_list) != 0:
-            index = self.free_id_list.pop(0)
-        else:
-            index = self.alloc_new()
-        return index
+        return self.id_allocator.alloc()
     
     def alloc_new(self):
-        if self.entry_id_no > self.max_number:
-            return -1
-        index = self.entry_id_no
-        self.entry_id_no += 1
-        return index
+        return self.id_allocator.alloc_new()
+    
+    def reserve(self, index):
+        return self.id_allocator.reserve(index)
     
     def set_max_number(self, max_number):
         if max_number >= 0 and max_number > self.start_no:
             self.max_number = max_number
+            self.id_allocator.max_number = max_number
             
     def get_all_data(self):
         return self.data_table
@@ -352,16 +515,20 @@ class PMSwitchDB(object):
         self.ports_name_map = {}    #port_name : port_id
         self.flow_table_resource_map = {}    #{slot_id: ofp_flow_table_resource()}
         self.flow_tables_map = {}            #{global_table_id: ofp_flow_table()}
+        self.flow_table_name_map = {}        #{table_name: set of global_table_id}
         self.flow_table_DB_map = {}    #{global_table_id: PMFlowTableDB()}
         self.flow_table_no_base_map = {}     #table_type: NO_base (0 for MM, 8 for LPM, 10 for EM, 16 for LINEAR)
-        self.flow_table_no_map = {}
-        self.free_flow_table_id_list_map = {}   # ofp_table_type: list[]
+        self.flow_table_id_allocator_map = {}   # ofp_table_type: IDAllocator
         
         self.counter_table = DataTable(COUNTERID_START)
+        self.counter_stats_map = {}   #{counter_id: PMCounterStats}
         self.group_table = DataTable(GROUPID_START)
         self.meter_table = DataTable(COUNTERID_START)
         
-        self.sended_of_msg_queue = []   # list of ofp
+        self.sended_of_msg_queue = deque()   # xids sent, in sending order
+        self.sended_of_msg_map = {}     # xid: ofp sent and not answered yet
+        self.sended_command_map = {}    # xid: command a flow_mod was sent with, as they are reused
+        self.old_backup_msg_map = {}    # sent xid: copy of the flow entry before it, to roll back to
         
     def get_flow_tables_map(self):
         return self.flow_tables_map
@@ -374,19 +541,25 @@ class PMSwitchDB(object):
             
     # Flow table functions
     def get_new_flow_table_id(self, table_type):
-        new_flow_table_id = FLOWTABLEID_INVALID
-        if self.free_flow_table_id_list_map is None or self.free_flow_table_id_list_map.get(table_type) is None or len(self.free_flow_table_id_list_map.get(table_type)) == 0:
-            new_flow_table_id = self.flow_table_no_map.get(table_type)
-            self.flow_table_no_map[table_type] += 1
-        else:
-            new_flow_table_id = self.free_flow_table_id_list_map[table_type].pop(0)
-        return new_flow_table_id
+        id_allocator = self.flow_table_id_allocator_map.get(table_type)
+        if id_allocator is None:
+            return FLOWTABLEID_INVALID
+        return id_allocator.alloc()
     
+    def add_table_name(self, table_name, global_table_id):
+        self.flow_table_name_map.setdefault(table_name, set()).add(global_table_id)
+
+    def remove_table_name(self, table_name, global_table_id):
+        table_ids = self.flow_table_name_map.get(table_name)
+        if table_ids is not None:
+            table_ids.discard(global_table_id)
+            if not table_ids:
+                del self.flow_table_name_map[table_name]
+
     def add_free_table_id(self, table_type, global_table_id):
-        free_id_list = self.free_flow_table_id_list_map.get(table_type)
-        if free_id_list is not None:
-            free_id_list.append(global_table_id)
-            free_id_list.sort()
+        id_allocator = self.flow_table_id_allocator_map.get(table_type)
+        if id_allocator is not None:
+            id_allocator.free(global_table_id)
         else:
             log.error("table is None")
             
@@ -403,11 +576,15 @@ class PMSwitchDB(object):
         self.group_table.set_max_number(flow_table_resource.group_num)
         
     def set_flow_table_no(self, table_type, flow_table_no):
-        self.flow_table_no_map[table_type] = flow_table_no
+        # global table ids of this type are handed out from flow_table_no on;
+        # a switch connecting again with the same resources keeps its ids
+        id_allocator = self.flow_table_id_allocator_map.get(table_type)
+        if id_allocator is not None and id_allocator.start_no == flow_table_no:
+            return
+        self.flow_table_id_allocator_map[table_type] = IDAllocator(flow_table_no)
         
     def set_flow_table_no_base(self, table_type, flow_table_no_base):
         self.flow_table_no_base_map[table_type] = flow_table_no_base
-        self.free_flow_table_id_list_map[table_type] = []   # FIXME:
     
     def get_flow_table_no_base(self, table_type):
         return self.flow_table_no_base_map.get(table_type)
@@ -419,7 +596,7 @@ class PMSwitchDB(object):
         return self.flow_table_resource_map.get(slot_id)
     
     def get_table_number(self, table_type):
-        return self.flow_table_no_map.get(table_type) - self.flow_table_no_base_map.get(table_type) - len(self.free_flow_table_id_list_map)
+        return self.flow_table_id_allocator_map.get(table_type).used_size()
     
     def get_all_table_number(self):
         return len(self.flow_tables_map)
@@ -427,11 +604,17 @@ class PMSwitchDB(object):
     # Counter functions 
     def alloc_counter_id(self):
         new_counter_id = self.counter_table.alloc()
+        if new_counter_id < COUNTERID_START:
+            log.error("no free counter id")
+            return COUNTERID_INVALID
         new_counter = of.ofp_counter(command = of.OFPCC_ADD, counter_id = new_counter_id)     # ofp_counter
         self.counter_table.put(new_counter_id, new_counter)
         return new_counter_id
     
     def remove_counter(self, counter_id):
+        if self.counter_table.get(counter_id) is None:
+            return None
+        self.counter_stats_map.pop(counter_id, None)
         return self.counter_table.remove(counter_id)
     
     def set_counter(self, new_counter):
@@ -456,6 +639,21 @@ class PMSwitchDB(object):
     def get_used_counter_number(self):
         return self.counter_table.used_size()
     
+    def update_counter_stats(self, counter_id, counter_value, byte_value, timestamp):   # return PMCounterStats
+        stats = self.counter_stats_map.get(counter_id)
+        if stats is None:
+            stats = PMCounterStats(counter_id)
+            self.counter_stats_map[counter_id] = stats
+        stats.update(counter_value, byte_value, timestamp)
+        counter = self.counter_table.get(counter_id)
+        if counter is not None:
+            counter.counter_value = counter_value
+            counter.byte_value = byte_value
+        return stats
+    
+    def get_counter_stats(self, counter_id):
+        return self.counter_stats_map.get(counter_id)
+    
     # Group functions
     def alloc_group_id(self):
         return self.group_table.alloc()
@@ -550,25 +748,79 @@ class PMSwitchDB(object):
     def add_sended_of_message(self, msg):
         if not isinstance(msg, of.ofp_header):
             log.error("Wrong message")
-        pass
-    
-    def get_sended_of_message_queue(self):
-        return self.sended_of_msg_queue
-    
-    def get_sended_of_message(self, xid):
-        pass
+            return
+        self.sended_of_msg_queue.append(msg.xid)
+        self.sended_of_msg_map[msg.xid] = msg
+        
+    def add_sended_of_messages(self, msgs, xids, commands, old_copies = None):
+        """
+        msgs written at once, with the xid and command (None but for
+        flow_mods) each was sent with; old_copies: None, or a backup (or
+        None) per message
+        """
+        self.sended_of_msg_queue.extend(xids)
+        self.sended_of_msg_map.update(zip(xids, msgs))
+        self.sended_command_map.update((xid, command) for xid, command in zip(xids, commands)
+                                       if command is not None)
+        if old_copies is not None:
+            self.old_backup_msg_map.update((xid, old) for xid, old in zip(xids, old_copies)
+                                           if old is not None)
+    
+    def get_sended_of_message_queue(self):   # return a list of ofp, in sending order
+        return [self.sended_of_msg_map[xid] for xid in self.sended_of_msg_queue
+                if xid in self.sended_of_msg_map]
+    
+    def get_sended_of_message_number(self):
+        return len(self.sended_of_msg_map)
+    
+    def get_sended_of_message(self, xid):   # return the message as it was sent, or None
+        msg = self.sended_of_msg_map.get(xid)
+        command = self.sended_command_map.get(xid)
+        if msg is not None and (msg.xid != xid or (command is not None and msg.command != command)):
+            msg = copy.copy(msg)   # sent again since
+            msg.xid = xid
+            msg.command = command
+        return msg
     
     def delete_sended_of_message(self, xid):
-        pass
+        # answered (by an error); its xid leaves the queue with the next barrier
+        self.old_backup_msg_map.pop(xid, None)
+        self.sended_command_map.pop(xid, None)
+        self.sended_of_msg_map.pop(xid, None)
+    
+    def acknowledge_sended_of_messages(self, barrier_xid):
+        # the barrier has been answered, so has everything sent before it;
+        # return the number of messages acknowledged
+        if barrier_xid not in self.sended_of_msg_map:
+            return 0
+        queue = self.sended_of_msg_queue
+        msg_map = self.sended_of_msg_map
+        command_map = self.sended_command_map
+        backup_map = self.old_backup_msg_map
+        acked_num = len(msg_map)
+        while True:
+            xid = queue.popleft()
+            msg_map.pop(xid, None)
+            command_map.pop(xid, None)
+            if backup_map:
+                backup_map.pop(xid, None)
+            if xid == barrier_xid:
+                return acked_num - len(msg_map)
+            
+    def clear_sended_of_messages(self):   # the connection is gone, with any answers
+        self.sended_of_msg_queue.clear()
+        self.sended_of_msg_map.clear()
+        self.sended_command_map.clear()
+        self.old_backup_msg_map.clear()
         
     def add_old_backup_message(self, sended_msg_xid, msg):
-        pass
+        self.old_backup_msg_map[sended_msg_xid] = msg
     
     def get_old_backup_message(self, xid):
-        pass
+        return self.old_backup_msg_map.get(xid)
     
     def delete_old_backup_message(self, xid):
-        pass
+        return self.old_backup_msg_map.pop(xid, None)
     
 
 class PMdatabase(EventMixin):
@@ -582,6 +834,14 @@ class PMdatabase(EventMixin):
         self.protocol_no = 0
         self.field_database = {}  #field_id : ofp_match20
         self.field_id_no = 0
+        # Secondary indexes, kept up to date by the functions below
+        self.field_name_index = {}       #field_name : [ofp_match20] in field_id order
+        self.field_protocol_index = {}   #field_id : set of protocol_id
+        self.protocol_field_ids = {}     #protocol_id : set of field_id, as indexed
+        self.metadata_name_index = None  #field_name : ofp_match20, rebuilt after a change
+        self.sorted_fields = None        #get_all_field(), until a field changes
+        self.journal = None              #PMJournal every change is written to (see pmjournal)
+        self.stored_switches = {}        #device_id : PMStoredSwitch, restored when it reports its resources
         
     # PMSwitchDB functions
     def add_switch_DB(self, switch_id):   # return boolean
@@ -616,8 +876,11 @@ class PMdatabase(EventMixin):
         
         self.protocol_name_map[p_name] = p_id
         self.protocol_map[p_id] = new_protocol
+        self._index_protocol_fields(p_id, f_list)
        
         self.protocol_no += 1
+        if self.journal is not None:
+            self.journal.put_protocol(new_protocol)
         return p_id
         
     def modify_protocol(self, protocol, f_list):
@@ -627,7 +890,11 @@ class PMdatabase(EventMixin):
         for f in f_list:
             t_length += f.length
         protocol.total_length = t_length
+        self._unindex_protocol_fields(protocol.protocol_id)
         protocol.field_list = f_list
+        self._index_protocol_fields(protocol.protocol_id, f_list)
+        if self.journal is not None:
+            self.journal.put_protocol(protocol)
         return True
     
     def del_protocol(self, protocol):
@@ -635,7 +902,31 @@ class PMdatabase(EventMixin):
             return False
         self.protocol_name_map.pop(protocol.protocol_name)
         self.protocol_map.pop(protocol.protocol_id)
+        self._unindex_protocol_fields(protocol.protocol_id)
+        if self.journal is not None:
+            self.journal.del_protocol(protocol.protocol_id)
         return True
+
+    def _index_protocol_fields(self, protocol_id, f_list):
+        field_ids = set(f.field_id for f in f_list)
+        self.protocol_field_ids[protocol_id] = field_ids
+        for field_id in field_ids:
+            self.field_protocol_index.setdefault(field_id, set()).add(protocol_id)
+
+    def _unindex_protocol_fields(self, protocol_id):
+        # by the ids indexed, since the caller may have changed the list itself
+        for field_id in self.protocol_field_ids.pop(protocol_id, ()):
+            protocol_ids = self.field_protocol_index.get(field_id)
+            if protocol_ids is not None:
+                protocol_ids.discard(protocol_id)
+                if not protocol_ids:
+                    del self.field_protocol_index[field_id]
+
+    def get_belonged_protocol(self, field_id):   # the first protocol (lowest id) with the field
+        protocol_ids = self.field_protocol_index.get(field_id)
+        if not protocol_ids:
+            return None
+        return self.protocol_map.get(min(protocol_ids))
     
     def get_protocol_map(self):
         return self.protocol_map
@@ -652,7 +943,11 @@ class PMdatabase(EventMixin):
         match_field.offset = offset
         match_field.length = length
         self.field_database[field_id] = match_field
+        self.field_name_index.setdefault(field_name, []).append(match_field)   # ids only grow
+        self.sorted_fields = None
         self.field_id_no += 1
+        if self.journal is not None:
+            self.journal.put_field(match_field)
         log.info("Add Field [field_id] "+ str(field_id) + " [offset] " + str(offset) + " [length] " + str(length) + " [field_name] " + field_name)
         return field_id
     
@@ -660,24 +955,40 @@ class PMdatabase(EventMixin):
         match_field = self.field_database.get(field_id)
         if match_field is None or not isinstance(match_field, of.ofp_match20):
             return False
+        if match_field.field_name != field_name:
+            self._unindex_field_name(match_field)
+            named = self.field_name_index.setdefault(field_name, [])
+            named.append(match_field)
+            named.sort(key = attrgetter('field_id'))
         match_field.field_name = field_name
         match_field.offset = offset
         match_field.length = length
+        self.sorted_fields = None
+        if self.journal is not None:
+            self.journal.put_field(match_field)
         return True
     
     def del_field(self, field_id):
-        self.field_database.pop(field_id)
+        match_field = self.field_database.pop(field_id)
+        self._unindex_field_name(match_field)
+        self.sorted_fields = None
+        if self.journal is not None:
+            self.journal.del_field(field_id)
         return True
+
+    def _unindex_field_name(self, match_field):
+        named = self.field_name_index.get(match_field.field_name)
+        if named is not None:
+            named[:] = [f for f in named if f is not match_field]
+            if not named:
+                del self.field_name_index[match_field.field_name]
     
     def get_field_by_id(self, field_id):
         field = self.field_database.get(field_id)
         return field       #FIXME: should be copy
     
     def get_field_by_name(self, field_name):
-        match_field_list = []
-        for field in self.field_database.values():    # could use iter here
-            if field.field_name == field_name:
-                match_field_list.append(field)
+        match_field_list = list(self.field_name_index.get(field_name, ()))
         field_in_metadata = self.get_metadata_field(field_name)
         if field_in_metadata != None:
             match_field_list.append(field_in_metadata)
@@ -690,12 +1001,18 @@ class PMdatabase(EventMixin):
             return 1 if (f_1.field_id > f_2.field_id) else -1
     
     def get_all_field(self):
-        match_field_list = self.field_database.values()
-        return sorted(match_field_list, self.field_id_cmp)
+        if self.sorted_fields is None:
+            self.sorted_fields = sorted(self.field_database.itervalues(),
+                                        key = attrgetter('field_id'))
+        return list(self.sorted_fields)
     
     # METADATA functions
+    # (change metadata through these, so metadata_name_index follows it)
     def modify_metadata(self, metadata_list):   #input: a list of ofp_match20 with field=-1
         self.metadata_list = copy.deepcopy(metadata_list)
+        self.metadata_name_index = None
+        if self.journal is not None:
+            self.journal.put_metadata(self.metadata_list)
         
     def get_metadata(self):
         return self.metadata_list
@@ -716,14 +1033,20 @@ class PMdatabase(EventMixin):
         match_field.length = field_length
         log.info("Add Metadata [offset] " + str(field_offset) + " [length] " + str(field_length) + " [field_name] " + field_name)
         self.metadata_list.append(match_field)
+        self.metadata_name_index = None
+        if self.journal is not None:
+            self.journal.put_metadata(self.metadata_list)
         
     def get_metadata_field(self, field_name):
-        if field_name is None or self.metadata_list is None or len(self.metadata_list) == 0:
+        if field_name is None:
             return None
-        for field in self.metadata_list:
-            if field.field_name == field_name:
-                return field
-        return None
+        index = self.metadata_name_index
+        if index is None:
+            index = {}
+            for field in self.metadata_list or ():
+                index.setdefault(field.field_name, field)   # the first one wins
+            self.metadata_name_index = index
+        return index.get(field_name)
     
     # Flow Table functions
     def add_flow_table(self, s_id, table_name, table_type, key_length, table_size, field_num, match_field_list):
@@ -747,7 +1070,11 @@ class PMdatabase(EventMixin):
         new_flow_table.match_field_list = match_field_list
         
         switch_DB.flow_tables_map[global_table_id] = new_flow_table
-        switch_DB.flow_table_DB_map[global_table_id] = PMFlowTableDB(flow_table_id = global_table_id)
+        switch_DB.add_table_name(table_name, global_table_id)
+        switch_DB.flow_table_DB_map[global_table_id] = PMFlowTableDB(flow_table_id = global_table_id,
+                                                                     table_type = table_type)
+        if self.journal is not None:
+            self.journal.put_table(s_id, global_table_id, new_flow_table)
         return global_table_id
     
     def put_flow_table(self, switch_id, global_flow_table_id, flow_table):
@@ -756,7 +1083,13 @@ class PMdatabase(EventMixin):
         switch_DB = self.switch_DB_map.get(switch_id)
         if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
             return False
+        old_flow_table = switch_DB.flow_tables_map.get(global_flow_table_id)
+        if old_flow_table is not None:
+            switch_DB.remove_table_name(old_flow_table.table_name, global_flow_table_id)
         switch_DB.flow_tables_map[global_flow_table_id] = flow_table
+        switch_DB.add_table_name(flow_table.table_name, global_flow_table_id)
+        if self.journal is not None:
+            self.journal.put_table(switch_id, global_flow_table_id, flow_table)
         return True
         
     def get_flow_table(self, switch_id, global_table_id):   #return ofp_flow_table
@@ -766,12 +1099,13 @@ class PMdatabase(EventMixin):
         return switch_DB.flow_tables_map.get(global_table_id)
     
     def get_flow_table_id(self, switch_id, table_name):   #return global_table_id
-        flow_tables_map = self.get_flow_table_map(switch_id)
-        #print flow_tables_map
-        for table_id in flow_tables_map:
-            if flow_tables_map.get(table_id).table_name == table_name:
-                return table_id
-        return FLOWTABLEID_INVALID
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
+            return FLOWTABLEID_INVALID
+        table_ids = switch_DB.flow_table_name_map.get(table_name)
+        if not table_ids:
+            return FLOWTABLEID_INVALID
+        return min(table_ids)
     
     def get_flow_table_map(self, switch_id):
         switch_DB = self.switch_DB_map.get(switch_id)
@@ -782,9 +1116,12 @@ class PMdatabase(EventMixin):
     def delete_flow_table(self, switch_id, table_type, global_table_id):
         switch_DB = self.switch_DB_map.get(switch_id)
         if switch_DB is not None:
-            switch_DB.flow_tables_map.pop(global_table_id)
+            flow_table = switch_DB.flow_tables_map.pop(global_table_id)
+            switch_DB.remove_table_name(flow_table.table_name, global_table_id)
             switch_DB.flow_table_DB_map.pop(global_table_id)
             switch_DB.add_free_table_id(table_type, global_table_id)
+            if self.journal is not None:
+                self.journal.del_table(switch_id, global_table_id)
             
     def get_flow_table_no_base(self, switch_id, table_type):
         switch_DB = self.switch_DB_map.get(switch_id)
@@ -823,22 +1160,48 @@ class PMdatabase(EventMixin):
         if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
             return FLOWENTRYID_INVALID
         flow_entry_id = switch_DB.flow_table_DB_map.get(global_table_id).get_new_flow_entry_id()
-        table_type = switch_DB.flow_tables_map.get(global_table_id).table_type
         small_table_id = self.parse_to_small_table_id(switch_id, global_table_id)
+        self._put_new_flow_entry(switch_DB, global_table_id, small_table_id, flow_entry_id,
+                                 matchx_list, instruction_list, priority, counter_enable)
+        return flow_entry_id
+    
+    def add_flow_entries(self, switch_id, global_table_id, entry_list):
+        """
+        entry_list: a list of (matchx_list, instruction_list, priority, counter_enable)
+        Reserves all the entry ids at once; returns them in entry_list order
+        """
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
+            return [FLOWENTRYID_INVALID] * len(entry_list)
+        flow_entry_ids = switch_DB.flow_table_DB_map.get(global_table_id).get_new_flow_entry_ids(len(entry_list))
+        small_table_id = self.parse_to_small_table_id(switch_id, global_table_id)
+        with self.journal_batch():
+            for flow_entry_id, (matchx_list, instruction_list, priority, counter_enable) in zip(flow_entry_ids, entry_list):
+                self._put_new_flow_entry(switch_DB, global_table_id, small_table_id, flow_entry_id,
+                                         matchx_list, instruction_list, priority, counter_enable)
+        return flow_entry_ids
+    
+    def _put_new_flow_entry(self, switch_DB, global_table_id, small_table_id, flow_entry_id,
+                            matchx_list, instruction_list, priority, counter_enable):
+        table_type = switch_DB.flow_tables_map.get(global_table_id).table_type
         new_flow_entry = of.ofp_flow_mod(table_id = small_table_id)
         new_flow_entry.table_type = table_type
         new_flow_entry.index = flow_entry_id
-        new_flow_entry.match_field_num = match_field_num
+        new_flow_entry.match_field_num = len(matchx_list)
         new_flow_entry.match_list = matchx_list
-        new_flow_entry.instruction_num = instruction_num
+        new_flow_entry.instruction_num = len(instruction_list)
         new_flow_entry.instruction_list = instruction_list
         new_flow_entry.priority = priority
         #new_counter_id = 0
         if counter_enable == True:
-            new_counter_id = self.switch_DB_map.get(switch_id).alloc_counter_id()
+            new_counter_id = switch_DB.alloc_counter_id()
             new_flow_entry.counter_id = new_counter_id
-        switch_DB.flow_table_DB_map[global_table_id].flow_entries_map[flow_entry_id] = new_flow_entry
-        return flow_entry_id
+            if self.journal is not None and new_counter_id != COUNTERID_INVALID:
+                self.journal.put_counter(switch_DB.device_id, new_counter_id)
+        switch_DB.flow_table_DB_map[global_table_id].put_flow_entry(flow_entry_id, new_flow_entry)
+        if self.journal is not None:
+            self.journal.put_entry(switch_DB.device_id, global_table_id, new_flow_entry)
+        return new_flow_entry
     
     def get_flow_entries_map(self, switch_id, global_table_id):
         switch_DB = self.switch_DB_map.get(switch_id)
@@ -872,47 +1235,70 @@ class PMdatabase(EventMixin):
             if flow_mod.counter_id == COUNTERID_INVALID:   # no counter before, add counter now
                 counter_id = self.get_switch_DB(switch_id).alloc_counter_id()
                 flow_mod.counter_id = counter_id
+                if self.journal is not None and counter_id != COUNTERID_INVALID:
+                    self.journal.put_counter(switch_id, counter_id)
         else:
             if flow_mod.counter_id != COUNTERID_INVALID:
                 self.free_counter(switch_id, flow_mod.counter_id)   #free counter
             flow_mod.counter_id = COUNTERID_INVALID
-        switch_DB.get_flow_table_DB(global_table_id).flow_entries_map[flow_entry_id] = flow_mod
+        switch_DB.get_flow_table_DB(global_table_id).put_flow_entry(flow_entry_id, flow_mod)
+        if self.journal is not None:
+            self.journal.put_entry(switch_id, global_table_id, flow_mod)
         return True
     
     def delete_flow_entry(self, switch_id, global_table_id, index):
         flow_entry = self.get_switch_DB(switch_id).get_flow_table_DB(global_table_id).delete_flow_entry(index)
+        if self.journal is not None:
+            self.journal.del_entry(switch_id, global_table_id, index)
         if flow_entry.counter_id != COUNTERID_INVALID:
             self.free_counter(switch_id, flow_entry.counter_id)
         return flow_entry
         
     # Counter functions
     def allocate_counter(self, switch_id):   # return counter_id
-        return self.get_switch_DB(switch_id).alloc_counter_id()   # FIXME:
+        counter_id = self.get_switch_DB(switch_id).alloc_counter_id()   # FIXME:
+        if self.journal is not None and counter_id != COUNTERID_INVALID:
+            self.journal.put_counter(switch_id, counter_id)
+        return counter_id
     
     def free_counter(self, switch_id, counter_id):  # return ofp_counter
-        return self.get_switch_DB(switch_id).remove_counter(counter_id)
+        counter = self.get_switch_DB(switch_id).remove_counter(counter_id)
+        if self.journal is not None and counter is not None:
+            self.journal.del_counter(switch_id, counter_id)
+        return counter
     
     def set_counter(self, switch_id, new_counter):
         if not isinstance(new_counter, of.ofp_counter):
             return False
         self.get_switch_DB(switch_id).set_counter(new_counter)
+        if self.journal is not None:
+            self.journal.put_counter(switch_id, new_counter.counter_id)
         return True
     
     def get_counter(self, switch_id, counter_id):   # return ofp_counter
         return self.get_switch_DB(switch_id).get_counter(counter_id)
     
     def get_all_counters(self, switch_id):   # return a list of ofp_counter
-        self.get_switch_DB(switch_id).get_all_counter_list()
+        return self.get_switch_DB(switch_id).get_all_counter_list()
     
     def reset_counter(self, switch_id, counter_id):  # return boolean
-        counter = self.get_switch_DB(switch_id).get_counter(counter_id)
-        if counter is None or not isinstance(of.ofp_counter):
+        switch_DB = self.get_switch_DB(switch_id)
+        counter = switch_DB.get_counter(counter_id)
+        if counter is None or not isinstance(counter, of.ofp_counter):
             return False
-        counter.counter_id = 0
         counter.counter_value = 0
-        self.set_counter(switch_id, counter)
+        counter.byte_value = 0
+        stats = switch_DB.get_counter_stats(counter_id)
+        if stats is not None:
+            stats.reset()
         return True
     
+    def update_counter_stats(self, switch_id, counter_id, counter_value, byte_value, timestamp):   # return PMCounterStats
+        return self.get_switch_DB(switch_id).update_counter_stats(counter_id, counter_value, byte_value, timestamp)
+    
+    def get_counter_stats(self, switch_id, counter_id):   # return PMCounterStats
+        return self.get_switch_DB(switch_id).get_counter_stats(counter_id)
+    
     # Meter functions
     def add_meter_entry(self, switch_id, rate):  # return meter_id (int)
         try:
@@ -924,6 +1310,8 @@ class PMdatabase(EventMixin):
             new_meter.meter_id = meter_id
             new_meter.rate = rate
             switch_DB.put_meter(meter_id, new_meter)
+            if self.journal is not None:
+                self.journal.put_meter(switch_id, new_meter)
             return meter_id
         except:
             print 'something wrong in pmdatabase.add_meter_entry'
@@ -1068,35 +1456,268 @@ class PMdatabase(EventMixin):
             
             
             
+    # Match key functions, key_string is get_match_key(matchx_list)
     def put_match_key(self, switch_id, global_table_id, key_string, entry_id):
-        pass
+        table_DB = self._get_flow_table_DB(switch_id, global_table_id)
+        if table_DB is None:
+            return False
+        table_DB.put_match_key(key_string, entry_id)
+        return True
     
-    def get_flow_entry_index_by_match_key(self, switch_id, global_table_id, key_string):
-        pass
+    def get_flow_entry_index_by_match_key(self, switch_id, global_table_id, key_string):   # return entry_id
+        table_DB = self._get_flow_table_DB(switch_id, global_table_id)
+        if table_DB is None:
+            return FLOWENTRYID_INVALID
+        return table_DB.get_flow_entry_index_by_match_key(key_string)
     
     def delete_match_key(self, switch_id, global_table_id, key_string):
-        pass
+        table_DB = self._get_flow_table_DB(switch_id, global_table_id)
+        if table_DB is None:
+            return None
+        return table_DB.delete_match_key(key_string)
+    
+    def get_matched_flow_entry_ids(self, switch_id, global_table_id, matchx_list):   # return a list of entry_id
+        table_DB = self._get_flow_table_DB(switch_id, global_table_id)
+        if table_DB is None:
+            return []
+        return table_DB.get_matched_flow_entry_ids(matchx_list)
+    
+    def _get_flow_table_DB(self, switch_id, global_table_id):
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
+            return None
+        return switch_DB.get_flow_table_DB(global_table_id)
         
+    # Store functions (see pmjournal)
+    @contextmanager
+    def journal_batch(self):   # changes made inside go to the journal in one write
+        journal = self.journal
+        if journal is None:
+            yield
+            return
+        journal.begin_batch()
+        try:
+            yield
+        finally:
+            journal.end_batch()
+    
+    def dump(self, writer):   # write the whole state through a PMRecordWriter
+        writer.put_next_ids(self.protocol_no, self.field_id_no)
+        for field in self.get_all_field():
+            writer.put_field(field)
+        for protocol_id in sorted(self.protocol_map):
+            writer.put_protocol(self.protocol_map[protocol_id])
+        writer.put_metadata(self.metadata_list)
+        for switch_id in sorted(self.switch_DB_map):
+            switch_DB = self.switch_DB_map[switch_id]
+            for counter_id in sorted(switch_DB.counter_table.get_all_data()):
+                writer.put_counter(switch_id, counter_id)
+            for meter in switch_DB.get_all_meter_list():
+                writer.put_meter(switch_id, meter)
+            for global_table_id in sorted(switch_DB.flow_tables_map):
+                writer.put_table(switch_id, global_table_id, switch_DB.flow_tables_map[global_table_id])
+                entries_map = switch_DB.get_flow_entries_map(global_table_id)
+                for entry_id in sorted(entries_map):
+                    writer.put_entry(switch_id, global_table_id, entries_map[entry_id])
+        for switch_id in sorted(self.stored_switches):   # never connected since loading
+            writer.put_stored_switch(self.stored_switches[switch_id])
+    
+    def restore(self, state):
+        """
+        Take the protocols, fields and metadata of a PMStoredState; its
+        switches wait in stored_switches for restore_switch()
+        """
+        self.protocol_no = max(self.protocol_no, state.protocol_no)
+        self.field_id_no = max(self.field_id_no, state.field_id_no)
+        for field_id in sorted(state.fields):
+            old_field = self.field_database.get(field_id)
+            if old_field is not None:
+                self._unindex_field_name(old_field)
+            field = state.fields[field_id]
+            self.field_database[field_id] = field
+            named = self.field_name_index.setdefault(field.field_name, [])
+            named.append(field)
+            named.sort(key = attrgetter('field_id'))
+        self.sorted_fields = None
+        for protocol_id in sorted(state.protocols):
+            protocol_name, field_list = state.protocols[protocol_id]
+            protocol = Protocol()
+            protocol.protocol_name = protocol_name
+            protocol.protocol_id = protocol_id
+            protocol.total_length = sum(f.length for f in field_list)
+            protocol.field_list = field_list
+            self._unindex_protocol_fields(protocol_id)
+            self.protocol_name_map[protocol_name] = protocol_id
+            self.protocol_map[protocol_id] = protocol
+            self._index_protocol_fields(protocol_id, field_list)
+        if state.metadata is not None:
+            self.metadata_list = state.metadata
+            self.metadata_name_index = None
+        self.stored_switches.update(state.switches)
+        restored = {}
+        for switch_id in state.switches.keys():
+            table_ids = self.restore_switch(switch_id)
+            if table_ids is not None:
+                restored[switch_id] = table_ids
+        return restored   # switch_id: restored global_table_ids, for switches already known
+    
+    def restore_switch(self, switch_id):
+        """
+        Put the stored tables, entries, counters and meters of a switch back
+        into its PMSwitchDB, once it has reported its flow table resources.
+        Return the restored global_table_ids, or None when there is nothing
+        to restore (yet).
+        """
+        stored = self.stored_switches.get(switch_id)
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if stored is None or switch_DB is None or not switch_DB.flow_table_id_allocator_map:
+            return None
+        del self.stored_switches[switch_id]
+        for counter_id in sorted(stored.counters):
+            if switch_DB.counter_table.reserve(counter_id):
+                switch_DB.set_counter(of.ofp_counter(command = of.OFPCC_ADD, counter_id = counter_id))
+            else:
+                log.error("switch [id = " + str(switch_id) + "]: cannot restore counter " + str(counter_id))
+        for meter_id in sorted(stored.meters):
+            meter = decode_meter(stored.meters[meter_id])
+            if switch_DB.meter_table.reserve(meter.meter_id):
+                switch_DB.put_meter(meter.meter_id, meter)
+            else:
+                log.error("switch [id = " + str(switch_id) + "]: cannot restore meter " + str(meter.meter_id))
+        table_ids = []
+        moved_table_ids = []
+        for stored_table_id in sorted(stored.tables):
+            flow_table = decode_table(stored.tables[stored_table_id])[1]
+            table_type = flow_table.table_type
+            # the same small table id, wherever the switch now puts tables of this type
+            global_table_id = self.parse_to_global_table_id(switch_id, table_type, flow_table.table_id)
+            id_allocator = switch_DB.flow_table_id_allocator_map.get(table_type)
+            if id_allocator is None or not id_allocator.reserve(global_table_id):
+                log.error("switch [id = " + str(switch_id) + "]: cannot restore table " + flow_table.table_name)
+                continue
+            switch_DB.flow_tables_map[global_table_id] = flow_table
+            switch_DB.add_table_name(flow_table.table_name, global_table_id)
+            table_DB = PMFlowTableDB(flow_table_id = global_table_id, table_type = table_type)
+            switch_DB.flow_table_DB_map[global_table_id] = table_DB
+            entries = stored.entries.get(stored_table_id, {})
+            for entry_id in sorted(entries):
+                flow_entry = decode_entry(entries[entry_id])[2]
+                flow_entry.table_id = flow_table.table_id
+                self._name_matchx_list(flow_entry.match_list)
+                table_DB.flow_entry_id_allocator.reserve(entry_id)
+                table_DB.put_flow_entry(entry_id, flow_entry)
+            if global_table_id != stored_table_id:
+                moved_table_ids.append((stored_table_id, global_table_id))
+            table_ids.append(global_table_id)
+        if moved_table_ids and self.journal is not None:
+            with self.journal_batch():
+                for stored_table_id, global_table_id in moved_table_ids:
+                    self.journal.del_table(switch_id, stored_table_id)
+                    self.journal.put_table(switch_id, global_table_id, switch_DB.flow_tables_map[global_table_id])
+                    for flow_entry in switch_DB.get_flow_entries_map(global_table_id).itervalues():
+                        self.journal.put_entry(switch_id, global_table_id, flow_entry)
+        log.info("switch [id = " + str(switch_id) + "]: restored " + str(len(table_ids)) + " tables, " +
+                 str(stored.entry_number()) + " entries")
+        return table_ids
+    
+    def _name_matchx_list(self, matchx_list):
+        # names (and metadata field ids) are not in the packed matchx
+        for matchx in matchx_list:
+            if matchx.field_id == of.ofp_match20._METADATA_FIELD_ID:
+                matchx.field_id = -1
+                for field in self.metadata_list:
+                    if field.offset == matchx.offset and field.length == matchx.length:
+                        matchx.field_name = field.field_name
+                        break
+            else:
+                field = self.field_database.get(matchx.field_id)
+                if field is not None:
+                    matchx.field_name = field.field_name
         
     # used to roll back
     def add_sended_of_msg(self, switch_id, msg):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is not None:
+            switch_DB.add_sended_of_message(msg)
     
     def get_sended_of_msg_queue(self, switch_id):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return None
+        return switch_DB.get_sended_of_message_queue()
+    
+    def get_sended_of_msg_number(self, switch_id):
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return 0
+        return switch_DB.get_sended_of_message_number()
     
     def get_sended_of_msg(self, switch_id, xid):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return None
+        return switch_DB.get_sended_of_message(xid)
     
-    def delete_sended_of_msg(self, switch_id, msg):
-        pass
+    def delete_sended_of_msg(self, switch_id, xid):
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is not None:
+            switch_DB.delete_sended_of_message(xid)
+    
+    def acknowledge_sended_of_msg(self, switch_id, barrier_xid):
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return 0
+        return switch_DB.acknowledge_sended_of_messages(barrier_xid)
+    
+    def clear_sended_of_msg(self, switch_id):
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is not None:
+            switch_DB.clear_sended_of_messages()
     
     def add_old_backup_of_msg(self, switch_id, sended_msg_xid, msg):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is not None:
+            switch_DB.add_old_backup_message(sended_msg_xid, msg)
     
     def get_old_backup_of_msg(self, switch_id, sended_msg_xid):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return None
+        return switch_DB.get_old_backup_message(sended_msg_xid)
     
     def delete_old_backup_of_msg(self, switch_id, sended_msg_xid):
-        pass
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None:
+            return None
+        return switch_DB.delete_old_backup_message(sended_msg_xid)
+    
+    def put_back_flow_entry(self, switch_id, global_table_id, flow_entry, current = None):
+        """
+        Roll back a flow entry: flow_entry, a copy saved before the entry was
+        modified or deleted, becomes the entry at its index again, if that
+        index holds current (None: is free).
+        Return boolean
+        """
+        switch_DB = self.switch_DB_map.get(switch_id)
+        if switch_DB is None or not isinstance(switch_DB, PMSwitchDB):
+            return False
+        table_DB = switch_DB.flow_table_DB_map.get(global_table_id)
+        if table_DB is None:
+            return False
+        entry_id = flow_entry.index
+        if table_DB.get_flow_entry(entry_id) is not current:
+            return False
+        if current is None and not table_DB.flow_entry_id_allocator.reserve(entry_id):
+            return False
+        with self.journal_batch():
+            if (current is not None and current.counter_id != flow_entry.counter_id and
+                current.counter_id != COUNTERID_INVALID):
+                self.free_counter(switch_id, current.counter_id)
+            if (flow_entry.counter_id != COUNTERID_INVALID and
+                switch_DB.counter_table.reserve(flow_entry.counter_id)):   # freed with the entry
+                self.set_counter(switch_id, of.ofp_counter(command = of.OFPCC_ADD, counter_id = flow_entry.counter_id))
+            table_DB.put_flow_entry(entry_id, flow_entry)
+            if self.journal is not None:
+                self.journal.put_entry(switch_id, global_table_id, flow_entry)
+        return True
         
\ No newline at end of file
@@ -0,0 +1,511 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Durable store behind PMdatabase
+
+The state is kept in two files: a snapshot (file_name) and an append-only
+journal of the changes made since (file_name + '.journal').  Both are a
+16 byte header (magic, version, generation) followed by records:
+
+  op (1 byte) | payload length (4 bytes) | crc32 of payload (4 bytes) | payload
+
+Every record carries the whole new state of one object (a PUT) or the id
+of a deleted one (a DEL), so replaying is just setting and popping dict
+items.  Flow entries are kept as compact ofp_flow_mods.
+
+A snapshot is written to a temporary file, synced and renamed over the old
+one, then a new journal with the snapshot's generation is started.  A
+journal whose generation is not the snapshot's is stale and is ignored.
+Loading maps the files and stops at the first torn or corrupt record.
+
+Switch state is restored lazily: records of a switch are kept raw (see
+PMStoredSwitch) until the switch has connected and reported its
+resources, and only then decoded (PMdatabase.restore_switch()).
+"""
+
+from pox.core import core
+import pox.openflow.libpof_02 as of
+
+import os
+import mmap
+import time
+import zlib
+from struct import Struct
+
+log = core.getLogger()
+
+DEFAULT_SAVE_FILE_NAME = 'Database.db'
+JOURNAL_SUFFIX = '.journal'
+
+# fsync policies
+FSYNC_ALWAYS = 'always'       # every write (a batch is one write) is synced before returning
+FSYNC_INTERVAL = 'interval'   # sync() is called every fsync_interval seconds
+FSYNC_NEVER = 'never'         # left to the OS
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+SNAPSHOT_MAGIC = 'PMDS'
+JOURNAL_MAGIC = 'PMDJ'
+FORMAT_VERSION = 1
+
+# Record ops
+OP_NEXT_IDS = 1       # protocol_no, field_id_no
+OP_PROTOCOL = 2
+OP_DEL_PROTOCOL = 3
+OP_FIELD = 4
+OP_DEL_FIELD = 5
+OP_METADATA = 6
+OP_TABLE = 16         # switch records start with the switch id
+OP_DEL_TABLE = 17
+OP_ENTRY = 18
+OP_DEL_ENTRY = 19
+OP_COUNTER = 20
+OP_DEL_COUNTER = 21
+OP_METER = 22
+OP_DEL_METER = 23
+
+_file_header = Struct('!4sB3xQ')   # magic, version, generation
+_record_header = Struct('!BLL')    # op, length, crc32
+_u16 = Struct('!H')
+_u32x2 = Struct('!LL')
+_match20 = Struct('!hHH')          # field_id (-1 for metadata), offset, length
+_switch_id = Struct('!QL')         # switch_id, global_table_id / counter_id / meter_id
+_entry_id = Struct('!QLL')         # switch_id, global_table_id, entry_id
+_table = Struct('!QLBBLH')         # switch_id, global_table_id, table_id, table_type, table_size, key_length
+_meter = Struct('!QLHL')           # switch_id, meter_id, slot_id, rate
+
+
+def _pack_str(s):
+    s = s or ''
+    return _u16.pack(len(s)) + s
+
+def _unpack_str(raw, offset):
+    (length,) = _u16.unpack_from(raw, offset)
+    offset += 2
+    return offset + length, raw[offset:offset + length]
+
+def _pack_match20_list(field_list):
+    parts = [_u16.pack(len(field_list))]
+    for f in field_list:
+        parts.append(_match20.pack(f.field_id, f.offset, f.length))
+        parts.append(_pack_str(f.field_name))
+    return b''.join(parts)
+
+def _unpack_match20_list(raw, offset):
+    (num,) = _u16.unpack_from(raw, offset)
+    offset += 2
+    field_list = []
+    for _ in xrange(num):
+        field_id, field_offset, length = _match20.unpack_from(raw, offset)
+        offset, name = _unpack_str(raw, offset + _match20.size)
+        field_list.append(of.ofp_match20(field_name = name, field_id = field_id,
+                                         offset = field_offset, length = length))
+    return offset, field_list
+
+
+class PMStoredSwitch(object):
+    """
+    The stored state of one switch, as raw record payloads
+    """
+    def __init__(self, switch_id):
+        self.switch_id = switch_id
+        self.tables = {}     # global_table_id: payload
+        self.entries = {}    # global_table_id: {entry_id: payload}
+        self.counters = {}   # counter_id: payload
+        self.meters = {}     # meter_id: payload
+
+    def entry_number(self):
+        return sum(len(entries) for entries in self.entries.itervalues())
+
+    def records(self):   # (op, payload), tables before the entries in them
+        for counter_id in sorted(self.counters):
+            yield OP_COUNTER, self.counters[counter_id]
+        for meter_id in sorted(self.meters):
+            yield OP_METER, self.meters[meter_id]
+        for global_table_id in sorted(self.tables):
+            yield OP_TABLE, self.tables[global_table_id]
+            entries = self.entries.get(global_table_id, {})
+            for entry_id in sorted(entries):
+                yield OP_ENTRY, entries[entry_id]
+
+
+class PMStoredState(object):
+    """
+    What a snapshot and journal replay to.  Protocols, fields and metadata
+    are decoded; switches are kept raw (PMStoredSwitch).
+    """
+    def __init__(self):
+        self.protocol_no = 0
+        self.field_id_no = 0
+        self.protocols = {}   # protocol_id: (protocol_name, [ofp_match20])
+        self.fields = {}      # field_id: ofp_match20
+        self.metadata = None  # [ofp_match20], None when never stored
+        self.switches = {}    # switch_id: PMStoredSwitch
+        self.records = 0
+
+    def get_switch(self, switch_id):
+        stored = self.switches.get(switch_id)
+        if stored is None:
+            stored = PMStoredSwitch(switch_id)
+            self.switches[switch_id] = stored
+        return stored
+
+    def apply(self, op, payload):
+        self.records += 1
+        if op >= OP_TABLE:
+            switch_id, object_id = _switch_id.unpack_from(payload)
+            stored = self.get_switch(switch_id)
+            if op == OP_ENTRY:
+                entry_id = _entry_id.unpack_from(payload)[2]
+                stored.entries.setdefault(object_id, {})[entry_id] = payload
+            elif op == OP_DEL_ENTRY:
+                entry_id = _entry_id.unpack_from(payload)[2]
+                stored.entries.get(object_id, {}).pop(entry_id, None)
+            elif op == OP_TABLE:
+                stored.tables[object_id] = payload
+            elif op == OP_DEL_TABLE:
+                stored.tables.pop(object_id, None)
+                stored.entries.pop(object_id, None)
+            elif op == OP_COUNTER:
+                stored.counters[object_id] = payload
+            elif op == OP_DEL_COUNTER:
+                stored.counters.pop(object_id, None)
+            elif op == OP_METER:
+                stored.meters[object_id] = payload
+            elif op == OP_DEL_METER:
+                stored.meters.pop(object_id, None)
+            else:
+                log.warning("unknown journal record op " + str(op))
+        elif op == OP_FIELD:
+            offset, (field,) = _unpack_match20_list(_u16.pack(1) + payload, 0)
+            self.fields[field.field_id] = field
+            self.field_id_no = max(self.field_id_no, field.field_id + 1)
+        elif op == OP_DEL_FIELD:
+            self.fields.pop(_u16.unpack_from(payload)[0], None)
+        elif op == OP_PROTOCOL:
+            (protocol_id,) = _u16.unpack_from(payload)
+            offset, name = _unpack_str(payload, 2)
+            offset, field_list = _unpack_match20_list(payload, offset)
+            self.protocols[protocol_id] = (name, field_list)
+            self.protocol_no = max(self.protocol_no, protocol_id + 1)
+        elif op == OP_DEL_PROTOCOL:
+            self.protocols.pop(_u16.unpack_from(payload)[0], None)
+        elif op == OP_METADATA:
+            self.metadata = _unpack_match20_list(payload, 0)[1]
+        elif op == OP_NEXT_IDS:
+            protocol_no, field_id_no = _u32x2.unpack_from(payload)
+            self.protocol_no = max(self.protocol_no, protocol_no)
+            self.field_id_no = max(self.field_id_no, field_id_no)
+        else:
+            log.warning("unknown journal record op " + str(op))
+
+
+# Decoding of switch records, done when a switch is restored
+def decode_table(payload):   # return (global_table_id, ofp_flow_table)
+    (switch_id, global_table_id, table_id, table_type, table_size,
+     key_length) = _table.unpack_from(payload)
+    offset, name = _unpack_str(payload, _table.size)
+    match_field_list = _unpack_match20_list(payload, offset)[1]
+    flow_table = of.ofp_flow_table(table_id = table_id, table_type = table_type,
+                                   table_size = table_size, key_length = key_length,
+                                   table_name = name, match_field_list = match_field_list,
+                                   match_field_num = len(match_field_list))
+    return global_table_id, flow_table
+
+def decode_entry(payload):   # return (global_table_id, entry_id, ofp_flow_mod)
+    switch_id, global_table_id, entry_id = _entry_id.unpack_from(payload)
+    flow_mod = of.ofp_flow_mod()
+    flow_mod.unpack(payload, _entry_id.size)
+    flow_mod.compact = False    # the connection decides how it is sent
+    flow_mod.command = of.OFPFC_ADD
+    return global_table_id, entry_id, flow_mod
+
+def decode_meter(payload):   # return ofp_meter_mod
+    switch_id, meter_id, slot_id, rate = _meter.unpack_from(payload)
+    return of.ofp_meter_mod(meter_id = meter_id, slot_id = slot_id, rate = rate)
+
+
+class PMRecordWriter(object):
+    """
+    Encodes PMdatabase objects into records; _write() does the writing
+    """
+    def _write(self, op, payload):
+        raise NotImplementedError()
+
+    def put_next_ids(self, protocol_no, field_id_no):
+        self._write(OP_NEXT_IDS, _u32x2.pack(protocol_no, field_id_no))
+
+    def put_protocol(self, protocol):
+        self._write(OP_PROTOCOL, _u16.pack(protocol.protocol_id) +
+                    _pack_str(protocol.protocol_name) +
+                    _pack_match20_list(protocol.field_list))
+
+    def del_protocol(self, protocol_id):
+        self._write(OP_DEL_PROTOCOL, _u16.pack(protocol_id))
+
+    def put_field(self, field):
+        self._write(OP_FIELD, _pack_match20_list([field])[2:])
+
+    def del_field(self, field_id):
+        self._write(OP_DEL_FIELD, _u16.pack(field_id))
+
+    def put_metadata(self, metadata_list):
+        self._write(OP_METADATA, _pack_match20_list(metadata_list))
+
+    def put_table(self, switch_id, global_table_id, flow_table):
+        self._write(OP_TABLE, _table.pack(switch_id, global_table_id, flow_table.table_id,
+                                          flow_table.table_type, flow_table.table_size,
+                                          flow_table.key_length) +
+                    _pack_str(flow_table.table_name) +
+                    _pack_match20_list(flow_table.match_field_list))
+
+    def del_table(self, switch_id, global_table_id):
+        self._write(OP_DEL_TABLE, _switch_id.pack(switch_id, global_table_id))
+
+    def put_entry(self, switch_id, global_table_id, flow_entry):
+        self._write(OP_ENTRY, _entry_id.pack(switch_id, global_table_id, flow_entry.index) +
+                    flow_entry.pack(compact = True))
+
+    def del_entry(self, switch_id, global_table_id, entry_id):
+        self._write(OP_DEL_ENTRY, _entry_id.pack(switch_id, global_table_id, entry_id))
+
+    def put_counter(self, switch_id, counter_id):
+        self._write(OP_COUNTER, _switch_id.pack(switch_id, counter_id))
+
+    def del_counter(self, switch_id, counter_id):
+        self._write(OP_DEL_COUNTER, _switch_id.pack(switch_id, counter_id))
+
+    def put_meter(self, switch_id, meter):
+        self._write(OP_METER, _meter.pack(switch_id, meter.meter_id, meter.slot_id, meter.rate))
+
+    def del_meter(self, switch_id, meter_id):
+        self._write(OP_DEL_METER, _switch_id.pack(switch_id, meter_id))
+
+    def put_stored_switch(self, stored):   # PMStoredSwitch, written as it was read
+        for op, payload in stored.records():
+            self._write(op, payload)
+
+
+def _record(op, payload):
+    return _record_header.pack(op, len(payload), zlib.crc32(payload) & 0xffffffff) + payload
+
+def read_records(file_name, magic, apply, generation = None):
+    """
+    Call apply(op, payload) for every good record of the file.  Return
+    (generation, records, end of the last good record), or None when the
+    file is missing, empty, not of the given kind or (when generation is
+    given) of another generation.
+    """
+    try:
+        f = open(file_name, 'rb')
+    except IOError:
+        return None
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size < _file_header.size:
+            return None
+        m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        file_magic, version, file_generation = _file_header.unpack_from(m)
+        if file_magic != magic or version != FORMAT_VERSION:
+            log.error(file_name + " is not a PMdatabase " +
+                      ("snapshot" if magic == SNAPSHOT_MAGIC else "journal"))
+            return None
+        if generation is not None and file_generation != generation:
+            log.info("ignoring stale " + file_name)
+            return None
+        records = 0
+        offset = _file_header.size
+        header_size = _record_header.size
+        while offset + header_size <= size:
+            op, length, crc = _record_header.unpack_from(m, offset)
+            end = offset + header_size + length
+            if end > size:
+                break
+            payload = m[offset + header_size:end]
+            if zlib.crc32(payload) & 0xffffffff != crc:
+                break
+            apply(op, payload)
+            records += 1
+            offset = end
+        if offset != size:
+            log.warning(file_name + ": ignoring " + str(size - offset) +
+                        " bytes of torn or corrupt records")
+        return file_generation, records, offset
+    finally:
+        m.close()
+
+
+class _SnapshotWriter(PMRecordWriter):
+    def __init__(self, f):
+        self.f = f
+        self.parts = []
+        self.size = 0
+        self.records = 0
+
+    def _write(self, op, payload):
+        record = _record(op, payload)
+        self.parts.append(record)
+        self.size += len(record)
+        self.records += 1
+        if self.size >= 1 << 20:
+            self.flush()
+
+    def flush(self):
+        self.f.write(b''.join(self.parts))
+        self.parts = []
+        self.size = 0
+
+
+class PMJournal(PMRecordWriter):
+    """
+    The journal and snapshot files of one PMdatabase
+
+    fsync: FSYNC_ALWAYS, FSYNC_INTERVAL (the owner calls sync() every
+    fsync_interval seconds) or FSYNC_NEVER
+    snapshot_records: journal records after which needs_snapshot() is True
+    """
+    def __init__(self, file_name = DEFAULT_SAVE_FILE_NAME, fsync = FSYNC_INTERVAL,
+                 fsync_interval = 1.0, snapshot_records = 1000000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError("fsync must be one of " + ", ".join(FSYNC_POLICIES))
+        self.file_name = file_name
+        self.journal_name = file_name + JOURNAL_SUFFIX
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_records = snapshot_records
+        self.generation = 0
+        self.records = 0         # records in the journal
+        self.fd = None
+        self._batch = None       # list of records while batching
+        self._batch_depth = 0
+        self._dirty = False      # written but not synced
+
+    def load(self):   # return PMStoredState; opens the journal for appending
+        state = PMStoredState()
+        start = time.time()
+        self.generation, journal = _read_files(self.file_name, state)
+        if journal is not None:
+            self.records = journal[1]
+            self.fd = os.open(self.journal_name, os.O_WRONLY)
+            os.ftruncate(self.fd, journal[2])   # drop a torn tail
+            os.lseek(self.fd, 0, os.SEEK_END)
+        else:
+            self._new_journal()
+        if state.records:
+            log.info("loaded " + str(state.records) + " records (" + str(self.records) +
+                     " from the journal) of " + self.file_name + " in " +
+                     "%.2f" % (time.time() - start) + " s")
+        return state
+
+    def _new_journal(self):
+        tmp_name = self.journal_name + '.tmp'
+        fd = os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        os.write(fd, _file_header.pack(JOURNAL_MAGIC, FORMAT_VERSION, self.generation))
+        os.fsync(fd)
+        os.rename(tmp_name, self.journal_name)
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = fd
+        self.records = 0
+        self._dirty = False
+
+    def _write(self, op, payload):
+        if self.fd is None:
+            return
+        self.records += 1
+        if self._batch is not None:
+            self._batch.append(_record(op, payload))
+        else:
+            self._write_out(_record(op, payload))
+
+    def _write_out(self, data):
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+        if self.fsync == FSYNC_ALWAYS:
+            os.fsync(self.fd)
+        else:
+            self._dirty = True
+
+    def begin_batch(self):
+        # records until the matching end_batch() go out in one write (and sync)
+        self._batch_depth += 1
+        if self._batch is None:
+            self._batch = []
+
+    def end_batch(self):
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            records, self._batch = self._batch, None
+            if records and self.fd is not None:
+                self._write_out(b''.join(records))
+
+    def sync(self):
+        if self._dirty and self.fd is not None:
+            os.fsync(self.fd)
+            self._dirty = False
+
+    def needs_snapshot(self):
+        return self.snapshot_records > 0 and self.records >= self.snapshot_records
+
+    def snapshot(self, dump):
+        """
+        dump(writer) writes the whole state through writer (PMRecordWriter);
+        it becomes the new snapshot and the journal starts over
+        """
+        start = time.time()
+        records = write_snapshot(self.file_name, dump, self.generation + 1)
+        self.generation += 1
+        self._new_journal()
+        log.info("snapshot of " + str(records) + " records written to " + self.file_name +
+                 " in " + "%.2f" % (time.time() - start) + " s")
+
+    def close(self):
+        if self.fd is not None:
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+
+def write_snapshot(file_name, dump, generation = 0):   # return the number of records
+    tmp_name = file_name + '.tmp'
+    f = open(tmp_name, 'wb')
+    try:
+        f.write(_file_header.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, generation))
+        writer = _SnapshotWriter(f)
+        dump(writer)
+        writer.flush()
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+    os.rename(tmp_name, file_name)
+    return writer.records
+
+def _read_files(file_name, state):
+    # return (generation, what read_records() returned for the journal)
+    snapshot = read_records(file_name, SNAPSHOT_MAGIC, state.apply)
+    generation = snapshot[0] if snapshot is not None else 0
+    # only a journal of the snapshot's generation follows it
+    journal = read_records(file_name + JOURNAL_SUFFIX, JOURNAL_MAGIC, state.apply, generation)
+    return generation, journal
+
+def load_state(file_name):   # return PMStoredState of a snapshot and its journal, leaving both closed
+    state = PMStoredState()
+    _read_files(file_name, state)
+    return state
@@ -23,7 +23,7 @@ from pox.core import core
 import pox
 import pox.lib.util
 from pox.lib.addresses import EthAddr
-from pox.lib.revent.revent import EventMixin
+from pox.lib.revent.revent import EventMixin, raiseEventChainNoErrors
 import datetime
 import time
 from pox.lib.socketcapture import CaptureSocket
@@ -35,24 +35,16 @@ import pox.openflow.bypassmanager as bpm   # edit by cc
 log = core.getLogger()
 
 import socket
-import select
+import struct
+
+# version, type and length at the front of every message
+_header_peek = struct.Struct("!BBH")
 
 # List where the index is an OpenFlow message type (OFPT_xxx), and
 # the values are unpack functions that unpack the wire format of that
 # type into a message object.
 unpackers = make_type_to_unpacker_table()
 
-try:
-    PIPE_BUF = select.PIPE_BUF
-except:
-    try:
-        # Try to get it from where PyPy (sometimes) has it
-        import IN
-        PIPE_BUF = IN.PIPE_BUF
-    except:
-        # (Hopefully) reasonable default
-        PIPE_BUF = 512
-
 #import pox.openflow.libopenflow_01 as of
 #import pox.openflow.libpof_01 as of
 import pox.openflow.libpof_02 as of
@@ -62,7 +54,16 @@ import threading
 import os
 import sys
 import exceptions
-from errno import EAGAIN, ECONNRESET, EADDRINUSE, EADDRNOTAVAIL
+from errno import EAGAIN, EWOULDBLOCK, ECONNRESET, EADDRINUSE, EADDRNOTAVAIL
+from errno import ECONNABORTED, EINTR, EPROTO, EMFILE, ENFILE, ENOBUFS, ENOMEM
+from collections import deque
+
+# socket errors meaning "full, try again later" (10035 is WSAEWOULDBLOCK)
+_WOULD_BLOCK = (EAGAIN, EWOULDBLOCK, 10035)
+# accept() errors for one connection attempt (10053 is WSAECONNABORTED)
+_ACCEPT_RETRY = (ECONNABORTED, EINTR, EPROTO, 10053)
+# accept() errors for running out of descriptors or memory (10024 is WSAEMFILE)
+_ACCEPT_EXHAUSTED = (EMFILE, ENFILE, ENOBUFS, ENOMEM, 10024)
 
 
 import traceback
@@ -79,7 +80,7 @@ def handle_HELLO (con, msg): #S
 
 def handle_ECHO_REPLY (con, msg):
     #con.msg("Got echo reply")
-    pass
+    raiseEventChainNoErrors((con.ofnexus, con), EchoReply, con, msg)
 
 def handle_ECHO_REQUEST (con, msg): #S
     reply = msg
@@ -87,9 +88,7 @@ def handle_ECHO_REQUEST (con, msg): #S
     con.send(reply)
 
 def handle_FLOW_REMOVED (con, msg): #A
-    e = con.ofnexus.raiseEventNoErrors(FlowRemoved, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(FlowRemoved, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), FlowRemoved, con, msg)
 """
 def handle_FEATURES_REPLY (con, msg):
     #print(msg)
@@ -104,9 +103,7 @@ def handle_FEATURES_REPLY (con, msg):
 
     if not connecting:
         con.ofnexus._connect(con)
-        e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
-        if e is None or e.halt != True:
-            con.raiseEventNoErrors(FeaturesReceived, con, msg)
+        raiseEventChainNoErrors((con.ofnexus, con), FeaturesReceived, con, msg)
         return
 
     #OpenFlowConnectionArbiter is defined and registered in openflow.__init__.py
@@ -134,12 +131,9 @@ def handle_FEATURES_REPLY (con, msg):
         else:
             con.info("connected")
             con.connect_time = time.time()
-            e = con.ofnexus.raiseEventNoErrors(ConnectionUp, con, msg)
-            if e is None or e.halt != True:
-                con.raiseEventNoErrors(ConnectionUp, con, msg)
-            e = con.ofnexus.raiseEventNoErrors(FeaturesReceived, con, msg)
-            if e is None or e.halt != True:
-                con.raiseEventNoErrors(FeaturesReceived, con, msg)
+            raiseEventChainNoErrors((con.ofnexus, con), ConnectionUp, con, msg)
+            raiseEventChainNoErrors((con.ofnexus, con),
+                                    FeaturesReceived, con, msg)
         con.removeListeners(listeners)
     listeners.append(con.addListener(GetConfigReply, finish_connecting))
     
@@ -175,9 +169,7 @@ def handle_FEATURES_REPLY (con, msg):
     '''
 """
 def handle_STATS_REPLY (con, msg):
-    e = con.ofnexus.raiseEventNoErrors(RawStatsReply, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(RawStatsReply, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), RawStatsReply, con, msg)
     con._incoming_stats_reply(msg)
 """
 def handle_PORT_STATUS (con, msg): #A
@@ -186,91 +178,72 @@ def handle_PORT_STATUS (con, msg): #A
         con.ports._forget(msg.desc)
     else:
         con.ports._update(msg.desc)
-    e = con.ofnexus.raiseEventNoErrors(PortStatus, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(PortStatus, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), PortStatus, con, msg)
 """
 def handle_PACKET_IN (con, msg): #A
-    e = con.ofnexus.raiseEventNoErrors(PacketIn, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(PacketIn, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), PacketIn, con, msg)
 
 def handle_ERROR_MSG (con, msg): #A
     err = ErrorIn(con, msg)
-    e = con.ofnexus.raiseEventNoErrors(err)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(err)
+    raiseEventChainNoErrors((con.ofnexus, con), err)
     if err.should_log:
         log.error(str(con) + " OpenFlow Error:\n" +
               msg.show(str(con) + " Error: ").strip())
 
 def handle_BARRIER (con, msg):
     #print("receive barrier reply message")   #print information
-    e = con.ofnexus.raiseEventNoErrors(BarrierIn, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(BarrierIn, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), BarrierIn, con, msg)
 
 # handlers for stats replies
 def handle_OFPST_DESC (con, parts):
     msg = parts[0].body
-    e = con.ofnexus.raiseEventNoErrors(SwitchDescReceived,con,parts[0],msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(SwitchDescReceived, con, parts[0], msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            SwitchDescReceived, con, parts[0], msg)
 
 def handle_OFPST_FLOW (con, parts):
     msg = []
     for part in parts:
         msg.extend(part.body)
-    e = con.ofnexus.raiseEventNoErrors(FlowStatsReceived, con, parts, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(FlowStatsReceived, con, parts, msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            FlowStatsReceived, con, parts, msg)
 
 def handle_OFPST_AGGREGATE (con, parts):
     msg = parts[0].body
-    e = con.ofnexus.raiseEventNoErrors(AggregateFlowStatsReceived, con,
-                                     parts[0], msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(AggregateFlowStatsReceived, con, parts[0], msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            AggregateFlowStatsReceived, con, parts[0], msg)
 
 def handle_OFPST_TABLE (con, parts):
     msg = []
     for part in parts:
         msg.extend(part.body)
-    e = con.ofnexus.raiseEventNoErrors(TableStatsReceived, con, parts, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(TableStatsReceived, con, parts, msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            TableStatsReceived, con, parts, msg)
 
 def handle_OFPST_PORT (con, parts):
     msg = []
     for part in parts:
         msg.extend(part.body)
-    e = con.ofnexus.raiseEventNoErrors(PortStatsReceived, con, parts, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(PortStatsReceived, con, parts, msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            PortStatsReceived, con, parts, msg)
 
 def handle_OFPST_QUEUE (con, parts):
     msg = []
     for part in parts:
         msg.extend(part.body)
-    e = con.ofnexus.raiseEventNoErrors(QueueStatsReceived, con, parts, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(QueueStatsReceived, con, parts, msg)
+    raiseEventChainNoErrors((con.ofnexus, con),
+                            QueueStatsReceived, con, parts, msg)
 
 def handle_VENDOR (con, msg):   # FIXME: need to change to experiment
     log.info("Vendor msg: " + str(msg))
     
 def handle_GET_CONFIG_REPLY (con, msg):
     #print "CC: receive GET_CONFIG_REPLY message\n",msg  #cc
-    e = con.ofnexus.raiseEventNoErrors(GetConfigReply, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(GetConfigReply, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), GetConfigReply, con, msg)
 """        
 def handle_RESOURCE_REPORT (con, msg):
     #print ("receive Resource_report message")  #cc
     #print msg                                 # cc: for test
-    e = con.ofnexus.raiseEventNoErrors(ResourceReport, con, msg)
-    if e is None or e.halt != True:
-        con.raiseEventNoErrors(ResourceReport, con, msg)
+    raiseEventChainNoErrors((con.ofnexus, con), ResourceReport, con, msg)
     pass
 """
     
@@ -307,114 +280,6 @@ statsHandlerMap = {
 }
 """
 
-class DeferredSender (threading.Thread):
-    """
-    Class that handles sending when a socket write didn't complete
-    Deferred sending should be unusual, so don't worry too much about efficiency
-    """
-    def __init__ (self):
-        threading.Thread.__init__(self)
-        core.addListeners(self)
-        self._dataForConnection = {}
-        self._lock = threading.RLock()
-        self._waker = pox.lib.util.makePinger()
-        self.sending = False
-    
-        self.start()
-
-    def _handle_GoingDownEvent (self, event):
-        self._waker.ping()
-
-    def _sliceup (self, data):
-        """
-        Takes an array of data bytes, and slices into elements of
-        PIPE_BUF bytes each
-        """
-        out = []
-        while len(data) > PIPE_BUF:
-            out.append(data[0:PIPE_BUF])
-            data = data[PIPE_BUF:]
-        if len(data) > 0:
-            out.append(data)
-        return out
-
-    def send (self, con, data):
-        with self._lock:
-            self.sending = True
-    
-            data = self._sliceup(data)
-    
-            if con not in self._dataForConnection:
-                self._dataForConnection[con] = data
-            else:
-                self._dataForConnection[con].extend(data)
-    
-            self._waker.ping()
-
-    def kill (self, con):
-        with self._lock:
-            try:
-                del self._dataForConnection[con]
-            except:
-                pass
-    
-            self._waker.ping()
-
-    def run (self):
-        while core.running:
-            #print ('DeferredSender running...','thread_count:',threading.active_count()) # cc:
-    
-            with self._lock:
-                cons = self._dataForConnection.keys()
-    
-            rlist, wlist, elist = select.select([self._waker], cons, cons, 5)
-            if not core.running: break
-    
-            with self._lock:
-                if len(rlist) > 0:
-                    self._waker.pongAll()
-        
-                for con in elist:
-                    try:
-                        del self._dataForConnection[con]
-                    except:
-                        pass
-        
-                for con in wlist:
-                    try:
-                        alldata = self._dataForConnection[con]
-                        while len(alldata):
-                            data = alldata[0]
-                            try:
-                                l = con.sock.send(data)
-                                if l != len(data):
-                                    alldata[0] = data[l:]
-                                    break
-                                del alldata[0]
-                            except socket.error as (errno, strerror):
-                                if errno != EAGAIN:
-                                    con.msg("DeferredSender/Socket error: " + strerror)
-                                    log.error("pof_01.DeferredSender.run --- disconnect")  #CC
-                                    con.disconnect()
-                                    del self._dataForConnection[con]
-                                break
-                            except:
-                                con.msg("Unknown error doing deferred sending")
-                                break
-                        if len(alldata) == 0:
-                            try:
-                                del self._dataForConnection[con]
-                                if len(self._dataForConnection) == 0:
-                                    self.sending = False
-                                    break
-                            except:
-                                pass
-                    except:
-                        try:
-                            del self._dataForConnection[con]
-                        except:
-                            pass
-
 class DummyOFNexus (object):
     def raiseEventNoErrors (self, event, *args, **kw):
         log.warning("%s raised on dummy OpenFlow nexus" % event)
@@ -614,6 +479,7 @@ class Connection (EventMixin):
         PacketIn,
         ErrorIn,
         BarrierIn,
+        EchoReply,
         RawStatsReply,
         SwitchDescReceived,
         FlowStatsReceived,
@@ -624,11 +490,35 @@ class Connection (EventMixin):
         FlowRemoved,
         GetConfigReply,   #cc
         ResourceReport,
+        CounterReply,
+        SendQueueHigh,
+        SendQueueLow,
     ])
 
     # Globally unique identifier for the Connection instance
     ID = 0
 
+    # Whether compact ofp_flow_mods may be used at all (see launch()); the
+    # per-connection compact_flow_mod is only set once the switch reports
+    # OFPC_COMPACT_FLOW_MOD in its features reply.
+    allow_compact_flow_mod = False
+
+    # Bytes asked of the socket per read() (see launch())
+    read_size = 65536
+
+    # Output the switch does not take at once waits in a per-connection
+    # queue, which POF_01_Task drains when the socket is writable (see
+    # launch()): past send_queue_high bytes SendQueueHigh is raised, and
+    # SendQueueLow once back under send_queue_low; past send_queue_limit
+    # (unless 0) the switch is given up on and disconnected.
+    send_queue_high = 4 * 1024 * 1024
+    send_queue_low = 1024 * 1024
+    send_queue_limit = 256 * 1024 * 1024
+    # Queued messages smaller than this are joined up to it, for one send
+    send_chunk_size = 65536
+    # Pinged when output gets queued, so that POF_01_Task selects on it
+    send_waker = None
+
     def msg (self, m):
         #print str(self), m
         log.debug(str(self) + " " + str(m))
@@ -645,7 +535,10 @@ class Connection (EventMixin):
     
         self.ofnexus = _dummyOFNexus
         self.sock = sock
-        self.buf = ''
+        # receive buffer; buf[buf_start:buf_end] has been read but not parsed
+        self.buf = bytearray(self.read_size)
+        self.buf_start = 0
+        self.buf_end = 0
         Connection.ID += 1
         self.ID = Connection.ID
         # TODO: dpid and features don't belong here; they should be eventually
@@ -656,6 +549,14 @@ class Connection (EventMixin):
         self.disconnection_raised = False
         self.connect_time = None
         self.idle_time = time.time()
+        self.compact_flow_mod = False
+        # output waiting for the socket; the first send_offset bytes of
+        # send_queue[0] have been sent already
+        self.send_queue = deque()
+        self.send_offset = 0
+        self.send_queue_bytes = 0
+        self.send_queue_full = False    # past send_queue_high, SendQueueLow not raised yet
+        self._send_lock = threading.Lock()   # apps may send from their own threads
     
         self.send(of.ofp_hello())
     
@@ -704,11 +605,9 @@ class Connection (EventMixin):
                 self.ofnexus.raiseEventNoErrors(ConnectionDown, self)
                 self.raiseEventNoErrors(ConnectionDown, self)
     
-        try:
-            #deferredSender.kill(self)
-            pass
-        except:
-            pass
+        with self._send_lock:
+            self.send_queue.clear()
+            self.send_offset = self.send_queue_bytes = 0
         try:
             #print '33333333333333'  #CC
             self.sock.shutdown(socket.SHUT_RDWR)
@@ -736,41 +635,116 @@ class Connection (EventMixin):
             #self.info("[Send] POF message "+"[length] "+str(len(data))+" [type] "+str(data.header_type) + ", " + 
             #          of.ofp_type_map[data.header_type])     #add by CC
             #print of.ofp_type_map[data.header_type]   #CC
-            data = data.pack()
+            if self.compact_flow_mod and isinstance(data, of.ofp_flow_mod):
+                data = data.pack(compact = True)
+            else:
+                data = data.pack()
         
-        if deferredSender.sending:
-            log.debug("deferred sender is sending!")
-            deferredSender.send(self, data)
-            return
-        try:
-            l = self.sock.send(data)
-            if l != len(data):
-                self.msg("Didn't send complete buffer.")
-                data = data[l:]
-                deferredSender.send(self, data)
-        except socket.error as (errno, strerror):
-            if errno == EAGAIN:   # EAGIAN = 11
-                self.msg("Out of send buffer space.  " +
-                         "Consider increasing SO_SNDBUF.")
-                deferredSender.send(self, data)
-            ############ add by CC ##############
-            elif errno == 10035:
-                log.info("error " + str(errno))   #CC
-                   
-                time.sleep(0.1)
-                l = self.sock.send(data)
-                if l != len(data):
-                    self.msg("Didn't send complete buffer.")
-                    data = data[l:]
-                    deferredSender.send(self, data)
-                
-                #deferredSender.send(self, data)
-            ############ add by CC ##############
+        wake = False
+        with self._send_lock:
+            if not self.send_queue:
+                # nothing waiting: straight to the socket
+                try:
+                    sent = self.sock.send(data)
+                except socket.error as (errno, strerror):
+                    if errno not in _WOULD_BLOCK:
+                        self.msg("Socket error: " + strerror)
+                        log.info("pof_01.Connection.send --- disconnected")  #CC
+                        sent = None
+                    else:
+                        sent = 0
+                if sent is not None:
+                    if sent == len(data):
+                        return
+                    self.send_offset = sent
+                    self.send_queue_bytes = len(data) - sent
+                    self.send_queue.append(data)
+                    wake = True
             else:
-                self.msg("Socket error: " + strerror)
-                log.info("pof_01.Connection.send --- disconnected")  #CC
-                print('errno', errno)   #CC
-                self.disconnect(defer_event=True)
+                sent = 0
+                self.send_queue.append(data)
+                self.send_queue_bytes += len(data)
+        if sent is None:
+            self.disconnect(defer_event=True)
+            return
+        if wake and self.send_waker is not None:
+            self.send_waker.ping()
+        self._check_send_queue()
+
+    def _flush (self):
+        """
+        Send the queued output, as much of it as the socket takes, joining
+        small messages to send_chunk_size for fewer sends.  (Python 2 has no
+        sendmsg()/writev(), so this is how they are gathered.)
+        """
+        sent = 0
+        with self._send_lock:
+            queue = self.send_queue
+            while queue:
+                head = queue[0]
+                offset = self.send_offset
+                if len(queue) == 1 or len(head) - offset >= self.send_chunk_size:
+                    data = buffer(head, offset) if offset else head   # no copy
+                else:
+                    # join the small ones after it; a large one goes on its own
+                    parts = [head[offset:] if offset else head]
+                    size = len(parts[0])
+                    i = 1
+                    while (i < len(queue) and size < self.send_chunk_size and
+                           len(queue[i]) < self.send_chunk_size):
+                        parts.append(queue[i])
+                        size += len(queue[i])
+                        i += 1
+                    data = b''.join(parts) if i > 1 else parts[0]
+                try:
+                    sent = self.sock.send(data)
+                except socket.error as (errno, strerror):
+                    if errno in _WOULD_BLOCK:
+                        break
+                    self.msg("Socket error: " + strerror)
+                    sent = None
+                    break
+                self.send_queue_bytes -= sent
+                done = offset + sent
+                while queue and done >= len(queue[0]):
+                    done -= len(queue.popleft())
+                self.send_offset = done
+                if sent < len(data):
+                    break   # the socket is full
+        if sent is None:
+            self.disconnect(defer_event=True)
+            return
+        self._check_send_queue()
+
+    def _check_send_queue (self):
+        # watermark events, outside of the lock
+        queued = self.send_queue_bytes
+        if self.send_queue_limit and queued > self.send_queue_limit:
+            self.err("send queue past " + str(self.send_queue_limit) + " bytes")
+            self.disconnect(defer_event=True)
+        elif not self.send_queue_full:
+            if queued > self.send_queue_high:
+                self.send_queue_full = True
+                raiseEventChainNoErrors((self.ofnexus, self), SendQueueHigh, self)
+        elif queued < self.send_queue_low:
+            self.send_queue_full = False
+            raiseEventChainNoErrors((self.ofnexus, self), SendQueueLow, self)
+
+    def _make_room (self):
+        """
+        Move the unparsed bytes to the front of the receive buffer, growing
+        it if read_size more bytes would still not fit.
+        """
+        pending = self.buf_end - self.buf_start
+        need = pending + self.read_size
+        if need > len(self.buf):
+            buf = bytearray(max(need, 2 * len(self.buf)))
+            buf[:pending] = self.buf[self.buf_start:self.buf_end]
+            self.buf = buf
+        elif pending:
+            self.buf[:pending] = self.buf[self.buf_start:self.buf_end]
+        self.buf_start = 0
+        self.buf_end = pending
 
     def read (self):
         """
@@ -778,52 +752,57 @@ class Connection (EventMixin):
         main OpenFlow loop below.
     
         Note: This function will block if data is not available.
+
+        Data is received straight into self.buf and messages are unpacked
+        from a read-only buffer() over it, so no bytes are copied or
+        concatenated until an unpacker slices out a field.
         """
+        if len(self.buf) - self.buf_end < self.read_size:
+            self._make_room()
+        buf = self.buf
         try:
-            d = self.sock.recv(2048)
+            view = memoryview(buf)
+            d_len = self.sock.recv_into(view[self.buf_end:], self.read_size)
+            del view    # a live memoryview would keep buf from being resized
         except:
             return False
-        if len(d) == 0:
+        if d_len == 0:
             #print('len(d) == 0')  #cc
             return False
-        self.buf += d
-        buf_len = len(self.buf)
+        buf_len = self.buf_end = self.buf_end + d_len
+        data = buffer(buf, 0, buf_len)
     
-    
-        offset = 0
+        offset = self.buf_start
         while buf_len - offset >= 8: # 8 bytes is minimum OF message size
             # We pull the first four bytes of the OpenFlow header off by hand
-            # (using ord) to find the version/length/type so that we can
-            # correctly call libpof to unpack it.
-    
-            ofp_type = ord(self.buf[offset+1])
+            # to find the version/length/type so that we can correctly call
+            # libpof to unpack it.
+            version, ofp_type, msg_length = _header_peek.unpack_from(buf, offset)
     
-            #if ord(self.buf[offset]) != of.OFP_VERSION:
-            if ord(self.buf[offset]) != 4:
+            #if version != of.OFP_VERSION:
+            if version != 4:
                 if ofp_type == of.OFPT_HELLO:
                     # We let this through and hope the other side switches down.
                     pass
                 else:
                     log.warning("Bad OpenFlow version (0x%02x) on connection %s"
-                              % (ord(self.buf[offset]), self))
+                              % (version, self))
                     return False # Throw connection away
             else:
                 #print "pof_01 --> POF messages type:", ofp_type,",", pofMsgMap[ofp_type],   #cc
                 pass
                 
-    
-            msg_length = ord(self.buf[offset+2]) << 8 | ord(self.buf[offset+3])
             #print ", message length:",msg_length
             #self.info("[Recv] POF message " + "[length] " + str(msg_length) + " [type] " + str(ofp_type) + ", " + 
             #          of.ofp_type_map[ofp_type])
     
             if buf_len - offset < msg_length: break
     
-            new_offset,msg = unpackers[ofp_type](self.buf, offset)
+            new_offset,msg = unpackers[ofp_type](data, offset)
             assert new_offset - offset == msg_length
             offset = new_offset
             
-            log.debug(str(msg))
+            log.debug("%s", msg)    # only formatted when debug logging is on
     
             try:
                 h = handlers[ofp_type]
@@ -834,8 +813,10 @@ class Connection (EventMixin):
                           ("\n" + str(self) + " ").join(str(msg).split('\n')))
                 continue
     
-        if offset != 0:
-            self.buf = self.buf[offset:]
+        if offset == buf_len:
+            self.buf_start = self.buf_end = 0
+        else:
+            self.buf_start = offset
     
         return True
 
@@ -901,6 +882,30 @@ def wrap_socket (new_sock):
 from pox.lib.recoco.recoco import Task
 from pox.lib.recoco.recoco import Select
 
+def _accept_pending (listener):
+    """
+    Accept the connections waiting on the listener (many switches may
+    connect at once) and return their sockets
+
+    Errors stop (or skip) this drain, they don't leave it: the listener
+    must keep going.
+    """
+    socks = []
+    while True:
+        try:
+            socks.append(listener.accept()[0])
+        except socket.error as e:
+            if e.args[0] in _WOULD_BLOCK:
+                break
+            if e.args[0] in _ACCEPT_RETRY:
+                continue   # that one gave up; there may be more
+            if e.args[0] in _ACCEPT_EXHAUSTED:
+                log.error("Can't accept switch connections: " + str(e))
+            else:
+                log.exception("Error accepting switch connections")
+            break
+    return socks
+
 class POF_01_Task (Task):
     """
     The main recoco thread for listening to openflow messages
@@ -942,8 +947,12 @@ class POF_01_Task (Task):
                       "another port.")
             return
     
-        listener.listen(16)
+        listener.listen(1024)
+        listener.setblocking(0)
         sockets.append(listener)
+        waker = pox.lib.util.makePinger()
+        Connection.send_waker = waker
+        sockets.append(waker)
     
         log.debug("Listening on %s:%s" % (self.address, self.port))
     
@@ -952,8 +961,11 @@ class POF_01_Task (Task):
             try:
                 while True:
                     #print ('of_01 running...','thread_count:',threading.active_count()) #print information
+                    # connections with output queued, waiting for the socket
+                    sending = [c for c in sockets
+                               if c is not listener and c is not waker and c.send_queue]
                     con = None
-                    rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+                    rlist, wlist, elist = yield Select(sockets, sending, sockets, 5)
                     if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
                         if not core.running: break
         
@@ -970,19 +982,26 @@ class POF_01_Task (Task):
                             except:
                                 pass
         
+                    for con in wlist:
+                        # a socket error disconnects it; its read then fails
+                        # and it is dropped as below
+                        con._flush()
+        
                     timestamp = time.time()
                     for con in rlist:
                         #print ('len(rlist)',len(rlist))
-                        if con is listener:                       # ovs connected
-                            new_sock = listener.accept()[0]
-                            if pox.openflow.debug.pcap_traces:
-                                new_sock = wrap_socket(new_sock)
-                            new_sock.setblocking(0)    
-                            # Note that instantiating a Connection object fires a
-                            # ConnectionUp event (after negotation has completed)
-                            newcon = Connection(new_sock)        # generate a new instance of class 'Connection'
-                            sockets.append( newcon )
-                            #print str(newcon) + " connected"
+                        if con is waker:
+                            waker.pongAll()
+                        elif con is listener:                       # ovs connected
+                            for new_sock in _accept_pending(listener):
+                                if pox.openflow.debug.pcap_traces:
+                                    new_sock = wrap_socket(new_sock)
+                                new_sock.setblocking(0)    
+                                # Note that instantiating a Connection object fires a
+                                # ConnectionUp event (after negotation has completed)
+                                newcon = Connection(new_sock)        # generate a new instance of class 'Connection'
+                                sockets.append( newcon )
+                                #print str(newcon) + " connected"
                         else:
                             con.idle_time = timestamp
                             if con.read() is False:    # do the read function of class 'Connection'
@@ -1027,15 +1046,25 @@ def _set_handlers ():
 _set_handlers()
 
 
-# Used by the Connection class
-deferredSender = None
-
-def launch (port = 6633, address = "0.0.0.0"):
+def launch (port = 6633, address = "0.0.0.0", compact_flow_mod = False,
+            read_size = 65536, send_queue_high = 4 * 1024 * 1024,
+            send_queue_low = 1024 * 1024, send_queue_limit = 256 * 1024 * 1024):
+    """
+    --compact_flow_mod lets switches which advertise OFPC_COMPACT_FLOW_MOD
+    receive flow_mods without the zero padded matchx/instruction slots.
+    --read_size sets how many bytes each Connection.read() asks for.
+    --send_queue_high and --send_queue_low are the bytes of queued output
+    at which a connection raises SendQueueHigh and SendQueueLow;
+    --send_queue_limit is where it disconnects (0 never).
+    """
     if core.hasComponent('pof_01'):
         return None
 
-    global deferredSender
-    deferredSender = DeferredSender()   # run the __init__ function and start function
+    Connection.allow_compact_flow_mod = pox.lib.util.str_to_bool(compact_flow_mod)
+    Connection.read_size = int(read_size)
+    Connection.send_queue_high = int(send_queue_high)
+    Connection.send_queue_low = int(send_queue_low)
+    Connection.send_queue_limit = int(send_queue_limit)
     
     if of._logger is None:
         #of._logger = core.getLogger('libopenflow_01')
@@ -0,0 +1,394 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Converting libpof_02 objects to and from JSON-friendly dicts
+
+of_json does this for OpenFlow 1.0; this is the POF counterpart, covering
+ofp_match20, ofp_matchx, ofp_flow_table, ofp_flow_mod, every action and
+instruction, ofp_counter, ofp_phy_port and ofp_port_status.
+
+Each class has a schema (below) listing its attributes and, for the ones
+which aren't plain ints, how to convert them.  The schemas are
+compiled once into a _Codec per class, so converting an object is one
+attrgetter call plus the nested fields, with no per-object introspection.
+
+Actions and instructions carry their type by the name libpof_02 gives it
+("OFPAT_OUTPUT", "APPLY_ACTIONS"); on the way in a number, or the name
+with or without an OFPAT_/OFPIT_ prefix, does as well.  Enumerated fields (command, table_type, reason, ...)
+come out as numbers and may go in as names.  Counts which follow from a
+list (match_field_num, instruction_num, action_num, key_length) can be
+left out and are filled in.  Anything else left out keeps the class's
+default.  Bad input raises ValueError.
+"""
+
+import json
+from operator import attrgetter
+
+import pox.openflow.libpof_02 as of
+from pox.lib.addresses import EthAddr
+
+
+class _Codec (object):
+    """
+    Converts one class to and from dicts according to its schema
+
+    fields is a list of (attribute, kind) where kind is None for plain
+    ints or an (encode, decode) pair.  counts is a list of
+    (attribute, list attribute, function of the list) filled in on decode
+    when the dict leaves them out.
+    """
+    def __init__ (self, cls, fields, counts = ()):
+        self.cls = cls
+        self.plain = tuple(n for n, k in fields if k is None)
+        self.nested = tuple((n, k[0], k[1]) for n, k in fields if k is not None)
+        self.counts = tuple(counts)
+        if len(self.plain) > 1:
+            self._get = attrgetter(*self.plain)
+        elif self.plain:
+            get = attrgetter(self.plain[0])
+            self._get = lambda obj: (get(obj),)
+        else:
+            self._get = lambda obj: ()
+
+    def encode (self, obj):
+        d = dict(zip(self.plain, self._get(obj)))
+        for n, enc, dec in self.nested:
+            v = getattr(obj, n)
+            d[n] = None if v is None else enc(v)
+        return d
+
+    def decode (self, d, obj = None):
+        if not isinstance(d, dict):
+            raise ValueError("expected an object for %s, got %r"
+                             % (self.cls.__name__, d))
+        if obj is None:
+            obj = self.cls()
+        for n in self.plain:
+            if n in d:
+                v = d[n]
+                if not isinstance(v, (int, long)):
+                    raise ValueError("%s.%s should be a number, got %r"
+                                     % (self.cls.__name__, n, v))
+                setattr(obj, n, v)
+        for n, enc, dec in self.nested:
+            if n in d:
+                v = d[n]
+                setattr(obj, n, None if v is None else dec(v))
+        for n, list_name, f in self.counts:
+            if n not in d:
+                setattr(obj, n, f(getattr(obj, list_name)))
+        return obj
+
+
+_codecs = {}   # class -> _Codec
+
+def _codec_of (cls):
+    try:
+        return _codecs[cls]
+    except KeyError:
+        raise ValueError("no JSON schema for %s" % (cls.__name__,))
+
+def _list_of (kind):
+    enc, dec = kind
+    def encode (l):
+        return [enc(x) for x in l]
+    def decode (l):
+        if not isinstance(l, list):
+            raise ValueError("expected a list, got %r" % (l,))
+        return [dec(x) for x in l]
+    return encode, decode
+
+def _enum (rev_map):
+    def decode (v):
+        if isinstance(v, basestring):
+            try:
+                return rev_map[v]
+            except KeyError:
+                raise ValueError("unknown value %r" % (v,))
+        return v
+    return int, decode
+
+def _schema (cls, fields, counts = ()):
+    """ Compiles and registers the schema for cls; returns its kind """
+    codec = _Codec(cls, fields, counts)
+    _codecs[cls] = codec
+    return codec.encode, codec.decode
+
+
+def _unhex (v):
+    if not isinstance(v, basestring):
+        raise ValueError("expected a hex string, got %r" % (v,))
+    try:
+        int(v or "0", 16)
+    except ValueError:
+        raise ValueError("not a hex string: %r" % (v,))
+    return str(v)
+
+# JSON strings come back unicode; the packers want str
+_STR = (str, str)
+_HEX = (str, _unhex)
+_ETH = (str, EthAddr)
+_NAME = (lambda v: v.rstrip('\0'), str)
+
+
+_MATCH20 = _schema(of.ofp_match20,
+                   [('field_name', _STR), ('field_id', None),
+                    ('offset', None), ('length', None)])
+
+# value and mask are properties, so they go through setattr like the rest
+_MATCHX = _schema(of.ofp_matchx,
+                  [('field_name', _STR), ('field_id', None),
+                   ('offset', None), ('length', None),
+                   ('value', _HEX), ('mask', _HEX)])
+
+_MATCH20_LIST = _list_of(_MATCH20)
+_MATCHX_LIST = _list_of(_MATCHX)
+
+
+def _typed (type_map, rev_map, type_to_class, prefix):
+    """
+    Kind for a polymorphic list element (action or instruction), tagged
+    with its type name
+    """
+    def encode (obj):
+        d = _codec_of(type(obj)).encode(obj)
+        d['type'] = type_map.get(obj.type, obj.type)
+        return d
+    def decode (d):
+        if not isinstance(d, dict) or 'type' not in d:
+            raise ValueError("expected an object with a type, got %r" % (d,))
+        t = d['type']
+        if isinstance(t, basestring):
+            # libpof_02 names actions OFPAT_X but instructions just X
+            t = t.upper()
+            if t.startswith(prefix):
+                t = rev_map.get(t, rev_map.get(t[len(prefix):]))
+            else:
+                t = rev_map.get(t, rev_map.get(prefix + t))
+        cls = type_to_class.get(t)
+        if cls is None:
+            raise ValueError("unknown type %r" % (d['type'],))
+        return _codec_of(cls).decode(d)
+    return encode, decode
+
+_ACTION = _typed(of.ofp_action_type_map, of.ofp_action_type_rev_map,
+                 of._action_type_to_class, "OFPAT_")
+_INSTRUCTION = _typed(of.ofp_instruction_type_map,
+                      of.ofp_instruction_type_rev_map,
+                      of._instruction_type_to_class, "OFPIT_")
+
+
+# Actions
+_schema(of.ofp_action_output,
+        [('port_id_value_type', None), ('metadata_offset', None),
+         ('metadata_length', None), ('packet_offset', None),
+         ('port_id', None), ('port_id_field', _MATCH20)])
+_schema(of.ofp_action_set_field, [('field_setting', _MATCHX)])
+_schema(of.ofp_action_set_field_from_metadata,
+        [('field_setting', _MATCH20), ('metadata_offset', None)])
+_schema(of.ofp_action_modify_field,
+        [('match_field', _MATCH20), ('increment', None)])
+_schema(of.ofp_action_add_field,
+        [('field_id', None), ('field_position', None),
+         ('field_length', None), ('field_value', _HEX)])
+_schema(of.ofp_action_delete_field,
+        [('tag_position', None), ('tag_length_value_type', None),
+         ('tag_length_value', None), ('tag_length_field', _MATCH20)])
+_schema(of.ofp_action_calculate_checksum,
+        [('checksum_pos_type', None), ('calc_pos_type', None),
+         ('checksum_position', None), ('checksum_length', None),
+         ('calc_start_position', None), ('calc_length', None)])
+_schema(of.ofp_action_group, [('group_id', None)])
+_schema(of.ofp_action_drop,
+        [('reason', _enum(of.ofp_drop_reason_rev_map))])
+_schema(of.ofp_action_packetin,
+        [('reason', _enum(of.ofp_packet_in_reason_rev_map))])
+_schema(of.ofp_action_counter, [('counter_id', None)])
+_schema(of.ofp_action_experimenter, [('exterimenter', None)])
+
+_ACTION_LIST = _list_of(_ACTION)
+
+
+# Instructions
+_schema(of.ofp_instruction_goto_table,
+        [('next_table_id', None), ('match_field_num', None),
+         ('packet_offset', None), ('match_list', _MATCH20_LIST)],
+        [('match_field_num', 'match_list', len)])
+_schema(of.ofp_instruction_write_metadata,
+        [('metadata_offset', None), ('write_length', None),
+         ('value', _HEX)])
+_schema(of.ofp_instruction_write_actions, [])
+_schema(of.ofp_instruction_apply_actions,
+        [('action_num', None), ('action_list', _ACTION_LIST)],
+        [('action_num', 'action_list', len)])
+_schema(of.ofp_instruction_clear_actions, [])
+_schema(of.ofp_instruction_meter, [('meter_id', None)])
+_schema(of.ofp_instruction_write_metadata_from_packet,
+        [('metadata_offset', None), ('write_length', None),
+         ('packet_offset', None)])
+_schema(of.ofp_instruction_goto_direct_table,
+        [('next_table_id', None), ('index_type', None),
+         ('packet_offset', None), ('index_value', None),
+         ('index_field', _MATCH20)])
+_schema(of.ofp_instruction_conditional_jmp,
+        [('field2_value_type', None), ('field2_value', None),
+         ('field1', _MATCH20), ('field2', _MATCH20)] +
+        [('offset%s_%s' % (i, n), None) for i in (1, 2, 3)
+         for n in ('direction', 'value_type', 'value')] +
+        [('offset%s_field' % (i,), _MATCH20) for i in (1, 2, 3)])
+_schema(of.ofp_instruction_calculate_field,
+        [('calc_type', _enum(of.ofp_calc_type_rev_map)),
+         ('src_value_type', None), ('des_field', _MATCH20),
+         ('src_value', None), ('src_field', _MATCH20)])
+
+_INSTRUCTION_LIST = _list_of(_INSTRUCTION)
+
+
+# Tables, entries, counters and ports
+_schema(of.ofp_flow_table,
+        [('command', _enum(of.ofp_table_mod_cmd_rev_map)),
+         ('table_id', None),
+         ('table_type', _enum(of.ofp_table_type_rev_map)),
+         ('match_field_num', None), ('table_size', None),
+         ('key_length', None), ('table_name', _NAME),
+         ('match_field_list', _MATCH20_LIST)],
+        [('match_field_num', 'match_field_list', len),
+         ('key_length', 'match_field_list',
+          lambda l: sum(f.length for f in l))])
+
+_schema(of.ofp_flow_mod,
+        [('command', _enum(of.ofp_flow_mod_command_rev_map)),
+         ('match_field_num', None), ('instruction_num', None),
+         ('counter_id', None), ('cookie', None), ('cookie_mask', None),
+         ('table_id', None),
+         ('table_type', _enum(of.ofp_table_type_rev_map)),
+         ('idle_timeout', None), ('hard_timeout', None),
+         ('priority', None), ('index', None),
+         ('match_list', _MATCHX_LIST),
+         ('instruction_list', _INSTRUCTION_LIST)],
+        [('match_field_num', 'match_list', len),
+         ('instruction_num', 'instruction_list', len)])
+
+_schema(of.ofp_counter,
+        [('command', _enum(of.ofp_counter_mod_com_rev_map)),
+         ('counter_id', None), ('counter_value', None),
+         ('byte_value', None)])
+
+_PHY_PORT = _schema(of.ofp_phy_port,
+                    [('port_id', None), ('device_id', None),
+                     ('hw_addr', _ETH), ('name', _NAME),
+                     ('config', None), ('state', None), ('curr', None),
+                     ('advertised', None), ('supported', None),
+                     ('peer', None), ('curr_speed', None),
+                     ('max_speed', None), ('of_enable', None)])
+
+_schema(of.ofp_port_status,
+        [('reason', _enum(of.ofp_port_reason_rev_map)),
+         ('desc', _PHY_PORT)])
+
+
+def pof_to_dict (obj):
+    """
+    Converts any of the supported libpof_02 objects to a dict
+    """
+    if isinstance(obj, of.ofp_action_base):
+        return _ACTION[0](obj)
+    if isinstance(obj, of.ofp_instruction_base):
+        return _INSTRUCTION[0](obj)
+    return _codec_of(type(obj)).encode(obj)
+
+def dict_to_pof (d, cls):
+    """
+    Builds a cls from dict d
+
+    For actions and instructions cls may be the base class, and the type
+    is taken from d.
+    """
+    if cls is of.ofp_action_base:
+        return _ACTION[1](d)
+    if cls is of.ofp_instruction_base:
+        return _INSTRUCTION[1](d)
+    return _codec_of(cls).decode(d)
+
+
+def match20_to_dict (m):
+    return _MATCH20[0](m)
+
+def dict_to_match20 (d):
+    return _MATCH20[1](d)
+
+def matchx_to_dict (m):
+    return _MATCHX[0](m)
+
+def dict_to_matchx (d):
+    return _MATCHX[1](d)
+
+def action_to_dict (a):
+    return _ACTION[0](a)
+
+def dict_to_action (d):
+    return _ACTION[1](d)
+
+def instruction_to_dict (i):
+    return _INSTRUCTION[0](i)
+
+def dict_to_instruction (d):
+    return _INSTRUCTION[1](d)
+
+def flow_table_to_dict (t):
+    return _codecs[of.ofp_flow_table].encode(t)
+
+def dict_to_flow_table (d):
+    return _codecs[of.ofp_flow_table].decode(d)
+
+def flow_mod_to_dict (fm):
+    return _codecs[of.ofp_flow_mod].encode(fm)
+
+def dict_to_flow_mod (d):
+    return _codecs[of.ofp_flow_mod].decode(d)
+
+def counter_to_dict (c):
+    return _codecs[of.ofp_counter].encode(c)
+
+def dict_to_counter (d):
+    return _codecs[of.ofp_counter].decode(d)
+
+def port_status_to_dict (ps):
+    return _codecs[of.ofp_port_status].encode(ps)
+
+def dict_to_port_status (d):
+    return _codecs[of.ofp_port_status].decode(d)
+
+
+def iter_json_list (objs, encode = pof_to_dict, batch = 256):
+    """
+    Yields a JSON array of encode(obj) for each of objs, in pieces
+
+    Each piece holds up to batch elements, so a caller can write out a
+    large table as it goes rather than building the whole document.
+    """
+    dumps = json.JSONEncoder(separators = (',', ':')).encode
+    yield "["
+    sep = ""
+    piece = []
+    for obj in objs:
+        piece.append(dumps(encode(obj)))
+        if len(piece) >= batch:
+            yield sep + ",".join(piece)
+            sep = ","
+            del piece[:]
+    if piece:
+        yield sep + ",".join(piece)
+    yield "]"
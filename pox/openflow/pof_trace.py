@@ -0,0 +1,366 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reading POF channel traffic back out of pcap captures
+
+A capture may come from pof_01's OFCaptureSocket (openflow.debug), which
+writes one message per record, or from tcpdump on the control network,
+where a message can span TCP segments and segments can be retransmitted.
+TraceReader follows each TCP stream to or from the OpenFlow port,
+reassembles it, and yields the messages in capture order.  TraceStats
+totals them up: counts, sizes and inter-arrival times per message type,
+and the rate at which flow_mods were sent, with every message put through
+the libpof_02 unpacker that pof_01 would use.
+
+tools/pof_trace.py is the command line front end, and can also replay a
+capture's switch side into a running controller.
+"""
+
+import math
+import struct
+from socket import inet_ntoa
+from array import array
+
+import pox.openflow.libpof_02 as of
+from pox.openflow.util import make_type_to_unpacker_table
+from pox.lib.pxpcap.parser import PCapReader
+
+_header = struct.Struct("!BBH")
+_eth_type = struct.Struct("!H")
+_ipv4 = struct.Struct("!BxH5xBxx4s4s")
+_tcp = struct.Struct("!HHL4xBB")
+
+_LINKTYPE_ETHERNET = 1
+_LINKTYPE_RAW = 101
+_LINKTYPE_LINUX_SLL = 113
+
+_ETH_IPV4 = 0x0800
+_ETH_VLAN = 0x8100
+
+_TCP_FIN = 0x01
+_TCP_SYN = 0x02
+_TCP_RST = 0x04
+
+_FLOW_MOD_COMMAND_OFFSET = 8
+
+_flow_mod_command_map = dict((v, k) for k, v in
+                             of.ofp_flow_mod_command_rev_map.items())
+
+
+class _HalfStream (object):
+    """
+    One direction of a TCP connection, reassembled into POF messages
+    """
+    def __init__ (self):
+        self.next_seq = None
+        self.buf = bytearray()
+        self.synced = True
+
+    def feed (self, reader, seq, payload, syn):
+        if syn:
+            self.next_seq = (seq + 1) & 0xffffffff
+            return ()
+        if not payload:
+            return ()
+        if self.next_seq is not None:
+            diff = (seq - self.next_seq) & 0xffffffff
+            if diff >= 0x80000000:
+                # Starts before what we have; keep only the new part
+                diff = 0x100000000 - diff
+                if diff >= len(payload):
+                    reader.retransmits += 1
+                    return ()
+                payload = payload[diff:]
+                seq = self.next_seq
+            elif diff:
+                # Bytes are missing, so message boundaries are lost until
+                # a segment starts with something that looks like a header
+                reader.gaps += 1
+                del self.buf[:]
+                self.synced = False
+        self.next_seq = (seq + len(payload)) & 0xffffffff
+        if not self.synced:
+            if ord(payload[0]) != of.OFP_VERSION or len(payload) < 8:
+                return ()
+            self.synced = True
+        buf = self.buf
+        if buf:
+            buf += payload
+            data = buf
+        else:
+            data = payload
+        msgs = []
+        offset = 0
+        end = len(data)
+        while end - offset >= 8:
+            length = _header.unpack_from(data, offset)[2]
+            if length < 8:
+                reader.bad_headers += 1
+                offset = end
+                self.synced = False
+                break
+            if end - offset < length: break
+            msgs.append(bytes(data[offset:offset + length]))
+            offset += length
+        if data is buf:
+            del buf[:offset]
+        elif offset < end:
+            buf += payload[offset:]
+        return msgs
+
+
+class TraceReader (object):
+    """
+    The POF messages in a pcap capture
+
+    Iterating yields (timestamp, switch, to_controller, raw) for each
+    message, where switch is the (ip, port) of the switch's end of the
+    connection and raw is the message's bytes.  The controller's end is
+    whichever one uses of_port.  Counts of what couldn't be used are kept
+    in records, skipped (not IPv4 TCP on of_port), retransmits, gaps
+    (missing data) and bad_headers.
+    """
+    def __init__ (self, infile, of_port = 6633):
+        self.pcap = PCapReader(infile)
+        self.of_port = of_port
+        self.records = 0
+        self.skipped = 0
+        self.retransmits = 0
+        self.gaps = 0
+        self.bad_headers = 0
+        self._streams = {}   # (switch, to_controller) -> _HalfStream
+
+        lltype = self.pcap.lltype
+        if lltype == _LINKTYPE_ETHERNET:
+            self._ip_offset = self._ethernet
+        elif lltype == _LINKTYPE_LINUX_SLL:
+            self._ip_offset = self._linux_sll
+        elif lltype == _LINKTYPE_RAW:
+            self._ip_offset = lambda data: 0
+        else:
+            raise RuntimeError("Unsupported pcap link type %s" % (lltype,))
+
+    @staticmethod
+    def _ethernet (data):
+        offset = 12
+        eth_type = _eth_type.unpack_from(data, offset)[0]
+        while eth_type == _ETH_VLAN:
+            offset += 4
+            eth_type = _eth_type.unpack_from(data, offset)[0]
+        if eth_type != _ETH_IPV4: return None
+        return offset + 2
+
+    @staticmethod
+    def _linux_sll (data):
+        if _eth_type.unpack_from(data, 14)[0] != _ETH_IPV4: return None
+        return 16
+
+    def __iter__ (self):
+        of_port = self.of_port
+        streams = self._streams
+        for timestamp, data, wire_size in self.pcap:
+            self.records += 1
+            try:
+                ip = self._ip_offset(data)
+                if ip is None:
+                    self.skipped += 1
+                    continue
+                vihl, ip_len, proto, src, dst = _ipv4.unpack_from(data, ip)
+                tcp = ip + (vihl & 0x0f) * 4
+                if vihl >> 4 != 4 or proto != 6:
+                    self.skipped += 1
+                    continue
+                sport, dport, seq, off, flags = _tcp.unpack_from(data, tcp)
+            except struct.error:
+                self.skipped += 1
+                continue
+            if dport == of_port:
+                key = ((inet_ntoa(src), sport), True)
+            elif sport == of_port:
+                key = ((inet_ntoa(dst), dport), False)
+            else:
+                self.skipped += 1
+                continue
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = _HalfStream()
+            payload = data[tcp + (off >> 4) * 4:ip + ip_len]
+            msgs = stream.feed(self, seq, payload, flags & _TCP_SYN)
+            if flags & (_TCP_FIN | _TCP_RST):
+                del streams[key]
+            switch = key[0]
+            to_controller = key[1]
+            for raw in msgs:
+                yield timestamp, switch, to_controller, raw
+
+
+def percentile (ordered, p):
+    if not ordered: return None
+    i = int(math.ceil(p / 100.0 * len(ordered))) - 1
+    return ordered[max(0, min(i, len(ordered) - 1))]
+
+
+class _TypeStats (object):
+    def __init__ (self):
+        self.count = 0
+        self.bytes = 0
+        self.min_size = None
+        self.max_size = 0
+        self.last = None
+        self.gaps = array('d')   # inter-arrival times
+
+    def summary (self, duration):
+        gaps = sorted(self.gaps)
+        ms = lambda v: None if v is None else v * 1000.0
+        return {
+          'count' : self.count,
+          'bytes' : self.bytes,
+          'size_min' : self.min_size,
+          'size_avg' : float(self.bytes) / self.count,
+          'size_max' : self.max_size,
+          'per_sec' : self.count / duration if duration else None,
+          'interarrival_ms' : {
+            'avg' : ms(sum(gaps) / len(gaps)) if gaps else None,
+            'p50' : ms(percentile(gaps, 50)),
+            'p99' : ms(percentile(gaps, 99)),
+            'max' : ms(gaps[-1] if gaps else None),
+          },
+        }
+
+
+class TraceStats (object):
+    """
+    Totals for a stream of POF messages, as TraceReader gives them
+
+    Every message is unpacked with the libpof_02 unpacker for its type
+    (as pof_01 would) unless decode is False; messages that fail to unpack
+    are counted in unpack_errors, per type.
+    """
+    def __init__ (self, decode = True):
+        self.decode = decode
+        self._unpackers = make_type_to_unpacker_table(of)
+        self.types = {}          # (to_controller, ofp_type) -> _TypeStats
+        self.unpack_errors = {}  # ofp_type -> count
+        self.flow_mod_commands = {}
+        self.flow_mod_seconds = {}  # whole second of the capture -> count
+        self.switches = set()
+        self.first = None
+        self.last = None
+
+    def add (self, timestamp, switch, to_controller, raw):
+        if self.first is None:
+            self.first = timestamp
+        self.last = timestamp
+        self.switches.add(switch)
+        ofp_type = ord(raw[1])
+        size = len(raw)
+
+        key = (to_controller, ofp_type)
+        s = self.types.get(key)
+        if s is None:
+            s = self.types[key] = _TypeStats()
+        s.count += 1
+        s.bytes += size
+        if s.min_size is None or size < s.min_size: s.min_size = size
+        if size > s.max_size: s.max_size = size
+        if s.last is not None:
+            s.gaps.append(timestamp - s.last)
+        s.last = timestamp
+
+        if self.decode:
+            try:
+                offset = self._unpackers[ofp_type](raw, 0)[0]
+                if offset != size:
+                    raise ValueError("unpacked %s of %s bytes" % (offset, size))
+            except Exception:
+                self.unpack_errors[ofp_type] = \
+                    self.unpack_errors.get(ofp_type, 0) + 1
+
+        if ofp_type == of.OFPT_FLOW_MOD and size > _FLOW_MOD_COMMAND_OFFSET:
+            command = ord(raw[_FLOW_MOD_COMMAND_OFFSET])
+            self.flow_mod_commands[command] = \
+                self.flow_mod_commands.get(command, 0) + 1
+            second = int(timestamp)
+            self.flow_mod_seconds[second] = \
+                self.flow_mod_seconds.get(second, 0) + 1
+
+    def add_all (self, messages):
+        add = self.add
+        for timestamp, switch, to_controller, raw in messages:
+            add(timestamp, switch, to_controller, raw)
+        return self
+
+    def summary (self):
+        """
+        The totals as a dict of plain values (for JSON)
+        """
+        duration = (self.last - self.first) if self.first is not None else 0
+        types = []
+        for (to_controller, ofp_type), s in sorted(self.types.items()):
+            d = s.summary(duration)
+            d['type'] = of.ofp_type_map.get(ofp_type, ofp_type)
+            d['direction'] = "to_controller" if to_controller \
+                             else "to_switch"
+            types.append(d)
+        flow_mods = sum(self.flow_mod_commands.values())
+        per_second = self.flow_mod_seconds.values()
+        return {
+          'duration' : duration,
+          'switches' : len(self.switches),
+          'messages' : sum(s.count for s in self.types.itervalues()),
+          'bytes' : sum(s.bytes for s in self.types.itervalues()),
+          'types' : types,
+          'unpack_errors' : dict((of.ofp_type_map.get(t, str(t)), n)
+                                 for t, n in self.unpack_errors.items()),
+          'flow_mods' : {
+            'count' : flow_mods,
+            'by_command' : dict(
+                (_flow_mod_command_map.get(c, str(c)), n)
+                for c, n in self.flow_mod_commands.items()),
+            'per_sec' : flow_mods / duration if duration else None,
+            'peak_per_sec' : max(per_second) if per_second else 0,
+          },
+        }
+
+
+def format_summary (s):
+    """
+    TraceStats.summary() as a text table
+    """
+    def num (v, fmt = "%.3f"):
+        return "-" if v is None else fmt % (v,)
+    lines = ["%d messages, %d bytes, %d switches in %.3f s" % (
+             s['messages'], s['bytes'], s['switches'], s['duration']),
+             "",
+             "%-13s %-26s %9s %11s %7s %7s %7s %10s %9s %9s" % (
+             "direction", "type", "count", "bytes", "min", "avg", "max",
+             "per_sec", "iat_p50", "iat_p99")]
+    for t in s['types']:
+        iat = t['interarrival_ms']
+        lines.append("%-13s %-26s %9d %11d %7d %7.1f %7d %10s %9s %9s" % (
+                     t['direction'], t['type'], t['count'], t['bytes'],
+                     t['size_min'], t['size_avg'], t['size_max'],
+                     num(t['per_sec'], "%.1f"), num(iat['p50']),
+                     num(iat['p99'])))
+    fm = s['flow_mods']
+    lines.append("")
+    lines.append("flow_mods: %d (%s), %s/s average, %d/s peak" % (
+                 fm['count'],
+                 ", ".join("%s %d" % kv for kv in sorted(fm['by_command'].items()))
+                 or "none", num(fm['per_sec'], "%.1f"), fm['peak_per_sec']))
+    if s['unpack_errors']:
+        lines.append("unpack errors: " + ", ".join(
+                     "%s %d" % kv for kv in sorted(s['unpack_errors'].items())))
+    return "\n".join(lines)
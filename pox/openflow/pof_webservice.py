@@ -0,0 +1,269 @@
+# Copyright 2014, 2015 USTC INFINITE Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A bulk REST service for PofManager's tables and flow entries
+
+Objects are in the form pof_json gives them.  Switches are given by
+number (decimal or 0x...) or as a dpid string.
+
+  GET  /POF/switches
+    The ids of the switches PofManager knows.
+  GET  /POF/<switch>/tables
+    The switch's flow tables, each with its "global_table_id".
+  POST /POF/<switch>/tables
+    Adds flow tables.  The body is a list of
+    {"table_name", "table_type", "table_size", "match_field_list"};
+    the reply is the list of their global table ids (-1 if rejected).
+  GET  /POF/<switch>/tables/<global_table_id>/entries
+    The table's flow entries (ofp_flow_mod), streamed out with chunked
+    encoding so a large table is never built up as one document.
+  POST /POF/<switch>/tables/<global_table_id>/entries
+    Changes many flow entries at once.  The body is
+      {"add" : [entry, ...], "modify" : [entry, ...],
+       "delete" : [index, ...], "barrier" : false}
+    where an entry is a flow entry as dumped (only match_list,
+    instruction_list and priority are looked at, plus "counter_enable",
+    default true, and for modify, "index").  Each list goes to the
+    matching PofManager batch call, so its flow mods leave in one write.
+    The reply has the new indexes for "add" (-1 if rejected), true or
+    false for "modify" and "delete".
+  GET  /POF/<switch>/ports
+    The switch's ports as ofp_port_status objects.
+
+Errors come back as {"error" : message} with status 400 or 404.
+
+Example - dump a table:
+curl http://127.0.0.1:8000/POF/1/tables/0/entries
+"""
+
+import json
+import sys
+import threading
+
+from pox.core import core
+from pox.lib.util import strToDPID
+from pox.web.webcore import SplitRequestHandler
+import pox.openflow.pof_json as pof_json
+
+log = core.getLogger()
+
+_dumps = json.JSONEncoder(separators = (',', ':')).encode
+
+# flow entries encoded per trip to the controller's thread
+ENTRY_BATCH = 256
+
+
+class _NotFound (Exception):
+    pass
+
+
+def _call_in_core (f, *args, **kw):
+    """
+    Runs f on the cooperative thread, which owns PofManager, and returns
+    its result (or raises what it raised) to the calling web thread
+    """
+    done = threading.Event()
+    result = [None, None]
+    def run ():
+        try:
+            result[0] = f(*args, **kw)
+        except Exception:
+            result[1] = sys.exc_info()
+        done.set()
+    core.callLater(run)
+    if not done.wait(30):
+        raise RuntimeError("timed out waiting for the controller")
+    if result[1] is not None:
+        raise result[1][0], result[1][1], result[1][2]
+    return result[0]
+
+
+def _switch_id (s):
+    try:
+        return int(s, 0)
+    except ValueError:
+        pass
+    try:
+        return strToDPID(s)
+    except Exception:
+        raise _NotFound("no such switch: " + s)
+
+
+def _entry_args (d):
+    fm = pof_json.dict_to_flow_mod(d)
+    return (fm.match_list, fm.instruction_list, fm.priority,
+            bool(d.get('counter_enable', True)))
+
+
+class POFRequestHandler (SplitRequestHandler):
+    """
+    Serves /POF/; see the module docstring for the URLs
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _parts (self):
+        path = self.path.split('?', 1)[0]
+        return [p for p in path.split('/') if p]
+
+    def _reply (self, code, obj):
+        body = _dumps(obj)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_stream (self, pieces):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        write = self.wfile.write
+        for piece in pieces:
+            if piece:
+                write("%x\r\n%s\r\n" % (len(piece), piece))
+        write("0\r\n\r\n")
+
+    def _dispatch (self, method):
+        try:
+            parts = self._parts()
+            if parts == ['switches']:
+                if method != 'GET': raise _NotFound(self.path)
+                return self._reply(200, _call_in_core(
+                    core.PofManager.get_all_switch_id))
+            if len(parts) == 2:
+                name, args = parts[1], ()
+            elif len(parts) == 4 and parts[1:4:2] == ['tables', 'entries']:
+                name, args = 'entries', (int(parts[2]),)
+            else:
+                raise _NotFound(self.path)
+            handler = getattr(self, "_%s_%s" % (method, name), None)
+            if handler is None: raise _NotFound(self.path)
+            switch_id = _switch_id(parts[0])
+            if _call_in_core(core.PofManager.database.get_switch_DB,
+                             switch_id) is None:
+                raise _NotFound("no such switch: " + parts[0])
+            handler(switch_id, *args)
+        except _NotFound as e:
+            self._reply(404, {'error' : str(e)})
+        except (ValueError, TypeError, KeyError) as e:
+            self._reply(400, {'error' : "%s: %s" % (type(e).__name__, e)})
+
+    def do_GET (self):
+        self._dispatch('GET')
+
+    def do_POST (self):
+        self._dispatch('POST')
+
+    def _read_body (self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length))
+
+    def _GET_tables (self, switch_id):
+        def get ():
+            table_map = core.PofManager.database.get_flow_table_map(switch_id)
+            r = []
+            for global_table_id, flow_table in sorted((table_map or {}).items()):
+                d = pof_json.flow_table_to_dict(flow_table)
+                d['global_table_id'] = global_table_id
+                r.append(d)
+            return r
+        self._reply(200, _call_in_core(get))
+
+    def _POST_tables (self, switch_id):
+        tables = [pof_json.dict_to_flow_table(d) for d in self._read_body()]
+        def add ():
+            return [core.PofManager.add_flow_table(switch_id, t.table_name,
+                                                   t.table_type, t.table_size,
+                                                   t.match_field_list)
+                    for t in tables]
+        self._reply(200, _call_in_core(add))
+
+    def _GET_entries (self, switch_id, global_table_id):
+        # The controller's thread changes the entries in place, so they're
+        # encoded there, ENTRY_BATCH at a time as they go out; entries
+        # deleted in the meantime are left out.
+        def get (pm, global_table_id):
+            return sorted(pm.database.get_flow_entries_map(switch_id,
+                                                           global_table_id) or ())
+        entry_ids = self._in_table(switch_id, global_table_id, get)
+        def encode (ids):
+            entries = core.PofManager.database.get_flow_entries_map(
+                switch_id, global_table_id) or {}
+            return [pof_json.flow_mod_to_dict(entries[i]) for i in ids
+                    if i in entries]
+        def dicts ():
+            for i in range(0, len(entry_ids), ENTRY_BATCH):
+                for d in _call_in_core(encode, entry_ids[i:i + ENTRY_BATCH]):
+                    yield d
+        self._reply_stream(pof_json.iter_json_list(dicts(), lambda d: d,
+                                                   ENTRY_BATCH))
+
+    def _POST_entries (self, switch_id, global_table_id):
+        body = self._read_body()
+        if not isinstance(body, dict):
+            raise ValueError("expected an object with add/modify/delete")
+        barrier = bool(body.get('barrier', False))
+        add = [_entry_args(d) for d in body.get('add', [])]
+        modify = [(int(d['index']),) + _entry_args(d)
+                  for d in body.get('modify', [])]
+        delete = [int(i) for i in body.get('delete', [])]
+        def change (pm, global_table_id):
+            r = {}
+            if add:
+                r['add'] = pm.add_flow_entries(switch_id, global_table_id,
+                                               add, barrier)
+            if modify:
+                r['modify'] = pm.modify_flow_entries(switch_id,
+                                                     global_table_id,
+                                                     modify, barrier)
+            if delete:
+                r['delete'] = [fm is not None for fm in
+                               pm.delete_flow_entries(switch_id,
+                                                      global_table_id,
+                                                      delete, barrier)]
+            return r
+        self._reply(200, self._in_table(switch_id, global_table_id, change))
+
+    def _in_table (self, switch_id, global_table_id, f):
+        """
+        Runs f(PofManager, global_table_id) on the controller's thread,
+        if switch_id has that table
+        """
+        pm = core.PofManager
+        def run ():
+            if pm.get_flow_table(switch_id, global_table_id) is None:
+                raise _NotFound("no such table: %s" % (global_table_id,))
+            return f(pm, global_table_id)
+        return _call_in_core(run)
+
+    def _GET_ports (self, switch_id):
+        def get ():
+            pm = core.PofManager
+            r = []
+            for port_id in pm.get_all_port_id(switch_id) or ():
+                ps = pm.get_port_status(switch_id, port_id)
+                if ps is not None:
+                    r.append(pof_json.port_status_to_dict(ps))
+            return r
+        self._reply(200, _call_in_core(get))
+
+
+def launch ():
+    def _launch ():
+        core.WebServer.set_handler("/POF/", POFRequestHandler, {}, True)
+
+    core.call_when_ready(_launch, ["WebServer", "PofManager"],
+                         name = "openflow.pof_webservice")
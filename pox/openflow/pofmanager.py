@@ -14,11 +14,16 @@
 
 
 from pox.core import core
-from pox.lib.revent.revent import EventMixin
+from pox.lib.revent.revent import EventMixin, Event
+from pox.lib.recoco import Timer
+from pox.lib.util import str_to_bool
 import pox.openflow.libpof_02 as of
-from pox.openflow.pmdatabase import PMdatabase
+from pox.openflow.pmdatabase import PMdatabase, get_match_key, COUNTERID_INVALID
+from pox.openflow.pmjournal import PMJournal, FSYNC_INTERVAL, write_snapshot, load_state
 
 import time
+import copy
+from collections import deque
 
 log = core.getLogger()
 
@@ -26,6 +31,89 @@ OFPROTOCOLID_INVALID = 0
 FLOWTABLEID_INVALID = -1
 FLOWENTRYID_INVALID = -1
 DEFAULT_SAVE_FILE_NAME = 'Database.db'
+DEFAULT_METADATA_FILE_NAME = 'Metadata.db'
+COUNTER_REQUEST_TIMEOUT = 5    # seconds before an unanswered counter request is given up
+RESYNC_BATCH_SIZE = 1000       # flow entries per resync batch, each batch ends with a barrier
+RESYNC_WINDOW = 4              # resync batches sent but not yet acknowledged
+
+class CounterStatsReceived (Event):
+    """
+    Raised on core.PofManager when a counter reply has been cached
+    stats: PMCounterStats of the counter
+    xid: xid of the counter request
+    """
+    def __init__ (self, switch_id, stats, xid):
+        Event.__init__(self)
+        self.dpid = switch_id
+        self.counter_id = stats.counter_id
+        self.stats = stats
+        self.xid = xid
+
+class FlowTableChanged (Event):
+    """
+    Raised on core.PofManager after a flow table is added or deleted, or
+    entries are added to, modified in or deleted from it
+    """
+    def __init__ (self, switch_id, global_table_id):
+        Event.__init__(self)
+        self.dpid = switch_id
+        self.global_table_id = global_table_id
+
+class PortStatusChanged (Event):
+    """
+    Raised on core.PofManager after the stored status of a port changes
+    (added, deleted, modified or its POF enable set)
+    """
+    def __init__ (self, switch_id, port_id):
+        Event.__init__(self)
+        self.dpid = switch_id
+        self.port_id = port_id
+
+class ResyncProgress (Event):
+    """
+    Raised on core.PofManager each time a batch of a switch resync is
+    acknowledged by its barrier
+    acked, sent, total: flow entries acknowledged, sent and to send
+    errors: errors the switch reported meanwhile
+    """
+    def __init__ (self, resync):
+        Event.__init__(self)
+        self.dpid = resync.switch_id
+        self.acked = resync.acked
+        self.sent = resync.sent
+        self.total = resync.total
+        self.errors = resync.errors
+
+class ResyncFinished (Event):
+    """
+    Raised on core.PofManager when a switch resync ends
+    completed: False when it was cancelled (the switch went down, or a new
+    resync of it started) before every batch was acknowledged
+    duration: seconds since it started
+    """
+    def __init__ (self, resync, completed):
+        Event.__init__(self)
+        self.dpid = resync.switch_id
+        self.acked = resync.acked
+        self.total = resync.total
+        self.errors = resync.errors
+        self.completed = completed
+        self.duration = time.time() - resync.started_at
+
+class MessageFailed (Event):
+    """
+    Raised on core.PofManager when a switch answers a tracked message (see
+    PofManager.inflight_window) with an error
+    ofp: the message as sent, error: the ofp_error
+    rolled_back: whether the database was put back as before the message
+    (for failed flow entry adds, modifies and deletes)
+    """
+    def __init__ (self, dpid, ofp, error, rolled_back):
+        Event.__init__(self)
+        self.dpid = dpid
+        self.ofp = ofp
+        self.error = error
+        self.rolled_back = rolled_back
 
 class Switch (EventMixin):
     def __init__ (self):
@@ -61,14 +149,172 @@ class Switch (EventMixin):
         #self._listeners = self.listenTo(connection)
         self._connected_at = time.time()
         
+class SwitchResync (object):
+    """
+    Sends a switch everything PofManager's database holds for it
+
+    Table, group, meter and counter mods go out at once; the flow entries
+    then go in batches of batch_size, each one write ending with a barrier.
+    At most window batches are unacknowledged at a time, and with rate set
+    no more than rate entries are sent per second.  Entries are looked up
+    when their batch is sent, so changes made meanwhile are picked up.
+    Batching also holds off while the connection's send queue is past its
+    high mark (SendQueueHigh), and resumes on SendQueueLow.
+    """
+    def __init__ (self, manager, switch_id, batch_size = RESYNC_BATCH_SIZE,
+                  window = RESYNC_WINDOW, rate = 0):
+        self.manager = manager
+        self.switch_id = switch_id
+        self.connection = manager.get_switch_by_id(switch_id).connection
+        self.batch_size = max(1, batch_size)
+        self.window = max(1, window)
+        self.rate = rate
+        self.entry_keys = []     # (global_table_id, entry_id), in sending order
+        self.position = 0        # of the next entry to send in entry_keys
+        self.total = 0
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.in_flight = {}      # barrier xid: entries in its batch
+        self.started_at = time.time()
+        self.done = False
+        self._next_send = 0      # earliest time of the next batch, with rate set
+        self._timer = None
+        
+    def start (self):
+        database = self.manager.database
+        switch_DB = database.get_switch_DB(self.switch_id)
+        msgs = []
+        entry_counter_ids = set()
+        flow_table_map = switch_DB.get_flow_tables_map()
+        for global_table_id in sorted(flow_table_map):
+            flow_table = flow_table_map[global_table_id]
+            flow_table.command = of.OFPTC_ADD
+            msgs.append(of.ofp_table_mod(flow_table = flow_table))
+            entries_map = switch_DB.get_flow_entries_map(global_table_id)
+            for entry_id in sorted(entries_map):
+                self.entry_keys.append((global_table_id, entry_id))
+                entry_counter_ids.add(entries_map[entry_id].counter_id)
+        for counter in switch_DB.get_all_counter_list():
+            if counter.counter_id not in entry_counter_ids:   # entries bring their own
+                counter_mod = of.ofp_counter_mod()
+                counter_mod.counter.command = of.OFPCC_ADD
+                counter_mod.counter.counter_id = counter.counter_id
+                msgs.append(counter_mod)
+        for group in switch_DB.get_all_group_list():
+            group.command = of.OFPGC_ADD
+            msgs.append(group)
+        for meter in switch_DB.get_all_meter_list():
+            meter.command = of.OFPMC_ADD
+            msgs.append(meter)
+        self.total = len(self.entry_keys)
+        log.info("switch [id = " + str(self.switch_id) + "]: resync of " + str(len(msgs)) +
+                 " table/counter/group/meter mods and " + str(self.total) + " flow entries")
+        if msgs:
+            self.manager._write_msgs(self.switch_id, msgs)
+        self._pump()
+        
+    def _pump (self):
+        self._timer = None
+        while (not self.done and len(self.in_flight) < self.window and
+               self.position < len(self.entry_keys)):
+            if getattr(self.connection, 'send_queue_full', False):
+                return   # the switch isn't keeping up, wait for SendQueueLow
+            if self.rate > 0:
+                now = time.time()
+                if now < self._next_send:
+                    self._timer = Timer(self._next_send - now, self._pump)
+                    return
+            keys = self.entry_keys[self.position:self.position + self.batch_size]
+            self.position += len(keys)
+            flow_entries = []
+            database = self.manager.database
+            for global_table_id, entry_id in keys:
+                entries_map = database.get_flow_entries_map(self.switch_id, global_table_id) or {}
+                flow_entry = entries_map.get(entry_id)
+                if flow_entry is not None:   # else deleted since
+                    flow_entry.command = of.OFPFC_ADD
+                    flow_entries.append(flow_entry)
+            self.total -= len(keys) - len(flow_entries)
+            if not flow_entries:
+                continue
+            xid = self.manager._write_msgs(self.switch_id, flow_entries, barrier = True)
+            self.in_flight[xid] = len(flow_entries)
+            self.sent += len(flow_entries)
+            if self.rate > 0:
+                self._next_send = max(self._next_send, time.time()) + len(flow_entries) / float(self.rate)
+        if not self.done and not self.in_flight and self.position >= len(self.entry_keys):
+            self._finish(True)
+            
+    def barrier_in (self, xid):   # return boolean, whether the barrier was ours
+        entry_number = self.in_flight.pop(xid, None)
+        if entry_number is None:
+            return False
+        self.acked += entry_number
+        self.manager.raiseEventNoErrors(ResyncProgress, self)
+        if self._timer is None:
+            self._pump()
+        return True
+    
+    def error_in (self):
+        self.errors += 1
+        
+    def cancel (self):
+        if not self.done:
+            self._finish(False)
+        
+    def _finish (self, completed):
+        self.done = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.manager.resyncs.get(self.switch_id) is self:
+            del self.manager.resyncs[self.switch_id]
+        log.info("switch [id = " + str(self.switch_id) + "]: resync " +
+                 ("finished, " if completed else "cancelled, ") + str(self.acked) + " of " +
+                 str(self.total) + " flow entries acknowledged in " +
+                 "%.2f" % (time.time() - self.started_at) + " s, " + str(self.errors) + " errors")
+        self.manager.raiseEventNoErrors(ResyncFinished, self, completed)
+        
         
 
 class PofManager(EventMixin):
-    
-    def __init__(self):
+    _eventMixin_events = set([
+        CounterStatsReceived,
+        FlowTableChanged,
+        PortStatusChanged,
+        ResyncProgress,
+        ResyncFinished,
+        MessageFailed,
+    ])
+    
+    def __init__(self, counter_poll_interval = 0, resync = True, resync_batch_size = RESYNC_BATCH_SIZE,
+                 resync_window = RESYNC_WINDOW, resync_rate = 0, inflight_window = 0):
         core.openflow.addListeners(self, priority = of.OFP_DEFAULT_PRIORITY)
         self.database = PMdatabase()
         self.switches = {}  #device_id:Switch()
+        
+        self.resync = resync                    # resync known switches when they connect again
+        self.resync_batch_size = resync_batch_size
+        self.resync_window = resync_window
+        self.resync_rate = resync_rate          # flow entries per second, 0 for no limit
+        self.resyncs = {}   #switch_id: SwitchResync under way
+        
+        # with inflight_window > 0, every message is tracked by xid until a
+        # barrier reply acknowledges it, and at most inflight_window messages
+        # per switch are unacknowledged; the writes beyond wait in pending_writes
+        self.inflight_window = inflight_window
+        self.pending_writes = {}   #switch_id: deque of (data, messages, xids, commands, old copies)
+        
+        self.counter_polls = {}       #switch_id: set(counter_id), queried every counter_poll_interval
+        self.counter_queries = {}     #switch_id: {counter_id: [callback]}, waiting for the next flush
+        self.counter_requests = {}    #xid: (switch_id, counter_id, [callback], send_time)
+        self.counter_request_xids = {}   #(switch_id, counter_id): xid of the request in flight
+        self._counter_flush_pending = False
+        self._counter_timer = None
+        self._counter_expiry_timer = None   # for the oldest request in counter_requests
+        self.set_counter_poll_interval(counter_poll_interval)
+        self._journal_timer = None
           
     # Protocol functions
     def add_protocol(self, protocol_name, field_list):   # protocol_name: string, field_list: list of ofp_match20
@@ -165,14 +411,7 @@ class PofManager(EventMixin):
         return self.database.get_all_field()
         
     def get_belonged_protocol(self, field_id):
-        protocol_map = self.database.get_protocol_map()
-        if protocol_map != None:
-            for protocol_id in protocol_map:
-                field_list = protocol_map.get(protocol_id).get_all_field()
-                for field in field_list:
-                    if field.field_id == field_id:
-                        return protocol_map.get(protocol_id)
-        return None
+        return self.database.get_belonged_protocol(field_id)
     
     # METADATA functions
     def modify_metadata(self, metadata_list):  # metadata_list: a list of ofp_match20
@@ -185,7 +424,7 @@ class PofManager(EventMixin):
         return self.database.get_metadata_field(field_name)
     
     def remove_all_metadata(self):
-        self.database.get_metadata().clear()
+        self.database.modify_metadata([])
         
     def new_metadata_field(self, field_name, field_offset, field_length):
         self.database.new_metadata_field(field_name, field_offset, field_length)
@@ -205,6 +444,15 @@ class PofManager(EventMixin):
         if (table_type != of.OF_LINEAR_TABLE) and (len(match_field_list) == 0):
             log.error("wrong match_field_list")
             return FLOWTABLEID_INVALID
+        # the switch DB outlives the connection, so an app adding its tables
+        # on every ConnectionUp gets the one it added before
+        existing_id = self.database.get_flow_table_id(switch_id, table_name)
+        if existing_id != FLOWTABLEID_INVALID:
+            existing = self.database.get_flow_table(switch_id, existing_id)
+            if existing.table_type == table_type and list(existing.match_field_list) == list(match_field_list):
+                return existing_id
+            log.error("switch [id = " + str(switch_id) + "] has another table named " + table_name)
+            return FLOWTABLEID_INVALID
         
         field_num = len(match_field_list)  # calculate the field_num
         key_length = 0
@@ -225,6 +473,7 @@ class PofManager(EventMixin):
         #log.info('ADD <table[' + str(flow_table.table_type) + '][' + str(flow_table.table_id) + ']> ' + flow_table.table_name)
         log.info(msg_info)
         #self.add_sended_msg(switch_id, msg)
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
         return global_table_id
         
     def get_all_flow_table(self, switch_id):   # return a list of ofp_flow_table
@@ -256,6 +505,7 @@ class PofManager(EventMixin):
         table_mod = of.ofp_table_mod()
         table_mod.flow_table = flow_table
         self.write_of(switch_id, table_mod)      # send to switch
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
         return True
         # TODO: add sended msg
     
@@ -289,46 +539,54 @@ class PofManager(EventMixin):
         return self.database.parse_to_global_table_id(switch_id, table_type, small_table_id)
     
     # Flow Entry functions
-    def add_flow_entry(self, switch_id, global_table_id, matchx_list, instruction_list, priority = 0, counter_enable = True):
-        # return entry_id
-        # Have been tested
+    def _check_flow_entry(self, flow_table, matchx_list, instruction_list):
+        # return boolean, shared by the single and batch flow entry functions
         if not isinstance(matchx_list, list):
             log.error("wrong matchx_list")
-            return FLOWENTRYID_INVALID
+            return False
         if not isinstance(instruction_list, list):
             log.error("wrong instruction_list")
-            return FLOWENTRYID_INVALID
+            return False
         
-        flow_table = self.get_flow_table(switch_id, global_table_id)
         if flow_table is None or not isinstance(flow_table, of.ofp_flow_table):
             log.error("wrong flow table")
-            return FLOWENTRYID_INVALID
+            return False
         
         table_type = flow_table.table_type
         if table_type == of.OF_LINEAR_TABLE and len(matchx_list) != 0:
-            return FLOWENTRYID_INVALID
+            return False
         if table_type != of.OF_LINEAR_TABLE and len(matchx_list) == 0:
-            return FLOWENTRYID_INVALID
+            return False
         
         if len(matchx_list) != 0:
             total_field_length = 0
             for matchx in matchx_list:
                 if not isinstance(matchx, of.ofp_matchx):
                     log.error("wrong matchx")
-                    return FLOWENTRYID_INVALID
+                    return False
                 total_field_length += matchx.length
             if total_field_length != flow_table.key_length:
                 log.error("wrong total field_length")
-                return FLOWENTRYID_INVALID
-                
-        #TODO: CHECK DUPLICATION
+                return False
+        return True
+    
+    def add_flow_entry(self, switch_id, global_table_id, matchx_list, instruction_list, priority = 0, counter_enable = True):
+        # return entry_id
+        # Have been tested
+        flow_table = self.get_flow_table(switch_id, global_table_id)
+        if not self._check_flow_entry(flow_table, matchx_list, instruction_list):
+            return FLOWENTRYID_INVALID
+        if self.check_flow_entry_reduplication(switch_id, global_table_id, matchx_list) != FLOWENTRYID_INVALID:
+            log.error("flow entry already exists")
+            return FLOWENTRYID_INVALID
         
         match_field_num = len(matchx_list)
         instruction_num = len(instruction_list)
         flow_entry_id = self.database.add_flow_entry(switch_id, global_table_id, match_field_num, matchx_list, instruction_num, instruction_list, priority, counter_enable)
         flow_entry = self.get_flow_entry(switch_id, global_table_id, flow_entry_id)
-        self.write_of(switch_id, flow_entry)
+        self._write_msgs(switch_id, [flow_entry], old_copies = [flow_entry])
         log.info('ADD <entry[' + str(flow_entry.table_type) + '][' + str(flow_entry.table_id) + '][' + str(flow_entry.index) + ']>')
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
         return flow_entry_id
     
     def get_flow_entry(self, switch_id, global_table_id, flow_entry_id):   #return ofp_flow_mod
@@ -344,55 +602,43 @@ class PofManager(EventMixin):
         return flow_entry_map.values()
     
     def get_all_matched_flow_entry(self, switch_id, global_table_id, matchx_list):   #return a list of ofp_flow_mod 
-        pass
+        # entries overlapping matchx_list (all of them covering it when the masks are all ones),
+        # highest priority / longest prefix first
+        return [self.get_flow_entry(switch_id, global_table_id, flow_entry_id) for flow_entry_id in
+                self.database.get_matched_flow_entry_ids(switch_id, global_table_id, matchx_list)]
     
     def get_exact_matched_flow_entry(self, switch_id, global_table_id, matchx_list):  #return ofp_flow_mod
-        pass
+        # O(1) through the match key index
+        flow_entry_id = self.database.get_flow_entry_index_by_match_key(switch_id, global_table_id,
+                                                                        get_match_key(matchx_list))
+        if flow_entry_id == FLOWENTRYID_INVALID:
+            return None
+        return self.get_flow_entry(switch_id, global_table_id, flow_entry_id)
     
     def modify_flow_entry(self, switch_id, global_table_id, flow_entry_id, matchx_list, instruction_list, priority = 0, counter_enable = True):   # return boolean
         # Have been tested
-        if not isinstance(matchx_list, list):
-            log.error("wrong matchx_list")
-            return False
-        if not isinstance(instruction_list, list):
-            log.error("wrong instruction_list")
-            return False
-        
         flow_table = self.get_flow_table(switch_id, global_table_id)
-        if flow_table is None or not isinstance(flow_table, of.ofp_flow_table):
-            log.error("wrong flow table")
+        if not self._check_flow_entry(flow_table, matchx_list, instruction_list):
             return False
-        table_type = flow_table.table_type
-        if table_type == of.OF_LINEAR_TABLE and len(matchx_list) != 0:
-            return False
-        if table_type != of.OF_LINEAR_TABLE and len(matchx_list) == 0:
+        if self.check_flow_entry_reduplication(switch_id, global_table_id, matchx_list, flow_entry_id) != FLOWENTRYID_INVALID:
+            log.error("flow entry already exists")
             return False
-        
-        if len(matchx_list) != 0:
-            total_field_length = 0
-            for matchx in matchx_list:
-                if not isinstance(matchx, of.ofp_matchx):
-                    log.error("wrong matchx")
-                    return False
-                total_field_length += matchx.length
-            if total_field_length != flow_table.key_length:
-                log.error("wrong total field_length")
-                return False
         """
         old_flow_mod = self.database.get_flow_entry(switch_id, global_table_id, flow_entry_id)
         if old_flow_mod is None:
             return False
         """
-        #TODO: CHECK DUPLICATION
         
         match_field_num = len(matchx_list)
         instruction_num = len(instruction_list)  #FIXME:
-        self.database.modify_flow_entry(switch_id, global_table_id, flow_entry_id, match_field_num, matchx_list, instruction_num, instruction_list, priority, counter_enable)
+        old_flow_entry = self._old_copy(self.database.get_flow_entry(switch_id, global_table_id, flow_entry_id))
+        if not self.database.modify_flow_entry(switch_id, global_table_id, flow_entry_id, match_field_num, matchx_list, instruction_num, instruction_list, priority, counter_enable):
+            return False
         flow_entry = self.get_flow_entry(switch_id, global_table_id, flow_entry_id)
         flow_entry.command = of.OFPFC_MODIFY  # 1
-        self.write_of(switch_id, flow_entry)
+        self._write_msgs(switch_id, [flow_entry], old_copies = [old_flow_entry])
         log.info('MOD <entry[' + str(flow_entry.table_type) + '][' + str(flow_entry.table_id) + '][' + str(flow_entry.index) + ']>')
-        # TODO: add sended msg
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
         return True
     
     def delete_flow_entry(self, switch_id, global_table_id, index):
@@ -402,17 +648,217 @@ class PofManager(EventMixin):
             return None
         self.database.delete_flow_entry(switch_id, global_table_id, index)   # delete flow_entry from the database
         flow_entry.command = of.OFPFC_DELETE  # 3
-        self.write_of(switch_id, flow_entry)
+        self._write_msgs(switch_id, [flow_entry], old_copies = [flow_entry])
         log.info('DELETE <entry[' + str(flow_entry.table_type) + '][' + str(flow_entry.table_id) + '][' + str(flow_entry.index) + ']>')
-        # TODO: add sended msg
-        # TODO: delete match key
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
     
-    def check_flow_entry_reduplication(self):
-        pass
+    # Batch flow entry functions.  Each takes a list of entries for one table
+    # and sends every resulting ofp_flow_mod in a single write, optionally
+    # followed by an ofp_barrier_request.
+    def add_flow_entries(self, switch_id, global_table_id, entry_list, barrier = False):
+        """
+        entry_list: a list of (matchx_list, instruction_list[, priority[, counter_enable]])
+        return a list of entry_id, FLOWENTRYID_INVALID for rejected entries
+        """
+        flow_table = self.get_flow_table(switch_id, global_table_id)
+        entry_ids = [FLOWENTRYID_INVALID] * len(entry_list)
+        positions = []
+        checked_list = []
+        batch_keys = set()
+        for i, entry in enumerate(entry_list):
+            matchx_list, instruction_list, priority, counter_enable = \
+                tuple(entry) + (0, True)[len(entry) - 2:]
+            if not self._check_flow_entry(flow_table, matchx_list, instruction_list):
+                continue
+            if len(matchx_list) != 0:
+                key = get_match_key(matchx_list)
+                if key in batch_keys or self.database.get_flow_entry_index_by_match_key(
+                        switch_id, global_table_id, key) != FLOWENTRYID_INVALID:
+                    log.error("flow entry already exists")
+                    continue
+                batch_keys.add(key)
+            positions.append(i)
+            checked_list.append((matchx_list, instruction_list, priority, counter_enable))
+        if not checked_list:
+            return entry_ids
+        
+        new_ids = self.database.add_flow_entries(switch_id, global_table_id, checked_list)
+        flow_entries = []
+        for i, flow_entry_id in zip(positions, new_ids):
+            entry_ids[i] = flow_entry_id
+            flow_entries.append(self.get_flow_entry(switch_id, global_table_id, flow_entry_id))
+        self._write_msgs(switch_id, flow_entries, barrier, flow_entries)
+        log.info('ADD <entries[' + str(flow_table.table_type) + '][' + str(flow_entries[0].table_id) + '] x ' + str(len(flow_entries)) + '>')
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
+        return entry_ids
+    
+    def modify_flow_entries(self, switch_id, global_table_id, entry_list, barrier = False):
+        """
+        entry_list: a list of (flow_entry_id, matchx_list, instruction_list[, priority[, counter_enable]])
+        return a list of boolean
+        """
+        flow_table = self.get_flow_table(switch_id, global_table_id)
+        results = []
+        flow_entries = []
+        old_copies = []
+        with self.database.journal_batch():
+            for entry in entry_list:
+                flow_entry_id, matchx_list, instruction_list, priority, counter_enable = \
+                    tuple(entry) + (0, True)[len(entry) - 3:]
+                old_flow_entry = self._old_copy(self.database.get_flow_entry(switch_id, global_table_id, flow_entry_id))
+                if (not self._check_flow_entry(flow_table, matchx_list, instruction_list) or
+                    self.check_flow_entry_reduplication(switch_id, global_table_id, matchx_list,
+                                                        flow_entry_id) != FLOWENTRYID_INVALID or
+                    not self.database.modify_flow_entry(switch_id, global_table_id, flow_entry_id, len(matchx_list), matchx_list,
+                                                        len(instruction_list), instruction_list, priority, counter_enable)):
+                    results.append(False)
+                    continue
+                flow_entry = self.get_flow_entry(switch_id, global_table_id, flow_entry_id)
+                flow_entry.command = of.OFPFC_MODIFY  # 1
+                flow_entries.append(flow_entry)
+                old_copies.append(old_flow_entry)
+                results.append(True)
+        if flow_entries:
+            self._write_msgs(switch_id, flow_entries, barrier, old_copies)
+            log.info('MOD <entries[' + str(flow_table.table_type) + '][' + str(flow_entries[0].table_id) + '] x ' + str(len(flow_entries)) + '>')
+            self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
+        return results
+    
+    def delete_flow_entries(self, switch_id, global_table_id, index_list, barrier = False):
+        """
+        return a list of the deleted ofp_flow_mod, None for unknown indexes
+        """
+        flow_entries = []
+        results = []
+        with self.database.journal_batch():
+            for index in index_list:
+                flow_entry = self.database.get_flow_entry(switch_id, global_table_id, index)
+                if flow_entry is None or not isinstance(flow_entry, of.ofp_flow_mod):
+                    results.append(None)
+                    continue
+                self.database.delete_flow_entry(switch_id, global_table_id, index)
+                flow_entry.command = of.OFPFC_DELETE  # 3
+                flow_entries.append(flow_entry)
+                results.append(flow_entry)
+        if flow_entries:
+            self._write_msgs(switch_id, flow_entries, barrier, flow_entries)
+            log.info('DELETE <entries[' + str(flow_entries[0].table_type) + '][' + str(flow_entries[0].table_id) + '] x ' + str(len(flow_entries)) + '>')
+            self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
+        return results
+    
+    def _write_msgs(self, switch_id, msgs, barrier = False, old_copies = None):
+        """
+        Pack msgs (and a barrier) into one buffer, for one send; return the
+        barrier's xid, or None
+        With the in-flight window on, every write ends with a barrier and the
+        messages are tracked.  old_copies, in the order of msgs, are what the
+        flow entries are rolled back to if their flow_mod fails: the entry
+        added, the entry before it was modified, the entry deleted.
+        """
+        connection = self._get_connection(switch_id)
+        if connection is None:
+            return None
+        compact = getattr(connection, 'compact_flow_mod', False)
+        track = self.inflight_window > 0
+        msgs = list(msgs)
+        if barrier or track:
+            msgs.append(of.ofp_barrier_request())
+        lengths = [m._wire_len(compact) if isinstance(m, of.ofp_flow_mod) else len(m) for m in msgs]
+        buf = bytearray(sum(lengths))
+        offset = 0
+        for m, length in zip(msgs, lengths):
+            if track:
+                m.xid = of.generate_xid()   # the database's flow_mods are sent again and again
+            if isinstance(m, of.ofp_flow_mod):
+                m.pack_into(buf, offset, compact)
+            else:
+                buf[offset:offset + length] = m.pack()
+            offset += length
+        if not track:
+            self.write_of(switch_id, bytes(buf))
+            return msgs[-1].xid if barrier else None
+        # the database's flow_mods are tracked themselves (copying them all
+        # is slow), with the xids and commands they are sent with
+        xids = [m.xid for m in msgs]
+        commands = [m.command if isinstance(m, of.ofp_flow_mod) else None for m in msgs]
+        self._write_tracked(switch_id, (bytes(buf), msgs, xids, commands, old_copies))
+        return xids[-1]
+    
+    def _write_tracked(self, switch_id, write):
+        pending = self.pending_writes.get(switch_id)
+        if pending is None:
+            pending = self.pending_writes[switch_id] = deque()
+        pending.append(write)
+        self._flush_pending_writes(switch_id)
+        
+    def _flush_pending_writes(self, switch_id):
+        # send the waiting writes, in order, as far as the window allows
+        pending = self.pending_writes.get(switch_id)
+        switch_DB = self.database.get_switch_DB(switch_id)
+        if not pending or switch_DB is None:
+            return
+        while pending:
+            data, msgs, xids, commands, old_copies = pending[0]
+            inflight_number = switch_DB.get_sended_of_message_number()
+            if inflight_number and inflight_number + len(msgs) > self.inflight_window:
+                return
+            pending.popleft()
+            switch_DB.add_sended_of_messages(msgs, xids, commands, old_copies)
+            self.write_of(switch_id, data)
+            
+    def _old_copy(self, flow_entry):
+        # what a modified flow entry is rolled back to, if it fails
+        if self.inflight_window <= 0 or flow_entry is None:
+            return None
+        return copy.copy(flow_entry)
+    
+    def get_inflight_number(self, switch_id):   # return number of messages sent and not answered
+        return self.database.get_sended_of_msg_number(switch_id)
+    
+    def get_pending_write_number(self, switch_id):   # return number of writes waiting for the window
+        return len(self.pending_writes.get(switch_id, ()))
+    
+    def _roll_back(self, switch_id, msg, old_flow_entry):
+        # return boolean, whether the database was put back as before msg
+        if not isinstance(msg, of.ofp_flow_mod) or old_flow_entry is None:
+            return False
+        global_table_id = self.parse_to_global_table_id(switch_id, msg.table_type, msg.table_id)
+        # only while the index holds what msg left there: the entry added,
+        # nothing after a delete, the entry modified (msg is a copy if it
+        # has been sent again since); else a later change would be undone
+        if msg.command == of.OFPFC_ADD:
+            expected = old_flow_entry
+        elif msg.command == of.OFPFC_DELETE:
+            expected = None
+        else:
+            expected = msg
+        current = (self.database.get_flow_entries_map(switch_id, global_table_id) or {}).get(msg.index)
+        if current is not expected:
+            log.warning("switch [id = " + str(switch_id) + "]: entry [" + str(global_table_id) + "][" +
+                        str(msg.index) + "] changed since, not rolled back")
+            return False
+        if msg.command == of.OFPFC_ADD:
+            self.database.delete_flow_entry(switch_id, global_table_id, msg.index)
+        elif not self.database.put_back_flow_entry(switch_id, global_table_id, old_flow_entry, current):
+            return False
+        self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
+        return True
+    
+    def check_flow_entry_reduplication(self, switch_id, global_table_id, matchx_list, flow_entry_id = FLOWENTRYID_INVALID):
+        # return the entry_id of another entry with the same match, or FLOWENTRYID_INVALID
+        # flow_entry_id: the entry being modified, which may keep its own match
+        if len(matchx_list) == 0:   # linear table entries have no match
+            return FLOWENTRYID_INVALID
+        dup_id = self.database.get_flow_entry_index_by_match_key(switch_id, global_table_id,
+                                                                 get_match_key(matchx_list))
+        if dup_id == flow_entry_id:
+            return FLOWENTRYID_INVALID
+        return dup_id
     
     # Port functions
     def set_port_status(self, switch_id, port_status):
         self.database.set_port_status(switch_id, port_status)
+        self.raiseEventNoErrors(PortStatusChanged, switch_id, port_status.desc.port_id)
         #TODO: need to display in the GUI
     
     def get_port_status(self, switch_id, port_id):
@@ -431,6 +877,7 @@ class PofManager(EventMixin):
             self.write_of(device_id, msg)
             #log.info("Port [" + str(port.desc.port_id) + "] Set pof enable [" + str(port.desc.device_id) + "]")
             log.info("Port [" + "0x%x" % port.desc.port_id + "] Set POF Enable [" + str(port.desc.device_id) + "]")
+            self.raiseEventNoErrors(PortStatusChanged, device_id, port_id)
             
     def get_all_port_id(self, switch_id):
         return self.database.get_all_port_id(switch_id)   # return a list of port_id
@@ -446,18 +893,48 @@ class PofManager(EventMixin):
         return self.switches.get(switch_id)
     
     def check_switch_connected(self, switch_id):
-        pass   #FIXME:
+        sw = self.switches.get(switch_id)
+        if sw is None or sw.connection is None:
+            return False
+        return not getattr(sw.connection, 'disconnected', False)
     
     def get_all_switch_id(self):
         return self.database.get_all_switch_id()
     
-    def send_all_of_messages_base_on_DB(self):
-        pass  #FIXME:
+    def send_all_of_messages_base_on_DB(self):   # resync every connected switch
+        for switch_id in self.database.get_all_switch_id():
+            if self.check_switch_connected(switch_id):
+                self.resync_switch(switch_id)
+    
+    def resync_switch(self, switch_id):   # return SwitchResync, see there
+        old_resync = self.resyncs.get(switch_id)
+        if old_resync is not None:
+            old_resync.cancel()
+        resync = SwitchResync(self, switch_id, self.resync_batch_size, self.resync_window,
+                              self.resync_rate)
+        self.resyncs[switch_id] = resync
+        resync.start()
+        return resync
+    
+    def get_resync(self, switch_id):   # return SwitchResync under way, or None
+        return self.resyncs.get(switch_id)
     
     def write_of(self, switch_id, ofp):
         #time.sleep(0.1)
+        if self.inflight_window > 0 and isinstance(ofp, of.ofp_header):
+            self._write_msgs(switch_id, [ofp])
+            return
+        connection = self._get_connection(switch_id)
+        if connection is not None:
+            connection.send(ofp)
+    
+    def _get_connection(self, switch_id):   # return the switch's connection, or None
         sw = self.get_switch_by_id(switch_id)
-        sw.connection.send(ofp)
+        if sw is None or sw.connection is None:
+            # the database has the change; a resync sends it on connect
+            log.warning("switch [id = " + str(switch_id) + "] not connected, message not sent")
+            return None
+        return sw.connection
         
     # Resource report functions
     def get_resource_report_map(self, switch_id):
@@ -467,31 +944,167 @@ class PofManager(EventMixin):
         return self.database.get_resource_report(switch_id, slot_id)
     
     # Counter functions
+    def _write_counter_mod(self, switch_id, command, counter_id):
+        counter_mod = of.ofp_counter_mod()
+        counter_mod.counter.command = command
+        counter_mod.counter.counter_id = counter_id
+        self.write_of(switch_id, counter_mod)
+        
     def allocate_counter(self, switch_id):   # return counter_id
-        pass
+        counter_id = self.database.allocate_counter(switch_id)
+        if counter_id == COUNTERID_INVALID:
+            log.error("Allocate counter failed")
+            return COUNTERID_INVALID
+        self._write_counter_mod(switch_id, of.OFPCC_ADD, counter_id)
+        return counter_id
     
     def free_counter(self, switch_id, counter_id): # return ofp_counter
-        pass
+        counter = self.database.free_counter(switch_id, counter_id)
+        if counter is None:
+            log.error("no such counter: " + str(counter_id))
+            return None
+        self.remove_counter_poll(switch_id, counter_id)
+        self._write_counter_mod(switch_id, of.OFPCC_DELETE, counter_id)
+        return counter
     
     def free_all_counters(self, switch_id):
-        pass
+        for counter in self.database.get_all_counters(switch_id):
+            self.free_counter(switch_id, counter.counter_id)
     
     def reset_counter(self, switch_id, counter_id, writo_to_switch=True):   #return boolean
-        pass
+        if not self.database.reset_counter(switch_id, counter_id):
+            log.error("no such counter: " + str(counter_id))
+            return False
+        if writo_to_switch:
+            self._write_counter_mod(switch_id, of.OFPCC_CLEAR, counter_id)
+        return True
     
-    def query_counter_value(self, switch_id, counter_id):   # return a ofp_counter
-        if self.database.get_counter(switch_id, counter_id) is None:
-            return None
+    def get_counter_stats(self, switch_id, counter_id):   # return PMCounterStats, None before the first reply
+        return self.database.get_counter_stats(switch_id, counter_id)
+    
+    def query_counter_value(self, switch_id, counter_id, callback = None):   # return a ofp_counter
         """
-        value = of.ofp_counter()
-        value.counter_id = counter_id
-        counter_reply_list = []
+        Ask the switch for counter_id without waiting for the answer.
+        Queries made in the same event are sent together (one write per
+        switch), and a counter already being asked for is not asked again.
+        callback(stats) is called with the PMCounterStats when the reply
+        arrives, or with None if the switch does not answer.
+        Returns the ofp_counter holding the last value read, None if
+        counter_id is not allocated.
         """
-        counter_req = of.ofp_counter_request()
-        counter_req.counter.counter_id = counter_id
-        counter_req.counter.command = of.OFPCC_QUERY
-        self.write_of(switch_id, counter_req)
-        #FIXME:
+        counter = self.database.get_counter(switch_id, counter_id)
+        if counter is None:
+            return None
+        xid = self.counter_request_xids.get((switch_id, counter_id))
+        if xid is not None and time.time() - self.counter_requests[xid][3] > COUNTER_REQUEST_TIMEOUT:
+            self._expire_counter_requests(time.time())   # not answered, ask again
+            xid = None
+        if xid is not None:
+            if callback is not None:
+                self.counter_requests[xid][2].append(callback)
+            return counter
+        callbacks = self.counter_queries.setdefault(switch_id, {}).setdefault(counter_id, [])
+        if callback is not None:
+            callbacks.append(callback)
+        if not self._counter_flush_pending:
+            self._counter_flush_pending = True
+            core.callLater(self._flush_counter_queries)
+        return counter
+    
+    def add_counter_poll(self, switch_id, counter_id):
+        # have counter_id queried every counter_poll_interval seconds
+        if self.database.get_counter(switch_id, counter_id) is None:
+            log.error("no such counter: " + str(counter_id))
+            return False
+        self.counter_polls.setdefault(switch_id, set()).add(counter_id)
+        return True
+    
+    def remove_counter_poll(self, switch_id, counter_id):
+        counter_ids = self.counter_polls.get(switch_id)
+        if counter_ids is not None:
+            counter_ids.discard(counter_id)
+            if not counter_ids:
+                del self.counter_polls[switch_id]
+    
+    def set_counter_poll_interval(self, interval):   # 0 stops polling
+        if self._counter_timer is not None:
+            self._counter_timer.cancel()
+            self._counter_timer = None
+        self.counter_poll_interval = interval
+        if interval > 0:
+            self._counter_timer = Timer(interval, self._poll_counters, recurring = True)
+    
+    def _poll_counters(self):
+        self._expire_counter_requests(time.time())
+        for switch_id, counter_ids in self.counter_polls.items():
+            queries = self.counter_queries.setdefault(switch_id, {})
+            for counter_id in counter_ids:
+                if (switch_id, counter_id) not in self.counter_request_xids:
+                    queries.setdefault(counter_id, [])
+        self._flush_counter_queries()
+    
+    def _flush_counter_queries(self):
+        # one write per switch with every counter request queued for it
+        self._counter_flush_pending = False
+        queries, self.counter_queries = self.counter_queries, {}
+        now = time.time()
+        for switch_id, counters in queries.iteritems():
+            sw = self.get_switch_by_id(switch_id)
+            if sw is None or sw.connection is None:
+                log.warning("counter query: switch " + str(switch_id) + " not connected")
+                for callbacks in counters.itervalues():
+                    self._call_counter_callbacks(callbacks, None)
+                continue
+            packed = []
+            for counter_id, callbacks in counters.iteritems():
+                counter_req = of.ofp_counter_request()
+                counter_req.counter.counter_id = counter_id
+                counter_req.counter.command = of.OFPCC_QUERY
+                self.counter_requests[counter_req.xid] = (switch_id, counter_id, callbacks, now)
+                self.counter_request_xids[(switch_id, counter_id)] = counter_req.xid
+                packed.append(counter_req.pack())
+            if packed:
+                self.write_of(switch_id, b''.join(packed))
+        self._arm_counter_expiry()
+    
+    def _arm_counter_expiry(self):
+        # time out requests whether or not polling is on
+        if self._counter_expiry_timer is None and self.counter_requests:
+            oldest = min(request[3] for request in self.counter_requests.itervalues())
+            self._counter_expiry_timer = Timer(max(0, oldest + COUNTER_REQUEST_TIMEOUT - time.time()),
+                                               self._counter_expiry)
+    
+    def _counter_expiry(self):
+        self._counter_expiry_timer = None
+        self._expire_counter_requests(time.time())
+        self._arm_counter_expiry()
+    
+    def _drop_counter_requests(self, switch_id):
+        # the switch is gone: what it was asked is not answered
+        for xid, request in self.counter_requests.items():
+            if request[0] == switch_id:
+                self._pop_counter_request(xid)
+                self._call_counter_callbacks(request[2], None)
+    
+    def _expire_counter_requests(self, now):
+        for xid, (switch_id, counter_id, callbacks, send_time) in self.counter_requests.items():
+            if now - send_time > COUNTER_REQUEST_TIMEOUT:
+                log.warning("counter " + str(counter_id) + " of switch " + str(switch_id) + ": no reply")
+                self._pop_counter_request(xid)
+                self._call_counter_callbacks(callbacks, None)
+    
+    def _pop_counter_request(self, xid):
+        request = self.counter_requests.pop(xid, None)
+        if request is not None:
+            self.counter_request_xids.pop((request[0], request[1]), None)
+        return request
+    
+    def _call_counter_callbacks(self, callbacks, stats):
+        for callback in callbacks:
+            try:
+                callback(stats)
+            except Exception:
+                log.exception("counter callback failed")
     
     # Meter functions
     def add_meter_entry(self, switch_id, rate):  # return meter_id
@@ -705,22 +1318,132 @@ class PofManager(EventMixin):
         action.counter_id = counter_id
         return action
     
+    # Store functions (see pmjournal)
+    def open_database(self, file_name = DEFAULT_SAVE_FILE_NAME, fsync = FSYNC_INTERVAL,
+                      fsync_interval = 1.0, snapshot_records = 1000000):
+        """
+        Load the database stored in file_name (and its journal), then journal
+        every change to it.  fsync is 'always', 'interval' or 'never'; a new
+        snapshot is taken once the journal holds snapshot_records records.
+        """
+        self.close_database()
+        journal = PMJournal(file_name, fsync, fsync_interval, snapshot_records)
+        self._restore(journal.load())
+        self.database.journal = journal
+        self._journal_timer = Timer(fsync_interval, self._journal_tick, recurring = True)
+        
+    def close_database(self):
+        journal = self.database.journal
+        if journal is None:
+            return
+        self._journal_tick()
+        self._journal_timer.cancel()
+        self._journal_timer = None
+        self.database.journal = None
+        journal.close()
+        
+    def _journal_tick(self):
+        journal = self.database.journal
+        if journal.needs_snapshot():
+            journal.snapshot(self.database.dump)
+        elif journal.fsync == FSYNC_INTERVAL:
+            journal.sync()
+    
+    def _restore(self, state):
+        for switch_id, table_ids in self.database.restore(state).iteritems():
+            self._restored(switch_id, table_ids)
+    
+    def _restored(self, switch_id, table_ids):
+        if self.check_switch_connected(switch_id):
+            self.resync_switch(switch_id)
+        for global_table_id in table_ids:
+            self.raiseEventNoErrors(FlowTableChanged, switch_id, global_table_id)
+    
     def save_all_data_into_file(self, file_name = DEFAULT_SAVE_FILE_NAME):
-        pass
+        # a snapshot; that of the open database also restarts its journal
+        journal = self.database.journal
+        if journal is not None and file_name == journal.file_name:
+            journal.snapshot(self.database.dump)
+        else:
+            write_snapshot(file_name, self.database.dump)
     
-    def save_metadata_into_file(self):
-        pass
+    def save_metadata_into_file(self, file_name = DEFAULT_METADATA_FILE_NAME):
+        write_snapshot(file_name, lambda writer: writer.put_metadata(self.database.get_metadata()))
     
-    def load_all_data_from_file(self):
-        pass
+    def load_all_data_from_file(self, file_name = DEFAULT_SAVE_FILE_NAME):
+        self._restore(load_state(file_name))
+        if self.database.journal is not None:   # what was loaded is not in the journal yet
+            self.save_all_data_into_file(self.database.journal.file_name)
     
-    def load_metadata_from_file(self):
-        pass
+    def load_metadata_from_file(self, file_name = DEFAULT_METADATA_FILE_NAME):
+        metadata_list = load_state(file_name).metadata
+        if metadata_list is not None:
+            self.database.modify_metadata(metadata_list)
     
-    def send_all_of_msg_based_on_DB(self):
-        pass
+    def send_all_of_msg_based_on_DB(self, switch_id):
+        return self.resync_switch(switch_id)
     
     # Handlers of POF messages
+    def _handle_ConnectionUp(self, event):
+        # a switch the database has tables of: give it back its state, unless
+        # restoring it from the database file (on its resource report) already does
+        switch_id = event.dpid
+        switch_DB = self.database.get_switch_DB(switch_id)
+        if not self.resync or switch_DB is None or not switch_DB.get_flow_tables_map():
+            return
+        resync = self.resyncs.get(switch_id)
+        if resync is not None and resync.connection is event.connection:
+            return
+        sw = self.switches.get(switch_id)
+        if sw is None:
+            sw = Switch()
+            sw.set_device_id(switch_id)
+            self.add_switch(switch_id, sw)
+        sw.connect(event.connection)
+        self.resync_switch(switch_id)
+        
+    def _handle_ConnectionDown(self, event):
+        # unanswered messages stay unanswered; a resync brings the switch back in step
+        self.pending_writes.pop(event.dpid, None)
+        self.database.clear_sended_of_msg(event.dpid)
+        self._drop_counter_requests(event.dpid)
+        resync = self.resyncs.get(event.dpid)
+        if resync is not None:
+            resync.cancel()
+        sw = self.switches.get(event.dpid)
+        if sw is not None and sw.connection is event.connection:
+            sw.disconnect()
+        
+    def _handle_BarrierIn(self, event):
+        if self.database.acknowledge_sended_of_msg(event.dpid, event.xid):
+            self._flush_pending_writes(event.dpid)
+        resync = self.resyncs.get(event.dpid)
+        if resync is not None:
+            resync.barrier_in(event.xid)
+            
+    def _handle_SendQueueLow(self, event):
+        resync = self.resyncs.get(event.dpid)
+        if resync is not None and resync.connection is event.connection and resync._timer is None:
+            resync._pump()
+            
+    def _handle_ErrorIn(self, event):
+        switch_id = event.dpid
+        msg = self.database.get_sended_of_msg(switch_id, event.xid)
+        if msg is not None:
+            old_flow_entry = self.database.get_old_backup_of_msg(switch_id, event.xid)
+            self.database.delete_sended_of_msg(switch_id, event.xid)
+            rolled_back = self._roll_back(switch_id, msg, old_flow_entry)
+            event.should_log = False
+            log.error("switch [id = " + str(switch_id) + "]: " + of.ofp_type_map.get(msg.header_type, '?') +
+                      " [xid = " + str(event.xid) + "] failed, [type] " +
+                      str(of.ofp_error_type_map.get(event.ofp.type, event.ofp.type)) +
+                      " [code] " + str(event.ofp.code) + (", rolled back" if rolled_back else ""))
+            self.raiseEventNoErrors(MessageFailed, switch_id, msg, event.ofp, rolled_back)
+            self._flush_pending_writes(switch_id)
+        resync = self.resyncs.get(event.dpid)
+        if resync is not None:
+            resync.error_in()
+        
     def _handle_FeaturesReceived(self, event):
         #print "PofManager: Features Reply Received"
         features_reply = event.ofp
@@ -734,7 +1457,8 @@ class PofManager(EventMixin):
         sw.connect(event.connection)
         self.add_switch(device_id, sw)
         
-        self.database.add_switch_DB(device_id)
+        if self.database.get_switch_DB(device_id) is None:   # else known from before
+            self.database.add_switch_DB(device_id)
         self.database.set_features(device_id, features_reply)
         
     def _handle_ResourceReport(self, event):
@@ -742,6 +1466,9 @@ class PofManager(EventMixin):
         switch_id = event.dpid
         resource_report = event.ofp
         self.database.set_resource_report(switch_id, resource_report)
+        table_ids = self.database.restore_switch(switch_id)
+        if table_ids is not None:
+            self._restored(switch_id, table_ids)
         
     def _handle_PortStatus(self, event):
         #print "PofManager: Port Status Received"     #for test
@@ -760,11 +1487,63 @@ class PofManager(EventMixin):
             self.database.set_port_status(port.device_id, port_status)
             #log.info("Port [" + str(port.port_id) + "] modified for Switch [" + str(port.device_id) + "]")
             log.info("Port [" + "0x%x" % port.port_id + "] modified for Switch [" + str(port.device_id) + "]")
-            
+        else:
+            return
+        self.raiseEventNoErrors(PortStatusChanged, port.device_id, port.port_id)
+
     def _handle_CounterReply(self, event):
-        print 'PofManager: CounterReply received'
+        #print 'PofManager: CounterReply received'
+        switch_id = event.dpid
+        counter = event.ofp.counter
+        request = self._pop_counter_request(event.ofp.xid)
+        if request is not None and (request[0], request[1]) != (switch_id, counter.counter_id):
+            log.warning("counter reply xid " + str(event.ofp.xid) + " does not match its request")
+            self._call_counter_callbacks(request[2], None)
+            request = None
+        if self.database.get_switch_DB(switch_id) is None:
+            return
+        stats = self.database.update_counter_stats(switch_id, counter.counter_id, counter.counter_value,
+                                                   counter.byte_value, time.time())
+        self.raiseEventNoErrors(CounterStatsReceived, switch_id, stats, event.ofp.xid)
+        if request is not None:
+            self._call_counter_callbacks(request[2], stats)
         
         
         
-def launch():
-    core.registerNew(PofManager)
\ No newline at end of file
+def launch(counter_poll_interval = 0, database_file = None, fsync = FSYNC_INTERVAL,
+           fsync_interval = 1, snapshot_records = 1000000, resync = True,
+           resync_batch_size = RESYNC_BATCH_SIZE, resync_window = RESYNC_WINDOW, resync_rate = 0,
+           inflight_window = 0):
+    """
+    --counter_poll_interval=X queries the counters registered with
+    add_counter_poll() every X seconds (default 0, no polling)
+    --database_file=F keeps the database in F (and F.journal): it is loaded
+    at start, and the tables and entries of a switch are restored and sent
+    to it when it connects
+    --fsync=always|interval|never says when journal writes are synced
+    (default interval, every --fsync_interval=X seconds)
+    --snapshot_records=N takes a new snapshot once the journal holds N
+    records (default 1000000, 0 never)
+    --resync=False leaves switches which connect again as they are; else
+    their tables and entries are sent again, in batches of
+    --resync_batch_size=N entries (default 1000) with a barrier each, at
+    most --resync_window=N batches unacknowledged (default 4) and at most
+    --resync_rate=X entries per second (default 0, no limit)
+    --inflight_window=N tracks every message sent until a barrier reply
+    acknowledges it, with at most N unacknowledged per switch; failed flow
+    entries are then rolled back (default 0, no tracking)
+    """
+    if not core.hasComponent('PofManager'):
+        core.registerNew(PofManager, counter_poll_interval = float(counter_poll_interval))
+    else:
+        core.PofManager.set_counter_poll_interval(float(counter_poll_interval))
+    pm = core.PofManager
+    pm.resync = str_to_bool(resync)
+    pm.resync_batch_size = int(resync_batch_size)
+    pm.resync_window = int(resync_window)
+    pm.resync_rate = float(resync_rate)
+    pm.inflight_window = int(inflight_window)
+    if database_file is not None:
+        core.PofManager.open_database(database_file, fsync, float(fsync_interval),
+                                      int(snapshot_records))
+        core.addListenerByName("GoingDownEvent", lambda event: core.PofManager.close_database())
\ No newline at end of file
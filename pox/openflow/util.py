@@ -20,17 +20,18 @@ import pox.openflow
 
 from pox.lib.util import str_to_dpid    # cc
 
-def make_type_to_unpacker_table ():
+def make_type_to_unpacker_table (lib = of):
     """
     Returns a list of unpack methods.
 
     The resulting list maps OpenFlow types to functions which unpack
-    data for those types into message objects.
+    data for those types into message objects.  lib is the OpenFlow
+    library the messages come from (libpof_02 by default).
     """
 
-    top = max(of._message_type_to_class)
+    top = max(lib._message_type_to_class)
 
-    r = [of._message_type_to_class[i].unpack_new for i in range(0, top + 1)]
+    r = [lib._message_type_to_class[i].unpack_new for i in range(0, top + 1)]
 
     return r
 
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libpof_02 as of
+from pox.openflow.util import make_type_to_unpacker_table
+from pox.datapaths.pof_switch import *
+
+unpackers = make_type_to_unpacker_table()
+
+def wire (msg):
+  """ msg as the other end unpacks it """
+  raw = msg.pack()
+  offset, msg = unpackers[ord(raw[1])](raw, 0)
+  assert offset == len(raw)
+  return msg
+
+
+class MockConnection (object):
+  """ Passes messages both ways through pack() and unpack() """
+  def __init__ (self):
+    self.received = []
+
+  def set_message_handler (self, handler):
+    self.on_message_received = handler
+
+  def to_switch (self, msg):
+    self.on_message_received(self, wire(msg))
+
+  def send (self, msg):
+    self.received.append(wire(msg))
+
+  def take (self):
+    r = self.received
+    self.received = []
+    return r
+
+
+# The fields the tests match on: Ethernet addresses, type, IPv4 dst and
+# 16 bits of metadata (field id -1 going out, 0xffff as it arrives)
+DMAC = of.ofp_match20(field_id = 0, offset = 0, length = 48)
+SMAC = of.ofp_match20(field_id = 1, offset = 48, length = 48)
+ETYPE = of.ofp_match20(field_id = 2, offset = 96, length = 16)
+IP_DST = of.ofp_match20(field_id = 3, offset = 240, length = 32)
+META = of.ofp_match20(field_id = -1, offset = 32, length = 16)
+
+def frame (dst = 2, src = 1, etype = 0x0800, ip_dst = 0x0a000001):
+  return ('%012x%012x%04x' % (dst, src, etype)).decode('hex') + \
+         '\x45' + '\x00' * 15 + ('%08x' % (ip_dst,)).decode('hex')
+
+def matchx (field, value, mask = None):
+  m = of.ofp_matchx(match20 = field)
+  m.value = '%0*x' % (field.length // 4, value)
+  m.mask = '%0*x' % (field.length // 4,
+                     (1 << field.length) - 1 if mask is None else mask)
+  return m
+
+def apply_actions (*actions):
+  return of.ofp_instruction_apply_actions(action_num = len(actions),
+                                          action_list = list(actions))
+
+def output (port_id):
+  return of.ofp_action_output(port_id_value_type = 0, port_id = port_id)
+
+
+class PofSwitchTest (unittest.TestCase):
+  def setUp (self):
+    self.conn = MockConnection()
+    self.switch = PofSoftwareSwitch(5, name = "sw5", ports = 3)
+    self.switch.set_connection(self.conn)
+    self.out = []
+    self.switch.addListener(PofDpPacketOut,
+                            lambda e: self.out.append((e.port.port_id,
+                                                       e.data)))
+    for port_id in self.switch.ports:
+      self.conn.to_switch(of.ofp_port_mod(desc = of.ofp_phy_port(
+          port_id = port_id, of_enable = 1)))
+
+  def add_table (self, table_type, table_id, fields, size = 64):
+    ft = of.ofp_flow_table(command = of.OFPTC_ADD, table_id = table_id,
+                           table_type = table_type, table_size = size,
+                           match_field_num = len(fields),
+                           key_length = sum(f.length for f in fields),
+                           table_name = 't%s' % (table_id,),
+                           match_field_list = fields)
+    self.conn.to_switch(of.ofp_table_mod(flow_table = ft))
+    return self.switch.table_id(table_type, table_id)
+
+  def add_entry (self, table_type, table_id, index, matches, instructions,
+                 priority = 0, counter_id = 0, command = of.OFPFC_ADD):
+    fm = of.ofp_flow_mod(command = command, table_type = table_type,
+                         table_id = table_id, index = index,
+                         priority = priority, counter_id = counter_id,
+                         match_field_num = len(matches),
+                         match_list = matches,
+                         instruction_num = len(instructions),
+                         instruction_list = instructions)
+    self.conn.to_switch(fm)
+
+  def test_handshake (self):
+    self.conn.take()
+    self.conn.to_switch(of.ofp_features_request(xid = 7))
+    fr, = self.conn.take()
+    self.assertTrue(isinstance(fr, of.ofp_features_reply))
+    self.assertEqual((fr.xid, fr.device_id, fr.port_num, fr.table_num),
+                     (7, 5, 3, 40))
+    self.assertTrue(fr.capabilities & of.OFPC_COMPACT_FLOW_MOD)
+
+    self.conn.to_switch(of.ofp_set_config(miss_send_len = 0xffff))
+    self.conn.to_switch(of.ofp_get_config_request(xid = 8))
+    msgs = self.conn.take()
+    self.assertEqual([type(m) for m in msgs],
+                     [of.ofp_get_config_reply, of.ofp_resource_report] +
+                     [of.ofp_port_status] * 3)
+    self.assertEqual((msgs[0].xid, msgs[0].miss_send_len), (8, 0xffff))
+    report = msgs[1].table_resources_map
+    self.assertEqual(report[of.OF_LPM_TABLE].table_num, 8)
+    self.assertEqual([m.desc.port_id for m in msgs[2:]], [1, 2, 3])
+    self.assertEqual(msgs[2].desc.device_id, 5)
+
+    # reported once per connection
+    self.conn.to_switch(of.ofp_get_config_request(xid = 9))
+    self.assertEqual(len(self.conn.take()), 1)
+
+  def test_table_ids (self):
+    # global ids follow the resource report: MM 0-15, LPM 16-23, EM 24-31
+    self.assertEqual(self.switch.table_id(of.OF_MM_TABLE, 3), 3)
+    self.assertEqual(self.switch.table_id(of.OF_EM_TABLE, 1), 25)
+    self.assertEqual(self.switch.table_id(of.OF_LINEAR_TABLE, 8), None)
+    self.conn.take()
+    self.add_table(of.OF_EM_TABLE, 8, [DMAC])
+    err, = self.conn.take()
+    self.assertEqual((err.type, err.code),
+                     (of.OFPET_TABLE_MOD_FAILED, of.OFPTMFC_BAD_TABLE_ID))
+
+  def test_miss (self):
+    self.conn.take()
+    self.switch.rx_packet(frame(), 1)
+    pi, = self.conn.take()
+    self.assertEqual((pi.reason, pi.slot_port_id, pi.device_id),
+                     (of.OFPR_NO_MATCH, 1, 5))
+    # miss_send_len is 128 until the controller sets it
+    self.assertEqual(pi.data, frame())
+    self.switch.miss_send_len = 10
+    self.switch.rx_packet(frame(), 2)
+    pi, = self.conn.take()
+    self.assertEqual((pi.data, pi.total_len), (frame()[:10], len(frame())))
+
+  def test_pipeline (self):
+    # MM table 0 on the Ethernet type goes to EM table 1 past the 14 byte
+    # Ethernet header; table 1 matches the IPv4 destination from there
+    ip_dst = of.ofp_match20(field_id = 3, offset = 128, length = 32)
+    mm = self.add_table(of.OF_MM_TABLE, 0, [ETYPE])
+    em = self.add_table(of.OF_EM_TABLE, 1, [ip_dst])
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(ETYPE, 0x0800)],
+                   [of.ofp_instruction_goto_table(next_table_id = em,
+                                                  packet_offset = 14)])
+    self.add_entry(of.OF_EM_TABLE, 1, 0, [matchx(ip_dst, 0x0a000002)],
+                   [apply_actions(output(3))])
+    self.assertEqual(self.conn.take(), [])
+
+    self.switch.rx_packet(frame(ip_dst = 0x0a000002), 1)
+    self.assertEqual(self.out, [(3, frame(ip_dst = 0x0a000002))])
+    self.assertEqual(self.conn.take(), [])
+    # a miss in the EM table comes from that table
+    self.switch.rx_packet(frame(ip_dst = 0x0a000003), 1)
+    pi, = self.conn.take()
+    self.assertEqual(pi.table_id, em)
+    # ... and one in the MM table from table 0
+    self.switch.rx_packet(frame(etype = 0x86dd), 1)
+    pi, = self.conn.take()
+    self.assertEqual(pi.table_id, mm)
+
+  def test_lpm_and_priority (self):
+    self.add_table(of.OF_LPM_TABLE, 0, [IP_DST])
+    lpm = self.switch.table_id(of.OF_LPM_TABLE, 0)
+    self.add_table(of.OF_MM_TABLE, 0, [ETYPE])
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(ETYPE, 0, 0)],
+                   [apply_actions(output(1))], priority = 1)
+    self.add_entry(of.OF_MM_TABLE, 0, 1, [matchx(ETYPE, 0x0800)],
+                   [of.ofp_instruction_goto_table(next_table_id = lpm)],
+                   priority = 5)
+    self.add_entry(of.OF_LPM_TABLE, 0, 0,
+                   [matchx(IP_DST, 0x0a000000, 0xff000000)],
+                   [apply_actions(output(2))])
+    self.add_entry(of.OF_LPM_TABLE, 0, 1,
+                   [matchx(IP_DST, 0x0a010000, 0xffff0000)],
+                   [apply_actions(output(3))])
+    self.assertEqual(self.conn.take(), [])
+    self.switch.rx_packet(frame(ip_dst = 0x0a010101), 1)
+    self.switch.rx_packet(frame(ip_dst = 0x0a020101), 1)
+    self.switch.rx_packet(frame(etype = 0x0806), 2)
+    self.assertEqual([p for p, d in self.out], [3, 2, 1])
+
+    # deleting the /16 leaves the /8
+    self.add_entry(of.OF_LPM_TABLE, 0, 1, [], [], command = of.OFPFC_DELETE)
+    self.switch.rx_packet(frame(ip_dst = 0x0a010101), 1)
+    self.assertEqual(self.out[-1][0], 2)
+
+  def test_linear_and_metadata (self):
+    # table 0 writes the packet's in port to metadata and jumps to linear
+    # entry 1, which outputs to the port in the metadata
+    linear = self.switch.table_id(of.OF_LINEAR_TABLE, 0)
+    self.add_table(of.OF_MM_TABLE, 0, [DMAC])
+    self.add_table(of.OF_LINEAR_TABLE, 0, [])
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 0, 0)], [
+        of.ofp_instruction_write_metadata(metadata_offset = 32,
+                                          write_length = 16, value = '0003'),
+        of.ofp_instruction_goto_direct_table(next_table_id = linear,
+                                             index_type = 0,
+                                             index_value = 1)])
+    out = of.ofp_action_output(port_id_value_type = 1, port_id_field = META)
+    self.add_entry(of.OF_LINEAR_TABLE, 0, 1, [], [apply_actions(out)])
+    self.assertEqual(self.conn.take(), [])
+    self.switch.rx_packet(frame(), 1)
+    self.assertEqual(self.out, [(3, frame())])
+
+  def test_field_actions (self):
+    self.add_table(of.OF_MM_TABLE, 0, [DMAC])
+    set_dst = of.ofp_action_set_field(field_setting = matchx(DMAC, 0x7))
+    add = of.ofp_action_add_field(field_id = 9, field_position = 96,
+                                  field_length = 32, field_value = '81000005')
+    delete = of.ofp_action_delete_field(tag_position = 48,
+                                        tag_length_value_type = 0,
+                                        tag_length_value = 48)
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 2)],
+                   [apply_actions(set_dst, add, delete, output(2))])
+    self.add_entry(of.OF_MM_TABLE, 0, 1, [matchx(DMAC, 3)],
+                   [apply_actions(of.ofp_action_drop(), output(2))])
+    self.switch.rx_packet(frame(), 1)
+    self.switch.rx_packet(frame(dst = 3), 1)
+    f = frame(dst = 7)
+    self.assertEqual(self.out, [(2, f[:6] + '\x81\x00\x00\x05' + f[12:])])
+
+  def test_counters (self):
+    self.add_table(of.OF_MM_TABLE, 0, [DMAC])
+    self.conn.to_switch(of.ofp_counter_mod(counter = of.ofp_counter(
+        command = of.OFPCC_ADD, counter_id = 4)))
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 2)],
+                   [apply_actions(output(2))], counter_id = 4)
+    self.switch.rx_packet(frame(), 1)
+    self.switch.rx_packet(frame(), 3)
+    self.conn.to_switch(of.ofp_counter_request(xid = 11,
+        counter = of.ofp_counter(command = of.OFPCC_QUERY, counter_id = 4)))
+    reply, = self.conn.take()
+    self.assertEqual((reply.xid, reply.counter.counter_id,
+                      reply.counter.counter_value, reply.counter.byte_value),
+                     (11, 4, 2, 2 * len(frame())))
+    self.conn.to_switch(of.ofp_counter_request(
+        counter = of.ofp_counter(command = of.OFPCC_QUERY, counter_id = 5)))
+    err, = self.conn.take()
+    self.assertTrue(isinstance(err, of.ofp_error))
+
+  def test_flow_mod_errors (self):
+    self.conn.take()
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 2)], [])
+    self.add_table(of.OF_MM_TABLE, 0, [DMAC])
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 2)], [])
+    self.add_entry(of.OF_MM_TABLE, 0, 0, [matchx(DMAC, 2)], [])
+    self.add_entry(of.OF_MM_TABLE, 0, 1, [matchx(ETYPE, 2)], [])
+    self.add_entry(of.OF_MM_TABLE, 0, 2, [], [], command = of.OFPFC_DELETE)
+    codes = [m.code for m in self.conn.take()]
+    self.assertEqual(codes, [of.OFPFMFC_BAD_TABLE_ID, of.OFPFMFC_ENTRY_EXIST,
+                             of.OFPFMFC_UNKNOWN, of.OFPFMFC_ENTRY_UNEXIST])
+
+  def test_packet_out (self):
+    po = of.ofp_packet_out(in_port = 1, data = frame(),
+                           actions = [output(of.OFPP_FLOOD)])
+    self.conn.to_switch(po)
+    self.assertEqual(sorted(p for p, d in self.out), [2, 3])
+    self.assertEqual(self.out[0][1], frame())
+
+
+if __name__ == '__main__':
+  unittest.main()
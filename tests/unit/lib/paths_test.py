@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import random
+import heapq
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.graph.paths import PathService
+
+def reference (links, nodes, src):
+  """ Dijkstra over a {(a,b):weight} dict """
+  adj = dict((n, []) for n in nodes)
+  for (a, b), w in links.iteritems():
+    adj[a].append((b, w))
+    adj[b].append((a, w))
+  dist = {src : 0}
+  heap = [(0, src)]
+  while heap:
+    d, x = heapq.heappop(heap)
+    if d > dist[x]: continue
+    for y, w in adj[x]:
+      if y not in dist or d + w < dist[y]:
+        dist[y] = d + w
+        heapq.heappush(heap, (d + w, y))
+  return dist
+
+def fat_tree (k):
+  """ Links of a k-ary fat-tree: cores c*, aggregation a*, edge e* """
+  links = []
+  half = k // 2
+  for pod in range(k):
+    for i in range(half):
+      agg = "a%s_%s" % (pod, i)
+      for j in range(half):
+        links.append((agg, "e%s_%s" % (pod, j)))
+        links.append((agg, "c%s" % (i * half + j)))
+  return links
+
+
+class paths_test (unittest.TestCase):
+  def _check (self, ps, links, nodes):
+    for s in nodes:
+      dist = reference(links, nodes, s)
+      for d in nodes:
+        self.assertEqual(ps.distance(s, d), dist.get(d))
+        p = ps.path(s, d)
+        if d not in dist:
+          self.assertEqual(p, None)
+          continue
+        self.assertEqual(p[0], s)
+        self.assertEqual(p[-1], d)
+        self.assertEqual(sum(links.get((a, b), links.get((b, a)))
+                             for a, b in zip(p[:-1], p[1:])), dist[d])
+
+  def _differential (self, weights, seed):
+    rnd = random.Random(seed)
+    ps = PathService()
+    nodes = range(30)
+    for n in nodes: ps.add_node(n)
+    links = {}
+    for step in range(300):
+      if links and rnd.random() < 0.4:
+        a, b = rnd.choice(links.keys())
+        self.assertTrue(ps.remove_link(b, a))
+        del links[(a, b)]
+      else:
+        a, b = rnd.sample(nodes, 2)
+        if (b, a) in links: a, b = b, a
+        w = rnd.choice(weights)
+        ps.add_link(a, b, w)
+        links[(a, b)] = w
+      if step % 25 == 0:
+        self._check(ps, links, nodes)
+    self._check(ps, links, nodes)
+
+  def test_unweighted (self):
+    self._differential([1], 1)
+
+  def test_weighted (self):
+    self._differential([1, 2, 3, 7], 2)
+
+  def test_nodes (self):
+    ps = PathService()
+    ps.add_link("a", "b")
+    ps.add_link("b", "c")
+    self.assertEqual(ps.path("a", "c"), ["a", "b", "c"])
+    self.assertTrue(ps.remove_node("b"))
+    self.assertFalse(ps.remove_node("b"))
+    self.assertEqual(ps.distance("a", "c"), None)
+    self.assertEqual(len(ps), 2)
+    ps.add_link("d", "a")
+    ps.add_link("d", "c")
+    self.assertEqual(ps.path("a", "c"), ["a", "d", "c"])
+    self.assertFalse(ps.remove_link("a", "c"))
+    self.assertRaises(ValueError, ps.add_link, "a", "c", 0)
+    self.assertRaises(ValueError, ps.add_link, "a", "a")
+
+  def test_ecmp (self):
+    ps = PathService()
+    for a, b in fat_tree(4):
+      ps.add_link(a, b)
+    # edge to edge across pods: 2 aggregation * 2 core choices
+    self.assertEqual(ps.distance("e0_0", "e1_0"), 4)
+    self.assertEqual(ps.next_hops("e0_0", "e1_0"), ["a0_0", "a0_1"])
+    all_paths = list(ps.paths("e0_0", "e1_0"))
+    self.assertEqual(len(all_paths), 4)
+    self.assertEqual(len(set(map(tuple, all_paths))), 4)
+    self.assertEqual(len(list(ps.paths("e0_0", "e1_0", limit = 3))), 3)
+    used = set(tuple(ps.path("e0_0", "e1_0", key)) for key in range(64))
+    self.assertTrue(len(used) > 1)
+    self.assertTrue(used <= set(map(tuple, all_paths)))
+
+    # losing one uplink leaves the other paths
+    ps.remove_link("e0_0", "a0_0")
+    self.assertEqual(ps.distance("e0_0", "e1_0"), 4)
+    self.assertEqual(len(list(ps.paths("e0_0", "e1_0"))), 2)
+    ps.remove_link("e0_0", "a0_1")
+    self.assertEqual(ps.path("e0_0", "e1_0"), None)
+    ps.add_link("e0_0", "a0_1")
+    self.assertEqual(ps.distance("e0_0", "e1_0"), 4)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+import select
+import threading
+import time
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.recoco import Scheduler, BaseTask, Select, Sleep
+from pox.lib.recoco.recoco import EpollSelectHub, RunQueue
+
+def stop (scheduler):
+  """ Quits scheduler and waits for its threads to finish """
+  scheduler.quit()
+  scheduler._event.set()
+  for t in (scheduler._thread, scheduler._selectHub._thread):
+    if t is not None: t.join(5)
+
+
+class ReadTask (BaseTask):
+  """ Reads from socks until it has seen count messages """
+  def __init__ (self, socks, count, done):
+    BaseTask.__init__(self)
+    self.socks = socks
+    self.count = count
+    self.done = done
+    self.got = []
+    self.timeouts = 0
+
+  def run (self):
+    while len(self.got) < self.count:
+      rl, wl, xl = yield Select(self.socks, [], self.socks, 0.05)
+      if not rl and not xl:
+        self.timeouts += 1
+      for s in rl:
+        self.got.append(s.recv(100))
+    self.done.set()
+
+
+class SleepTask (BaseTask):
+  def __init__ (self, delays, done):
+    BaseTask.__init__(self)
+    self.delays = delays
+    self.done = done
+    self.woken = []
+
+  def run (self):
+    for delay in self.delays:
+      yield Sleep(delay)
+      self.woken.append(delay)
+    self.done.set()
+
+
+@unittest.skipUnless(hasattr(select, 'epoll'), "requires epoll")
+class epoll_select_hub_test (unittest.TestCase):
+  def setUp (self):
+    self.scheduler = Scheduler(isDefaultScheduler = False, daemon = True,
+                               persistentEpoll = True)
+    self.assertTrue(isinstance(self.scheduler._selectHub, EpollSelectHub))
+    self.pairs = [socket.socketpair() for _ in range(20)]
+
+  def tearDown (self):
+    stop(self.scheduler)
+    for a, b in self.pairs:
+      a.close()
+      b.close()
+
+  def test_reads (self):
+    done = threading.Event()
+    task = ReadTask([b for a, b in self.pairs], 40, done)
+    task.start(self.scheduler)
+    for n in range(2):
+      for i, (a, b) in enumerate(self.pairs):
+        a.send("%d.%d" % (n, i))
+        if i % 5 == 0: time.sleep(0.01)
+    done.wait(5)
+    self.assertTrue(done.is_set())
+    self.assertEqual(sorted(task.got),
+                     sorted("%d.%d" % (n, i) for n in range(2)
+                            for i in range(20)))
+    # one registration per socket, all of them kept between cycles
+    hub = self.scheduler._selectHub
+    self.assertEqual(len(hub._fds), 20)
+
+  def test_interest_changes (self):
+    done = threading.Event()
+    socks = [b for a, b in self.pairs[:2]]
+    task = ReadTask(socks, 3, done)
+    task.start(self.scheduler)
+    self.pairs[0][0].send("a")
+    time.sleep(0.1)
+    # swap the watched sockets; data on the dropped one is not reported
+    socks[1:] = [self.pairs[2][1]]
+    time.sleep(0.1)
+    self.pairs[1][0].send("x")
+    self.pairs[2][0].send("b")
+    self.pairs[0][0].send("c")
+    done.wait(5)
+    self.assertEqual(sorted(task.got), ["a", "b", "c"])
+    self.assertTrue(task.timeouts > 0)
+    fds = set(self.scheduler._selectHub._fds)
+    self.assertEqual(fds, set([self.pairs[0][1].fileno(),
+                               self.pairs[2][1].fileno()]))
+
+  def test_timers (self):
+    done = threading.Event()
+    delays = [0.05, 0.01, 0.03, 0.02]
+    tasks = [SleepTask(delays[i:] + delays[:i], done) for i in range(4)]
+    start = time.time()
+    for task in tasks:
+      task.start(self.scheduler)
+    done.wait(5)
+    time.sleep(0.05)
+    self.assertTrue(time.time() - start >= sum(delays))
+    for task in tasks:
+      self.assertEqual(sorted(task.woken), sorted(delays))
+
+
+class Named (object):
+  def __init__ (self, name, priority = 1):
+    self.name = name
+    self.priority = priority
+
+  def __repr__ (self):
+    return self.name
+
+
+class CountTask (BaseTask):
+  """ Yields 0 (stays ready) times times, logging each run """
+  def __init__ (self, name, times, log, priority = 1):
+    BaseTask.__init__(self)
+    self.name = name
+    self.times = times
+    self.log = log
+    self.priority = priority
+
+  def run (self):
+    for _ in range(self.times):
+      self.log.append(self.name)
+      yield 0
+
+
+class run_queue_test (unittest.TestCase):
+  def test_fifo (self):
+    q = RunQueue()
+    tasks = [Named(str(i)) for i in range(5)]
+    for t in tasks: q.append(t)
+    self.assertEqual(len(q), 5)
+    self.assertTrue(tasks[3] in q)
+    self.assertEqual([q.popleft() for _ in range(5)], tasks)
+    self.assertFalse(tasks[3] in q)
+    self.assertRaises(IndexError, q.popleft)
+    self.assertEqual(q.max_depth, 5)
+
+  def test_shares (self):
+    # priority 0.25 gets one turn in five, always in the same places
+    q = RunQueue()
+    hi, lo = Named("hi"), Named("lo", 0.25)
+    q.append(hi)
+    q.append(lo)
+    order = []
+    for _ in range(20):
+      t = q.popleft()
+      order.append(t.name)
+      q.append(t)
+    self.assertEqual(order.count("lo"), 4)
+    self.assertEqual(order[:5].count("lo"), 1)
+    self.assertEqual(q.depths(), {1 : 1, 0.25 : 1})
+
+  def test_first_and_idle (self):
+    q = RunQueue()
+    a, b, c = Named("a"), Named("b", 0.5), Named("c")
+    # b being idle while a runs does not let it run repeatedly later
+    for _ in range(10):
+      q.append(a)
+      q.popleft()
+    q.append(a)
+    q.append(b)
+    q.appendleft(c)
+    self.assertEqual(q.depths(), {1 : 1, 0.5 : 1, None : 1})
+    order = []
+    for _ in range(6):
+      t = q.popleft()
+      order.append(t.name)
+      if t is not c: q.append(t)
+    self.assertEqual(order[0], "c")
+    self.assertEqual(order[1:].count("b"), 2)
+
+  def test_zero_priority (self):
+    q = RunQueue()
+    z = Named("z", 0)
+    q.append(z)
+    self.assertTrue(q.popleft() is z)
+
+  def test_threads (self):
+    # the SelectHub thread appends while the scheduler thread pops
+    q = RunQueue()
+    tasks = [Named(str(i), (1, 0.5)[i % 2]) for i in range(20000)]
+    def produce ():
+      for t in tasks: q.append(t)
+    producer = threading.Thread(target = produce)
+    producer.start()
+    got = []
+    deadline = time.time() + 30
+    while len(got) < len(tasks) and time.time() < deadline:
+      try:
+        got.append(q.popleft())
+      except IndexError:
+        pass
+    producer.join()
+    self.assertEqual(len(got), len(tasks))
+    self.assertEqual(set(got), set(tasks))
+    self.assertEqual(len(q), 0)
+
+
+class scheduler_test (unittest.TestCase):
+  def test_batch (self):
+    s = Scheduler(isDefaultScheduler = False, startInThread = False,
+                  batch = 4)
+    log = []
+    CountTask("a", 10, log).start(s, fast = True)
+    CountTask("b", 10, log, priority = 0.5).start(s, fast = True)
+    self.assertEqual(s.stats()['ready'], 2)
+    self.assertTrue(s.cycle())
+    self.assertEqual(len(log), 4)
+    s.cycle()
+    s.cycle()
+    self.assertEqual((log.count("a"), log.count("b")), (8, 4))
+    while s.cycle(): pass
+    self.assertEqual(len(log), 20)
+
+    stats = s.stats()
+    self.assertEqual(stats['ready'], 0)
+    self.assertEqual(stats['ready_max'], 2)
+    # each task ran once more to finish
+    self.assertEqual(stats['runs'], 22)
+    self.assertTrue(stats['run_time'] >= stats['slowest_run'] > 0)
+    self.assertTrue(stats['slowest_task'] is not None)
+    stop(s)
+
+  def test_task_counters (self):
+    s = Scheduler(isDefaultScheduler = False, startInThread = False)
+    t = CountTask("a", 2, [])
+    t.start(s, fast = True)
+    while s.cycle(): pass
+    self.assertEqual(t.run_count, 3)
+    self.assertTrue(t.run_time > 0)
+    stop(s)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.lib.revent.revent as revent
+from pox.lib.revent import *
+
+class Ping (Event):
+  made = 0
+  def __init__ (self, value):
+    Event.__init__(self)
+    self.value = value
+    Ping.made += 1
+
+class Source (EventMixin):
+  _eventMixin_events = set([Ping])
+
+
+class dispatch_test (unittest.TestCase):
+  def test_priority_order (self):
+    s = Source()
+    calls = []
+    def make (name):
+      return lambda event: calls.append(name)
+    s.addListener(Ping, make("none1"))
+    s.addListener(Ping, make("p5"), priority = 5)
+    s.addListener(Ping, make("none2"))
+    s.addListener(Ping, make("p9"), priority = 9)
+    s.addListener(Ping, make("p5b"), priority = 5)
+    s.addListener(Ping, make("p0"), priority = 0)
+    s.raiseEvent(Ping, 1)
+    self.assertEqual(calls, ["p9", "p5", "p5b", "p0", "none1", "none2"])
+
+  def test_snapshot (self):
+    # listeners added or removed while raising apply from the next raise
+    s = Source()
+    calls = []
+    def late (event):
+      calls.append("late")
+    def first (event):
+      calls.append("first")
+      s.addListener(Ping, late)
+      return EventRemove
+    s.addListener(Ping, first)
+    s.raiseEvent(Ping, 1)
+    self.assertEqual(calls, ["first"])
+    s.raiseEvent(Ping, 2)
+    self.assertEqual(calls, ["first", "late"])
+
+  def test_once_and_remove (self):
+    s = Source()
+    calls = []
+    s.addListener(Ping, lambda e: calls.append(e.value), once = True)
+    eid = s.addListener(Ping, lambda e: calls.append(-e.value))
+    s.raiseEvent(Ping, 1)
+    s.raiseEvent(Ping, 2)
+    self.assertTrue(s.removeListener(eid))
+    self.assertEqual(s.raiseEvent(Ping, 3), None)
+    self.assertEqual(calls, [1, -1, -2])
+
+
+class chain_test (unittest.TestCase):
+  def setUp (self):
+    self.nexus = Source()
+    self.con = Source()
+    self.seen = []
+    Ping.made = 0
+
+  def _listen (self, source, name, rv = None):
+    def handler (event):
+      self.seen.append((name, event, event.source))
+      return rv
+    source.addListener(Ping, handler)
+
+  def test_shared_event (self):
+    self._listen(self.nexus, "nexus")
+    self._listen(self.con, "con")
+    e = raiseEventChainNoErrors((self.nexus, self.con), Ping, 7)
+    self.assertEqual(Ping.made, 1)
+    self.assertEqual([n for n, ev, src in self.seen], ["nexus", "con"])
+    self.assertTrue(self.seen[0][1] is self.seen[1][1] is e)
+    self.assertEqual([src for n, ev, src in self.seen],
+                     [self.nexus, self.con])
+
+  def test_halt (self):
+    self._listen(self.nexus, "nexus", EventHalt)
+    self._listen(self.con, "con")
+    e = raiseEventChainNoErrors((self.nexus, self.con), Ping, 7)
+    self.assertTrue(e.halt)
+    self.assertEqual([n for n, ev, src in self.seen], ["nexus"])
+
+  def test_no_listeners (self):
+    self.assertEqual(raiseEventChainNoErrors((self.nexus, self.con),
+                                             Ping, 7), None)
+    self.assertEqual(Ping.made, 0)
+    # only the second source listens; the event is made for it alone
+    self._listen(self.con, "con")
+    raiseEventChainNoErrors((self.nexus, self.con), Ping, 7)
+    self.assertEqual(Ping.made, 1)
+
+  def test_exception (self):
+    def broken (event):
+      raise RuntimeError("broken")
+    self.nexus.addListener(Ping, broken)
+    self._listen(self.con, "con")
+    saved = revent.handleEventException
+    errors = []
+    revent.handleEventException = lambda *args: errors.append(args)
+    try:
+      raiseEventChainNoErrors((self.nexus, self.con), Ping, 7)
+    finally:
+      revent.handleEventException = saved
+    self.assertEqual(len(errors), 1)
+    self.assertEqual([n for n, ev, src in self.seen], ["con"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import core
+import pox.openflow
+import pox.openflow.libpof_02 as of
+import pox.lib.packet as pkt
+from pox.lib.addresses import EthAddr
+from pox.openflow.discovery_pof import LLDPSender, Discovery, _fast_lldp
+from pox.openflow.pofmanager import PofManager, Switch
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.sent = []
+
+  def send (self, data):
+    self.sent.append(data)
+
+class FakePacketIn (object):
+  def __init__ (self, data):
+    self.parsed = pkt.ethernet(data)
+
+def packet_out_data (packed):
+  po = of.ofp_packet_out()
+  po.unpack(packed)
+  return po.data
+
+def split_packet_outs (buf):
+  r = []
+  while buf:
+    po = of.ofp_packet_out()
+    offset, length = po.unpack(buf)
+    r.append(po)
+    buf = buf[length:]
+  return r
+
+
+class discovery_pof_test (unittest.TestCase):
+  def setUp (self):
+    pox.openflow.launch()
+    self.sender = LLDPSender(5)
+    self.cons = [FakeConnection(dpid) for dpid in (1, 2)]
+    for con in self.cons:
+      core.openflow._connect(con)
+
+  def tearDown (self):
+    for con in self.cons:
+      core.openflow._disconnect(con.dpid)
+
+  def test_fast_parse (self):
+    data = packet_out_data(self.sender.create_discovery_packet(
+        0xabcdef123, 17, EthAddr("02:00:00:00:00:11")))
+    self.assertEqual(_fast_lldp(data), (0xabcdef123, 17))
+    disc = Discovery.__new__(Discovery)
+    self.assertEqual(disc._parse_lldp(FakePacketIn(data)), (0xabcdef123, 17))
+
+  def test_foreign_lldp (self):
+    # a MAC chassis id is not ours: no fast path, the parser still copes
+    lldph = pkt.lldp()
+    lldph.tlvs.append(pkt.chassis_id(subtype = pkt.chassis_id.SUB_MAC,
+                                     id = '\x00\x00\x00\x00\x00\x05'))
+    lldph.tlvs.append(pkt.port_id(subtype = pkt.port_id.SUB_PORT, id = "3"))
+    lldph.tlvs.append(pkt.ttl(ttl = 120))
+    lldph.tlvs.append(pkt.end_tlv())
+    eth = pkt.ethernet(type = pkt.ethernet.LLDP_TYPE,
+                       dst = pkt.ETHERNET.NDP_MULTICAST)
+    eth.payload = lldph
+    data = eth.pack()
+    self.assertEqual(_fast_lldp(data), None)
+    disc = Discovery.__new__(Discovery)
+    self.assertEqual(disc._parse_lldp(FakePacketIn(data)), (5, 3))
+    self.assertEqual(_fast_lldp(data[:20]), None)
+
+  def test_batched_send (self):
+    s = self.sender
+    for port in (1, 2, 3):
+      s.add_port(1, port, EthAddr("02:00:00:00:01:%02x" % port),
+                 set_timer = False)
+    s.add_port(2, 1, EthAddr("02:00:00:00:02:01"), set_timer = False)
+    s._timer_handler()
+    s._timer_handler()
+    s._timer_handler()
+    con1, con2 = self.cons
+    # one buffer per switch per send, holding every port's packet
+    self.assertEqual(len(con1.sent), 2)
+    self.assertEqual(len(con2.sent), 1)
+    self.assertTrue(con1.sent[0] is con1.sent[1])
+    pos = split_packet_outs(con1.sent[0])
+    self.assertEqual([_fast_lldp(po.data) for po in pos],
+                     [(1, 1), (1, 2), (1, 3)])
+    self.assertEqual([po.actions[0].port_id for po in pos], [1, 2, 3])
+
+    # a port change rebuilds just that switch's buffer
+    buf2 = s.get_buffer(2)
+    s.update_port(1, 2, EthAddr("02:00:00:00:01:02"))
+    self.assertTrue(s.get_buffer(1) is con1.sent[0])
+    s.del_port(1, 2)
+    self.assertEqual([_fast_lldp(po.data)
+                      for po in split_packet_outs(s.get_buffer(1))],
+                     [(1, 1), (1, 3)])
+    self.assertTrue(s.get_buffer(2) is buf2)
+    s.update_port(1, 3, EthAddr("02:00:00:00:01:33"))
+    self.assertEqual(pkt.ethernet(split_packet_outs(s.get_buffer(1))[1].data).src,
+                     EthAddr("02:00:00:00:01:33"))
+
+    s.del_switch(2, set_timer = False)
+    del con1.sent[:]
+    del con2.sent[:]
+    s._timer_handler()
+    s._timer_handler()
+    self.assertEqual((len(con1.sent), len(con2.sent)), (2, 0))
+
+
+class install_flow_test (unittest.TestCase):
+  def setUp (self):
+    pox.openflow.launch()
+    self.pm = PofManager()
+    core.components['PofManager'] = self.pm
+    self.pm.new_field('DMAC', 0, 48)
+    self.pm.new_field('Eth_Type', 96, 16)
+    self.pm.database.add_switch_DB(1)
+    report = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                    counter_num = 64, meter_num = 16,
+                                    group_num = 16)
+    for table_type in range(of.OF_MAX_TABLE_TYPE):
+      report.table_resources_map[table_type] = of.ofp_table_resource(
+          table_type = table_type, table_num = 8, key_length = 160,
+          total_size = 1024)
+    self.pm.database.set_resource_report(1, report)
+    self.sw = Switch()
+    self.pm.add_switch(1, self.sw)
+
+  def tearDown (self):
+    del core.components['PofManager']
+
+  def connect (self):
+    con = FakeConnection(1)
+    self.sw.connect(con)
+    Discovery.__new__(Discovery).install_flow(con)
+    return [data for data in con.sent if isinstance(data, of.ofp_table_mod)]
+
+  def test_reconnect (self):
+    self.assertEqual(len(self.connect()), 1)
+    self.sw.disconnect()
+    # the switch DB is kept: the table is there already
+    self.assertEqual(self.connect(), [])
+    self.assertEqual(sorted(self.pm.database.get_flow_table_map(1)), [0])
+    self.assertEqual(len(self.pm.get_all_flow_entry(1, 0)), 1)
+    # the same name for a different table is refused
+    self.assertEqual(self.pm.add_flow_table(1, 'FirstEntryTable',
+        of.OF_MM_TABLE, 32, [self.pm.get_field('DMAC')[0]]), -1)
+
+
+if __name__ == '__main__':
+  unittest.main()
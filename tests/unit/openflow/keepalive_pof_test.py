@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import time
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import core
+import pox.openflow
+import pox.openflow.libpof_02 as of
+from pox.openflow import EchoReply
+from pox.openflow.keepalive_pof import Keepalive, SwitchTimeout
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.idle_time = time.time()
+    self.sent = []
+    self.disconnected = None
+
+  def send (self, msg):
+    self.sent.append(msg)
+
+  def disconnect (self, msg = 'disconnected'):
+    self.disconnected = msg
+    core.openflow._disconnect(self.dpid)
+
+
+class keepalive_test (unittest.TestCase):
+  def setUp (self):
+    pox.openflow.launch()
+    self.ka = Keepalive(interval = 1000, timeout = 1000)
+    self.ka._timer.cancel()
+    self.cons = [FakeConnection(dpid) for dpid in (1, 2)]
+    for con in self.cons:
+      core.openflow._connect(con)
+
+  def tearDown (self):
+    for con in self.cons:
+      core.openflow._disconnect(con.dpid)
+
+  def _reply (self, con, xid):
+    reply = of.ofp_echo_reply(xid = xid)
+    self.ka._handle_openflow_EchoReply(EchoReply(con, reply))
+
+  def test_echo_rtt (self):
+    self.ka._handle_timer()
+    for con in self.cons:
+      self.assertEqual(len(con.sent), 1)
+      self.assertTrue(isinstance(con.sent[0], of.ofp_echo_request))
+    xids = set(con.sent[0].xid for con in self.cons)
+    self.assertEqual(len(xids), 2)
+
+    self._reply(self.cons[0], self.cons[0].sent[0].xid)
+    self._reply(self.cons[1], self.cons[1].sent[0].xid + 1000)   # not ours
+    s = self.ka.get_stats(1)
+    self.assertEqual((s['echo_sent'], s['echo_received']), (1, 1))
+    self.assertTrue(s['rtt_last'] >= 0)
+    self.assertEqual(s['rtt_avg'], s['rtt_last'])
+    self.assertEqual(self.ka.get_rtt(2), None)
+
+    # the unanswered echo is counted as missed on the next round
+    self.ka._handle_timer()
+    self.assertEqual(self.ka.get_stats(1)['echo_missed'], 0)
+    self.assertEqual(self.ka.get_stats(2)['echo_missed'], 1)
+    self.assertEqual(len(self.ka.get_stats()), 2)
+    self.assertEqual(self.ka.get_stats(3), None)
+
+  def test_dead_switch (self):
+    timeouts = []
+    self.ka.addListener(SwitchTimeout, timeouts.append)
+    self.cons[1].idle_time -= 5000
+    self.ka._handle_timer()
+    self.assertEqual(self.cons[0].disconnected, None)
+    self.assertEqual(self.cons[1].disconnected, "timed out")
+    self.assertEqual(self.cons[1].sent, [])
+    self.assertEqual([e.dpid for e in timeouts], [2])
+    self.assertFalse(self.ka.get_stats(2)['alive'])
+    self.assertEqual(core.openflow.connections.keys(), [1])
+
+
+if __name__ == '__main__':
+  unittest.main()
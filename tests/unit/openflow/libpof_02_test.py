@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libpof_02 as of
+
+def make_flow_mod (**kw):
+  match20 = of.ofp_match20(field_name = 'DMAC', field_id = 0, offset = 0,
+                           length = 48)
+  matchx = of.ofp_matchx(match20 = match20)
+  matchx.value = '000000000001'
+  matchx.mask = 'ffffffffffff'
+
+  output = of.ofp_action_output(port_id_value_type = 0, port_id = 2)
+  apply_actions = of.ofp_instruction_apply_actions()
+  apply_actions.action_num = 1
+  apply_actions.action_list = [output]
+
+  goto = of.ofp_instruction_goto_table(next_table_id = 1)
+
+  fm = of.ofp_flow_mod(xid = 7, command = of.OFPFC_ADD, table_id = 0,
+                       counter_id = 3, cookie = 0x1122, priority = 9,
+                       index = 4, **kw)
+  fm.match_list = [matchx]
+  fm.match_field_num = 1
+  fm.instruction_list = [apply_actions, goto]
+  fm.instruction_num = 2
+  return fm
+
+
+class ofp_flow_mod_test (unittest.TestCase):
+  def _round_trip (self, fm, compact):
+    packed = fm.pack(compact = compact)
+    self.assertEqual(len(packed), len(of.ofp_flow_mod(compact = compact,
+        match_list = fm.match_list,
+        instruction_list = fm.instruction_list)))
+
+    fm2 = of.ofp_flow_mod()
+    offset, length = fm2.unpack(packed)
+    self.assertEqual(offset, len(packed))
+    self.assertEqual(length, len(packed))
+    self.assertEqual(fm2.compact, compact)
+    self.assertEqual(fm2.pack(), packed)
+    return fm2
+
+  def test_full_round_trip (self):
+    fm = make_flow_mod()
+    self.assertEqual(len(fm.pack()), of.ofp_flow_mod._MAX_LENGTH)
+    fm2 = self._round_trip(fm, False)
+    self.assertEqual(len(fm2.match_list), 1)
+    self.assertEqual(fm2.match_list[0].value[:12], '000000000001')
+    self.assertEqual(len(fm2.instruction_list), 2)
+    self.assertEqual(fm2.instruction_list[0].action_list[0].port_id, 2)
+    self.assertEqual(fm2.instruction_list[1].next_table_id, 1)
+
+  def test_compact_round_trip (self):
+    fm = make_flow_mod(compact = True)
+    fm2 = self._round_trip(fm, True)
+    self.assertEqual((fm2.xid, fm2.counter_id, fm2.cookie, fm2.priority,
+                      fm2.index), (7, 3, 0x1122, 9, 4))
+    self.assertEqual(fm2.match_list[0].field_id, 0)
+    self.assertEqual(fm2.instruction_list[0].action_list[0].port_id, 2)
+    self.assertEqual(fm2.instruction_list[1].next_table_id, 1)
+
+  def test_compact_is_smaller (self):
+    fm = make_flow_mod()
+    full = fm.pack()
+    compact = fm.pack(compact = True)
+    self.assertEqual(ord(full[11]), 0)
+    self.assertEqual(ord(compact[11]) & of.OFPFMF_COMPACT, of.OFPFMF_COMPACT)
+    self.assertTrue(len(compact) * 10 < len(full))
+
+  def test_empty_compact (self):
+    fm = of.ofp_flow_mod(compact = True)
+    self.assertEqual(len(fm.pack()), of.ofp_flow_mod._MIN_LENGTH)
+    fm2 = of.ofp_flow_mod()
+    fm2.unpack(fm.pack())
+    self.assertEqual(fm2.match_list, [])
+    self.assertEqual(fm2.instruction_list, [])
+
+
+# Reference encoders, written the way the classes packed before they moved
+# to precompiled structs, so the fast path can be checked byte for byte.
+
+def ref_matchx (m, value, mask):
+  return (struct.pack("!h", m.field_id) + struct.pack("!H", m.offset) +
+          struct.pack("!H", m.length) + of._PAD2 +
+          of.Hex2Raw(value, of.OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw() +
+          of.Hex2Raw(mask, of.OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw())
+
+def ref_instruction (i):
+  packed = struct.pack("!HH", i.type, len(i)) + of._PAD4
+  if isinstance(i, of.ofp_instruction_goto_table):
+    packed += struct.pack("!BBH", i.next_table_id, i.match_field_num,
+                          i.packet_offset) + of._PAD4
+    for m in i.match_list:
+      packed += (struct.pack("!h", m.field_id) + struct.pack("!H", m.offset) +
+                 struct.pack("!H", m.length) + of._PAD2)
+    packed += of._PAD * (of.OFP_MAX_MATCH_FIELD_NUM - len(i.match_list)) * 8
+  elif isinstance(i, of.ofp_instruction_apply_actions):
+    packed += struct.pack("!B", i.action_num) + of._PAD7
+    for a in i.action_list:
+      packed += a.pack()
+      packed += of._PAD * (of.ofp_action_base._MAX_LENGTH - len(a))
+    packed += (of._PAD * of.ofp_action_base._MAX_LENGTH *
+               (of.OFP_MAX_ACTION_NUMBER_PER_INSTRUCTION - i.action_num))
+  return packed
+
+def ref_flow_mod (fm, matchx_values):
+  packed = struct.pack("!BBHL", fm.version, fm.header_type,
+                       of.ofp_flow_mod._MAX_LENGTH, fm.xid)
+  packed += struct.pack("!BBB", fm.command, fm.match_field_num,
+                        fm.instruction_num) + of._PAD
+  packed += struct.pack("!LQQBBHHHL", fm.counter_id, fm.cookie, fm.cookie_mask,
+                        fm.table_id, fm.table_type, fm.idle_timeout,
+                        fm.hard_timeout, fm.priority, fm.index) + of._PAD4
+  for m, (value, mask) in zip(fm.match_list, matchx_values):
+    packed += ref_matchx(m, value, mask)
+  packed += of._PAD * ((of.OFP_MAX_MATCH_FIELD_NUM - len(fm.match_list)) * 40)
+  for i in fm.instruction_list:
+    p = ref_instruction(i)
+    packed += p + of._PAD * (of.ofp_instruction_base._MAX_LENGTH - len(p))
+  packed += of._PAD * ((of.OFP_MAX_INSTRUCTION_NUM - len(fm.instruction_list)) *
+                       of.ofp_instruction_base._MAX_LENGTH)
+  return packed
+
+
+class fast_codec_equivalence_test (unittest.TestCase):
+  values = [('', ''), ('0a', 'ff'), ('abc', 'fff'),
+            ('000000000001', 'ffffffffffff'),
+            ('00112233445566778899aabbccddeeff', 'f' * 32)]
+
+  def test_matchx_pack (self):
+    for value, mask in self.values:
+      for field_id in (0, 5, -1):
+        m = of.ofp_matchx(field_id = field_id, offset = 96, length = 16)
+        m.value = value
+        m.mask = mask
+        self.assertEqual(m.pack(), ref_matchx(m, value, mask))
+
+  def test_matchx_unpack (self):
+    for value, mask in self.values:
+      m = of.ofp_matchx(field_id = 3, offset = 96, length = 16)
+      raw = ref_matchx(m, value, mask)
+      m2 = of.ofp_matchx()
+      self.assertEqual(m2.unpack(raw), 40)
+      self.assertEqual((m2.field_id, m2.offset, m2.length), (3, 96, 16))
+      self.assertEqual(m2.value,
+          of.Hex2Raw(value, of.OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw().encode('hex'))
+      self.assertEqual(m2.pack(), raw)
+      m.value = value
+      m.mask = mask
+      self.assertEqual(m, m2)
+
+  def test_matchx_values (self):
+    m = of.ofp_matchx()
+    m.set_value('0800')
+    self.assertEqual(m.value, '0800')
+    self.assertEqual(m.value_raw, '\x08\x00' + of._PAD * 14)
+    m.value = [8, 0]
+    self.assertEqual(m.value, '08' + '00' * 15)
+    m.mask_raw = '\xff\xff'
+    self.assertEqual(m.mask, 'ffff' + '00' * 14)
+    self.assertRaises(RuntimeError, setattr, m, 'value', '00' * 17)
+
+  def test_match20 (self):
+    m = of.ofp_match20(field_id = -1, offset = 32, length = 8)
+    raw = m.pack()
+    self.assertEqual(raw, struct.pack("!hHH", -1, 32, 8) + of._PAD2)
+    m2 = of.ofp_match20()
+    self.assertEqual(m2.unpack(raw), 8)
+    self.assertEqual((m2.field_id, m2.offset, m2.length), (0xffff, 32, 8))
+
+  def test_instructions (self):
+    fm = make_flow_mod()
+    goto = fm.instruction_list[1]
+    goto.match_list = [of.ofp_match20(field_id = 1, offset = 0, length = 48)]
+    goto.match_field_num = 1
+    for i in fm.instruction_list:
+      self.assertEqual(i.pack(), ref_instruction(i))
+      buf = bytearray(len(i))
+      i.pack_into(buf)
+      self.assertEqual(bytes(buf), ref_instruction(i) +
+          of._PAD * (len(i) - len(ref_instruction(i))))
+      buf = bytearray(i.compact_len())
+      self.assertEqual(i.pack_into(buf, 0, True), i.compact_len())
+      self.assertEqual(bytes(buf), i.pack_compact())
+
+  def test_flow_mod (self):
+    fm = make_flow_mod()
+    values = [('000000000001', 'ffffffffffff')]
+    self.assertEqual(fm.pack(), ref_flow_mod(fm, values))
+    fm2 = of.ofp_flow_mod()
+    fm2.unpack(ref_flow_mod(fm, values))
+    self.assertEqual(fm2.pack(), ref_flow_mod(fm, values))
+
+  def test_flow_mod_pack_into (self):
+    fm = make_flow_mod()
+    buf = bytearray(3 + len(fm) + fm._wire_len(True))
+    offset = fm.pack_into(buf, 3)
+    self.assertEqual(offset, 3 + len(fm))
+    self.assertEqual(fm.pack_into(buf, offset, True), len(buf))
+    self.assertEqual(bytes(buf[3:offset]), fm.pack())
+    self.assertEqual(bytes(buf[offset:]), fm.pack(compact = True))
+
+
+class ofp_packet_in_test (unittest.TestCase):
+  frame = ('\x00\x11\x22\x33\x44\x55' + '\x66\x77\x88\x99\xaa\xbb' +
+           '\x08\x06' + '\x00' * 28)
+
+  def _packet_in (self, data):
+    raw = of.ofp_packet_in(xid = 5, total_len = len(data), reason = 1,
+                           table_id = 2, cookie = 3, device_id = 4,
+                           slot_port_id = 6, data = data).pack()
+    offset, pi = of.ofp_packet_in.unpack_new(buffer('xx' + raw), 2)
+    self.assertEqual(offset, len(raw) + 2)
+    return pi
+
+  def test_unpack (self):
+    pi = self._packet_in(self.frame)
+    self.assertEqual((pi.xid, pi.total_len, pi.reason, pi.table_id, pi.cookie,
+                      pi.device_id, pi.slot_port_id), (5, 42, 1, 2, 3, 4, 6))
+    self.assertEqual(pi.data, self.frame)
+    self.assertRaises(of.UnderrunError, of.ofp_packet_in().unpack,
+                      pi.pack()[:31])
+
+  def test_parse_once (self):
+    from pox.openflow import PacketIn
+    class con (object):
+      dpid = 1
+    pi = self._packet_in(self.frame)
+    e1 = PacketIn(con, pi)
+    e2 = PacketIn(con, pi)
+    self.assertTrue(e1.parsed is e2.parsed)
+    self.assertEqual(e1.parsed.type, 0x0806)
+    pi.data = self.frame[:12] + '\x08\x00' + self.frame[14:]
+    self.assertEqual(e2.parsed.type, 0x0800)
+
+  def test_peek (self):
+    pi = self._packet_in(self.frame)
+    self.assertEqual(pi.peek_ethertype(), 0x0806)
+    self.assertEqual(str(pi.peek_dst()), '00:11:22:33:44:55')
+    self.assertEqual(str(pi.peek_src()), '66:77:88:99:aa:bb')
+    self.assertEqual(pi._parsed, None)
+
+    tagged = self.frame[:12] + '\x81\x00\x00\x05\x88\xcc' + self.frame[14:]
+    self.assertEqual(self._packet_in(tagged).peek_ethertype(), 0x88cc)
+    short = self._packet_in(self.frame[:10])
+    self.assertEqual((short.peek_ethertype(), short.peek_dst()), (None, None))
+
+
+class ofp_packet_out_test (unittest.TestCase):
+  def test_round_trip (self):
+    for actions in ([], [of.ofp_action_output(port_id = 2),
+                         of.ofp_action_counter(counter_id = 9)]):
+      po = of.ofp_packet_out(xid = 3, in_port = 1, actions = actions,
+                             data = 'frame')
+      raw = po.pack()
+      # the header's length is always the full message
+      self.assertEqual(len(raw), of.ofp_packet_out._MAX_LENGTH)
+      self.assertEqual(struct.unpack_from("!H", raw, 2)[0], len(raw))
+      offset, po2 = of.ofp_packet_out.unpack_new(raw)
+      self.assertEqual(offset, len(raw))
+      self.assertEqual(po2, po)
+      self.assertEqual(po2.data, 'frame')
+      self.assertEqual(len(po2.actions), len(actions))
+
+
+class ofp_flow_table_test (unittest.TestCase):
+  def test_round_trip (self):
+    fields = [of.ofp_match20(field_id = 0, offset = 0, length = 48),
+              of.ofp_match20(field_id = 2, offset = 96, length = 16)]
+    ft = of.ofp_flow_table(command = of.OFPTC_ADD, table_id = 1,
+                           table_type = of.OF_EM_TABLE, match_field_num = 2,
+                           table_size = 128, key_length = 64,
+                           table_name = 'FirstEntryTable',
+                           match_field_list = fields)
+    tm = of.ofp_table_mod(xid = 2, flow_table = ft)
+    offset, tm2 = of.ofp_table_mod.unpack_new(tm.pack())
+    self.assertEqual(tm2.flow_table.table_name, 'FirstEntryTable')
+    # padding slots are not fields
+    self.assertEqual(tm2.flow_table.match_field_list, fields)
+    self.assertEqual(tm2, tm)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import random
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libpof_02 as of
+from pox.openflow.pmclassifier import *
+
+def matchx (value, mask, length = 32, field_id = 1):
+  m = of.ofp_matchx(field_id = field_id, offset = 0, length = length)
+  m.value = "%0*x" % (length // 4, value)
+  m.mask = "%0*x" % (length // 4, mask)
+  return m
+
+def entry (value, mask, priority = 0):
+  return of.ofp_flow_mod(match_list = [matchx(value, mask)],
+                         priority = priority)
+
+def prefix_mask (plen):
+  return ((1 << plen) - 1) << (32 - plen)
+
+def scan (entries, value, mask):
+  """ linear reference: every overlapping entry id """
+  return set(i for i, (v, m) in entries.iteritems()
+             if (v ^ value) & m & mask == 0)
+
+
+class classifier_test (unittest.TestCase):
+  def test_key (self):
+    m = [matchx(0xc0a80001, 0xffffff00), matchx(0x12, 0xff, 8, 2)]
+    self.assertEqual(matchx_list_to_key(m),
+                     (0xc0a8000012, 0xffffff00ff, 40))
+    self.assertEqual(prefix_length(prefix_mask(24), 32), 24)
+    self.assertEqual(prefix_length(0, 32), 0)
+    self.assertEqual(prefix_length(0xff00ff00, 32), -1)
+
+  def _differential (self, table_type, make_mask, seed):
+    rnd = random.Random(seed)
+    c = PMTableClassifier(table_type)
+    entries = {}
+    for i in range(600):
+      mask = make_mask(rnd)
+      value = rnd.getrandbits(32) & mask & 0xff0fffff
+      c.put(i, entry(value, mask, rnd.randrange(10)))
+      entries[i] = (value, mask)
+    for i in rnd.sample(range(600), 200):
+      c.remove(i)
+      del entries[i]
+    for _ in range(300):
+      mask = rnd.choice([0xffffffff, make_mask(rnd), rnd.getrandbits(32)])
+      value = rnd.getrandbits(32) & mask & 0xff0fffff
+      got = c.lookup([matchx(value, mask)])
+      self.assertEqual(len(got), len(set(got)))
+      self.assertEqual(set(got), scan(entries, value, mask))
+
+  def test_mm (self):
+    masks = [0xffffffff, 0xffff0000, 0xff00ff00, 0x0000ffff, 0]
+    self._differential(of.OF_MM_TABLE, lambda rnd: rnd.choice(masks), 1)
+
+  def test_lpm (self):
+    self._differential(of.OF_LPM_TABLE,
+                       lambda rnd: prefix_mask(rnd.choice([0, 8, 16, 24, 32])), 2)
+
+  def test_lpm_odd_masks (self):
+    masks = [prefix_mask(16), prefix_mask(24), 0xff00ff00]
+    self._differential(of.OF_LPM_TABLE, lambda rnd: rnd.choice(masks), 3)
+
+  def test_order (self):
+    c = PMTableClassifier(of.OF_LPM_TABLE)
+    c.put(1, entry(0x0a000000, prefix_mask(8)))
+    c.put(2, entry(0x0a010000, prefix_mask(16)))
+    c.put(3, entry(0x0a010200, prefix_mask(24)))
+    c.put(4, entry(0x0b000000, prefix_mask(8)))
+    self.assertEqual(c.lookup([matchx(0x0a010203, 0xffffffff)]), [3, 2, 1])
+    self.assertEqual(c.lookup([matchx(0x0a000000, prefix_mask(8))]), [3, 2, 1])
+
+    c = PMTableClassifier(of.OF_MM_TABLE)
+    c.put(1, entry(0, 0, priority = 1))
+    c.put(2, entry(0x0a000000, 0xff000000, priority = 7))
+    self.assertEqual(c.lookup([matchx(0x0a000001, 0xffffffff)]), [2, 1])
+    c.remove(2)
+    self.assertEqual(c.lookup([matchx(0x0a000001, 0xffffffff)]), [1])
+    self.assertEqual(c.lookup([matchx(1, 0xffff, 16)]), [])
+
+  def test_match (self):
+    c = PMTableClassifier(of.OF_LPM_TABLE)
+    self.assertEqual(c.match(0x0a010203), None)
+    c.put(1, entry(0x0a000000, prefix_mask(8), priority = 9))
+    c.put(2, entry(0x0a010000, prefix_mask(16)))
+    c.put(3, entry(0x0a010200, 0xffff00ff))
+    self.assertEqual(c.match(0x0a010203), 2)
+    self.assertEqual(c.match(0x0a010200), 3)
+    self.assertEqual(c.match(0x0b010203), None)
+
+    c = PMTableClassifier(of.OF_MM_TABLE)
+    c.put(1, entry(0, 0, priority = 1))
+    c.put(2, entry(0x0a000000, 0xff000000, priority = 7))
+    self.assertEqual(c.match(0x0a000001), 2)
+    self.assertEqual(c.match(0x0b000001), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
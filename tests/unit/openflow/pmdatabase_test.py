@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import random
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.pmdatabase import IDAllocator, DataTable, PMFlowTableDB
+
+class IDAllocatorTest (unittest.TestCase):
+  def test_lowest_free_first (self):
+    a = IDAllocator(1)
+    self.assertEqual([a.alloc() for _ in range(5)], [1, 2, 3, 4, 5])
+    self.assertTrue(a.free(4))
+    self.assertTrue(a.free(2))
+    self.assertFalse(a.free(2))     # double free
+    self.assertFalse(a.free(9))     # never allocated
+    self.assertFalse(a.free(0))     # below start
+    self.assertEqual(a.get_free_ids(), [2, 4])
+    self.assertEqual(a.used_size(), 3)
+    self.assertEqual([a.alloc() for _ in range(3)], [2, 4, 6])
+    self.assertFalse(a.is_allocated(7))
+    self.assertTrue(a.is_allocated(6))
+
+  def test_alloc_many_and_max (self):
+    a = IDAllocator(0, max_number = 5)
+    self.assertEqual(a.alloc_many(3), [0, 1, 2])
+    a.free(1)
+    self.assertEqual(a.alloc_many(4), [1, 3, 4, 5])
+    self.assertEqual(a.alloc(), -1)
+    self.assertEqual(a.alloc_many(2), [])
+
+  def test_reserve (self):
+    a = IDAllocator(1, max_number = 10)
+    self.assertTrue(a.reserve(4))
+    self.assertEqual(a.get_free_ids(), [1, 2, 3])   # skipped ids are free
+    self.assertFalse(a.reserve(4))
+    self.assertTrue(a.reserve(2))
+    self.assertFalse(a.reserve(11))
+    self.assertFalse(a.reserve(0))
+    self.assertEqual([a.alloc() for _ in range(3)], [1, 3, 5])
+
+  def test_matches_sorted_free_list (self):
+    # the behaviour the old append/sort/pop(0) free lists had
+    rnd = random.Random(7)
+    a = IDAllocator(0)
+    used = set()
+    free_list = []
+    next_no = 0
+    for _ in range(5000):
+      if used and rnd.random() < 0.45:
+        index = rnd.choice(list(used))
+        used.remove(index)
+        a.free(index)
+        free_list.append(index)
+        free_list.sort()
+      else:
+        if free_list:
+          expected = free_list.pop(0)
+        else:
+          expected = next_no
+          next_no += 1
+        self.assertEqual(a.alloc(), expected)
+        used.add(expected)
+
+  def test_data_table (self):
+    t = DataTable(1)
+    t.set_max_number(3)
+    ids = [t.alloc() for _ in range(4)]
+    self.assertEqual(ids, [1, 2, 3, -1])
+    for i in ids[:3]:
+      t.put(i, str(i))
+    self.assertEqual(t.remove(2), '2')
+    self.assertEqual(t.alloc(), 2)
+
+  def test_flow_table_db (self):
+    db = PMFlowTableDB()
+    self.assertEqual(db.get_new_flow_entry_ids(3), [0, 1, 2])
+    for i in range(3):
+      db.flow_entries_map[i] = i
+    db.delete_flow_entry(1)
+    self.assertEqual(db.get_new_flow_entry_id(), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
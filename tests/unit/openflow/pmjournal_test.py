@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow
+import pox.openflow.libpof_02 as of
+from pox.openflow import ResourceReport
+from pox.openflow.pofmanager import PofManager, Switch
+from pox.openflow.pmjournal import PMJournal, load_state, FSYNC_NEVER
+
+SWITCH_ID = 1
+
+class RecordingConnection (object):
+  def __init__ (self):
+    self.dpid = SWITCH_ID
+    self.sent = []
+
+  def send (self, data):
+    if type(data) is not bytes:
+      data = data.pack()
+    self.sent.append(data)
+
+def split_all (raw):
+  """ Splits a buffer into POF messages, returning (header_type, data) """
+  msgs = []
+  offset = 0
+  while offset < len(raw):
+    header_type, length = struct.unpack_from("!xBH", raw, offset)
+    msgs.append((header_type, raw[offset:offset + length]))
+    offset += length
+  return msgs
+
+
+class pmjournal_test (unittest.TestCase):
+  def setUp (self):
+    self.dir = tempfile.mkdtemp()
+    self.file_name = os.path.join(self.dir, 'Database.db')
+
+  def tearDown (self):
+    shutil.rmtree(self.dir)
+
+  def start (self, table_num = 8):
+    """ A PofManager on the database file, its switch connected """
+    pox.openflow.launch()
+    pm = PofManager()
+    pm.open_database(self.file_name, FSYNC_NEVER)
+    self.con = RecordingConnection()
+    sw = Switch()
+    sw.connect(self.con)
+    pm.add_switch(SWITCH_ID, sw)
+    pm.database.add_switch_DB(SWITCH_ID)
+    report = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                    counter_num = 1024, meter_num = 16,
+                                    group_num = 16)
+    for table_type in range(of.OF_MAX_TABLE_TYPE):
+      report.table_resources_map[table_type] = of.ofp_table_resource(
+          table_type = table_type, table_num = table_num, key_length = 160,
+          total_size = 1024)
+    self.changed = []
+    pm.addListenerByName("FlowTableChanged",
+                         lambda event: self.changed.append(event.global_table_id))
+    pm._handle_ResourceReport(ResourceReport(self.con, report))
+    return pm
+
+  def fill (self, pm):
+    field_id = pm.new_field('DMAC', 0, 48)
+    field = pm.get_field(field_id)
+    pm.add_protocol('ETH', [field])
+    pm.new_metadata_field('PORT', 32, 16)
+    first = pm.add_flow_table(SWITCH_ID, 'FirstEntryTable', of.OF_MM_TABLE,
+                              128, [field])
+    em = pm.add_flow_table(SWITCH_ID, 'MacTable', of.OF_EM_TABLE, 128,
+                           [field])
+    entries = []
+    for i in range(6):
+      matchx = pm.new_matchx(field, "%012x" % (i,), 'ff' * 6)
+      action = pm.new_action_output(0, 0, 0, 0, i + 1)
+      entries.append(([matchx], [pm.new_ins_apply_actions([action])], i))
+    ids = pm.add_flow_entries(SWITCH_ID, em, entries)
+    pm.delete_flow_entries(SWITCH_ID, em, ids[:2])
+    entry = entries[3]
+    pm.modify_flow_entry(SWITCH_ID, em, ids[3], entry[0], entry[1], 9, False)
+    pm.add_flow_entry(SWITCH_ID, first, *entries[0][:2])
+    pm.allocate_counter(SWITCH_ID)
+    pm.add_meter_entry(SWITCH_ID, 100)
+    return em
+
+  def state (self, pm, global_table_id):
+    entries = {}
+    for entry_id, fm in pm.database.get_flow_entries_map(
+        SWITCH_ID, global_table_id).items():
+      entries[entry_id] = (fm.priority, fm.counter_id,
+                           [m.pack() for m in fm.match_list],
+                           [(m.field_name, m.field_id) for m in fm.match_list],
+                           fm.instruction_list[0].action_list[0].port_id)
+    counters = [c.counter_id for c in pm.database.get_all_counters(SWITCH_ID)]
+    return (entries, counters, pm.get_flow_table_id(SWITCH_ID, 'MacTable'),
+            pm.get_flow_table(SWITCH_ID, global_table_id).match_field_list,
+            [f.field_name for f in pm.get_all_field()],
+            [f.field_name for f in pm.get_protocol_by_name('ETH').field_list],
+            pm.database.get_metadata_field('PORT').offset,
+            pm.database.get_meter(SWITCH_ID, 1).rate)
+
+  def test_restore (self):
+    pm = self.start()
+    self.assertEqual(self.changed, [])
+    self.assertEqual(self.con.sent, [])
+    em = self.fill(pm)
+    before = self.state(pm, em)
+    pm.close_database()
+
+    pm = self.start()
+    self.assertEqual(sorted(self.changed), [0, em])
+    self.assertEqual(self.state(pm, em), before)
+    # tables, the counter no entry holds and the meter, then the entries
+    msgs = split_all(self.con.sent[0])
+    self.assertEqual([t for t, data in msgs],
+                     [of.OFPT_TABLE_MOD] * 2 + [of.OFPT_COUNTER_MOD,
+                                                of.OFPT_METER_MOD])
+    msgs = split_all(self.con.sent[1])
+    self.assertEqual([t for t, data in msgs],
+                     [of.OFPT_FLOW_MOD] * 5 + [of.OFPT_BARRIER_REQUEST])
+    for t, data in msgs[:-1]:
+      fm = of.ofp_flow_mod()
+      fm.unpack(data)
+      self.assertEqual(fm.command, of.OFPFC_ADD)
+
+    # ids go on from where they were
+    self.assertEqual(pm.add_flow_entry(SWITCH_ID, em, *self.entry(pm, 7)), 0)
+    self.assertEqual(pm.new_field('SMAC', 48, 48), 1)
+    pm.save_all_data_into_file(self.file_name)
+    pm.close_database()
+    journal = PMJournal(self.file_name)
+    state = journal.load()
+    journal.close()
+    self.assertEqual(journal.records, 0)   # all in the snapshot
+    self.assertEqual(len(state.switches[SWITCH_ID].entries[em]), 5)
+
+  def entry (self, pm, mac):
+    field = pm.get_field(0)
+    matchx = pm.new_matchx(field, "%012x" % (mac,), 'ff' * 6)
+    return [matchx], [pm.new_ins_apply_actions([pm.new_action_drop(0)])]
+
+  def test_moved_tables (self):
+    pm = self.start()
+    em = self.fill(pm)
+    pm.close_database()
+    pm = self.start(table_num = 4)   # the EM tables now start at 8, not 16
+    new_em = pm.get_flow_table_id(SWITCH_ID, 'MacTable')
+    self.assertEqual(new_em, em - 8)
+    self.assertEqual(len(pm.get_all_flow_entry(SWITCH_ID, new_em)), 4)
+    pm.close_database()
+    state = load_state(self.file_name)
+    self.assertEqual(sorted(state.switches[SWITCH_ID].tables), [0, new_em])
+
+  def test_torn_and_stale (self):
+    pm = self.start()
+    em = self.fill(pm)
+    pm.close_database()
+    journal_name = self.file_name + '.journal'
+    with open(journal_name, 'ab') as f:
+      f.write('\x12\x00\x00\x01\x00junk')   # a torn record
+    size = os.path.getsize(journal_name)
+    pm = self.start()
+    self.assertEqual(len(pm.get_all_flow_entry(SWITCH_ID, em)), 4)
+    self.assertTrue(os.path.getsize(journal_name) < size)   # cut off
+    pm.save_all_data_into_file(self.file_name)
+    entry_id = pm.add_flow_entry(SWITCH_ID, em, *self.entry(pm, 7))
+    pm.close_database()
+    stale = open(journal_name, 'rb').read()
+    pm = self.start()
+    pm.delete_flow_entry(SWITCH_ID, em, entry_id)
+    pm.save_all_data_into_file(self.file_name)
+    pm.close_database()
+    # a journal of an older generation is not replayed over the snapshot
+    with open(journal_name, 'wb') as f:
+      f.write(stale)
+    state = load_state(self.file_name)
+    self.assertEqual(len(state.switches[SWITCH_ID].entries[em]), 4)
+
+
+if __name__ == '__main__':
+  unittest.main()
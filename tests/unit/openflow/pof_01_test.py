@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import socket
+from errno import EAGAIN, EPIPE, ECONNABORTED, EINTR, EMFILE
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.pof_01 as pof_01
+import pox.openflow.libpof_02 as of
+from pox.lib.revent import EventMixin
+from pox.openflow import SendQueueHigh, SendQueueLow
+
+class ChunkSocket (object):
+  """ Hands out a byte stream in fixed size pieces through recv_into """
+  def __init__ (self, data, chunk):
+    self.data = data
+    self.chunk = chunk
+    self.offset = 0
+
+  def recv_into (self, buf, nbytes = 0):
+    n = min(self.chunk, nbytes or len(buf), len(buf),
+            len(self.data) - self.offset)
+    buf[:n] = self.data[self.offset:self.offset + n]
+    self.offset += n
+    return n
+
+class ReadConnection (pof_01.Connection):
+  def send (self, data):
+    pass
+
+class SendSocket (object):
+  """ Takes up to room bytes, then blocks (EAGAIN) until given more """
+  def __init__ (self, room = 1 << 20):
+    self.room = room
+    self.sent = []
+    self.error = None
+
+  def send (self, data):
+    if self.error:
+      raise socket.error(self.error, "error")
+    if self.room == 0:
+      raise socket.error(EAGAIN, "would block")
+    n = min(self.room, len(data))
+    self.sent.append(bytes(data[:n]))
+    self.room -= n
+    return n
+
+  def shutdown (self, how):
+    pass
+
+  def close (self):
+    pass
+
+class RecordingNexus (EventMixin):
+  _eventMixin_events = set([SendQueueHigh, SendQueueLow])
+
+  def _disconnect (self, dpid):
+    pass
+
+def make_stream ():
+  msgs = []
+  for i in range(5):
+    msgs.append(of.ofp_packet_in(xid = i, total_len = 1500,
+                                 data = chr(i) * 1500))
+    msgs.append(of.ofp_echo_reply(xid = 100 + i, body = 'x' * i))
+    msgs.append(of.ofp_counter_reply(xid = 200 + i))
+  return msgs, b''.join(m.pack() for m in msgs)
+
+
+class connection_read_test (unittest.TestCase):
+  def setUp (self):
+    self.saved = list(pof_01.handlers)
+    self.handled = []
+    for t in range(len(pof_01.handlers)):
+      pof_01.handlers[t] = lambda con, msg: self.handled.append(msg)
+
+  def tearDown (self):
+    pof_01.handlers[:] = self.saved
+
+  def _read_all (self, chunk, read_size):
+    msgs, stream = make_stream()
+    con = ReadConnection(ChunkSocket(stream, chunk))
+    con.read_size = read_size
+    while con.read():
+      pass
+    self.assertEqual(self.handled, msgs)
+    self.assertEqual([type(m.data) for m in self.handled[::3]], [str] * 5)
+    return con
+
+  def test_large_reads (self):
+    con = self._read_all(1 << 20, 65536)
+    self.assertEqual((con.buf_start, con.buf_end), (0, 0))
+
+  def test_split_messages (self):
+    # messages straddle reads; the unparsed tail moves to the front
+    for chunk in (1, 7, 100, 1531):
+      del self.handled[:]
+      self._read_all(chunk, 64)
+
+  def test_buffer_grows (self):
+    # a packet_in larger than the buffer makes it grow instead of looping
+    con = ReadConnection(ChunkSocket(b'', 1))
+    con.read_size = 16
+    con.buf = bytearray(16)
+    msgs, stream = make_stream()
+    con.sock = ChunkSocket(stream, 16)
+    while con.read():
+      pass
+    self.assertEqual(self.handled, msgs)
+    self.assertTrue(len(con.buf) >= 1532)
+
+
+class connection_send_test (unittest.TestCase):
+  def setUp (self):
+    self.sock = SendSocket()
+    self.con = pof_01.Connection(self.sock)
+    self.con.ofnexus = RecordingNexus()
+    self.con.send_queue_high = 1000
+    self.con.send_queue_low = 200
+    self.con.send_queue_limit = 10000
+    self.con.send_chunk_size = 300
+    self.events = []
+    self.con.ofnexus.addListenerByName("SendQueueHigh",
+        lambda event: self.events.append(('high', event.queued)))
+    self.con.ofnexus.addListenerByName("SendQueueLow",
+        lambda event: self.events.append(('low', event.queued)))
+    self.hello = self.sock.sent[0]   # from the constructor
+
+  def test_partial_and_queued (self):
+    self.assertEqual(len(self.sock.sent), 1)
+    self.sock.room = 5
+    msgs = [of.ofp_echo_request(xid = i, body = 'x' * 20).pack()
+            for i in range(3)]
+    for m in msgs:
+      self.con.send(m)
+    # the first went out in part, the others wait behind it
+    self.assertEqual(self.sock.sent[1], msgs[0][:5])
+    self.assertEqual(len(self.con.send_queue), 3)
+    self.assertEqual(self.con.send_queue_bytes, 3 * len(msgs[0]) - 5)
+    self.con._flush()                       # still full: nothing happens
+    self.assertEqual(len(self.sock.sent), 2)
+    self.sock.room = 1000
+    self.con._flush()
+    # the rest of the first and the two after it, joined in one send
+    self.assertEqual(self.sock.sent[2], msgs[0][5:] + msgs[1] + msgs[2])
+    self.assertEqual(b''.join(self.sock.sent), self.hello + b''.join(msgs))
+    self.assertEqual(len(self.con.send_queue), 0)
+    self.assertEqual((self.con.send_offset, self.con.send_queue_bytes), (0, 0))
+
+  def test_chunks (self):
+    self.sock.room = 0
+    msgs = [chr(i) * 100 for i in range(7)] + ['z' * 700]
+    for m in msgs:
+      self.con.send(m)
+    self.sock.room = 1 << 20
+    self.con._flush()
+    # small ones up to send_chunk_size at a time, the large one on its own
+    self.assertEqual([len(d) for d in self.sock.sent[1:]],
+                     [300, 300, 100, 700])
+    self.assertEqual(b''.join(self.sock.sent[1:]), b''.join(msgs))
+
+  def test_watermarks (self):
+    self.sock.room = 0
+    for i in range(12):
+      self.con.send('x' * 100)
+    self.assertEqual(self.events, [('high', 1100)])
+    self.assertTrue(self.con.send_queue_full)
+    self.sock.room = 850
+    self.con._flush()
+    self.assertEqual(self.events, [('high', 1100)])   # 350 is not below 200
+    self.sock.room = 200
+    self.con._flush()
+    self.assertEqual(self.events, [('high', 1100), ('low', 150)])
+    self.assertFalse(self.con.send_queue_full)
+
+  def test_limit_and_errors (self):
+    self.sock.room = 0
+    self.con.send('x' * 10001)
+    self.assertTrue(self.con.disconnected)
+    self.assertEqual(self.con.send_queue_bytes, 0)
+    self.con.send('x')                      # dropped
+    self.assertEqual(len(self.con.send_queue), 0)
+
+    con = pof_01.Connection(SendSocket(room = 0))
+    con.ofnexus = RecordingNexus()
+    con.send('x' * 10)
+    con.sock.error = EPIPE
+    con._flush()
+    self.assertTrue(con.disconnected)
+
+
+class ScriptedListener (object):
+  """ accept() gives the next of results: a socket, or an errno to raise """
+  def __init__ (self, results):
+    self.results = list(results)
+
+  def accept (self):
+    r = self.results.pop(0)
+    if isinstance(r, int):
+      raise socket.error(r, "error")
+    return r, ('127.0.0.1', 40000)
+
+
+class accept_test (unittest.TestCase):
+  def test_errors (self):
+    # an aborted connect or a signal skips one; the drain goes on
+    listener = ScriptedListener(['a', ECONNABORTED, 'b', EINTR, 'c', EAGAIN])
+    self.assertEqual(pof_01._accept_pending(listener), ['a', 'b', 'c'])
+    self.assertEqual(pof_01._accept_pending(ScriptedListener([10035])), [])
+    # out of descriptors: this drain stops, nothing is raised
+    listener = ScriptedListener(['a', EMFILE, 'b', EAGAIN])
+    self.assertEqual(pof_01._accept_pending(listener), ['a'])
+    self.assertEqual(pof_01._accept_pending(listener), ['b'])
+
+
+if __name__ == '__main__':
+  unittest.main()
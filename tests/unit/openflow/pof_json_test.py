@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import json
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libpof_02 as of
+import pox.openflow.pof_json as pof_json
+from pox.lib.addresses import EthAddr
+
+DMAC = of.ofp_match20(field_name = "DMAC", field_id = 0, offset = 0,
+                      length = 48)
+TTL = of.ofp_match20(field_name = "TTL", field_id = 9, offset = 176,
+                     length = 8)
+
+def through_json (d):
+  return json.loads(json.dumps(d))
+
+def all_actions ():
+  mx = of.ofp_matchx(match20 = DMAC, value = "0a0b0c0d0e0f",
+                     mask = "ffffffffffff")
+  return [of.ofp_action_output(port_id = 2),
+          of.ofp_action_output(port_id_value_type = 1, port_id_field = TTL),
+          of.ofp_action_set_field(field_setting = mx),
+          of.ofp_action_set_field_from_metadata(field_setting = TTL,
+                                                metadata_offset = 32),
+          of.ofp_action_modify_field(match_field = TTL, increment = 0xffff),
+          of.ofp_action_add_field(field_id = 3, field_position = 96,
+                                  field_length = 16, field_value = "8100"),
+          of.ofp_action_delete_field(tag_position = 96, tag_length_value = 32),
+          of.ofp_action_calculate_checksum(checksum_position = 10,
+                                           checksum_length = 16,
+                                           calc_length = 160),
+          of.ofp_action_group(group_id = 4),
+          of.ofp_action_drop(reason = 1),
+          of.ofp_action_packetin(reason = 1),
+          of.ofp_action_counter(counter_id = 7)]
+
+def all_instructions ():
+  actions = all_actions()
+  return [of.ofp_instruction_apply_actions(action_num = len(actions),
+                                           action_list = actions),
+          of.ofp_instruction_goto_table(next_table_id = 1,
+                                        match_field_num = 1,
+                                        match_list = [TTL]),
+          of.ofp_instruction_write_metadata(metadata_offset = 32,
+                                            write_length = 16,
+                                            value = "beef"),
+          of.ofp_instruction_write_metadata_from_packet(metadata_offset = 32,
+                                                        write_length = 48),
+          of.ofp_instruction_meter(meter_id = 3),
+          of.ofp_instruction_goto_direct_table(next_table_id = 2,
+                                               index_value = 5),
+          of.ofp_instruction_calculate_field(calc_type = 1, des_field = TTL,
+                                             src_value = 1)]
+
+
+class pof_json_test (unittest.TestCase):
+  def test_flow_mod (self):
+    mx = of.ofp_matchx(match20 = DMAC, value = "0a0b0c0d0e0f",
+                       mask = "ffffffffffff")
+    ins = all_instructions()
+    fm = of.ofp_flow_mod(match_field_num = 1, instruction_num = len(ins),
+                         match_list = [mx], instruction_list = ins,
+                         priority = 5, index = 9, counter_id = 2,
+                         table_type = of.OF_MM_TABLE, table_id = 1)
+    d = through_json(pof_json.flow_mod_to_dict(fm))
+    self.assertEqual(d['match_list'][0]['value'][:12], "0a0b0c0d0e0f")
+    self.assertEqual(d['instruction_list'][0]['type'], "APPLY_ACTIONS")
+    self.assertEqual(d['instruction_list'][0]['action_list'][0]['type'],
+                     "OFPAT_OUTPUT")
+    fm2 = pof_json.dict_to_flow_mod(d)
+    fm2.xid = fm.xid
+    self.assertEqual(fm2.pack(), fm.pack())
+    self.assertEqual(through_json(pof_json.flow_mod_to_dict(fm2)), d)
+
+  def test_every_class (self):
+    objs = all_actions() + all_instructions()
+    objs.append(of.ofp_instruction_conditional_jmp(field1 = TTL,
+                                                   field2_value = 3,
+                                                   offset1_value = 2))
+    objs.append(of.ofp_flow_table(table_id = 1, table_type = of.OF_MM_TABLE,
+                                  match_field_num = 2, table_size = 128,
+                                  key_length = 56, table_name = "FirstTable",
+                                  match_field_list = [DMAC, TTL]))
+    objs.append(of.ofp_counter(command = 3, counter_id = 5,
+                               counter_value = 1 << 40, byte_value = 99))
+    port = of.ofp_phy_port(port_id = 3, device_id = 1,
+                           hw_addr = EthAddr("02:00:00:00:00:03"),
+                           name = "eth3", curr_speed = 1000, of_enable = 1)
+    objs.append(of.ofp_port_status(reason = of.OFPPR_MODIFY, desc = port))
+    for obj in objs:
+      d = through_json(pof_json.pof_to_dict(obj))
+      base = obj.__class__
+      if isinstance(obj, of.ofp_action_base): base = of.ofp_action_base
+      if isinstance(obj, of.ofp_instruction_base):
+        base = of.ofp_instruction_base
+      obj2 = pof_json.dict_to_pof(d, base)
+      self.assertTrue(type(obj2) is type(obj), d)
+      if hasattr(obj, 'xid'): obj2.xid = obj.xid
+      self.assertEqual(obj2.pack(), obj.pack(), d)
+    self.assertEqual(d['desc']['hw_addr'], "02:00:00:00:00:03")
+    self.assertEqual(d['desc']['name'], "eth3")
+
+  def test_defaults_and_names (self):
+    # counts follow the lists, enums and types may be given by name
+    fm = pof_json.dict_to_flow_mod({
+      'table_type' : 'OF_MM_TABLE',
+      'command' : 'OFPFC_MODIFY',
+      'match_list' : [{'field_id' : 0, 'length' : 48, 'value' : "01"}],
+      'instruction_list' : [
+        {'type' : 'OFPIT_APPLY_ACTIONS',
+         'action_list' : [{'type' : 'output', 'port_id' : 1},
+                          {'type' : of.OFPAT_DROP}]}]})
+    self.assertEqual(fm.table_type, of.OF_MM_TABLE)
+    self.assertEqual(fm.command, of.OFPFC_MODIFY)
+    self.assertEqual((fm.match_field_num, fm.instruction_num), (1, 1))
+    self.assertEqual(fm.priority, of.OFP_DEFAULT_PRIORITY)
+    apply = fm.instruction_list[0]
+    self.assertEqual(apply.action_num, 2)
+    self.assertTrue(isinstance(apply.action_list[1], of.ofp_action_drop))
+    t = pof_json.dict_to_flow_table({'match_field_list' :
+                                     [pof_json.match20_to_dict(DMAC),
+                                      pof_json.match20_to_dict(TTL)]})
+    self.assertEqual((t.match_field_num, t.key_length), (2, 56))
+
+  def test_errors (self):
+    self.assertRaises(ValueError, pof_json.dict_to_action, {'type' : 'nope'})
+    self.assertRaises(ValueError, pof_json.dict_to_action, {'port_id' : 1})
+    self.assertRaises(ValueError, pof_json.dict_to_instruction,
+                      {'type' : 99})
+    self.assertRaises(ValueError, pof_json.dict_to_matchx, {'value' : 'xyz'})
+    self.assertRaises(ValueError, pof_json.dict_to_flow_mod,
+                      {'match_list' : {}})
+    self.assertRaises(ValueError, pof_json.dict_to_flow_mod,
+                      {'command' : 'OFPFC_BOGUS'})
+    self.assertRaises(ValueError, pof_json.dict_to_counter,
+                      {'counter_id' : "5"})
+    self.assertRaises(ValueError, pof_json.pof_to_dict, of.ofp_hello())
+
+  def test_iter_json_list (self):
+    tables = [of.ofp_counter(counter_id = i) for i in range(10)]
+    for batch in (1, 3, 10, 100):
+      pieces = list(pof_json.iter_json_list(tables, batch = batch))
+      self.assertEqual([d['counter_id'] for d in json.loads("".join(pieces))],
+                       range(10))
+    self.assertEqual("".join(pof_json.iter_json_list([])), "[]")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+from StringIO import StringIO
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+import pox.openflow.libpof_02 as of
+from pox.lib.socketcapture import PCapWriter
+from pox.openflow.pof_trace import TraceReader, TraceStats
+
+
+def capture (writes):
+  """
+  A pcap of (outgoing, data) writes, outgoing being controller to switch
+  """
+  f = StringIO()
+  w = PCapWriter(f, local_addrs = (None, None, 6633),
+                 remote_addrs = (None, None, 40000))
+  for outgoing, data in writes:
+    if outgoing is None:
+      # replay the last data of the switch's side: a retransmission
+      w._s_to_c.next.next.seq -= len(data)
+      outgoing = False
+    w.write(outgoing, data)
+  f.seek(0)
+  return f
+
+
+class pof_trace_test (unittest.TestCase):
+  def test_messages (self):
+    hello = of.ofp_hello().pack()
+    fm = of.ofp_flow_mod(command = of.OFPFC_MODIFY).pack()
+    pi = of.ofp_packet_in(total_len = 20, data = "x" * 20).pack()
+    echo = of.ofp_echo_request().pack()
+    f = capture([(False, hello),
+                 (True, fm[:50]),          # a flow_mod over two segments
+                 (True, fm[50:] + echo),
+                 (False, pi),
+                 (None, pi),               # retransmitted
+                 (False, pi[:5]),
+                 (False, pi[5:])])
+    reader = TraceReader(f)
+    msgs = [(switch, to_controller, raw)
+            for t, switch, to_controller, raw in reader]
+    switch = ("1.1.1.1", 40000)
+    self.assertEqual(msgs, [(switch, True, hello), (switch, False, fm),
+                            (switch, False, echo), (switch, True, pi),
+                            (switch, True, pi)])
+    self.assertEqual(reader.records, 7)
+    self.assertEqual(reader.retransmits, 1)
+    self.assertEqual(reader.gaps, 0)
+
+  def test_stats (self):
+    fms = [of.ofp_flow_mod(command = c).pack()
+           for c in (of.OFPFC_ADD, of.OFPFC_ADD, of.OFPFC_DELETE)]
+    bad = of.ofp_echo_request().pack()
+    bad = bad[0] + chr(of.OFPT_FLOW_MOD) + bad[2:]   # can't unpack
+    f = capture([(True, fm) for fm in fms] + [(True, bad)])
+    s = TraceStats().add_all(TraceReader(f)).summary()
+    self.assertEqual(s['messages'], 4)
+    self.assertEqual(s['switches'], 1)
+    self.assertEqual(len(s['types']), 1)
+    t = s['types'][0]
+    self.assertEqual((t['type'], t['direction'], t['count']),
+                     ("OFPT_FLOW_MOD", "to_switch", 4))
+    self.assertEqual((t['size_min'], t['size_max']), (8, len(fms[0])))
+    self.assertEqual(s['unpack_errors'], {"OFPT_FLOW_MOD" : 1})
+    self.assertEqual(s['flow_mods']['by_command'],
+                     {"OFPFC_ADD" : 2, "OFPFC_DELETE" : 1})
+    self.assertTrue(s['flow_mods']['peak_per_sec'] >= 1)
+
+  def test_truncated (self):
+    data = capture([(False, of.ofp_hello().pack())] * 3).getvalue()
+    reader = TraceReader(StringIO(data[:-10]))
+    self.assertEqual(len(list(reader)), 2)
+    self.assertRaises(RuntimeError, TraceReader, StringIO("nope" * 10))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,663 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import os.path
+import struct
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.core import core
+import pox.openflow
+import pox.openflow.libpof_02 as of
+from pox.openflow import CounterReply, BarrierIn, ErrorIn
+from pox.openflow import ConnectionUp, ConnectionDown, SendQueueLow
+import pox.openflow.pofmanager as pofmanager
+from pox.openflow.pofmanager import PofManager, Switch, FLOWENTRYID_INVALID
+from pox.openflow.pofmanager import FLOWTABLEID_INVALID
+from pox.openflow.pofmanager import CounterStatsReceived
+
+SWITCH_ID = 1
+
+class RecordingConnection (object):
+  """ Stands in for pof_01.Connection, keeping whatever is sent """
+  def __init__ (self, compact_flow_mod = False):
+    self.dpid = SWITCH_ID
+    self.compact_flow_mod = compact_flow_mod
+    self.sent = []
+
+  def send (self, data):
+    if type(data) is not bytes:
+      data = data.pack()
+    self.sent.append(data)
+
+class RecordingTimer (object):
+  """ Stands in for recoco's Timer; the test calls back by hand """
+  timers = []
+
+  def __init__ (self, interval, callback, recurring = False):
+    self.interval = interval
+    self.callback = callback
+    self.cancelled = False
+    RecordingTimer.timers.append(self)
+
+  def cancel (self):
+    self.cancelled = True
+
+def unpack_all (raw):
+  """ Splits a buffer into POF messages, returning unpacked objects """
+  msgs = []
+  offset = 0
+  while offset < len(raw):
+    header = of.ofp_header()
+    header.unpack(raw, offset)
+    msg = of._message_type_to_class[header.header_type]()
+    offset = msg.unpack(raw, offset)[0]
+    msgs.append(msg)
+  return msgs
+
+def make_pof_manager (connection):
+  pox.openflow.launch()
+  pm = PofManager()
+  pm.database.add_switch_DB(SWITCH_ID)
+  report = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                  counter_num = 1024, meter_num = 16,
+                                  group_num = 16)
+  for table_type in range(of.OF_MAX_TABLE_TYPE):
+    report.table_resources_map[table_type] = of.ofp_table_resource(
+        table_type = table_type, table_num = 8, key_length = 160,
+        total_size = 1024)
+  pm.database.set_resource_report(SWITCH_ID, report)
+  sw = Switch()
+  sw.connect(connection)
+  pm.add_switch(SWITCH_ID, sw)
+  return pm
+
+
+class pof_manager_case (unittest.TestCase):
+  """ One switch with an MM table matching on DMAC """
+  def setUp (self):
+    self.con = RecordingConnection()
+    self.pm = make_pof_manager(self.con)
+    self.field = of.ofp_match20(field_name = 'DMAC', field_id = 0, offset = 0,
+                                length = 48)
+    self.table_id = self.pm.add_flow_table(SWITCH_ID, 'FirstEntryTable',
+                                           of.OF_MM_TABLE, 128, [self.field])
+    del self.con.sent[:]
+
+  def _entry (self, mac, port):
+    matchx = self.pm.new_matchx(self.field, "%012x" % (mac,), 'ff' * 6)
+    action = self.pm.new_action_output(0, 0, 0, 0, port)
+    return ([matchx], [self.pm.new_ins_apply_actions([action])], 5, False)
+
+
+class batch_flow_entry_test (pof_manager_case):
+  def test_add_single_write (self):
+    entries = [self._entry(i, i + 1) for i in range(10)]
+    entries.insert(3, ([], []))   # rejected: MM tables need a match
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id, entries,
+                                   barrier = True)
+    self.assertEqual(len(self.con.sent), 1)
+    self.assertEqual(ids[3], FLOWENTRYID_INVALID)
+    self.assertEqual([i for i in ids if i != FLOWENTRYID_INVALID], range(10))
+
+    msgs = unpack_all(self.con.sent[0])
+    self.assertEqual(len(msgs), 11)
+    self.assertTrue(isinstance(msgs[-1], of.ofp_barrier_request))
+    for n, fm in enumerate(msgs[:-1]):
+      self.assertTrue(isinstance(fm, of.ofp_flow_mod))
+      self.assertEqual(fm.index, n)
+      self.assertEqual(fm.priority, 5)
+      self.assertEqual(fm.instruction_list[0].action_list[0].port_id, n + 1)
+      self.assertEqual(fm, self.pm.get_flow_entry(SWITCH_ID, self.table_id, n))
+
+  def test_add_compact (self):
+    self.con.compact_flow_mod = True
+    self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                             [self._entry(i, 1) for i in range(4)])
+    msgs = unpack_all(self.con.sent[0])
+    self.assertEqual(len(msgs), 4)
+    self.assertTrue(all(fm.compact for fm in msgs))
+    self.assertEqual(len(self.con.sent[0]), sum(len(fm) for fm in msgs))
+
+  def test_modify_and_delete (self):
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                   [self._entry(i, 1) for i in range(4)])
+    del self.con.sent[:]
+    matchx_list, instruction_list, priority, counter_enable = self._entry(9, 7)
+    results = self.pm.modify_flow_entries(SWITCH_ID, self.table_id,
+        [(ids[1], matchx_list, instruction_list, 2, False),
+         (99, matchx_list, instruction_list)])
+    self.assertEqual(results, [True, False])
+    msgs = unpack_all(self.con.sent[0])
+    self.assertEqual(len(msgs), 1)
+    self.assertEqual(msgs[0].command, of.OFPFC_MODIFY)
+    self.assertEqual(msgs[0].priority, 2)
+
+    deleted = self.pm.delete_flow_entries(SWITCH_ID, self.table_id,
+                                          [ids[0], ids[2], 99])
+    self.assertEqual(deleted[2], None)
+    msgs = unpack_all(self.con.sent[1])
+    self.assertEqual([fm.command for fm in msgs], [of.OFPFC_DELETE] * 2)
+    self.assertEqual([fm.index for fm in msgs], [ids[0], ids[2]])
+    self.assertEqual(sorted(self.pm.get_all_flow_entry(SWITCH_ID, self.table_id),
+                            key = lambda fm: fm.index)[0].index, ids[1])
+
+    # freed ids are handed out again first
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                   [self._entry(i, 1) for i in range(3)])
+    self.assertEqual(ids, [0, 2, 4])
+
+  def test_disconnected (self):
+    # the database takes the change; it is sent when the switch comes back
+    self.pm._handle_ConnectionDown(ConnectionDown(self.con))
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                   [self._entry(i, 1) for i in range(2)])
+    self.assertEqual(ids, [0, 1])
+    self.pm.delete_flow_entry(SWITCH_ID, self.table_id, ids[0])
+    self.pm.add_flow_entries(7, self.table_id, [self._entry(9, 1)])
+    self.assertEqual(self.con.sent, [])
+    self.assertEqual([fm.index for fm in
+                      self.pm.get_all_flow_entry(SWITCH_ID, self.table_id)],
+                     [1])
+
+
+class match_key_test (pof_manager_case):
+  def test_exact_match_and_duplicates (self):
+    matchx_list, instruction_list, _, _ = self._entry(0x10, 1)
+    entry_id = self.pm.add_flow_entry(SWITCH_ID, self.table_id, matchx_list,
+                                      instruction_list, counter_enable = False)
+    fm = self.pm.get_exact_matched_flow_entry(SWITCH_ID, self.table_id,
+                                              self._entry(0x10, 2)[0])
+    self.assertEqual(fm.index, entry_id)
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, self._entry(0x11, 2)[0]), None)
+
+    # same match again, alone or in a batch, is refused
+    self.assertEqual(self.pm.check_flow_entry_reduplication(SWITCH_ID,
+        self.table_id, self._entry(0x10, 3)[0]), entry_id)
+    self.assertEqual(self.pm.add_flow_entry(SWITCH_ID, self.table_id,
+        *self._entry(0x10, 3)[:2]), FLOWENTRYID_INVALID)
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+        [self._entry(0x10, 3), self._entry(0x20, 3), self._entry(0x20, 4)])
+    self.assertEqual(ids[0], FLOWENTRYID_INVALID)
+    self.assertEqual(ids[2], FLOWENTRYID_INVALID)
+
+    # modify moves the key; the entry may keep its own match
+    self.assertTrue(self.pm.modify_flow_entry(SWITCH_ID, self.table_id,
+        entry_id, *self._entry(0x10, 5)[:2]))
+    self.assertFalse(self.pm.modify_flow_entry(SWITCH_ID, self.table_id,
+        entry_id, *self._entry(0x20, 5)[:2]))
+    self.assertTrue(self.pm.modify_flow_entry(SWITCH_ID, self.table_id,
+        entry_id, *self._entry(0x30, 5)[:2]))
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, self._entry(0x10, 2)[0]), None)
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, self._entry(0x30, 2)[0]).index, entry_id)
+
+    self.pm.delete_flow_entry(SWITCH_ID, self.table_id, entry_id)
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, self._entry(0x30, 2)[0]), None)
+    self.assertNotEqual(self.pm.add_flow_entry(SWITCH_ID, self.table_id,
+        *self._entry(0x30, 3)[:2]), FLOWENTRYID_INVALID)
+
+  def test_dont_care_bits (self):
+    # bits outside the mask don't make a different match
+    instruction_list = self._entry(0, 1)[1]
+    entry_id = self.pm.add_flow_entry(SWITCH_ID, self.table_id,
+        [self.pm.new_matchx(self.field, '0000000010ff', 'ffffffff0000')],
+        instruction_list)
+    same = [self.pm.new_matchx(self.field, '000000001000', 'ffffffff0000')]
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, same).index, entry_id)
+    self.assertEqual(self.pm.check_flow_entry_reduplication(SWITCH_ID,
+        self.table_id, same), entry_id)
+    self.assertEqual(self.pm.add_flow_entry(SWITCH_ID, self.table_id,
+        same, instruction_list), FLOWENTRYID_INVALID)
+    other = [self.pm.new_matchx(self.field, '0000000010ff', 'ffffffff00ff')]
+    self.assertEqual(self.pm.get_exact_matched_flow_entry(SWITCH_ID,
+        self.table_id, other), None)
+
+  def test_all_matched (self):
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                   [self._entry(0x10, 1), self._entry(0x20, 2)])
+    wildcard = self.pm.new_matchx(self.field, '000000000010', 'ffffffff00ff')
+    ids.append(self.pm.add_flow_entry(SWITCH_ID, self.table_id, [wildcard],
+                                      self._entry(0, 3)[1], priority = 9))
+    found = self.pm.get_all_matched_flow_entry(SWITCH_ID, self.table_id,
+                                               self._entry(0x10, 1)[0])
+    self.assertEqual([fm.index for fm in found], [ids[2], ids[0]])
+    self.pm.delete_flow_entry(SWITCH_ID, self.table_id, ids[2])
+    found = self.pm.get_all_matched_flow_entry(SWITCH_ID, self.table_id,
+                                               self._entry(0x10, 1)[0])
+    self.assertEqual([fm.index for fm in found], [ids[0]])
+
+
+class counter_stats_test (pof_manager_case):
+  def setUp (self):
+    pof_manager_case.setUp(self)
+    # flushed by hand below instead of from core.callLater
+    self.pm._counter_flush_pending = True
+    self.counter_ids = [self.pm.allocate_counter(SWITCH_ID) for _ in range(3)]
+    self.timers = RecordingTimer.timers = []
+    self.Timer, pofmanager.Timer = pofmanager.Timer, RecordingTimer
+
+  def tearDown (self):
+    pofmanager.Timer = self.Timer
+
+  def _reply (self, xid, counter_id, packets, octets):
+    reply = of.ofp_counter_reply(xid = xid)
+    reply.counter.command = of.OFPCC_QUERYREPLY
+    reply.counter.counter_id = counter_id
+    reply.counter.counter_value = packets
+    reply.counter.byte_value = octets
+    self.pm._handle_CounterReply(CounterReply(self.con, reply))
+
+  def test_counter_mods (self):
+    msgs = [unpack_all(raw)[0] for raw in self.con.sent]
+    self.assertEqual([m.counter.command for m in msgs], [of.OFPCC_ADD] * 3)
+    self.assertEqual([m.counter.counter_id for m in msgs], self.counter_ids)
+    del self.con.sent[:]
+
+    self.assertTrue(self.pm.reset_counter(SWITCH_ID, self.counter_ids[0]))
+    self.assertTrue(self.pm.reset_counter(SWITCH_ID, self.counter_ids[1],
+                                          False))
+    counter = self.pm.free_counter(SWITCH_ID, self.counter_ids[2])
+    self.assertEqual(counter.counter_id, self.counter_ids[2])
+    self.assertEqual(self.pm.free_counter(SWITCH_ID, self.counter_ids[2]), None)
+    self.assertFalse(self.pm.reset_counter(SWITCH_ID, self.counter_ids[2]))
+    msgs = [unpack_all(raw)[0] for raw in self.con.sent]
+    self.assertEqual([(m.counter.command, m.counter.counter_id) for m in msgs],
+                     [(of.OFPCC_CLEAR, self.counter_ids[0]),
+                      (of.OFPCC_DELETE, self.counter_ids[2])])
+    self.assertEqual(self.pm.allocate_counter(SWITCH_ID), self.counter_ids[2])
+
+  def test_query_batched (self):
+    del self.con.sent[:]
+    results = []
+    events = []
+    self.pm.addListener(CounterStatsReceived, events.append)
+    for counter_id in self.counter_ids:
+      counter = self.pm.query_counter_value(SWITCH_ID, counter_id,
+                                            results.append)
+      self.assertEqual(counter.counter_id, counter_id)
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.assertEqual(self.pm.query_counter_value(SWITCH_ID, 999), None)
+    self.assertEqual(self.con.sent, [])
+
+    self.pm._flush_counter_queries()
+    self.assertEqual(len(self.con.sent), 1)
+    reqs = unpack_all(self.con.sent[0])
+    self.assertEqual(sorted(r.counter.counter_id for r in reqs),
+                     self.counter_ids)
+    self.assertTrue(all(r.counter.command == of.OFPCC_QUERY for r in reqs))
+
+    # a query for a counter in flight rides on the outstanding request
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.pm._flush_counter_queries()
+    self.assertEqual(len(self.con.sent), 1)
+
+    req = [r for r in reqs if r.counter.counter_id == self.counter_ids[0]][0]
+    self._reply(req.xid, self.counter_ids[0], 10, 1000)
+    self.assertEqual(len(results), 3)
+    self.assertTrue(all(r is results[0] for r in results))
+    self.assertEqual((results[0].counter_value, results[0].byte_value),
+                     (10, 1000))
+    self.assertEqual([e.counter_id for e in events], [self.counter_ids[0]])
+    self.assertEqual(self.pm.get_counter_stats(SWITCH_ID, self.counter_ids[0]),
+                     results[0])
+    self.assertEqual(self.pm.query_counter_value(SWITCH_ID,
+        self.counter_ids[0]).counter_value, 10)
+
+    # rates come from consecutive readings
+    stats = results[0]
+    stats.timestamp -= 2
+    self._reply(req.xid, self.counter_ids[0], 30, 1400)
+    self.assertEqual(len(results), 3)   # request already answered
+    self.assertAlmostEqual(stats.packet_rate, 10, 1)
+    self.assertAlmostEqual(stats.byte_rate, 200, 1)
+    self.pm.reset_counter(SWITCH_ID, self.counter_ids[0])
+    self.assertEqual(stats.counter_value, 0)
+
+  def test_poll_and_timeout (self):
+    del self.con.sent[:]
+    self.assertTrue(self.pm.add_counter_poll(SWITCH_ID, self.counter_ids[1]))
+    self.assertFalse(self.pm.add_counter_poll(SWITCH_ID, 999))
+    results = []
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[1], results.append)
+    self.pm._poll_counters()
+    reqs = unpack_all(self.con.sent[0])
+    self.assertEqual([r.counter.counter_id for r in reqs], [self.counter_ids[1]])
+
+    # still in flight: the next round does not ask again
+    self.pm._poll_counters()
+    self.assertEqual(len(self.con.sent), 1)
+
+    for xid, request in self.pm.counter_requests.items():
+      self.pm.counter_requests[xid] = request[:3] + (0,)
+    self.pm._poll_counters()
+    self.assertEqual(results, [None])
+    self.assertEqual(len(self.con.sent), 2)
+
+    self.pm.free_counter(SWITCH_ID, self.counter_ids[1])
+    self.assertEqual(self.pm.counter_polls, {})
+
+  def test_timeout_without_polling (self):
+    del self.con.sent[:]
+    results = []
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.pm._flush_counter_queries()
+    self.assertEqual(len(self.timers), 1)
+    self.assertTrue(0 < self.timers[0].interval <= pofmanager.COUNTER_REQUEST_TIMEOUT)
+    # late: a query asks again instead of waiting on the old request
+    for xid, request in self.pm.counter_requests.items():
+      self.pm.counter_requests[xid] = request[:3] + (0,)
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.assertEqual(results, [None])
+    self.pm._flush_counter_queries()
+    self.assertEqual(len(self.con.sent), 2)
+    # and the timer gives up on that one too
+    for xid, request in self.pm.counter_requests.items():
+      self.pm.counter_requests[xid] = request[:3] + (0,)
+    self.timers[0].callback()
+    self.assertEqual(results, [None, None])
+    self.assertEqual(self.pm.counter_requests, {})
+    self.assertEqual(len(self.timers), 1)   # nothing left to time out
+
+  def test_disconnect (self):
+    results = []
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.pm._flush_counter_queries()
+    self.pm._handle_ConnectionDown(ConnectionDown(self.con))
+    self.assertEqual(results, [None])
+    self.assertEqual((self.pm.counter_requests, self.pm.counter_request_xids),
+                     ({}, {}))
+    # back again, the counter is asked for anew
+    con = RecordingConnection()
+    self.pm.get_switch_by_id(SWITCH_ID).connect(con)
+    self.pm.query_counter_value(SWITCH_ID, self.counter_ids[0], results.append)
+    self.pm._flush_counter_queries()
+    req = unpack_all(con.sent[0])[0]
+    self._reply(req.xid, self.counter_ids[0], 1, 2)
+    self.assertEqual(results[1].counter_value, 1)
+
+
+class index_test (pof_manager_case):
+  def test_fields_and_protocols (self):
+    pm = self.pm
+    ids = [pm.new_field(name, offset, 16)
+           for name, offset in (("A", 0), ("B", 16), ("A", 32), ("C", 48))]
+    a1, b, a2, c = [pm.get_field(i) for i in ids]
+    self.assertEqual(pm.get_field("A"), [a1, a2])
+    self.assertEqual(pm.get_all_field(), [a1, b, a2, c])
+    pm.get_all_field().pop()    # callers get their own copy
+    self.assertEqual(len(pm.get_all_field()), 4)
+
+    pm.new_metadata_field("A", 32, 8)
+    self.assertEqual(pm.get_field("A")[2].field_id, -1)
+    self.assertTrue(pm.modify_field(ids[0], "B", 0, 16))
+    self.assertEqual(pm.get_field("A")[:1], [a2])
+    self.assertEqual(pm.get_field("B"), [a1, b])
+    pm.delete_field(ids[1])
+    self.assertEqual(pm.get_field("B"), [a1])
+    self.assertEqual(pm.get_all_field(), [a1, a2, c])
+    pm.remove_all_metadata()
+    self.assertEqual(pm.get_field("A"), [a2])
+
+    p1 = pm.add_protocol("P1", [a1, a2])
+    p2 = pm.add_protocol("P2", [a2, c])
+    self.assertEqual(pm.get_belonged_protocol(a2.field_id).protocol_id, p1)
+    self.assertEqual(pm.get_belonged_protocol(c.field_id).protocol_id, p2)
+    fields = pm.get_protocol_by_id(p1).get_all_field()
+    fields.remove(a2)           # changed in place, then handed back
+    pm.modify_protocol(p1, fields)
+    self.assertEqual(pm.get_belonged_protocol(a2.field_id).protocol_id, p2)
+    pm.del_protocol(p2)
+    self.assertEqual(pm.get_belonged_protocol(c.field_id), None)
+    self.assertEqual(pm.get_belonged_protocol(a1.field_id).protocol_id, p1)
+
+  def test_table_names (self):
+    pm = self.pm
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'FirstEntryTable'),
+                     self.table_id)
+    t2 = pm.add_flow_table(SWITCH_ID, 'Second', of.OF_MM_TABLE, 16,
+                           [self.field])
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'Second'), t2)
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'Nope'),
+                     FLOWTABLEID_INVALID)
+    self.assertEqual(pm.get_flow_table_id(999, 'Second'), FLOWTABLEID_INVALID)
+    self.assertTrue(pm.del_empty_flow_table(SWITCH_ID, t2))
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'Second'),
+                     FLOWTABLEID_INVALID)
+    renamed = of.ofp_flow_table(table_name = 'Renamed')
+    pm.database.put_flow_table(SWITCH_ID, self.table_id, renamed)
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'FirstEntryTable'),
+                     FLOWTABLEID_INVALID)
+    self.assertEqual(pm.get_flow_table_id(SWITCH_ID, 'Renamed'),
+                     self.table_id)
+
+
+class resync_test (pof_manager_case):
+  def setUp (self):
+    pof_manager_case.setUp(self)
+    self.pm.resync_batch_size = 3
+    self.pm.resync_window = 2
+    self.ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                        [self._entry(i, 1) for i in range(8)])
+    self.pm.add_meter_entry(SWITCH_ID, 100)
+    self.events = []
+    self.pm.addListenerByName("ResyncProgress", self.events.append)
+    self.pm.addListenerByName("ResyncFinished", self.events.append)
+    del self.con.sent[:]
+
+  def barrier (self, n):
+    msgs = unpack_all(self.con.sent[n])
+    self.assertTrue(isinstance(msgs[-1], of.ofp_barrier_request))
+    self.pm._handle_BarrierIn(BarrierIn(self.con, msgs[-1]))
+    return msgs[:-1]
+
+  def test_batches (self):
+    self.assertTrue(self.pm.check_switch_connected(SWITCH_ID))
+    self.pm.send_all_of_messages_base_on_DB()
+    resync = self.pm.get_resync(SWITCH_ID)
+    header = struct.unpack("!xBH", self.con.sent[0][:4])
+    self.assertEqual(header[0], of.OFPT_TABLE_MOD)
+    self.assertEqual(struct.unpack("!xB", self.con.sent[0][header[1]:][:2])[0],
+                     of.OFPT_METER_MOD)
+    # two batches in flight, the third waits for a barrier
+    self.assertEqual(len(self.con.sent), 3)
+    self.assertEqual(resync.sent, 6)
+
+    self.pm.delete_flow_entry(SWITCH_ID, self.table_id, self.ids[7])
+    del self.con.sent[3]
+    fms = self.barrier(1)
+    self.assertEqual([fm.index for fm in fms], self.ids[:3])
+    self.assertEqual([fm.command for fm in fms], [of.OFPFC_ADD] * 3)
+    self.assertEqual(self.events[-1].acked, 3)
+    # the deleted entry is not sent
+    self.assertEqual([fm.index for fm in unpack_all(self.con.sent[3])[:-1]],
+                     self.ids[6:7])
+    self.pm._handle_ErrorIn(ErrorIn(self.con, of.ofp_error()))
+    self.barrier(2)
+    self.barrier(3)
+    finished = self.events[-1]
+    self.assertTrue(finished.completed)
+    self.assertEqual((finished.acked, finished.total, finished.errors),
+                     (7, 7, 1))
+    self.assertEqual(self.pm.get_resync(SWITCH_ID), None)
+
+  def test_reconnect (self):
+    con = RecordingConnection()
+    self.pm._handle_ConnectionUp(ConnectionUp(con, of.ofp_features_reply()))
+    self.assertEqual(len(con.sent), 3)
+    self.pm._handle_ConnectionDown(ConnectionDown(con))
+    self.assertFalse(self.pm.check_switch_connected(SWITCH_ID))
+    self.assertFalse(self.events[-1].completed)
+    self.assertEqual(self.pm.get_resync(SWITCH_ID), None)
+
+  def test_rate (self):
+    timers = RecordingTimer.timers = []
+    Timer, pofmanager.Timer = pofmanager.Timer, RecordingTimer
+    try:
+      self.pm.resync_rate = 3
+      resync = self.pm.resync_switch(SWITCH_ID)
+      # the first batch goes, the next one waits its time
+      self.assertEqual(resync.sent, 3)
+      self.assertEqual(len(timers), 1)
+      self.assertTrue(0.5 < timers[0].interval <= 1)
+      self.barrier(1)   # acknowledged, but still not time
+      self.assertEqual(resync.sent, 3)
+      resync._next_send = 0
+      timers[0].callback()
+      self.assertEqual(resync.sent, 6)
+      resync.cancel()
+      self.assertTrue(timers[1].cancelled)
+    finally:
+      pofmanager.Timer = Timer
+
+  def test_send_queue (self):
+    self.con.send_queue_full = True    # the switch isn't keeping up
+    self.con.send_queue_bytes = 0
+    resync = self.pm.resync_switch(SWITCH_ID)
+    self.assertEqual(resync.sent, 0)
+    self.assertEqual(len(self.con.sent), 1)   # tables and meters only
+    self.con.send_queue_full = False
+    self.pm._handle_SendQueueLow(SendQueueLow(self.con))
+    self.assertEqual(resync.sent, 6)
+    self.assertEqual(len(self.con.sent), 3)
+
+
+class inflight_test (pof_manager_case):
+  def setUp (self):
+    pof_manager_case.setUp(self)
+    self.pm.inflight_window = 6
+    self.failed = []
+    self.pm.addListenerByName("MessageFailed", self.failed.append)
+
+  def error (self, msg):
+    err = of.ofp_error(type = of.OFPET_FLOW_MOD_FAILED, code = 0)
+    err.xid = msg.xid
+    self.pm._handle_ErrorIn(ErrorIn(self.con, err))
+    return self.failed[-1]
+
+  def test_window (self):
+    ids = self.pm.add_flow_entries(SWITCH_ID, self.table_id,
+                                   [self._entry(i, 1) for i in range(4)])
+    msgs = unpack_all(self.con.sent[0])
+    self.assertEqual(len(msgs), 5)   # each write ends with a barrier
+    self.assertEqual(len(set(m.xid for m in msgs)), 5)
+    self.assertEqual(self.pm.get_inflight_number(SWITCH_ID), 5)
+
+    # would go past the window: waits
+    self.pm.delete_flow_entries(SWITCH_ID, self.table_id, ids[:2])
+    self.pm.allocate_counter(SWITCH_ID)
+    self.assertEqual(len(self.con.sent), 1)
+    self.assertEqual(self.pm.get_pending_write_number(SWITCH_ID), 2)
+
+    self.pm._handle_BarrierIn(BarrierIn(self.con, msgs[-1]))
+    self.assertEqual(len(self.con.sent), 3)
+    self.assertEqual([m.command for m in unpack_all(self.con.sent[1])[:-1]],
+                     [of.OFPFC_DELETE] * 2)
+    self.assertTrue(isinstance(unpack_all(self.con.sent[2])[0],
+                               of.ofp_counter_mod))
+    self.assertEqual(self.pm.get_inflight_number(SWITCH_ID), 5)
+    self.assertEqual(self.pm.get_pending_write_number(SWITCH_ID), 0)
+    # unknown barriers change nothing
+    self.pm._handle_BarrierIn(BarrierIn(self.con, of.ofp_barrier_reply()))
+    self.assertEqual(self.pm.get_inflight_number(SWITCH_ID), 5)
+
+    self.pm._handle_ConnectionDown(ConnectionDown(self.con))
+    self.assertEqual(self.pm.get_inflight_number(SWITCH_ID), 0)
+
+  def test_error_rollback (self):
+    pm = self.pm
+    pm.inflight_window = 100
+    entries = [self._entry(i, i + 1) for i in range(3)]
+    entries[2] = entries[2][:3] + (True,)   # with a counter
+    ids = pm.add_flow_entries(SWITCH_ID, self.table_id, entries)
+    added = unpack_all(self.con.sent[-1])
+    matchx_list, instruction_list, priority, counter_enable = self._entry(9, 7)
+    pm.modify_flow_entry(SWITCH_ID, self.table_id, ids[1], matchx_list,
+                         instruction_list, 2)
+    modified = unpack_all(self.con.sent[-1])
+    pm.delete_flow_entry(SWITCH_ID, self.table_id, ids[2])
+    deleted = unpack_all(self.con.sent[-1])
+    # the flow_mod in the database has been sent again since
+    sent = pm.database.get_sended_of_msg(SWITCH_ID, added[1].xid)
+    self.assertEqual((sent.xid, sent.command), (added[1].xid, of.OFPFC_ADD))
+
+    event = self.error(added[0])
+    self.assertTrue(event.rolled_back)
+    self.assertEqual(event.ofp.index, ids[0])
+    self.assertEqual(event.ofp.command, of.OFPFC_ADD)
+    self.assertEqual(pm.get_flow_entry(SWITCH_ID, self.table_id, ids[0]), None)
+
+    self.assertTrue(self.error(modified[0]).rolled_back)
+    entry = pm.get_flow_entry(SWITCH_ID, self.table_id, ids[1])
+    self.assertEqual(entry.priority, 5)
+    self.assertEqual(entry.instruction_list[0].action_list[0].port_id, 2)
+    self.assertEqual(pm.get_exact_matched_flow_entry(
+        SWITCH_ID, self.table_id, self._entry(1, 0)[0]).index, ids[1])
+
+    self.assertTrue(self.error(deleted[0]).rolled_back)
+    entry = pm.get_flow_entry(SWITCH_ID, self.table_id, ids[2])
+    self.assertEqual(entry.instruction_list[0].action_list[0].port_id, 3)
+    self.assertTrue(pm.database.get_counter(SWITCH_ID, entry.counter_id)
+                    is not None)
+
+    # answered already: not ours any more
+    count = len(self.failed)
+    self.pm._handle_ErrorIn(ErrorIn(self.con, of.ofp_error(type = 0, code = 0)))
+    self.assertEqual(len(self.failed), count)
+    self.assertEqual(pm.get_inflight_number(SWITCH_ID), 5)
+
+  def test_late_error (self):
+    # an error for a change overtaken by later ones undoes nothing
+    pm = self.pm
+    pm.inflight_window = 100
+    ids = pm.add_flow_entries(SWITCH_ID, self.table_id,
+                              [self._entry(1, 1)[:3] + (True,),
+                               self._entry(2, 1)])
+    pm.delete_flow_entry(SWITCH_ID, self.table_id, ids[0])
+    deleted = unpack_all(self.con.sent[-1])
+    new_id = pm.add_flow_entry(SWITCH_ID, self.table_id,
+                               *self._entry(3, 4)[:2])
+    self.assertEqual(new_id, ids[0])   # the id is handed out again
+    new = pm.get_flow_entry(SWITCH_ID, self.table_id, new_id)
+    self.assertFalse(self.error(deleted[0]).rolled_back)
+    self.assertTrue(pm.get_flow_entry(SWITCH_ID, self.table_id, new_id) is new)
+    self.assertTrue(pm.database.get_counter(SWITCH_ID, new.counter_id)
+                    is not None)
+    self.assertEqual(pm.get_exact_matched_flow_entry(
+        SWITCH_ID, self.table_id, self._entry(3, 0)[0]).index, new_id)
+
+    # a modify sent again (modified again) since is not undone either
+    pm.modify_flow_entry(SWITCH_ID, self.table_id, ids[1], *self._entry(4, 5)[:2])
+    modified = unpack_all(self.con.sent[-1])
+    pm.modify_flow_entry(SWITCH_ID, self.table_id, ids[1], *self._entry(5, 6)[:2])
+    self.assertFalse(self.error(modified[0]).rolled_back)
+    entry = pm.get_flow_entry(SWITCH_ID, self.table_id, ids[1])
+    self.assertEqual(entry.instruction_list[0].action_list[0].port_id, 6)
+    # nor one of an entry deleted and added again
+    pm.modify_flow_entry(SWITCH_ID, self.table_id, new_id, *self._entry(6, 7)[:2])
+    modified = unpack_all(self.con.sent[-1])
+    pm.delete_flow_entry(SWITCH_ID, self.table_id, new_id)
+    pm.add_flow_entry(SWITCH_ID, self.table_id, *self._entry(7, 8)[:2])
+    self.assertFalse(self.error(modified[0]).rolled_back)
+    self.assertEqual(pm.get_exact_matched_flow_entry(
+        SWITCH_ID, self.table_id, self._entry(7, 0)[0]).index, new_id)
+
+
+if __name__ == '__main__':
+  unittest.main()
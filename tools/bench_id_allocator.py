@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Churn benchmark for the PMdatabase id allocator
+
+Fills a table with --size ids, then runs --ops alloc/free operations
+against it in bursts of --batch random deletes followed by as many adds.
+This runs once with pmdatabase.IDAllocator and once with the
+append/sort/pop(0) free list the flow entry, DataTable and table id
+allocators used before.  Both must hand out the same ids.
+
+  ./tools/bench_id_allocator.py [--ops 1000000] [--size 100000]
+"""
+
+import sys
+import os.path
+import time
+import random
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+from pox.openflow.pmdatabase import IDAllocator
+
+
+class LegacyFreeList (object):
+  def __init__ (self):
+    self.free_id_list = []
+    self.entry_id_no = 0
+
+  def alloc (self):
+    if len(self.free_id_list) != 0:
+      return self.free_id_list.pop(0)
+    index = self.entry_id_no
+    self.entry_id_no += 1
+    return index
+
+  def free (self, index):
+    self.free_id_list.append(index)
+    self.free_id_list.sort()
+
+
+def churn (allocator, size, ops, batch, seed):
+  """ returns (seconds, checksum of allocated ids) """
+  rnd = random.Random(seed)
+  used = [allocator.alloc() for _ in xrange(size)]
+  checksum = 0
+  start = time.time()
+  for _ in xrange(ops // (2 * batch)):
+    # delete a burst of random entries, then add as many back
+    for _ in xrange(batch):
+      i = rnd.randrange(len(used))
+      allocator.free(used[i])
+      used[i] = used[-1]
+      used.pop()
+    for _ in xrange(batch):
+      index = allocator.alloc()
+      used.append(index)
+      checksum = (checksum * 31 + index) & 0xffffffff
+  return time.time() - start, checksum
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--ops", type = int, default = 1000000,
+                      help = "alloc + free operations")
+  parser.add_argument("--size", type = int, default = 100000,
+                      help = "ids in use during the churn")
+  parser.add_argument("--batch", type = int, default = 1000,
+                      help = "ids freed (then reallocated) per burst")
+  parser.add_argument("--seed", type = int, default = 1)
+  parser.add_argument("--skip-legacy", action = "store_true",
+                      help = "only time IDAllocator")
+  args = parser.parse_args()
+
+  t_new, sum_new = churn(IDAllocator(0), args.size, args.ops, args.batch, args.seed)
+  print "IDAllocator   %8.3f s  %10.0f ops/s" % (t_new, args.ops / t_new)
+  if not args.skip_legacy:
+    t_old, sum_old = churn(LegacyFreeList(), args.size, args.ops, args.batch, args.seed)
+    print "sorted list   %8.3f s  %10.0f ops/s" % (t_old, args.ops / t_old)
+    assert sum_old == sum_new, "allocators handed out different ids"
+    print "speedup       %8.1fx" % (t_old / t_new,)
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for pox.lib.graph.paths.PathService on k-ary fat-trees
+
+For each k, builds the fat-tree (5k^2/4 switches, k^3/2 links) one link
+at a time, then flaps --flaps random links (remove, then add back),
+timing PathService against the Floyd-Warshall recomputation l2_multi and
+topo_proactive used to run after every link event.  Floyd-Warshall is
+timed once per k (it is the same work for every flap) and skipped past
+--floyd-max switches.  The two are also checked to agree on distances.
+
+  ./tools/bench_path_service.py [--k 4,8,16] [--flaps 200]
+"""
+
+import sys
+import os.path
+import time
+import random
+import argparse
+from collections import defaultdict
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pox.lib.graph.paths import PathService
+
+
+def fat_tree (k):
+  """ Switches and links of a k-ary fat-tree """
+  half = k // 2
+  cores = ["c%s" % (i,) for i in range(half * half)]
+  links = []
+  switches = list(cores)
+  for pod in range(k):
+    aggs = ["a%s_%s" % (pod, i) for i in range(half)]
+    edges = ["e%s_%s" % (pod, i) for i in range(half)]
+    switches += aggs + edges
+    for i, agg in enumerate(aggs):
+      for j in range(half):
+        links.append((agg, edges[j]))
+        links.append((agg, cores[i * half + j]))
+  return switches, links
+
+def floyd_warshall (switches, links):
+  """ The path computation l2_multi used to do (path_map and all) """
+  adjacency = defaultdict(lambda:defaultdict(lambda:None))
+  for a, b in links:
+    adjacency[a][b] = 1
+    adjacency[b][a] = 1
+  path_map = defaultdict(lambda:defaultdict(lambda:(None,None)))
+  sws = switches
+  for k in sws:
+    for j,port in adjacency[k].iteritems():
+      if port is None: continue
+      path_map[k][j] = (1,None)
+    path_map[k][k] = (0,None)
+  for k in sws:
+    for i in sws:
+      for j in sws:
+        if path_map[i][k][0] is not None:
+          if path_map[k][j][0] is not None:
+            ikj_dist = path_map[i][k][0]+path_map[k][j][0]
+            if path_map[i][j][0] is None or ikj_dist < path_map[i][j][0]:
+              path_map[i][j] = (ikj_dist, k)
+  return path_map
+
+def bench (k, flaps, floyd_max, rnd):
+  switches, links = fat_tree(k)
+  ps = PathService()
+  start = time.time()
+  for a, b in links:
+    ps.add_link(a, b)
+  build = time.time() - start
+
+  chosen = [rnd.choice(links) for _ in range(flaps)]
+  start = time.time()
+  for a, b in chosen:
+    ps.remove_link(a, b)
+    ps.add_link(a, b)
+  flap = (time.time() - start) / (2 * flaps)
+
+  start = time.time()
+  for i in range(1000):
+    ps.path(rnd.choice(switches), rnd.choice(switches), i)
+  query = (time.time() - start) / 1000
+
+  fw = None
+  if len(switches) <= floyd_max:
+    start = time.time()
+    path_map = floyd_warshall(switches, links)
+    fw = time.time() - start
+    for _ in range(2000):
+      a, b = rnd.choice(switches), rnd.choice(switches)
+      assert path_map[a][b][0] == ps.distance(a, b), (a, b)
+
+  print "k=%-3d %5d switches %6d links  build %8.3f s  link event %9.3f ms" \
+        "  path() %7.3f ms  floyd-warshall %s" % (
+        k, len(switches), len(links), build, flap * 1000, query * 1000,
+        "%8.3f s" % (fw,) if fw is not None else "  (skipped)")
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--k", default = "4,8,16",
+                      help = "comma separated fat-tree arities (even)")
+  parser.add_argument("--flaps", type = int, default = 200)
+  parser.add_argument("--floyd-max", type = int, default = 400,
+                      help = "largest switch count to run Floyd-Warshall on")
+  parser.add_argument("--seed", type = int, default = 0)
+  args = parser.parse_args()
+
+  rnd = random.Random(args.seed)
+  for k in [int(x) for x in args.k.split(",")]:
+    if k < 2 or k % 2:
+      parser.error("fat-tree arity must be even")
+    bench(k, args.flaps, args.floyd_max, rnd)
+
+if __name__ == '__main__':
+  main()
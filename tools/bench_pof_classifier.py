@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the MM/LPM flow table classifier
+
+Loads --entries random entries (IPv4 style prefixes for LPM, a handful of
+masks for MM) into a pmclassifier.PMTableClassifier and times packet key
+lookups against a linear scan over the same entries, the way
+get_all_matched_flow_entry had to be answered before.
+
+  ./tools/bench_pof_classifier.py [--entries 100000] [--lookups 1000]
+"""
+
+import sys
+import os.path
+import time
+import random
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libpof_02 as of
+from pox.openflow.pmclassifier import PMTableClassifier, matchx_list_to_key
+
+
+def matchx (value, mask):
+  m = of.ofp_matchx(field_id = 1, offset = 240, length = 32)
+  m.value = "%08x" % (value,)
+  m.mask = "%08x" % (mask,)
+  return m
+
+def prefix_mask (plen):
+  return ((1 << plen) - 1) << (32 - plen)
+
+def make_entries (table_type, num, rnd):
+  if table_type == of.OF_LPM_TABLE:
+    masks = [prefix_mask(p) for p in (8, 16, 20, 24, 24, 24, 28, 32)]
+  else:
+    masks = [0xffffffff, 0xffffff00, 0xffff0000, 0xff00ff00, 0x0000ffff]
+  entries = []
+  for i in xrange(num):
+    mask = rnd.choice(masks)
+    fm = of.ofp_flow_mod(index = i, priority = rnd.randrange(100))
+    fm.match_list = [matchx(rnd.getrandbits(32) & mask, mask)]
+    entries.append(fm)
+  return entries
+
+def linear_lookup (entries, matchx_list):
+  value, mask, _ = matchx_list_to_key(matchx_list)
+  found = []
+  for fm in entries:
+    e_value, e_mask, _ = matchx_list_to_key(fm.match_list)
+    if (e_value ^ value) & e_mask & mask == 0:
+      found.append(fm)
+  found.sort(key = lambda fm: fm.priority, reverse = True)
+  return found
+
+def bench (name, table_type, args):
+  rnd = random.Random(args.seed)
+  entries = make_entries(table_type, args.entries, rnd)
+  start = time.time()
+  c = PMTableClassifier(table_type)
+  for fm in entries:
+    c.put(fm.index, fm)
+  t_build = time.time() - start
+
+  keys = [[matchx(rnd.getrandbits(32), 0xffffffff)]
+          for _ in xrange(args.lookups)]
+  start = time.time()
+  hits = sum(len(c.lookup(k)) for k in keys)
+  t_fast = (time.time() - start) / len(keys)
+
+  scan_keys = keys[:args.scan_lookups]
+  start = time.time()
+  scan_hits = sum(len(linear_lookup(entries, k)) for k in scan_keys)
+  t_scan = (time.time() - start) / len(scan_keys)
+  assert scan_hits == sum(len(c.lookup(k)) for k in scan_keys)
+
+  print "%s: %d entries, build %.2f s, %.1f hits/lookup" % (
+      name, args.entries, t_build, float(hits) / len(keys))
+  print "  classifier %10.1f us/lookup" % (t_fast * 1e6,)
+  print "  linear     %10.1f us/lookup  (%.0fx slower)" % (
+      t_scan * 1e6, t_scan / t_fast)
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--entries", type = int, default = 100000)
+  parser.add_argument("--lookups", type = int, default = 1000)
+  parser.add_argument("--scan-lookups", type = int, default = 5,
+                      help = "lookups timed for the linear scan")
+  parser.add_argument("--seed", type = int, default = 1)
+  args = parser.parse_args()
+  bench("LPM", of.OF_LPM_TABLE, args)
+  bench("MM", of.OF_MM_TABLE, args)
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()
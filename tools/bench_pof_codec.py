@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark for the libpof_02 flow_mod codec
+
+Times packing and unpacking of ofp_matchx and of a flow_mod carrying
+OFP_MAX_MATCH_FIELD_NUM matchx, comparing the precompiled struct codec
+against the per-field/per-byte encoding the classes used before it.
+
+  ./tools/bench_pof_codec.py [-n ITERATIONS]
+"""
+
+import sys
+import os.path
+import struct
+import timeit
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libpof_02 as of
+
+
+def legacy_matchx_pack (m, value, mask):
+  packed = b""
+  packed += struct.pack("!h", m.field_id)
+  packed += struct.pack("!H", m.offset)
+  packed += struct.pack("!H", m.length)
+  packed += of._PAD2
+  packed += of.Hex2Raw(value, of.OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw()
+  packed += of.Hex2Raw(mask, of.OFP_MAX_FIELD_LENGTH_IN_BYTE).toRaw()
+  return packed
+
+def legacy_matchx_unpack (raw, offset=0):
+  offset, (field_id, off, length) = of._unpack('!HHH', raw, offset)
+  offset = of._skip(raw, offset, 2)
+  value = []
+  for _ in xrange(of.OFP_MAX_FIELD_LENGTH_IN_BYTE):
+    offset, (v,) = of._unpack('!B', raw, offset)
+    value.append(v)
+  mask = []
+  for _ in xrange(of.OFP_MAX_FIELD_LENGTH_IN_BYTE):
+    offset, (v,) = of._unpack('!B', raw, offset)
+    mask.append(v)
+  return offset
+
+def legacy_flow_mod_pack (fm, values):
+  packed = b""
+  packed += struct.pack("!BBHL", fm.version, fm.header_type, len(fm), fm.xid)
+  packed += struct.pack("!BBB", fm.command, fm.match_field_num,
+                        fm.instruction_num)
+  packed += of._PAD
+  packed += struct.pack("!LQQBBHHHL", fm.counter_id, fm.cookie, fm.cookie_mask,
+                        fm.table_id, fm.table_type, fm.idle_timeout,
+                        fm.hard_timeout, fm.priority, fm.index)
+  packed += of._PAD4
+  for m, (value, mask) in zip(fm.match_list, values):
+    packed += legacy_matchx_pack(m, value, mask)
+  packed += of._PAD * ((of.OFP_MAX_MATCH_FIELD_NUM - len(fm.match_list)) *
+                       of.ofp_matchx._MIN_LENGTH)
+  for i in fm.instruction_list:
+    packed += i.pack()
+    packed += of._PAD * (of.ofp_instruction_base._MAX_LENGTH - len(i))
+  packed += of._PAD * ((of.OFP_MAX_INSTRUCTION_NUM - len(fm.instruction_list)) *
+                       of.ofp_instruction_base._MAX_LENGTH)
+  return packed
+
+def make_flow_mod ():
+  values = []
+  fm = of.ofp_flow_mod(command = of.OFPFC_ADD, table_id = 0, priority = 1)
+  for i in xrange(of.OFP_MAX_MATCH_FIELD_NUM):
+    value = "%012x" % (0x1000 + i,)
+    mask = "ff" * 6
+    m = of.ofp_matchx(field_id = i, offset = 48 * i, length = 48)
+    m.value = value
+    m.mask = mask
+    fm.match_list.append(m)
+    values.append((value, mask))
+  fm.match_field_num = len(fm.match_list)
+  a = of.ofp_instruction_apply_actions(action_num = 1)
+  a.action_list = [of.ofp_action_output(port_id = 1)]
+  fm.instruction_list = [a]
+  fm.instruction_num = 1
+  return fm, values
+
+def bench (name, legacy, fast, n):
+  t_legacy = min(timeit.repeat(legacy, number = n, repeat = 3))
+  t_fast = min(timeit.repeat(fast, number = n, repeat = 3))
+  print "%-20s legacy %8.2f us  fast %8.2f us  speedup %5.1fx" % (
+      name, t_legacy / n * 1e6, t_fast / n * 1e6, t_legacy / t_fast)
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("-n", type = int, default = 20000,
+                      help = "iterations per measurement")
+  args = parser.parse_args()
+
+  fm, values = make_flow_mod()
+  m = fm.match_list[0]
+  value, mask = values[0]
+  raw_matchx = m.pack()
+  raw_fm = fm.pack()
+  assert raw_fm == legacy_flow_mod_pack(fm, values)
+  buf = bytearray(len(fm))
+
+  def fast_matchx_unpack ():
+    of.ofp_matchx().unpack(raw_matchx)
+  def fast_flow_mod_unpack ():
+    of.ofp_flow_mod().unpack(raw_fm)
+
+  bench("matchx pack", lambda: legacy_matchx_pack(m, value, mask),
+        m.pack, args.n)
+  bench("matchx unpack", lambda: legacy_matchx_unpack(raw_matchx),
+        fast_matchx_unpack, args.n)
+  bench("flow_mod pack", lambda: legacy_flow_mod_pack(fm, values),
+        fm.pack, args.n // 10)
+  bench("flow_mod pack_into", lambda: legacy_flow_mod_pack(fm, values),
+        lambda: fm.pack_into(buf), args.n // 10)
+  print "%-20s %8.2f us" % ("flow_mod unpack",
+      min(timeit.repeat(fast_flow_mod_unpack, number = args.n // 10,
+                        repeat = 3)) / (args.n // 10) * 1e6)
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the pof_01.Connection receive path
+
+Replays a switch-to-controller byte stream through Connection.read()
+(recv_into a reusable bytearray, unpack from a buffer over it) and through
+the string concatenate-and-slice reader it replaced.  Handlers are
+replaced by a counter, so only framing and unpacking are timed.
+
+The stream is --stream FILE (raw POF messages as the switch sent them, e.g.
+the TCP payload of a capture) or, by default, a synthetic burst of 2 KB
+packet-ins interleaved with resource reports and echo replies.
+
+  ./tools/bench_pof_recv.py [--stream FILE] [--chunk BYTES] [--repeat N]
+"""
+
+import sys
+import os.path
+import time
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libpof_02 as of
+import pox.openflow.pof_01 as pof_01
+
+
+class ReplaySocket (object):
+  """ Returns the stream at most chunk bytes per recv, as a socket would """
+  def __init__ (self, data, chunk):
+    self.data = data
+    self.chunk = chunk
+    self.offset = 0
+
+  def recv (self, bufsize):
+    n = min(bufsize, self.chunk)
+    d = self.data[self.offset:self.offset + n]
+    self.offset += len(d)
+    return d
+
+  def recv_into (self, buf, nbytes = 0):
+    n = min(nbytes or len(buf), len(buf), self.chunk,
+            len(self.data) - self.offset)
+    buf[:n] = self.data[self.offset:self.offset + n]
+    self.offset += n
+    return n
+
+
+class BenchConnection (pof_01.Connection):
+  def send (self, data):
+    pass
+
+
+class LegacyConnection (BenchConnection):
+  """ The read() pof_01 used before, with self.buf a str """
+  def read (self):
+    try:
+      d = self.sock.recv(2048)
+    except:
+      return False
+    if len(d) == 0:
+      return False
+    if isinstance(self.buf, bytearray):
+      self.buf = ''
+    self.buf += d
+    buf_len = len(self.buf)
+    offset = 0
+    while buf_len - offset >= 8:
+      ofp_type = ord(self.buf[offset+1])
+      msg_length = ord(self.buf[offset+2]) << 8 | ord(self.buf[offset+3])
+      if buf_len - offset < msg_length: break
+      new_offset,msg = pof_01.unpackers[ofp_type](self.buf, offset)
+      assert new_offset - offset == msg_length
+      offset = new_offset
+      pof_01.log.debug(str(msg))
+      pof_01.handlers[ofp_type](self, msg)
+    if offset != 0:
+      self.buf = self.buf[offset:]
+    return True
+
+
+def make_stream (n):
+  msgs = []
+  report = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                  counter_num = 1024)
+  for table_type in range(of.OF_MAX_TABLE_TYPE):
+    report.table_resources_map[table_type] = of.ofp_table_resource(
+        table_type = table_type, table_num = 8, key_length = 160)
+  for i in xrange(n):
+    msgs.append(of.ofp_packet_in(xid = i, total_len = 2048,
+                                 data = chr(i & 0xff) * 2048).pack())
+    if i % 8 == 0:
+      msgs.append(report.pack())
+    if i % 4 == 0:
+      msgs.append(of.ofp_echo_reply(xid = i).pack())
+  return b''.join(msgs)
+
+def replay (cls, stream, chunk, read_size):
+  count = [0]
+  def handler (con, msg):
+    count[0] += 1
+  saved = list(pof_01.handlers)
+  pof_01.handlers[:] = [handler] * len(saved)
+  try:
+    con = cls(ReplaySocket(stream, chunk))
+    con.read_size = read_size
+    start = time.time()
+    while con.read():
+      pass
+    return time.time() - start, count[0]
+  finally:
+    pof_01.handlers[:] = saved
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--stream", help = "file holding a raw POF byte stream")
+  parser.add_argument("--messages", type = int, default = 20000,
+                      help = "packet-ins in the synthetic stream")
+  parser.add_argument("--chunk", type = int, default = 1 << 20,
+                      help = "most bytes one recv returns")
+  parser.add_argument("--read-size", type = int,
+                      default = pof_01.Connection.read_size)
+  parser.add_argument("--repeat", type = int, default = 3)
+  args = parser.parse_args()
+
+  if args.stream:
+    stream = open(args.stream, "rb").read()
+  else:
+    stream = make_stream(args.messages)
+  mb = len(stream) / 1e6
+
+  for name, cls in (("recv_into", BenchConnection),
+                    ("legacy", LegacyConnection)):
+    best = None
+    for _ in xrange(args.repeat):
+      t, count = replay(cls, stream, args.chunk, args.read_size)
+      best = t if best is None else min(best, t)
+    print "%-10s %8.3f s  %8.1f MB/s  %8.0f msg/s  (%d messages)" % (
+        name, best, mb / best, count / best, count)
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the recoco SelectHubs
+
+One task waits in Select() on N UDP sockets, as pof_01's listener task
+waits on every switch connection.  Each time it wakes up it reads what
+arrived and sends a datagram to one random socket before waiting again,
+so every wakeup is one Select() round trip through the hub.  Reported is
+wakeups per second for
+
+  select      SelectHub with select.select (not run past FD_SETSIZE)
+  epoll       SelectHub with EpollSelect (a fresh diff of every list
+              each cycle)
+  persistent  EpollSelectHub (registrations kept between cycles)
+
+  ./tools/bench_recoco_select.py [--sockets 10,1000,10000] [--seconds S]
+"""
+
+import sys
+import os.path
+import time
+import random
+import socket
+import argparse
+import threading
+import resource
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pox.lib.recoco import Scheduler, BaseTask, Select
+
+# select.select() refuses fds past this
+FD_SETSIZE = 1024
+
+HUBS = (
+  ("select", {}),
+  ("epoll", {'useEpoll' : True}),
+  ("persistent", {'persistentEpoll' : True}),
+)
+
+
+class PingTask (BaseTask):
+  def __init__ (self, socks, seconds, done):
+    BaseTask.__init__(self)
+    self.socks = socks
+    self.addrs = [s.getsockname() for s in socks]
+    self.seconds = seconds
+    self.done = done
+    self.wakeups = 0
+    self.elapsed = None
+
+  def run (self):
+    out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    choice = random.choice
+    addrs = self.addrs
+    socks = self.socks
+    out.sendto("x", choice(addrs))
+    start = time.time()
+    end = start + self.seconds
+    while True:
+      rl, wl, xl = yield Select(socks, [], [])
+      for s in rl:
+        s.recv(16)
+      self.wakeups += 1
+      if (self.wakeups & 63) == 0 and time.time() > end:
+        break
+      out.sendto("x", choice(addrs))
+    self.elapsed = time.time() - start
+    out.close()
+    self.done.set()
+
+
+def raise_fd_limit (n):
+  soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+  if soft < n:
+    try:
+      resource.setrlimit(resource.RLIMIT_NOFILE, (min(n, hard), hard))
+    except ValueError:
+      pass
+  return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+def make_sockets (n):
+  socks = []
+  for _ in xrange(n):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    s.setblocking(0)
+    socks.append(s)
+  return socks
+
+def run_hub (kw, socks, seconds):
+  scheduler = Scheduler(isDefaultScheduler = False, daemon = True, **kw)
+  try:
+    done = threading.Event()
+    task = PingTask(socks, seconds, done)
+    task.start(scheduler)
+    done.wait(seconds * 10 + 30)
+    if not done.is_set():
+      return None
+    return task.wakeups / task.elapsed
+  finally:
+    scheduler.quit()
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--sockets", default = "10,1000,10000",
+                      help = "comma separated socket counts")
+  parser.add_argument("--seconds", type = float, default = 3)
+  parser.add_argument("--hubs", default = ",".join(h[0] for h in HUBS))
+  args = parser.parse_args()
+
+  counts = [int(n) for n in args.sockets.split(",")]
+  hubs = [h for h in HUBS if h[0] in args.hubs.split(",")]
+  limit = raise_fd_limit(max(counts) + 64)
+
+  print "%8s  %s" % ("sockets", "  ".join("%12s" % h[0] for h in hubs))
+  for n in counts:
+    if n + 32 > limit:
+      print "%8d  skipped, RLIMIT_NOFILE is %d" % (n, limit)
+      continue
+    socks = make_sockets(n)
+    try:
+      row = []
+      for name, kw in hubs:
+        if name == "select" and max(s.fileno() for s in socks) >= FD_SETSIZE:
+          row.append("%12s" % "-")
+          continue
+        rate = run_hub(kw, socks, args.seconds)
+        row.append("%12s" % ("stalled" if rate is None else
+                             "%.0f/s" % rate))
+      print "%8d  %s" % (n, "  ".join(row))
+    finally:
+      for s in socks:
+        s.close()
+
+if __name__ == '__main__':
+  main()
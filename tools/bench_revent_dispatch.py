@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Microbenchmark for revent dispatch
+
+Raises a PacketIn-like event the way the POF handlers do: on an OpenFlow
+nexus and then, unless halted, on the connection, with N listeners split
+between the two.  Compared are
+
+  chain    raiseEventChainNoErrors() (one event, compiled handler tuple)
+  double   raiseEventNoErrors() on each source (one event per source)
+  legacy   the same with the raiseEvent() loop revent used before
+
+  ./tools/bench_revent_dispatch.py [--listeners 1,10,100] [--raises N]
+"""
+
+import sys
+import os.path
+import time
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pox.lib.revent import *
+
+
+class Message (Event):
+  def __init__ (self, connection, ofp):
+    Event.__init__(self)
+    self.connection = connection
+    self.ofp = ofp
+
+
+class Source (EventMixin):
+  _eventMixin_events = set([Message])
+
+
+class LegacySource (Source):
+  """ raiseEvent() as revent had it, without the compiled handler tuple """
+  def raiseEvent (self, event, *args, **kw):
+    self._eventMixin_init()
+    classCall = False
+    if isinstance(event, Event):
+      eventType = event.__class__
+      classCall = True
+      if event.source is None: event.source = self
+    elif issubclass(event, Event):
+      if event not in self._eventMixin_handlers:
+        return None
+      if len(self._eventMixin_handlers[event]) == 0:
+        return None
+      classCall = True
+      eventType = event
+      event = eventType(*args, **kw)
+      args = ()
+      kw = {}
+      if event.source is None:
+        event.source = self
+    if (self._eventMixin_events is not True
+        and eventType not in self._eventMixin_events):
+      raise RuntimeError("Event %s not defined on object of type %s"
+                         % (eventType, type(self)))
+    handlers = self._eventMixin_handlers.get(eventType, [])
+    for (priority, handler, once, eid) in handlers:
+      if classCall:
+        rv = event._invoke(handler, *args, **kw)
+      else:
+        rv = handler(event, *args, **kw)
+      if once: self.removeListener(eid)
+      if rv is None: continue
+      if rv is False:
+        self.removeListener(eid)
+      if rv is True:
+        if classCall: event.halt = True
+        break
+      if type(rv) == tuple:
+        if len(rv) >= 2 and rv[1] == True:
+          self.removeListener(eid)
+        if len(rv) >= 1 and rv[0]:
+          if classCall: event.halt = True
+          break
+        if len(rv) == 0:
+          if classCall: event.halt = True
+          break
+      if classCall and event.halt:
+        break
+    return event
+
+
+class Sink (object):
+  def __init__ (self):
+    self.count = 0
+
+  def handle (self, event):
+    self.count += 1
+
+
+def make_sources (cls, listeners):
+  nexus = cls()
+  con = cls()
+  sink = Sink()
+  for i in range(listeners):
+    # most components listen on the nexus
+    (con if i % 4 == 3 else nexus).addListener(Message, sink.handle)
+  return nexus, con, sink
+
+def run_chain (nexus, con, n):
+  chain = raiseEventChainNoErrors
+  for i in xrange(n):
+    chain((nexus, con), Message, con, i)
+
+def run_double (nexus, con, n):
+  for i in xrange(n):
+    e = nexus.raiseEventNoErrors(Message, con, i)
+    if e is None or e.halt != True:
+      con.raiseEventNoErrors(Message, con, i)
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--listeners", default = "1,10,100")
+  parser.add_argument("--raises", type = int, default = 100000)
+  parser.add_argument("--repeat", type = int, default = 3)
+  args = parser.parse_args()
+
+  modes = (("chain", Source, run_chain),
+           ("double", Source, run_double),
+           ("legacy", LegacySource, run_double))
+  print "%9s  %s" % ("listeners",
+                     "  ".join("%14s" % m[0] for m in modes))
+  for listeners in [int(n) for n in args.listeners.split(",")]:
+    n = max(1000, args.raises // listeners)
+    row = []
+    for name, cls, fn in modes:
+      best = None
+      for _ in xrange(args.repeat):
+        nexus, con, sink = make_sources(cls, listeners)
+        start = time.time()
+        fn(nexus, con, n)
+        t = time.time() - start
+        assert sink.count == n * listeners
+        best = t if best is None else min(best, t)
+      row.append("%11.0f /s" % (n / best))
+    print "%9d  %s" % (listeners, "  ".join(row))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+cbench for the POF channel: controller packet-in throughput and latency
+
+Opens --switches emulated POF switches to the controller over TCP.  Each
+one completes the handshake the way a POF switch does (HELLO,
+FEATURES_REPLY, GET_CONFIG_REPLY, RESOURCE_REPORT, one PORT_STATUS per
+port) and then sends an ECHO_REQUEST; its ECHO_REPLY means the controller
+has handled the whole handshake.  Then the switches send PACKET_INs
+(--size byte frames, a new source MAC for each) and count the controller's
+responses (--response, flow_mod by default), as oflops cbench does:
+
+  latency     each switch has one packet-in outstanding and sends the
+              next when the response arrives
+  throughput  each switch keeps --window packet-ins outstanding
+
+Every --ms milliseconds a loop result (responses/s, per switch and in
+total) is printed; the first --warmup loops are not counted.  Responses
+come back in order on a connection, so each one is matched to the oldest
+outstanding packet-in of its switch for the latency percentiles.  --json
+writes the results in a machine readable form (- for stdout), labeled
+with --label, so runs can be compared across releases.
+
+The controller side should answer each packet-in exactly once, e.g.:
+
+  ./pox.py misc.pof_cbench
+  ./tools/pof_cbench.py --switches 16 --loops 10 --ms 1000
+  ./tools/pof_cbench.py --mode throughput --window 64 --json result.json
+"""
+
+import sys
+import os.path
+import time
+import json
+import math
+import errno
+import select
+import socket
+import struct
+import argparse
+import collections
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libpof_02 as of
+from pox.datapaths.pof_switch import DEFAULT_TABLE_RESOURCES
+from pox.lib.addresses import EthAddr
+
+RESPONSE_TYPES = {
+  "flow_mod" : of.OFPT_FLOW_MOD,
+  "packet_out" : of.OFPT_PACKET_OUT,
+}
+
+READY_XID = 0xfffffffe
+
+_header = struct.Struct("!BBHL")
+_xid = struct.Struct("!L")
+_src_mac = struct.Struct("!HL")
+
+
+class FakeSwitch (object):
+  """
+  One emulated switch: a non-blocking socket and its message framing
+
+  Only the message header is decoded on the hot path; the handshake
+  messages are packed once with libpof_02.
+  """
+  def __init__ (self, bench, dpid):
+    self.bench = bench
+    self.dpid = dpid
+    self.sock = None
+    self.buf = b''
+    self.out = collections.deque()
+    self.want_write = False
+    self.ready = False
+    self.outstanding = collections.deque()   # packet-in send times
+    self.responses = 0
+    self.other = 0
+    self.errors = 0
+    self.xid = 0
+    self.mac = 0
+
+    data = bytearray(bench.size)
+    data[0:6] = EthAddr("00:00:00:00:00:01").toRaw()
+    data[12:14] = b'\x08\x00'
+    msg = of.ofp_packet_in(xid = 0, total_len = bench.size,
+                           reason = of.OFPR_NO_MATCH, device_id = dpid,
+                           slot_port_id = 1, data = bytes(data))
+    self.packet_in = bytearray(msg.pack())
+
+  def connect (self, address):
+    self.sock = socket.create_connection(address)
+    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self.sock.setblocking(0)
+    self.send(of.ofp_hello(xid = 0).pack())
+
+  def fileno (self):
+    return self.sock.fileno()
+
+  def send (self, data):
+    if self.out:
+      self.out.append(data)
+      return
+    try:
+      n = self.sock.send(data)
+    except socket.error as e:
+      if e.args[0] != errno.EAGAIN: raise
+      n = 0
+    if n < len(data):
+      self.out.append(data[n:])
+      self.bench.set_writable(self, True)
+
+  def flush (self):
+    while self.out:
+      data = self.out.popleft()
+      try:
+        n = self.sock.send(data)
+      except socket.error as e:
+        if e.args[0] != errno.EAGAIN: raise
+        n = 0
+      if n < len(data):
+        self.out.appendleft(data[n:])
+        return
+    self.bench.set_writable(self, False)
+
+  def send_packet_ins (self, count):
+    """ Send count packet-ins in one write """
+    msgs = []
+    pi = self.packet_in
+    now = time.time()
+    for _ in xrange(count):
+      self.xid = (self.xid + 1) & 0xffffffff
+      self.mac = (self.mac + 1) & 0xffffffffffff
+      _xid.pack_into(pi, 4, self.xid)
+      _src_mac.pack_into(pi, 32 + 6, self.mac >> 32, self.mac & 0xffffffff)
+      msgs.append(bytes(pi))
+      self.outstanding.append(now)
+    self.send(b''.join(msgs))
+
+  def read (self):
+    try:
+      d = self.sock.recv(1 << 18)
+    except socket.error as e:
+      if e.args[0] == errno.EAGAIN: return
+      raise
+    if not d:
+      raise RuntimeError("controller closed the connection of switch %s"
+                         % (self.dpid,))
+    buf = self.buf + d if self.buf else d
+    offset = 0
+    end = len(buf)
+    response_type = self.bench.response_type
+    answered = 0
+    while end - offset >= 8:
+      version, ofp_type, length, xid = _header.unpack_from(buf, offset)
+      if length < 8:
+        raise RuntimeError("bad message length %s from the controller"
+                           % (length,))
+      if end - offset < length: break
+      if ofp_type == response_type:
+        answered += 1
+      else:
+        self._rx_other(ofp_type, xid, buf, offset, length)
+      offset += length
+    self.buf = buf[offset:]
+    if answered:
+      self.bench.answered(self, answered)
+
+  def _rx_other (self, ofp_type, xid, buf, offset, length):
+    if ofp_type == of.OFPT_ECHO_REQUEST:
+      msg = bytearray(buf[offset:offset + length])
+      msg[1] = of.OFPT_ECHO_REPLY
+      self.send(bytes(msg))
+    elif ofp_type == of.OFPT_ECHO_REPLY and xid == READY_XID:
+      self.ready = True
+    elif ofp_type == of.OFPT_FEATURES_REQUEST:
+      self.send(self.bench.features_reply(self.dpid, xid))
+    elif ofp_type == of.OFPT_GET_CONFIG_REQUEST:
+      self.send(self.bench.handshake(self.dpid, xid))
+    elif ofp_type == of.OFPT_BARRIER_REQUEST:
+      self.send(of.ofp_barrier_reply(xid = xid).pack())
+    elif ofp_type == of.OFPT_ERROR:
+      self.errors += 1
+    elif ofp_type not in (of.OFPT_HELLO, of.OFPT_SET_CONFIG):
+      self.other += 1
+
+
+class CBench (object):
+  def __init__ (self, args):
+    self.address = (args.controller, args.port)
+    self.mode = args.mode
+    self.window = 1 if args.mode == "latency" else args.window
+    self.size = max(args.size, 14)
+    self.ports = args.ports
+    self.compact = not args.no_compact
+    self.response_type = RESPONSE_TYPES[args.response]
+    self.switches = [FakeSwitch(self, args.start_dpid + i)
+                     for i in range(args.switches)]
+    self.by_fd = {}
+    self.latencies = None    # list while a counted loop runs
+    self.running = False
+    if hasattr(select, "epoll"):
+      self.poller = select.epoll()
+    else:
+      self.poller = None
+      self.writers = set()
+
+  def features_reply (self, dpid, xid):
+    capabilities = (of.OFPC_FLOW_STATS | of.OFPC_TABLE_STATS
+                    | of.OFPC_PORT_STATS)
+    if self.compact:
+      capabilities |= of.OFPC_COMPACT_FLOW_MOD
+    table_num = sum(r[0] for r in DEFAULT_TABLE_RESOURCES.itervalues())
+    return of.ofp_features_reply(xid = xid, device_id = dpid,
+                                 port_num = self.ports,
+                                 table_num = table_num,
+                                 capabilities = capabilities,
+                                 experimenter_name = "POX",
+                                 device_forward_engine_name = "pof_cbench",
+                                 device_lookup_engine_name = "pof_cbench"
+                                ).pack()
+
+  def handshake (self, dpid, xid):
+    """ The rest of the handshake, after the get_config_request """
+    msgs = [of.ofp_get_config_reply(xid = xid, device_id = dpid,
+                                    miss_send_len = 0xffff).pack()]
+    report = of.ofp_resource_report(resource_type = of.OFRRT_FLOW_TABLE,
+                                    counter_num = 1024)
+    for table_type in range(of.OF_MAX_TABLE_TYPE):
+      table_num, key_length, total_size = DEFAULT_TABLE_RESOURCES[table_type]
+      report.table_resources_map[table_type] = of.ofp_table_resource(
+          device_id = dpid, table_type = table_type, table_num = table_num,
+          key_length = key_length, total_size = total_size)
+    msgs.append(report.pack())
+    for port_id in range(1, self.ports + 1):
+      p = of.ofp_phy_port(port_id = port_id, device_id = dpid)
+      p.hw_addr = EthAddr("02%06x%04x" % (dpid % 0xffffff, port_id))
+      p.name = "cbench%s-eth%s" % (dpid, port_id)
+      p.curr_speed = p.max_speed = 10000000
+      msgs.append(of.ofp_port_status(desc = p, reason = of.OFPPR_ADD).pack())
+    msgs.append(of.ofp_echo_request(xid = READY_XID).pack())
+    return b''.join(msgs)
+
+  def set_writable (self, switch, writable):
+    if switch.want_write == writable: return
+    switch.want_write = writable
+    if self.poller is not None:
+      mask = select.EPOLLIN | (select.EPOLLOUT if writable else 0)
+      self.poller.modify(switch.sock.fileno(), mask)
+    elif writable:
+      self.writers.add(switch)
+    else:
+      self.writers.discard(switch)
+
+  def poll (self, timeout):
+    if self.poller is not None:
+      for fd, event in self.poller.poll(timeout):
+        switch = self.by_fd[fd]
+        if event & select.EPOLLOUT:
+          switch.flush()
+        if event & (select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP):
+          switch.read()
+    else:
+      rl, wl, _ = select.select(self.switches, list(self.writers), [],
+                                timeout)
+      for switch in wl:
+        switch.flush()
+      for switch in rl:
+        switch.read()
+
+  def answered (self, switch, count):
+    switch.responses += count
+    now = time.time()
+    outstanding = switch.outstanding
+    latencies = self.latencies
+    for _ in xrange(count):
+      if not outstanding: break
+      sent = outstanding.popleft()
+      if latencies is not None:
+        latencies.append(now - sent)
+    if self.running:
+      switch.send_packet_ins(self.window - len(outstanding))
+
+  def connect (self, timeout):
+    for switch in self.switches:
+      switch.connect(self.address)
+      self.by_fd[switch.fileno()] = switch
+      if self.poller is not None:
+        self.poller.register(switch.fileno(), select.EPOLLIN)
+    end = time.time() + timeout
+    while time.time() < end:
+      if all(s.ready for s in self.switches): return
+      self.poll(0.1)
+    waiting = sum(1 for s in self.switches if not s.ready)
+    raise RuntimeError("%s of %s switches did not finish the handshake"
+                       % (waiting, len(self.switches)))
+
+  def run (self, loops, ms, warmup):
+    self.running = True
+    self.latencies = None
+    for switch in self.switches:
+      switch.send_packet_ins(self.window)
+    results = []
+    for loop in range(loops):
+      counted = loop >= warmup
+      if counted and self.latencies is None:
+        self.latencies = []
+      before = [s.responses for s in self.switches]
+      start = time.time()
+      end = start + ms / 1000.0
+      while True:
+        now = time.time()
+        if now >= end: break
+        self.poll(end - now)
+      elapsed = time.time() - start
+      rates = [(s.responses - b) / elapsed
+               for s, b in zip(self.switches, before)]
+      total = sum(rates)
+      print "%-3d %d switches: responses/s: %s  total = %.1f/s%s" % (
+          loop, len(rates), " ".join("%.0f" % r for r in rates[:16])
+          + (" ..." if len(rates) > 16 else ""), total,
+          "" if counted else "  (warmup)")
+      sys.stdout.flush()
+      if counted:
+        results.append((total, rates))
+    self.running = False
+    return results
+
+  def close (self):
+    for switch in self.switches:
+      try:
+        switch.sock.close()
+      except Exception:
+        pass
+
+
+def percentile (ordered, p):
+  if not ordered: return None
+  i = int(math.ceil(p / 100.0 * len(ordered))) - 1
+  return ordered[max(0, min(i, len(ordered) - 1))]
+
+def summarize (results, latencies):
+  totals = [r[0] for r in results]
+  s = {'responses_per_sec' : totals}
+  if totals:
+    avg = sum(totals) / len(totals)
+    s['min'] = min(totals)
+    s['max'] = max(totals)
+    s['avg'] = avg
+    s['stdev'] = math.sqrt(sum((t - avg) ** 2 for t in totals)
+                           / len(totals))
+  ordered = sorted(latencies or [])
+  s['latency_samples'] = len(ordered)
+  s['latency_ms'] = dict(
+      (name, None if percentile(ordered, p) is None
+             else percentile(ordered, p) * 1000.0)
+      for name, p in (("p50", 50), ("p90", 90), ("p99", 99),
+                      ("p99.9", 99.9), ("max", 100)))
+  if ordered:
+    s['latency_ms']['min'] = ordered[0] * 1000.0
+    s['latency_ms']['avg'] = sum(ordered) / len(ordered) * 1000.0
+  return s
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--controller", default = "127.0.0.1")
+  parser.add_argument("--port", type = int, default = 6633)
+  parser.add_argument("--switches", type = int, default = 16)
+  parser.add_argument("--ports", type = int, default = 4,
+                      help = "ports each switch reports")
+  parser.add_argument("--start-dpid", type = int, default = 1)
+  parser.add_argument("--mode", choices = ("latency", "throughput"),
+                      default = "latency")
+  parser.add_argument("--window", type = int, default = 64,
+                      help = "packet-ins outstanding per switch "
+                             "(throughput mode)")
+  parser.add_argument("--loops", type = int, default = 16)
+  parser.add_argument("--ms", type = int, default = 1000,
+                      help = "length of one loop")
+  parser.add_argument("--warmup", type = int, default = 1,
+                      help = "loops not counted")
+  parser.add_argument("--size", type = int, default = 64,
+                      help = "bytes of packet data in each packet-in")
+  parser.add_argument("--response", choices = sorted(RESPONSE_TYPES),
+                      default = "flow_mod",
+                      help = "the message counted as the answer")
+  parser.add_argument("--no-compact", action = "store_true",
+                      help = "don't advertise OFPC_COMPACT_FLOW_MOD")
+  parser.add_argument("--connect-timeout", type = float, default = 30)
+  parser.add_argument("--json", help = "write results to this file (- for "
+                                       "stdout)")
+  parser.add_argument("--label", default = "",
+                      help = "stored with the results, e.g. a release")
+  args = parser.parse_args()
+  if args.warmup >= args.loops:
+    parser.error("--warmup must be less than --loops")
+
+  bench = CBench(args)
+  try:
+    start = time.time()
+    bench.connect(args.connect_timeout)
+    print "%d switches connected in %.2f s, %s mode" % (
+        len(bench.switches), time.time() - start, args.mode)
+    results = bench.run(args.loops, args.ms, args.warmup)
+    summary = summarize(results, bench.latencies)
+    errors = sum(s.errors for s in bench.switches)
+  finally:
+    bench.close()
+
+  print ("RESULT: %d switches %d tests min/max/avg/stdev = "
+         "%.2f/%.2f/%.2f/%.2f responses/sec" % (
+         args.switches, len(results), summary['min'], summary['max'],
+         summary['avg'], summary['stdev']))
+  lat = summary['latency_ms']
+  if summary['latency_samples']:
+    print ("LATENCY: p50/p90/p99/p99.9/max = %.3f/%.3f/%.3f/%.3f/%.3f ms "
+           "(%d samples)" % (lat['p50'], lat['p90'], lat['p99'],
+           lat['p99.9'], lat['max'], summary['latency_samples']))
+  if errors:
+    print "%d error messages from the controller" % (errors,)
+
+  if args.json:
+    doc = {
+      'tool' : 'pof_cbench',
+      'label' : args.label,
+      'time' : time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+      'controller' : "%s:%s" % (args.controller, args.port),
+      'mode' : args.mode,
+      'switches' : args.switches,
+      'window' : bench.window,
+      'loops' : args.loops,
+      'warmup' : args.warmup,
+      'ms' : args.ms,
+      'size' : args.size,
+      'response' : args.response,
+      'errors' : errors,
+      'results' : summary,
+      'per_switch_responses_per_sec' : [[round(x, 1) for x in r[1]]
+                                       for r in results],
+    }
+    text = json.dumps(doc, indent = 2, sort_keys = True)
+    if args.json == "-":
+      print text
+    else:
+      with open(args.json, "w") as f:
+        f.write(text + "\n")
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()
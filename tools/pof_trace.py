@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Analyze a POF channel capture, or replay it into a running controller
+
+The capture is a pcap file, either written by pof_01 (./pox.py
+openflow.debug ...) or taken with tcpdump on the control network.  It is
+read a record at a time, so captures of any size can be used.
+
+  stats   Streams every message through the libpof_02 unpackers and
+          prints, per direction and message type, counts, sizes and
+          inter-arrival times, plus the flow_mod rate (average and peak
+          per second) and any messages which did not unpack.
+
+  replay  Plays the switch side of the capture to a controller: one TCP
+          connection per captured switch connection, each sending its
+          switch's messages at their captured times (--speed 1), N times
+          faster (--speed N) or as fast as possible (--speed max).
+          Replies to controller requests (features, get_config, barrier,
+          multipart, counter ...) wait for the live request and take its
+          xid; the controller's echo requests are answered live.  The
+          controller's messages are counted by type, so the same trace
+          can be replayed against two releases and compared.
+
+Both can write their results as JSON with --json (- for stdout), labeled
+with --label.
+
+  ./tools/pof_trace.py stats trace.pcap
+  ./tools/pof_trace.py replay trace.pcap --speed 10 --json replay.json
+"""
+
+import sys
+import os.path
+import time
+import json
+import errno
+import select
+import socket
+import struct
+import argparse
+import collections
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pox.core
+pox.core.initialize()
+import pox.openflow.libpof_02 as of
+from pox.openflow.pof_trace import TraceReader, TraceStats, format_summary
+
+REPLY_TO = {
+  of.OFPT_FEATURES_REPLY : of.OFPT_FEATURES_REQUEST,
+  of.OFPT_GET_CONFIG_REPLY : of.OFPT_GET_CONFIG_REQUEST,
+  of.OFPT_MULTIPART_REPLY : of.OFPT_MULTIPART_REQUEST,
+  of.OFPT_BARRIER_REPLY : of.OFPT_BARRIER_REQUEST,
+  of.OFPT_QUEUE_GET_CONFIG_REPLY : of.OFPT_QUEUE_GET_CONFIG_REQUEST,
+  of.OFPT_ROLL_REPLY : of.OFPT_ROLL_REQUEST,
+  of.OFPT_GET_ASYNC_REPLY : of.OFPT_GET_ASYNC_REQUEST,
+  of.OFPT_COUNTER_REPLY : of.OFPT_COUNTER_REQUEST,
+}
+REQUESTS = frozenset(REPLY_TO.itervalues())
+
+MAX_QUEUED = 4 << 20   # bytes queued on a connection before we wait
+
+_header = struct.Struct("!BBHL")
+_xid = struct.Struct("!L")
+
+
+def type_name (ofp_type):
+  return of.ofp_type_map.get(ofp_type, str(ofp_type))
+
+
+class ReplaySwitch (object):
+  """
+  One captured switch connection, replayed over a non-blocking socket
+  """
+  def __init__ (self, replay, name):
+    self.replay = replay
+    self.name = name
+    self.sock = None
+    self.buf = b''
+    self.out = collections.deque()
+    self.queued = 0
+    self.held = collections.deque()   # replies waiting for their request
+    self.live_xids = collections.defaultdict(collections.deque)
+    self.sent = collections.Counter()
+    self.received = collections.Counter()
+    self.closed = False
+
+  def connect (self, address):
+    self.sock = socket.create_connection(address)
+    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    self.sock.setblocking(0)
+
+  def fileno (self):
+    return self.sock.fileno()
+
+  def message (self, raw):
+    """ Send a captured message, or hold it until it can be sent """
+    if self.held or not self._try_send(raw):
+      self.held.append(raw)
+
+  def _try_send (self, raw):
+    ofp_type = ord(raw[1])
+    if ofp_type == of.OFPT_ECHO_REPLY:
+      # Echo requests are answered live, so the captured replies would be
+      # answers to nothing
+      self.replay.skipped += 1
+      return True
+    request = REPLY_TO.get(ofp_type)
+    if request is not None:
+      xids = self.live_xids[request]
+      if not xids: return False
+      xid = xids[0]
+      if ofp_type != of.OFPT_MULTIPART_REPLY or not self._more(raw):
+        xids.popleft()
+      raw = raw[:4] + _xid.pack(xid) + raw[8:]
+    self.sent[ofp_type] += 1
+    self.send(raw)
+    return True
+
+  @staticmethod
+  def _more (raw):
+    # OFPMPF_REPLY_MORE: further parts of this reply follow, same xid
+    return len(raw) > 11 and ord(raw[11]) & 1
+
+  def release (self):
+    held = self.held
+    while held and self._try_send(held[0]):
+      held.popleft()
+
+  def send (self, data):
+    if self.out:
+      self.out.append(data)
+      self.queued += len(data)
+      return
+    try:
+      n = self.sock.send(data)
+    except socket.error as e:
+      if e.args[0] != errno.EAGAIN: raise
+      n = 0
+    if n < len(data):
+      self.out.append(data[n:])
+      self.queued += len(data) - n
+
+  def flush (self):
+    while self.out:
+      data = self.out.popleft()
+      try:
+        n = self.sock.send(data)
+      except socket.error as e:
+        if e.args[0] != errno.EAGAIN: raise
+        n = 0
+      self.queued -= n
+      if n < len(data):
+        self.out.appendleft(data[n:])
+        return
+
+  def read (self):
+    try:
+      d = self.sock.recv(1 << 18)
+    except socket.error as e:
+      if e.args[0] == errno.EAGAIN: return
+      raise
+    if not d:
+      self.closed = True
+      return
+    buf = self.buf + d if self.buf else d
+    offset = 0
+    end = len(buf)
+    while end - offset >= 8:
+      version, ofp_type, length, xid = _header.unpack_from(buf, offset)
+      if length < 8:
+        raise RuntimeError("bad message length %s from the controller"
+                           % (length,))
+      if end - offset < length: break
+      self.received[ofp_type] += 1
+      if ofp_type == of.OFPT_ECHO_REQUEST:
+        msg = bytearray(buf[offset:offset + length])
+        msg[1] = of.OFPT_ECHO_REPLY
+        self.send(bytes(msg))
+      elif ofp_type in REQUESTS:
+        self.live_xids[ofp_type].append(xid)
+      offset += length
+    self.buf = buf[offset:]
+    if self.held:
+      self.release()
+
+
+class Replay (object):
+  def __init__ (self, address, speed):
+    self.address = address
+    self.speed = speed       # None for as fast as possible
+    self.switches = {}       # captured (ip, port) -> ReplaySwitch
+    self.skipped = 0
+    self.max_lag = 0.0
+
+  def switch (self, name):
+    sw = self.switches.get(name)
+    if sw is None:
+      sw = self.switches[name] = ReplaySwitch(self, name)
+      sw.connect(self.address)
+    return sw
+
+  def poll (self, timeout):
+    live = [s for s in self.switches.itervalues() if not s.closed]
+    writers = [s for s in live if s.out]
+    rl, wl, _ = select.select(live, writers, [], max(timeout, 0))
+    for s in wl:
+      s.flush()
+    for s in rl:
+      s.read()
+
+  def run (self, messages):
+    """
+    Replays the to_controller messages of a TraceReader
+    """
+    speed = self.speed
+    start = time.time()
+    first = None
+    for timestamp, name, to_controller, raw in messages:
+      if not to_controller: continue
+      if first is None: first = timestamp
+      if speed is not None:
+        due = start + (timestamp - first) / speed
+        while True:
+          now = time.time()
+          if now >= due: break
+          self.poll(due - now)
+        self.max_lag = max(self.max_lag, now - due)
+      sw = self.switch(name)
+      sw.message(raw)
+      if sw.queued > MAX_QUEUED:
+        while sw.queued > MAX_QUEUED / 2 and not sw.closed:
+          self.poll(1)
+      elif speed is None:
+        self.poll(0)
+    return time.time() - start
+
+  def drain (self, linger):
+    """
+    Keeps answering the controller for linger seconds (and until every
+    held reply has gone out, up to linger more)
+    """
+    end = time.time() + linger
+    hard_end = end + linger
+    while True:
+      now = time.time()
+      busy = any((s.held or s.out) and not s.closed
+                 for s in self.switches.itervalues())
+      if now >= hard_end or (now >= end and not busy): break
+      self.poll(min(0.1, hard_end - now))
+
+  def summary (self, elapsed):
+    sent = collections.Counter()
+    received = collections.Counter()
+    for s in self.switches.itervalues():
+      sent.update(s.sent)
+      received.update(s.received)
+    total = sum(sent.values())
+    return {
+      'elapsed' : elapsed,
+      'switches' : len(self.switches),
+      'sent' : dict((type_name(t), n) for t, n in sent.items()),
+      'sent_total' : total,
+      'sent_per_sec' : total / elapsed if elapsed else None,
+      'received' : dict((type_name(t), n) for t, n in received.items()),
+      'skipped_echo_replies' : self.skipped,
+      'unsent_replies' : sum(len(s.held) for s in self.switches.itervalues()),
+      'closed_by_controller' : sum(1 for s in self.switches.itervalues()
+                                   if s.closed),
+      'max_lag' : self.max_lag if self.speed is not None else None,
+    }
+
+  def close (self):
+    for s in self.switches.itervalues():
+      try:
+        s.sock.close()
+      except Exception:
+        pass
+
+
+def reader_counts (reader):
+  return {
+    'records' : reader.records,
+    'skipped_records' : reader.skipped,
+    'retransmits' : reader.retransmits,
+    'gaps' : reader.gaps,
+    'bad_headers' : reader.bad_headers,
+  }
+
+def stats (args):
+  with open(args.capture, "rb") as f:
+    reader = TraceReader(f, args.of_port)
+    s = TraceStats(decode = not args.no_decode).add_all(reader)
+  summary = s.summary()
+  summary['capture'] = reader_counts(reader)
+  print format_summary(summary)
+  c = summary['capture']
+  if c['retransmits'] or c['gaps'] or c['bad_headers']:
+    print ("capture: %(retransmits)d retransmitted segments, %(gaps)d gaps, "
+           "%(bad_headers)d bad headers" % c)
+  return summary
+
+def replay (args):
+  if args.speed == "max":
+    speed = None
+  else:
+    speed = float(args.speed)
+    if speed <= 0:
+      raise RuntimeError("--speed must be positive or max")
+  r = Replay((args.controller, args.port), speed)
+  try:
+    with open(args.capture, "rb") as f:
+      reader = TraceReader(f, args.of_port)
+      elapsed = r.run(reader)
+    r.drain(args.linger)
+    summary = r.summary(elapsed)
+  finally:
+    r.close()
+  summary['capture'] = reader_counts(reader)
+  print "%d switches, %d messages in %.3f s (%s/s), speed %s" % (
+      summary['switches'], summary['sent_total'], elapsed,
+      "%.1f" % summary['sent_per_sec'] if summary['sent_per_sec'] else "-",
+      args.speed)
+  if summary['max_lag'] is not None:
+    print "largest delay behind the capture's timing: %.3f s" % (
+        summary['max_lag'],)
+  for name, n in sorted(summary['received'].items()):
+    print "  received %-26s %d" % (name, n)
+  if summary['unsent_replies']:
+    print ("%d replies never went out (the controller did not send their "
+           "requests)" % (summary['unsent_replies'],))
+  if summary['closed_by_controller']:
+    print "%d connections were closed by the controller" % (
+        summary['closed_by_controller'],)
+  return summary
+
+def main ():
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("command", choices = ("stats", "replay"))
+  parser.add_argument("capture", help = "pcap file")
+  parser.add_argument("--of-port", type = int, default = 6633,
+                      help = "the controller's port in the capture")
+  parser.add_argument("--no-decode", action = "store_true",
+                      help = "stats: don't unpack messages, only headers")
+  parser.add_argument("--controller", default = "127.0.0.1")
+  parser.add_argument("--port", type = int, default = 6633)
+  parser.add_argument("--speed", default = "1",
+                      help = "replay: N times captured speed, or max")
+  parser.add_argument("--linger", type = float, default = 2,
+                      help = "replay: seconds to keep connections up after "
+                             "the last message")
+  parser.add_argument("--json", help = "write results to this file (- for "
+                                       "stdout)")
+  parser.add_argument("--label", default = "",
+                      help = "stored with the results, e.g. a release")
+  args = parser.parse_args()
+
+  if args.command == "stats":
+    results = stats(args)
+  else:
+    results = replay(args)
+
+  if args.json:
+    doc = {
+      'tool' : 'pof_trace',
+      'command' : args.command,
+      'label' : args.label,
+      'time' : time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+      'capture' : args.capture,
+      'results' : results,
+    }
+    if args.command == "replay":
+      doc['controller'] = "%s:%s" % (args.controller, args.port)
+      doc['speed'] = args.speed
+    text = json.dumps(doc, indent = 2, sort_keys = True)
+    if args.json == "-":
+      print text
+    else:
+      with open(args.json, "w") as f:
+        f.write(text + "\n")
+
+if __name__ == '__main__':
+  try:
+    main()
+  finally:
+    pox.core.core.quit()